@@ -1,42 +1,138 @@
+"""Проверка шаблонов: синтаксис, N+1 и повторные запросы (school/templatelint.py).
+
+    python find_bad_urls.py                       # отчёт для человека
+    python find_bad_urls.py --format json         # для других инструментов
+    python find_bad_urls.py --format github       # аннотации GitHub Actions
+    python find_bad_urls.py --baseline template_lint_baseline.json
+
+Код выхода 1, если есть находки уровня ``--fail-on`` и выше, которых нет в
+списке известных (``--baseline``), или в списке остались записи, которым не
+соответствует ни одна находка: исправленную проблему нужно убрать из списка,
+иначе он снова скроет её. Так скрипт работает как проверка в CI.
+``--write-baseline`` сохраняет текущие находки как известные.
+"""
+
+import argparse
+import json
 import os
-import re
+import sys
+from pathlib import Path
 
+LEVELS = {"error": 2, "warning": 1}
 
-def find_syntax_errors():
-    """Найти синтаксические ошибки в шаблонах"""
-    templates_dir = "templates"
-    errors = []
 
-    for root, dirs, files in os.walk(templates_dir):
-        for file in files:
-            if file.endswith(".html"):
-                filepath = os.path.join(root, file)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Статический анализ шаблонов")
+    parser.add_argument("--format", choices=("text", "json", "github"), default="text")
+    parser.add_argument(
+        "--fail-on",
+        choices=("error", "warning", "never"),
+        default="warning",
+        help="С какого уровня находок завершаться с кодом 1",
+    )
+    parser.add_argument("--baseline", help="JSON со списком известных находок")
+    parser.add_argument(
+        "--write-baseline",
+        action="store_true",
+        help="Записать текущие находки в файл --baseline",
+    )
+    return parser.parse_args(argv)
 
-                with open(filepath, "r", encoding="utf-8") as f:
-                    content = f.read()
-                    lines = content.split("\n")
 
-                # Проверяем на некорректные теги
-                for i, line in enumerate(lines, 1):
-                    # Ищем странные конструкции с {% внутри переменных
-                    if (
-                        "course.{%" in line
-                        or "{% endwith %}{% endwith %}" in line
-                        or "{% with" in line
-                        and "{% endwith %}" not in line
-                    ):
-                        errors.append(f"Файл: {filepath}, Строка {i}: {line.strip()}")
+def load_baseline(path):
+    if not path or not Path(path).exists():
+        return set()
+    return set(json.loads(Path(path).read_text(encoding="utf-8")))
 
-    return errors
 
+def write_text(findings, known):
+    if not findings:
+        print("✅ Проблем в шаблонах не найдено!")
+        return
+    for finding in findings:
+        mark = " (известная)" if finding["known"] else ""
+        print(
+            f"{finding['file']}:{finding['line']}: {finding['severity']} "
+            f"[{finding['rule']}] {finding['message']}{mark}"
+        )
+        if finding["suggestion"]:
+            print(f"    -> {finding['suggestion']}")
+        if finding["views"]:
+            print(f"    представления: {', '.join(finding['views'])}")
+    new = sum(not finding["known"] for finding in findings)
+    print(f"\nНаходок: {len(findings)}, новых: {new}, известных: {known}")
+
+
+def write_stale(stale, options):
+    for key in stale:
+        if options.format == "github":
+            print(
+                f"::error file={options.baseline},title=stale-baseline::"
+                f"Запись {key} не соответствует ни одной находке"
+            )
+        else:
+            print(f"{options.baseline}: устаревшая запись {key}", file=sys.stderr)
+    if stale and options.format != "github":
+        print("Обновите список: --write-baseline", file=sys.stderr)
+
+
+def write_github(findings):
+    for finding in findings:
+        if finding["known"]:
+            continue
+        text = finding["message"]
+        if finding["suggestion"]:
+            text += f" -> {finding['suggestion']}"
+        print(
+            f"::{finding['severity']} file={finding['file']},line={finding['line']},"
+            f"title={finding['rule']}::{text}"
+        )
 
-if __name__ == "__main__":
-    print("Поиск синтаксических ошибок в шаблонах...")
-    errors = find_syntax_errors()
 
-    if errors:
-        print("\n=== Найдены ошибки: ===")
-        for error in errors:
-            print(error)
+def main(argv=None):
+    options = parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "school_web.settings")
+    import django
+
+    django.setup()
+    from school import templatelint
+
+    findings = templatelint.analyze()
+    if options.write_baseline:
+        if not options.baseline:
+            sys.exit("Укажите файл: --baseline")
+        keys = sorted({templatelint.fingerprint(finding) for finding in findings})
+        Path(options.baseline).write_text(
+            json.dumps(keys, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"Записано известных находок: {len(keys)}")
+        return 0
+
+    baseline = load_baseline(options.baseline)
+    for finding in findings:
+        finding["known"] = templatelint.fingerprint(finding) in baseline
+    stale = sorted(
+        baseline - {templatelint.fingerprint(finding) for finding in findings}
+    )
+
+    if options.format == "json":
+        print(json.dumps(findings, ensure_ascii=False, indent=2))
+    elif options.format == "github":
+        write_github(findings)
     else:
-        print("\n✅ Синтаксических ошибок не найдено!")
+        write_text(findings, sum(finding["known"] for finding in findings))
+    write_stale(stale, options)
+
+    threshold = LEVELS.get(options.fail_on)
+    failed = threshold is not None and (
+        bool(stale)
+        or any(
+            LEVELS[finding["severity"]] >= threshold and not finding["known"]
+            for finding in findings
+        )
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
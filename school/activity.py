@@ -0,0 +1,167 @@
+"""Лента активности.
+
+Раньше лента профиля собиралась тремя запросами к решениям, объявлениям и
+заданиям, а потом для каждой строки отдельно подгружались задание и курс.
+Теперь сдача, оценка, объявление и новое задание записывают событие в
+таблицу ActivityEvent (только добавление) с копиями названий, и лента
+пользователя или курса читается одним запросом по индексу
+``(user|course, -created_at, -id)``.
+
+Листание - по курсору: ``before`` - это время и id последнего показанного
+события, поэтому следующая страница читается с того же места индекса, а не
+через OFFSET, и не съезжает, когда приходят новые события.
+"""
+
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ActivityEvent, Course
+
+PER_PAGE = 20
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+# --- Курсор -----------------------------------------------------------------
+
+
+def encode_cursor(event):
+    """``"<микросекунды с 1970>_<id>"`` - без потери точности и символов,
+    требующих экранирования в URL"""
+    return f"{(event.created_at - _EPOCH) // _MICROSECOND}_{event.id}"
+
+
+def decode_cursor(cursor):
+    """(created_at, id) или None, если курсор пустой или испорчен"""
+    try:
+        micros, event_id = cursor.split("_")
+        return _EPOCH + int(micros) * _MICROSECOND, int(event_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+# --- Чтение -----------------------------------------------------------------
+
+
+def _page(queryset, before, limit):
+    queryset = queryset.order_by("-created_at", "-id")
+    position = decode_cursor(before)
+    if position is not None:
+        created_at, event_id = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=event_id)
+        )
+    # Лишняя строка показывает, есть ли следующая страница
+    events = list(queryset[: limit + 1])
+    if len(events) > limit:
+        events = events[:limit]
+        return events, encode_cursor(events[-1])
+    return events, None
+
+
+def user_feed(user, before=None, limit=PER_PAGE):
+    """События пользователя: ``(события, курсор следующей страницы или None)``"""
+    return _page(ActivityEvent.objects.filter(user=user), before, limit)
+
+
+def course_feed(course, before=None, limit=PER_PAGE):
+    """События курса: ``(события, курсор следующей страницы или None)``"""
+    return _page(ActivityEvent.objects.filter(course=course), before, limit)
+
+
+def as_json(event):
+    return {
+        "id": event.id,
+        "kind": event.kind,
+        "label": event.get_kind_display(),
+        "title": event.title,
+        "course_id": event.course_id,
+        "course_title": event.course_title,
+        "target_id": event.target_id,
+        "user_id": event.user_id,
+        "grade": event.grade,
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+# --- Запись -----------------------------------------------------------------
+
+
+def _course_titles(course_ids):
+    return dict(
+        Course.objects.filter(id__in=set(course_ids)).values_list("id", "title")
+    )
+
+
+def record_submissions(submissions):
+    """Сдача решений: событие в ленте ученика"""
+    submissions = list(submissions)
+    titles = _course_titles(s.assignment.course_id for s in submissions)
+    ActivityEvent.objects.bulk_create(
+        [
+            ActivityEvent(
+                kind="submission",
+                user_id=submission.student_id,
+                course_id=submission.assignment.course_id,
+                target_id=submission.assignment_id,
+                title=submission.assignment.title,
+                course_title=titles.get(submission.assignment.course_id, ""),
+                grade=submission.grade,
+                created_at=submission.submitted_at,
+            )
+            for submission in submissions
+        ]
+    )
+
+
+def record_grades(submissions):
+    """Оценка решений (учителем или автопроверкой): событие в ленте ученика"""
+    submissions = [s for s in submissions if s.grade is not None]
+    titles = _course_titles(s.assignment.course_id for s in submissions)
+    ActivityEvent.objects.bulk_create(
+        [
+            ActivityEvent(
+                kind="grade",
+                user_id=submission.student_id,
+                course_id=submission.assignment.course_id,
+                target_id=submission.assignment_id,
+                title=submission.assignment.title,
+                course_title=titles.get(submission.assignment.course_id, ""),
+                grade=submission.grade,
+                created_at=submission.graded_at or timezone.now(),
+            )
+            for submission in submissions
+        ]
+    )
+
+
+def record_announcement(announcement):
+    ActivityEvent.objects.create(
+        kind="announcement",
+        user_id=announcement.author_id,
+        course_id=announcement.course_id,
+        target_id=announcement.id,
+        title=announcement.title,
+        course_title=_course_titles([announcement.course_id]).get(
+            announcement.course_id, ""
+        ),
+        created_at=announcement.created_at,
+    )
+
+
+def record_assignment(assignment):
+    ActivityEvent.objects.create(
+        kind="assignment",
+        user_id=assignment.teacher_id,
+        course_id=assignment.course_id,
+        target_id=assignment.id,
+        title=assignment.title,
+        course_title=_course_titles([assignment.course_id]).get(
+            assignment.course_id, ""
+        ),
+        created_at=assignment.created_at,
+    )
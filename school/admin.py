@@ -1,7 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from .models import Profile, Course, Assignment, Submission, Announcement
+from .models import (
+    Profile,
+    Course,
+    Assignment,
+    AssignmentTestCase,
+    Submission,
+    Announcement,
+    ActivityEvent,
+    ArchivedAssignment,
+    ArchivedSubmission,
+    ArchivedAnnouncement,
+)
 
 
 class ProfileInline(admin.StackedInline):
@@ -32,34 +43,45 @@ class CustomUserAdmin(UserAdmin):
 
 
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ("title", "teacher", "students_count", "created_at")
-    list_filter = ("teacher", "created_at")
+    list_display = (
+        "title",
+        "teacher",
+        "students_count",
+        "assignments_count",
+        "created_at",
+        "archived_at",
+    )
+    list_filter = ("teacher", "created_at", "archived_at")
+    list_select_related = ("teacher",)
     search_fields = ("title", "description", "teacher__username")
     filter_horizontal = ("students",)
 
-    def students_count(self, obj):
-        return obj.students.count()
 
-    students_count.short_description = "Количество учеников"
+class AssignmentTestCaseInline(admin.TabularInline):
+    model = AssignmentTestCase
+    extra = 0
 
 
 class AssignmentAdmin(admin.ModelAdmin):
+    inlines = (AssignmentTestCaseInline,)
     list_display = ("title", "course", "teacher", "due_date", "status", "created_at")
     list_filter = ("status", "course", "teacher")
     search_fields = ("title", "description", "course__title")
 
 
 class SubmissionAdmin(admin.ModelAdmin):
-    list_display = ("assignment", "student", "submitted_at", "grade", "is_late")
-    list_filter = ("assignment__course", "assignment", "submitted_at")
+    list_display = (
+        "assignment",
+        "student",
+        "submitted_at",
+        "grade",
+        "grade_percentage",
+        "is_late",
+    )
+    list_filter = ("is_late", "assignment__course", "assignment", "submitted_at")
+    list_select_related = ("assignment__course", "student")
     search_fields = ("content", "student__username", "assignment__title")
 
-    def is_late(self, obj):
-        return obj.is_late()
-
-    is_late.boolean = True
-    is_late.short_description = "Опоздание"
-
 
 class AnnouncementAdmin(admin.ModelAdmin):
     list_display = ("title", "course", "author", "created_at")
@@ -67,9 +89,51 @@ class AnnouncementAdmin(admin.ModelAdmin):
     search_fields = ("title", "content", "course__title")
 
 
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """Архивные таблицы и ленту активности заполняет только само приложение"""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedAssignmentAdmin(ReadOnlyAdmin):
+    list_display = ("title", "course", "teacher", "due_date", "archived_at")
+    list_filter = ("course",)
+    list_select_related = ("course", "teacher")
+    search_fields = ("title", "course__title")
+
+
+class ArchivedSubmissionAdmin(ReadOnlyAdmin):
+    list_display = ("assignment", "student", "submitted_at", "grade", "is_late")
+    list_filter = ("assignment__course",)
+    list_select_related = ("assignment__course", "student")
+    search_fields = ("student__username", "assignment__title")
+
+
+class ArchivedAnnouncementAdmin(ReadOnlyAdmin):
+    list_display = ("title", "course", "author", "created_at")
+    list_filter = ("course",)
+    list_select_related = ("course", "author")
+    search_fields = ("title", "course__title")
+
+
+class ActivityEventAdmin(ReadOnlyAdmin):
+    list_display = ("kind", "title", "course_title", "user", "created_at")
+    list_filter = ("kind",)
+    list_select_related = ("user",)
+    search_fields = ("title", "course_title", "user__username")
+
+
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Course, CourseAdmin)
 admin.site.register(Assignment, AssignmentAdmin)
 admin.site.register(Submission, SubmissionAdmin)
 admin.site.register(Announcement, AnnouncementAdmin)
+admin.site.register(ArchivedAssignment, ArchivedAssignmentAdmin)
+admin.site.register(ArchivedSubmission, ArchivedSubmissionAdmin)
+admin.site.register(ArchivedAnnouncement, ArchivedAnnouncementAdmin)
+admin.site.register(ActivityEvent, ActivityEventAdmin)
@@ -0,0 +1,128 @@
+"""Распределение оценок по заданиям и курсам.
+
+Все оценки курса забираются одним запросом (процент от максимума уже хранится
+в Submission.grade_percentage) и обрабатываются NumPy: гистограмма,
+квартили, стандартное отклонение, сравнение сданных вовремя и с опозданием -
+для курса целиком и для каждого задания. Результат кешируется по номеру
+версии аналитики курса (CourseVersion в базе, общий для всех процессов),
+который увеличивается при каждом изменении оценок - сразу и ещё раз после
+commit, чтобы не закешировать данные, прочитанные до commit.
+"""
+
+import numpy as np
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import sharding
+from .models import ArchivedSubmission, CourseVersion, Submission
+
+HISTOGRAM_BINS = 10
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def invalidate(course_ids, using=DEFAULT_DB_ALIAS):
+    """Сбросить кеш распределений курсов после изменения оценок в базе
+    ``using``"""
+    course_ids = set(course_ids)
+    if not course_ids:
+        return
+    CourseVersion.bump(course_ids, "analytics")
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(
+            lambda: CourseVersion.bump(course_ids, "analytics"), using=using
+        )
+
+
+def _round(value):
+    return round(float(value), 1)
+
+
+def _group(percentages):
+    if not len(percentages):
+        return None
+    return {
+        "count": int(len(percentages)),
+        "mean": _round(percentages.mean()),
+        "median": _round(np.median(percentages)),
+    }
+
+
+def summarize(percentages, late):
+    """Статистика по массиву процентов; ``late`` - маска опоздавших"""
+    if not len(percentages):
+        return None
+    minimum, q1, median, q3, maximum = np.percentile(percentages, [0, 25, 50, 75, 100])
+    histogram, edges = np.histogram(percentages, bins=HISTOGRAM_BINS, range=(0, 100))
+    peak = int(histogram.max())
+    return {
+        "count": int(len(percentages)),
+        "mean": _round(percentages.mean()),
+        "std": _round(percentages.std()),
+        "min": _round(minimum),
+        "q1": _round(q1),
+        "median": _round(median),
+        "q3": _round(q3),
+        "max": _round(maximum),
+        "histogram": [
+            {
+                "from": int(edges[i]),
+                "to": int(edges[i + 1]),
+                "count": int(count),
+                "height": round(count / peak * 100) if peak else 0,
+            }
+            for i, count in enumerate(histogram)
+        ],
+        "on_time": _group(percentages[~late]),
+        "late": _group(percentages[late]),
+    }
+
+
+def _rows(submissions, course_id):
+    return list(
+        submissions.filter(assignment__course_id=course_id, grade__isnull=False)
+        .order_by()
+        .values_list("assignment_id", "grade_percentage", "is_late")
+    )
+
+
+def _compute(course_id):
+    # Решения архивного курса лежат в архивной таблице (school.archive)
+    rows = _rows(
+        Submission.objects.using(sharding.for_course(course_id)), course_id
+    ) or _rows(ArchivedSubmission.objects, course_id)
+    if not rows:
+        return {"course": None, "assignments": {}}
+
+    assignment_ids, percentages, late = (np.array(column) for column in zip(*rows))
+    percentages = percentages.astype(np.float64)
+    late = late.astype(bool)
+
+    # Группы по заданиям: одна сортировка и разбиение вместо фильтра на задание
+    ids, inverse, counts = np.unique(
+        assignment_ids, return_inverse=True, return_counts=True
+    )
+    order = np.argsort(inverse, kind="stable")
+    groups = np.split(order, np.cumsum(counts)[:-1])
+
+    return {
+        "course": summarize(percentages, late),
+        "assignments": {
+            int(assignment_id): summarize(percentages[group], late[group])
+            for assignment_id, group in zip(ids, groups)
+        },
+    }
+
+
+def course_distribution(course_id):
+    """``{"course": сводка, "assignments": {id задания: сводка}}``"""
+    version = CourseVersion.current(course_id, "analytics")
+    key = f"analytics:{course_id}:{version}"
+    result = cache.get(key)
+    if result is None:
+        result = _compute(course_id)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+def assignment_distribution(assignment):
+    return course_distribution(assignment.course_id)["assignments"].get(assignment.id)
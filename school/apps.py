@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class SchoolConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "school"
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        from . import signals  # noqa: F401
+        from . import memo, sharding, slowqueries, timing
+
+        post_migrate.connect(sharding.reserve_id_ranges, sender=self)
+
+        if timing.enabled():
+            timing.install()
+        if slowqueries.threshold() is not None:
+            slowqueries.install()
+        if memo.warnings_enabled():
+            memo.install()
@@ -0,0 +1,385 @@
+"""Архив прошедших курсов.
+
+Таблицы заданий, решений и объявлений растут бесконечно, и панели, списки и
+админка просматривают данные за все годы. Курсы, срок последнего задания
+которых прошёл больше ``ARCHIVE_AFTER_DAYS`` дней назад, переносятся в
+архивные таблицы (ArchivedAssignment, ArchivedSubmission,
+ArchivedAnnouncement) с прежними id:
+
+* решения и объявления переносятся пачками, каждая пачка - отдельная
+  транзакция (копирование и удаление из рабочей таблицы вместе), поэтому
+  перенос большого курса не держит длинную блокировку и после сбоя просто
+  продолжается повторным запуском;
+* последняя транзакция блокирует задания курса (SELECT ... FOR UPDATE:
+  новые решения ждут её завершения, а потом получают ошибку внешнего
+  ключа), переносит все остатки, удаляет задания (вместе с тестами - они
+  сохраняются в ArchivedAssignment.test_cases - и напоминаниями о сроках) и
+  ставит Course.archived_at. Решение, сданное во время переноса, не может
+  быть удалено каскадом, не попав в архив.
+
+Архивный курс открывается теми же представлениями только для чтения: они
+получают задания и объявления через assignments()/announcements() и
+get_assignment_or_404(). Команда archive_courses показывает план (--dry-run)
+и число строк и размер рабочих и архивных таблиц.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from . import analytics, querycache, sharding
+from .models import (
+    Announcement,
+    AnnouncementReadMarker,
+    ArchivedAnnouncement,
+    ArchivedAssignment,
+    ArchivedSubmission,
+    Assignment,
+    Course,
+    Submission,
+)
+
+BATCH_SIZE = 500
+
+# Рабочая таблица -> архивная, для отчёта о размерах
+TABLES = [
+    (Assignment, ArchivedAssignment),
+    (Submission, ArchivedSubmission),
+    (Announcement, ArchivedAnnouncement),
+]
+
+_archiving = ContextVar("archiving", default=False)
+
+
+def archive_after_days():
+    return getattr(settings, "ARCHIVE_AFTER_DAYS", 180)
+
+
+def is_archiving():
+    """Идёт перенос: сигналы удаления не пересчитывают счётчики по строке"""
+    return _archiving.get()
+
+
+@contextmanager
+def _suspend_signals():
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+
+# --- Чтение архивных курсов -------------------------------------------------
+
+
+def assignments(course):
+    if course.archived_at:
+        return course.archived_assignments.all()
+    return course.assignments.all()
+
+
+def announcements(course):
+    if course.archived_at:
+        return course.archived_announcements.all()
+    return course.announcements.all()
+
+
+def submissions(course):
+    if course.archived_at:
+        return ArchivedSubmission.objects.all()
+    return Submission.objects.using(sharding.for_course(course))
+
+
+def _hot(queryset, pk, filters):
+    # База запроса выбрана по URL (sharding.ShardRoutingMiddleware)
+    alias = sharding.current() or sharding.locate(queryset.model, pk)
+    if alias is None:
+        return None
+    return queryset.using(alias).filter(id=pk, **filters).first()
+
+
+def get_assignment_or_404(assignment_id, **filters):
+    """Задание из рабочей таблицы, а если его там нет - из архива"""
+    assignment = _hot(Assignment.objects.select_related("course"), assignment_id, filters)
+    if assignment is None:
+        assignment = get_object_or_404(
+            ArchivedAssignment.objects.select_related("course"),
+            id=assignment_id,
+            **filters,
+        )
+    return assignment
+
+
+def get_submission_or_404(submission_id, **filters):
+    submission = _hot(
+        Submission.objects.select_related("assignment__course"), submission_id, filters
+    )
+    if submission is None:
+        submission = get_object_or_404(
+            ArchivedSubmission.objects.select_related("assignment__course"),
+            id=submission_id,
+            **filters,
+        )
+    return submission
+
+
+# --- Перенос ----------------------------------------------------------------
+
+
+def closed_courses(days=None):
+    """Неархивные курсы, последний срок сдачи в которых был ``days`` дней назад"""
+    if days is None:
+        days = archive_after_days()
+    cutoff = timezone.now() - timedelta(days=days)
+    courses = Course.objects.filter(archived_at__isnull=True)
+    if not sharding.is_sharded():
+        return (
+            courses.annotate(last_due=Max("assignments__due_date"))
+            .filter(last_due__lt=cutoff)
+            .order_by("last_due", "id")
+        )
+
+    # Задания лежат в базах курсов: последний срок считается в каждой базе
+    last_due = {}
+    for alias in sharding.databases():
+        for course_id, due in (
+            Assignment.objects.using(alias)
+            .order_by()
+            .values_list("course_id")
+            .annotate(last_due=Max("due_date"))
+        ):
+            last_due[course_id] = max(due, last_due.get(course_id, due))
+    closed = [
+        course
+        for course in courses.filter(id__in=list(last_due))
+        if last_due[course.id] < cutoff
+    ]
+    for course in closed:
+        course.last_due = last_due[course.id]
+    closed.sort(key=lambda course: (course.last_due, course.id))
+    return closed
+
+
+def plan(courses):
+    """Сколько заданий, решений и объявлений каждого курса будет перенесено"""
+    courses = list(courses)
+    ids = [course.id for course in courses]
+
+    def counts(queryset, field):
+        totals = {}
+        for alias in sharding.databases():
+            for course_id, total in (
+                queryset.using(alias)
+                .filter(**{f"{field}__in": ids})
+                .order_by()
+                .values_list(field)
+                .annotate(total=Count("*"))
+            ):
+                totals[course_id] = totals.get(course_id, 0) + total
+        return totals
+
+    assignments_by_course = counts(Assignment.objects, "course_id")
+    submissions_by_course = counts(Submission.objects, "assignment__course_id")
+    announcements_by_course = counts(Announcement.objects, "course_id")
+    return [
+        {
+            "course": course,
+            "assignments": assignments_by_course.get(course.id, 0),
+            "submissions": submissions_by_course.get(course.id, 0),
+            "announcements": announcements_by_course.get(course.id, 0),
+        }
+        for course in courses
+    ]
+
+
+def _archive_assignments(course):
+    archived = [
+        ArchivedAssignment(
+            id=assignment.id,
+            title=assignment.title,
+            description=assignment.description,
+            course_id=assignment.course_id,
+            teacher_id=assignment.teacher_id,
+            due_date=assignment.due_date,
+            max_points=assignment.max_points,
+            status=assignment.status,
+            auto_grade=assignment.auto_grade,
+            test_cases=[
+                {
+                    "input_data": test.input_data,
+                    "expected_output": test.expected_output,
+                    "points": test.points,
+                }
+                for test in assignment.test_cases.all()
+            ],
+            created_at=assignment.created_at,
+            updated_at=assignment.updated_at,
+        )
+        for assignment in course.assignments.prefetch_related("test_cases")
+    ]
+    # ignore_conflicts: после прерванного запуска часть строк уже в архиве
+    ArchivedAssignment.objects.bulk_create(archived, ignore_conflicts=True)
+    return len(archived)
+
+
+def _move_submissions(course, batch_size):
+    submissions = Submission.objects.using(sharding.for_course(course))
+    batch = list(
+        submissions.filter(assignment__course=course).order_by("id")[:batch_size]
+    )
+    ArchivedSubmission.objects.bulk_create(
+        [
+            ArchivedSubmission(
+                id=submission.id,
+                assignment_id=submission.assignment_id,
+                student_id=submission.student_id,
+                content=submission.content,
+                file=submission.file.name or None,
+                submitted_at=submission.submitted_at,
+                grade=submission.grade,
+                feedback=submission.feedback,
+                graded_at=submission.graded_at,
+                is_late=submission.is_late,
+                grade_percentage=submission.grade_percentage,
+            )
+            for submission in batch
+        ],
+        ignore_conflicts=True,
+    )
+    submissions.filter(id__in=[submission.id for submission in batch]).delete()
+    return len(batch)
+
+
+def _move_announcements(course, batch_size):
+    batch = list(course.announcements.order_by("id")[:batch_size])
+    ArchivedAnnouncement.objects.bulk_create(
+        [
+            ArchivedAnnouncement(
+                id=announcement.id,
+                title=announcement.title,
+                content=announcement.content,
+                course_id=announcement.course_id,
+                author_id=announcement.author_id,
+                created_at=announcement.created_at,
+            )
+            for announcement in batch
+        ],
+        ignore_conflicts=True,
+    )
+    Announcement.objects.using(sharding.for_course(course)).filter(
+        id__in=[announcement.id for announcement in batch]
+    ).delete()
+    return len(batch)
+
+
+@contextmanager
+def _atomic(course):
+    # Рабочие таблицы курса могут быть в другой базе (school.sharding)
+    with transaction.atomic(), transaction.atomic(using=sharding.for_course(course)):
+        yield
+
+
+def _drain(move, course, batch_size, atomic=True):
+    # Пачками до опустошения; каждая пачка - своя транзакция, а при
+    # atomic=False - часть уже открытой
+    total = 0
+    while True:
+        if atomic:
+            with _atomic(course):
+                moved = move(course, batch_size)
+        else:
+            moved = move(course, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+def archive_course(course, batch_size=BATCH_SIZE):
+    """Перенести курс в архив; возвращает число перенесённых строк по таблицам"""
+    moved = {}
+    with _suspend_signals():
+        # Архивные задания нужны раньше решений (внешний ключ)
+        with _atomic(course):
+            _archive_assignments(course)
+        moved["submissions"] = _drain(_move_submissions, course, batch_size)
+        moved["announcements"] = _drain(_move_announcements, course, batch_size)
+
+        with _atomic(course):
+            # Строки, появившиеся во время переноса, и сами задания
+            list(course.assignments.select_for_update().values_list("id"))
+            moved["assignments"] = _archive_assignments(course)
+            moved["submissions"] += _drain(
+                _move_submissions, course, batch_size, atomic=False
+            )
+            moved["announcements"] += _drain(
+                _move_announcements, course, batch_size, atomic=False
+            )
+            course.assignments.all().delete()
+            course.archived_at = timezone.now()
+            Course.objects.filter(pk=course.pk).update(archived_at=course.archived_at)
+            querycache.invalidate([querycache.course_tag(course.pk)])
+
+    # Пересчёт того, что сигналы удаления пропустили во время переноса
+    Course.refresh_counters([course.id], students=False)
+    for marker in AnnouncementReadMarker.objects.filter(
+        user__courses_enrolled=course, unread_count__gt=0
+    ):
+        marker.recount()
+    analytics.invalidate([course.id])
+    return moved
+
+
+# --- Отчёт ------------------------------------------------------------------
+
+
+def _table_size(connection, table):
+    """Размер таблицы с индексами в байтах (None, если СУБД не сообщает)"""
+    with connection.cursor() as cursor:
+        return _query_size(connection, cursor, table)
+
+
+def _query_size(connection, cursor, table):
+    if connection.vendor == "sqlite":
+        try:
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                [table, table],
+            )
+        except DatabaseError:
+            # SQLite собран без SQLITE_ENABLE_DBSTAT_VTAB
+            return None
+    elif connection.vendor == "postgresql":
+        cursor.execute("SELECT pg_total_relation_size(%s)", [table])
+    else:
+        return None
+    return cursor.fetchone()[0] or 0
+
+
+def table_report():
+    """Число строк и размер рабочих и архивных таблиц (по всем базам)"""
+    rows = []
+    for hot, archived in TABLES:
+        for model in (hot, archived):
+            aliases = ["default"] if model is archived else sharding.databases()
+            sizes = [
+                _table_size(connections[alias], model._meta.db_table)
+                for alias in aliases
+            ]
+            rows.append(
+                {
+                    "table": model._meta.db_table,
+                    "archive": model is archived,
+                    "rows": sum(
+                        model.objects.using(alias).count() for alias in aliases
+                    ),
+                    "bytes": None if None in sizes else sum(sizes),
+                }
+            )
+    return rows
@@ -0,0 +1,464 @@
+"""Автоматическая проверка решений по тестам.
+
+Решения заданий с ``auto_grade`` попадают в очередь (autograde_status =
+"pending"). Команда run_autograder забирает их из базы и запускает каждое
+решение отдельным процессом Python. Пул держит занятыми все ядра; результаты
+записываются в базу пачками.
+
+Песочница (``AUTOGRADER_SANDBOX = "namespaces"``): решение запускается через
+``unshare`` в новых пространствах имён монтирования, сети, PID и IPC, так что
+у него нет сети, а все его процессы гибнут вместе с ним. Обёртка
+school/sandbox_exec.py даёт решению свои пустые /tmp, /var/tmp и /dev/shm
+(каталоги параллельных проверок не видны), скрывает проект, базы и
+MEDIA_ROOT, ставит
+ограничения процессорного времени, памяти, размера файлов и числа процессов
+и переходит к ``AUTOGRADER_USER`` (если проверка запущена от root). Вместо
+unshare можно задать свой префикс команды (bwrap, nsjail, контейнер) списком
+аргументов. По таймауту убивается вся группа процессов.
+"""
+
+import itertools
+import json
+import logging
+import os
+import pwd
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import cache, partial
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+
+from . import activity, analytics, leaderboard, sharding
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+MAX_OUTPUT = 64 * 1024
+# Каталоги, которые решение получает пустыми (только со своим рабочим каталогом)
+PRIVATE_TMP = ("/tmp", "/var/tmp", "/dev/shm")
+
+
+def time_limit():
+    return getattr(settings, "AUTOGRADER_TIME_LIMIT", 5)
+
+
+def memory_limit_mb():
+    return getattr(settings, "AUTOGRADER_MEMORY_LIMIT_MB", 256)
+
+
+def max_processes():
+    return getattr(settings, "AUTOGRADER_MAX_PROCESSES", 16)
+
+
+def python():
+    # Интерпретатор решений должен быть доступен AUTOGRADER_USER
+    return getattr(settings, "AUTOGRADER_PYTHON", None) or (
+        shutil.which("python3", path="/usr/local/bin:/usr/bin:/bin") or sys.executable
+    )
+
+
+def sandbox_user():
+    """(uid, gid) для решений или None, если проверка запущена не от root"""
+    name = getattr(settings, "AUTOGRADER_USER", "nobody")
+    if not name or os.geteuid() != 0:
+        return None
+    entry = pwd.getpwnam(name)
+    return entry.pw_uid, entry.pw_gid
+
+
+def _unshare_prefix():
+    unshare = shutil.which("unshare")
+    if unshare is None:
+        return None
+    prefix = [unshare, "--mount", "--net", "--pid", "--ipc", "--fork", "--kill-child"]
+    if os.geteuid() != 0:
+        prefix[1:1] = ["--user", "--map-root-user"]
+    return prefix
+
+
+@cache
+def _namespaces_work(prefix):
+    try:
+        return (
+            subprocess.run(
+                [*prefix, "true"], capture_output=True, timeout=10
+            ).returncode
+            == 0
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def sandbox_prefix():
+    """Префикс команды запуска решения.
+
+    Без работающей изоляции проверка не запускается: ``AUTOGRADER_SANDBOX =
+    "none"`` нужно указать явно.
+    """
+    sandbox = getattr(settings, "AUTOGRADER_SANDBOX", "namespaces")
+    if sandbox == "none":
+        return []
+    if sandbox != "namespaces":
+        return list(sandbox)
+    prefix = _unshare_prefix()
+    if prefix is None or not _namespaces_work(tuple(prefix)):
+        raise ImproperlyConfigured(
+            "Автопроверке нужны пространства имён (unshare); задайте "
+            'AUTOGRADER_SANDBOX - префикс команды bwrap/nsjail или "none"'
+        )
+    return prefix
+
+
+def hidden_paths():
+    """Пути, которых решение не должно видеть"""
+    paths = {str(settings.BASE_DIR), str(settings.MEDIA_ROOT)}
+    paths.update(str(database["NAME"]) for database in settings.DATABASES.values())
+    paths.update(getattr(settings, "AUTOGRADER_HIDDEN_PATHS", ()))
+    interpreter = os.path.realpath(python())
+    # Каталог с интерпретатором (venv внутри проекта) закрыть нельзя
+    return sorted(
+        path
+        for path in paths
+        if os.path.isabs(path)
+        and not interpreter.startswith(os.path.realpath(path) + os.sep)
+    )
+
+
+def _limits():
+    cpu = time_limit()
+    memory = memory_limit_mb() * 1024 * 1024
+    return {
+        "RLIMIT_CPU": cpu,
+        "RLIMIT_AS": memory,
+        "RLIMIT_FSIZE": MAX_OUTPUT,
+        "RLIMIT_CORE": 0,
+        "RLIMIT_NPROC": max_processes(),
+    }
+
+
+def _command(source_path, workdir, prefix, user):
+    options = {
+        "hide": hidden_paths() if prefix else [],
+        "private_tmp": list(PRIVATE_TMP) if prefix else [],
+        "limits": _limits(),
+        "uid": user[0] if user else None,
+        "gid": user[1] if user else None,
+        "workdir": workdir,
+        "python": python(),
+        "source": source_path,
+        "env": {"PATH": "/usr/bin:/bin", "PYTHONIOENCODING": "utf-8"},
+    }
+    wrapper = Path(__file__).with_name("sandbox_exec.py").read_text(encoding="utf-8")
+    return [*prefix, python(), "-I", "-S", "-c", wrapper, json.dumps(options)]
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def make_workdir():
+    """Пустой рабочий каталог решения (0700), доступный AUTOGRADER_USER"""
+    workdir = tempfile.mkdtemp(prefix="autograde_")
+    user = sandbox_user()
+    if user is not None:
+        os.chown(workdir, *user)
+    return workdir
+
+
+def load_source(submission):
+    if submission.file and submission.file.name.endswith(".py"):
+        with submission.file.open("rb") as f:
+            return f.read().decode("utf-8", errors="replace")
+    return submission.content
+
+
+def _normalize_output(text):
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+def run_test(source_path, test, workdir):
+    """Запустить решение на одном тесте. Возвращает (пройден, сообщение)."""
+    process = subprocess.Popen(
+        _command(source_path, workdir, sandbox_prefix(), sandbox_user()),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        cwd=workdir,
+        env={"PATH": "/usr/bin:/bin"},
+        # Своя группа процессов: по таймауту убиваются и потомки решения
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = process.communicate(test.input_data, timeout=time_limit() * 2)
+    except subprocess.TimeoutExpired:
+        _kill_group(process)
+        process.communicate()
+        return False, "превышено время выполнения"
+    finally:
+        _kill_group(process)
+
+    # Обёртка передаёт гибель решения от сигнала N кодом 128 + N
+    signum = process.returncode - 128 if process.returncode > 128 else None
+    if signum in (signal.SIGXCPU, signal.SIGKILL):
+        return False, "превышено время выполнения"
+    if signum is not None:
+        return False, f"процесс остановлен сигналом {signum}"
+    if process.returncode != 0:
+        error = stderr.strip().splitlines()[-1:] or [f"код {process.returncode}"]
+        return False, f"ошибка выполнения: {error[0][:200]}"
+    if _normalize_output(stdout[:MAX_OUTPUT]) != _normalize_output(
+        test.expected_output
+    ):
+        return False, "неверный ответ"
+    return True, "пройден"
+
+
+def grade(submission, tests):
+    """Проверить решение на всех тестах задания.
+
+    Возвращает словарь с оценкой и комментарием; в базу ничего не пишет.
+    """
+    start = time.perf_counter()
+    workdir = make_workdir()
+    try:
+        source_path = os.path.join(workdir, "solution.py")
+        with open(source_path, "w", encoding="utf-8") as f:
+            f.write(load_source(submission))
+        os.chmod(source_path, 0o644)
+
+        earned = 0
+        total = 0
+        lines = []
+        for number, test in enumerate(tests, 1):
+            passed, message = run_test(source_path, test, workdir)
+            total += test.points
+            if passed:
+                earned += test.points
+            lines.append(f"Тест {number}: {message}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    max_points = submission.assignment.max_points
+    score = round(earned / total * max_points) if total else 0
+    passed_count = sum(1 for line in lines if line.endswith("пройден"))
+    feedback = "\n".join(
+        [f"Автопроверка: пройдено тестов {passed_count} из {len(lines)}"] + lines
+    )
+    return {
+        "grade": max(0, min(score, 100)),
+        "feedback": feedback,
+        "latency": time.perf_counter() - start,
+    }
+
+
+class Stats:
+    """Счётчики проверяющего процесса: глубина очереди и задержки задач"""
+
+    def __init__(self):
+        self.processed = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def record(self, latency, error=False):
+        with self._lock:
+            self.processed += 1
+            self.errors += error
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+        p95 = (
+            latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else None
+        )
+        return {
+            "queue_depth": queue_depth(),
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "errors": self.errors,
+            "latency_p50": statistics.median(latencies) if latencies else None,
+            "latency_p95": p95,
+        }
+
+
+def queue_depth():
+    return sharding.count(Submission.objects.filter(autograde_status="pending"))
+
+
+def reset_stale():
+    """Вернуть в очередь решения, брошенные упавшим проверяющим процессом"""
+    return sum(
+        Submission.objects.using(alias)
+        .filter(autograde_status="running")
+        .update(autograde_status="pending")
+        for alias in sharding.databases()
+    )
+
+
+_claim_rotation = itertools.count()
+
+
+def _claim(alias, limit):
+    submissions = Submission.objects.using(alias)
+    with transaction.atomic(using=alias):
+        ids = list(
+            submissions.select_for_update(skip_locked=True)
+            .filter(autograde_status="pending")
+            .order_by("submitted_at")
+            .values_list("id", flat=True)[:limit]
+        )
+        ids = _mark_running(submissions, ids)
+    return list(submissions.filter(id__in=ids).select_related("assignment"))
+
+
+def _mark_running(submissions, ids):
+    """id решений, которые этот процесс перевёл из "pending" в "running".
+
+    Без блокировки строк (SQLite) другой процесс мог успеть забрать часть
+    выбранных решений: условный UPDATE на каждое решение показывает, какие
+    достались нам. Решений в пачке не больше ``workers * 2``.
+    """
+    return [
+        pk
+        for pk in ids
+        if submissions.filter(pk=pk, autograde_status="pending").update(
+            autograde_status="running"
+        )
+    ]
+
+
+def claim(limit):
+    """Забрать из очереди до ``limit`` решений, пометив их как проверяемые"""
+    if limit <= 0:
+        return []
+    # Очередь каждой базы (school.sharding); первая база меняется по кругу,
+    # чтобы загруженный шард не задерживал проверку в остальных
+    databases = sharding.databases()
+    start = next(_claim_rotation) % len(databases)
+    claimed = []
+    for alias in databases[start:] + databases[:start]:
+        claimed += _claim(alias, limit - len(claimed))
+        if len(claimed) >= limit:
+            break
+    return claimed
+
+
+def save_results(results):
+    """Записать пачку результатов одним bulk_update"""
+    if not results:
+        return
+    now = timezone.now()
+    submissions = []
+    for submission, old_grade, result in results:
+        if result is None:
+            submission.autograde_status = "error"
+        else:
+            submission.grade = result["grade"]
+            submission.feedback = result["feedback"]
+            submission.graded_at = now
+            submission.autograde_status = "done"
+            submission.update_derived_fields()
+        submissions.append(submission)
+
+    by_database = {}
+    for submission in submissions:
+        by_database.setdefault(submission._state.db, []).append(submission)
+    for alias, batch in by_database.items():
+        Submission.objects.using(alias).bulk_update(
+            batch,
+            ["grade", "feedback", "graded_at", "autograde_status", "grade_percentage"],
+        )
+    for submission, old_grade, result in results:
+        if result is not None:
+            transaction.on_commit(
+                partial(leaderboard.record_grade, submission, old_grade),
+                using=submission._state.db,
+            )
+    activity.record_grades(
+        submission for submission, old_grade, result in results if result is not None
+    )
+    analytics.invalidate(
+        submission.assignment.course_id
+        for submission, old_grade, result in results
+        if result is not None
+    )
+
+
+def run(workers=None, batch_size=50, poll_interval=1.0, once=False, stats=None):
+    """Основной цикл проверяющего процесса.
+
+    В работе одновременно ``workers * 2`` решений, чтобы ядра не простаивали
+    между пачками; готовые результаты сохраняются, когда их набралось
+    ``batch_size`` или прошла ``poll_interval`` секунд.
+    """
+    workers = workers or os.cpu_count() or 1
+    stats = stats or Stats()
+    tests_cache = {}
+    in_flight = {}
+    done = []
+    last_flush = time.monotonic()
+
+    def tests_for(assignment):
+        if assignment.id not in tests_cache:
+            tests_cache[assignment.id] = list(assignment.test_cases.all())
+        return tests_cache[assignment.id]
+
+    sandbox_prefix()  # без изоляции - ошибка сразу, а не на каждом решении
+    reset_stale()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for submission in claim(workers * 2 - len(in_flight)):
+                future = pool.submit(
+                    grade, submission, tests_for(submission.assignment)
+                )
+                in_flight[future] = (submission, submission.grade)
+            stats.in_flight = len(in_flight)
+
+            if not in_flight:
+                save_results(done)
+                done = []
+                if once:
+                    return stats
+                tests_cache.clear()
+                time.sleep(poll_interval)
+                continue
+
+            finished, _ = wait(
+                in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED
+            )
+            for future in finished:
+                submission, old_grade = in_flight.pop(future)
+                try:
+                    result = future.result()
+                    stats.record(result["latency"])
+                except Exception:
+                    logger.exception("Ошибка автопроверки решения %s", submission.id)
+                    result = None
+                    stats.record(0, error=True)
+                done.append((submission, old_grade, result))
+
+            if (
+                len(done) >= batch_size
+                or time.monotonic() - last_flush >= poll_interval
+            ):
+                save_results(done)
+                done = []
+                last_flush = time.monotonic()
@@ -0,0 +1,55 @@
+"""Каталог курсов.
+
+Карточки берут число учеников и заданий из денормализованных столбцов
+Course.students_count и Course.assignments_count; сортировка по популярности
+и новизне идёт по индексам course_popularity_idx и course_recent_idx. Курсы,
+на которые ученик уже записан, исключаются по списку id из кеша, а не
+анти-join'ом по всей таблице записей.
+"""
+
+from django.core.cache import cache
+
+from .models import Course
+
+PER_PAGE = 12
+ENROLLED_TIMEOUT = 60 * 60
+SORTS = {
+    "popular": ("-students_count", "-id"),
+    "new": ("-created_at", "-id"),
+}
+SORT_CHOICES = [("popular", "Популярные"), ("new", "Новые")]
+
+
+def _enrolled_key(user_id):
+    return f"catalog:enrolled:{user_id}"
+
+
+def enrolled_course_ids(user):
+    """id курсов, на которые записан ученик (из кеша)"""
+    key = _enrolled_key(user.id)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = list(
+            Course.students.through.objects.filter(user_id=user.id).values_list(
+                "course_id", flat=True
+            )
+        )
+        cache.set(key, course_ids, ENROLLED_TIMEOUT)
+    return course_ids
+
+
+def invalidate_enrolled(user_ids):
+    cache.delete_many([_enrolled_key(user_id) for user_id in user_ids])
+
+
+def courses(sort="popular"):
+    return (
+        Course.objects.filter(archived_at__isnull=True)
+        .select_related("teacher")
+        .order_by(*SORTS.get(sort, SORTS["popular"]))
+    )
+
+
+def available_courses(user, sort="popular"):
+    """Курсы, на которые ученик ещё не записан"""
+    return courses(sort).exclude(id__in=enrolled_course_ids(user))
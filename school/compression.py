@@ -0,0 +1,225 @@
+"""Минификация HTML и сжатие ответов.
+
+Страницы проекта большие (встроенный CSS, шаблоны по 700 строк с отступами),
+а основные пользователи - ученики с мобильным интернетом. CompressionMiddleware:
+
+* схлопывает пробелы и убирает комментарии в HTML вне ``<pre>``,
+  ``<textarea>`` и ``<script>`` (``HTML_MINIFY``); перевод строки
+  сохраняется, поэтому разметка и встроенные обработчики не меняют смысла;
+* сжимает текстовые ответы Brotli или gzip - что предпочитает клиент по
+  ``Accept-Encoding``, - если ответ не меньше ``COMPRESSION_MIN_SIZE`` байт.
+  Brotli используется, только если установлен пакет ``brotli``;
+* сжимает StreamingHttpResponse (в том числе асинхронные) по кускам, сбрасывая
+  сжатые данные после каждого куска, чтобы события SSE приходили сразу.
+
+Как и в django.middleware.gzip, к gzip добавляется случайное число байтов
+против BREACH. Сэкономленные байты видны в /metrics
+(``school_http_response_bytes_total``).
+"""
+
+import re
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # сжатие только gzip
+    brotli = None
+
+GZIP_LEVEL = 6
+# Качество 11 слишком медленное для динамических страниц
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+_PRESERVED = re.compile(
+    r"<(pre|textarea|script)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL
+)
+_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+_NEWLINES = re.compile(r"[ \t\r\f\v]*\n\s*")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+
+
+def minify_enabled():
+    return getattr(settings, "HTML_MINIFY", True)
+
+
+def min_size():
+    return getattr(settings, "COMPRESSION_MIN_SIZE", 512)
+
+
+def _collapse(html):
+    html = _COMMENT.sub("", html)
+    html = _NEWLINES.sub("\n", html)
+    return _SPACES.sub(" ", html)
+
+
+def minify_html(html):
+    """Схлопнуть пробелы вне ``<pre>``, ``<textarea>`` и ``<script>``"""
+    parts = []
+    position = 0
+    for match in _PRESERVED.finditer(html):
+        parts.append(_collapse(html[position : match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(_collapse(html[position:]))
+    return "".join(parts)
+
+
+def choose_encoding(accept_encoding):
+    """``"br"``, ``"gzip"`` или None по заголовку Accept-Encoding"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+
+    def quality(encoding):
+        return accepted.get(encoding, accepted.get("*", 0))
+
+    # Наибольший q клиента; при равных - Brotli (первый в supported)
+    supported = ("br", "gzip") if brotli is not None else ("gzip",)
+    encoding = max(supported, key=quality)
+    return encoding if quality(encoding) > 0 else None
+
+
+def compress(content, encoding):
+    if encoding == "br":
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return compress_string(content, max_random_bytes=100)
+
+
+def _stream_compressor(encoding):
+    """Функции (сжать кусок и сбросить, завершить поток)"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return (
+            lambda chunk: compressor.process(chunk) + compressor.flush(),
+            compressor.finish,
+        )
+    # wbits=31: поток с заголовком gzip
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return (
+        lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def _count(original, minified, sent):
+    metrics.RESPONSE_BYTES.inc(original, stage="original")
+    metrics.RESPONSE_BYTES.inc(minified, stage="minified")
+    metrics.RESPONSE_BYTES.inc(sent, stage="sent")
+
+
+def _compress_stream(content, encoding):
+    compress_chunk, finish = _stream_compressor(encoding)
+    for chunk in content:
+        data = compress_chunk(chunk)
+        _count(len(chunk), len(chunk), len(data))
+        yield data
+    data = finish()
+    _count(0, 0, len(data))
+    yield data
+
+
+async def _acompress_stream(content, encoding):
+    compress_chunk, finish = _stream_compressor(encoding)
+    async for chunk in content:
+        data = compress_chunk(chunk)
+        _count(len(chunk), len(chunk), len(data))
+        yield data
+    data = finish()
+    _count(0, 0, len(data))
+    yield data
+
+
+class CompressionMiddleware:
+    """Минификация HTML и сжатие gzip/Brotli по Accept-Encoding"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or response.status_code == 206:
+            return response
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        if "no-transform" in response.get("Cache-Control", ""):
+            return response
+
+        encoding = choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if response.streaming:
+            patch_vary_headers(response, ("Accept-Encoding",))
+            if encoding is None:
+                return response
+            if response.is_async:
+                response.streaming_content = _acompress_stream(
+                    response.streaming_content, encoding
+                )
+            else:
+                response.streaming_content = _compress_stream(
+                    response.streaming_content, encoding
+                )
+            del response.headers["Content-Length"]
+            response.headers["Content-Encoding"] = encoding
+            return response
+
+        content = original = response.content
+        if content_type == "text/html" and minify_enabled():
+            try:
+                content = minify_html(content.decode(response.charset)).encode(
+                    response.charset
+                )
+            except UnicodeDecodeError:
+                pass
+        minified = len(content)
+
+        if minified >= min_size():
+            patch_vary_headers(response, ("Accept-Encoding",))
+            if encoding is not None:
+                compressed = compress(content, encoding)
+                if len(compressed) < minified:
+                    content = compressed
+                    response.headers["Content-Encoding"] = encoding
+
+        if content is not original:
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+            # Байты изменились - строгий ETag больше не соответствует ответу
+            etag = response.get("ETag")
+            if etag and etag.startswith('"'):
+                response.headers["ETag"] = "W/" + etag
+        _count(len(original), minified, len(content))
+        return response
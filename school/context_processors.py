@@ -0,0 +1,32 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import events
+from .models import AnnouncementReadMarker
+
+
+def unread_announcements(request):
+    """Количество непрочитанных объявлений для значка в навигации.
+
+    Запрос (одна строка по уникальному индексу) выполняется только если
+    шаблон действительно обращается к значению.
+    """
+
+    def count():
+        if not request.user.is_authenticated:
+            return 0
+        return (
+            AnnouncementReadMarker.objects.filter(user=request.user)
+            .values_list("unread_count", flat=True)
+            .first()
+            or 0
+        )
+
+    return {"unread_announcements": SimpleLazyObject(count)}
+
+
+def submission_events(request):
+    """Подключать ли страницу к SSE-потоку (только под ASGI)"""
+    return {
+        "submission_events_enabled": request.user.is_authenticated
+        and events.available(request)
+    }
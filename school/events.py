@@ -0,0 +1,227 @@
+"""Шина событий о решениях для Server-Sent Events.
+
+Один фоновый опросчик на процесс раз в ``EVENTS_POLL_INTERVAL`` секунд
+забирает из базы новые сдачи и оценки и раскладывает их по подписчикам.
+Каждое SSE-соединение только ждёт своего ``asyncio.Event``, поэтому тысячи
+простаивающих соединений не создают нагрузки на базу.
+"""
+
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.utils import timezone
+
+from . import sharding
+from .models import Submission
+
+logger = logging.getLogger(__name__)
+
+# Если за один интервал накопилось больше событий, клиенту отправляется
+# "reset" - проще перезагрузить страницу, чем доставлять всё по одному.
+MAX_PENDING_EVENTS = 100
+
+
+def available(request):
+    """Поток возможен только под ASGI.
+
+    Под WSGI Django собирает асинхронный генератор ответа в список через
+    async_to_sync, и бесконечный поток навсегда занимает поток или процесс
+    сервера.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def poll_interval():
+    return getattr(settings, "EVENTS_POLL_INTERVAL", 2)
+
+
+def heartbeat_interval():
+    return getattr(settings, "EVENTS_HEARTBEAT_INTERVAL", 15)
+
+
+class Subscriber:
+    """Очередь событий одного SSE-соединения.
+
+    События складываются в словарь по ключу (тип, id решения), так что серия
+    изменений одного решения схлопывается в последнее состояние.
+    """
+
+    def __init__(self, course_ids=(), student_id=None):
+        self.course_ids = frozenset(course_ids)
+        self.student_id = student_id
+        self.pending = {}
+        self.overflow = False
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        if self.overflow:
+            return
+        key = (event["type"], event["submission_id"])
+        self.pending[key] = event
+        if len(self.pending) > MAX_PENDING_EVENTS:
+            self.pending.clear()
+            self.overflow = True
+        self.ready.set()
+
+    def drain(self):
+        events = list(self.pending.values())
+        overflow = self.overflow
+        self.pending = {}
+        self.overflow = False
+        self.ready.clear()
+        return events, overflow
+
+
+class SubmissionEventBus:
+    def __init__(self):
+        self._by_course = {}
+        self._by_student = {}
+        self._task = None
+        self._since = None
+        self._seen = set()
+
+    @property
+    def subscribers_count(self):
+        subscribers = set()
+        for group in self._by_course.values():
+            subscribers |= group
+        for group in self._by_student.values():
+            subscribers |= group
+        return len(subscribers)
+
+    def subscribe(self, subscriber):
+        for course_id in subscriber.course_ids:
+            self._by_course.setdefault(course_id, set()).add(subscriber)
+        if subscriber.student_id is not None:
+            self._by_student.setdefault(subscriber.student_id, set()).add(subscriber)
+
+        if self._task is None or self._task.done():
+            self._since = timezone.now()
+            self._seen = set()
+            self._task = asyncio.create_task(self._run())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        for course_id in subscriber.course_ids:
+            group = self._by_course.get(course_id)
+            if group is not None:
+                group.discard(subscriber)
+                if not group:
+                    del self._by_course[course_id]
+        if subscriber.student_id is not None:
+            group = self._by_student.get(subscriber.student_id)
+            if group is not None:
+                group.discard(subscriber)
+                if not group:
+                    del self._by_student[subscriber.student_id]
+
+    async def _run(self):
+        # Опросчик останавливается, когда не осталось подписчиков
+        while self._by_course or self._by_student:
+            await asyncio.sleep(poll_interval())
+            try:
+                events = await self._fetch()
+            except Exception:
+                logger.exception("Не удалось получить события о решениях")
+                continue
+            for event in events:
+                self._dispatch(event)
+
+    async def _fetch(self):
+        since = self._since
+        rows = (
+            Submission.objects.filter(
+                Q(submitted_at__gte=since) | Q(graded_at__gte=since)
+            )
+            .values(
+                "id",
+                "student_id",
+                "grade",
+                "submitted_at",
+                "graded_at",
+                "assignment_id",
+                "assignment__title",
+                "assignment__max_points",
+                "assignment__course_id",
+            )
+            .order_by()
+        )
+
+        events = []
+        seen = set()
+        latest = since
+        for alias in sharding.databases():
+            async for row in rows.using(alias):
+                for event_type, moment in (
+                    ("submitted", row["submitted_at"]),
+                    ("graded", row["graded_at"]),
+                ):
+                    if moment is None or moment < since:
+                        continue
+                    key = (event_type, row["id"], moment)
+                    seen.add(key)
+                    latest = max(latest, moment)
+                    if key in self._seen:
+                        continue
+                    events.append(
+                        {
+                            "type": event_type,
+                            "submission_id": row["id"],
+                            "student_id": row["student_id"],
+                            "assignment_id": row["assignment_id"],
+                            "assignment_title": row["assignment__title"],
+                            "course_id": row["assignment__course_id"],
+                            "grade": row["grade"],
+                            "max_points": row["assignment__max_points"],
+                            "at": moment.isoformat(),
+                        }
+                    )
+
+        # Курсор сравнивается через >=, поэтому события с тем же временем
+        # запоминаются, чтобы не отправить их повторно.
+        self._since = latest
+        self._seen = {key for key in seen if key[2] == latest}
+        return events
+
+    def _dispatch(self, event):
+        targets = set(self._by_course.get(event["course_id"], ()))
+        # Ученик получает только оценки за свои решения
+        if event["type"] == "graded":
+            targets |= self._by_student.get(event["student_id"], set())
+        for subscriber in targets:
+            subscriber.push(event)
+
+
+bus = SubmissionEventBus()
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream(subscriber):
+    """Асинхронный генератор SSE-сообщений для одного подписчика."""
+    bus.subscribe(subscriber)
+    try:
+        yield f"retry: {int(poll_interval() * 1000)}\n\n"
+        while True:
+            try:
+                await asyncio.wait_for(
+                    subscriber.ready.wait(), timeout=heartbeat_interval()
+                )
+            except asyncio.TimeoutError:
+                # Комментарий не даёт прокси закрыть простаивающее соединение
+                yield ": ping\n\n"
+                continue
+
+            events, overflow = subscriber.drain()
+            if overflow:
+                yield format_sse("reset", {})
+            elif events:
+                yield format_sse("submissions", events)
+    finally:
+        bus.unsubscribe(subscriber)
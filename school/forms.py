@@ -1,7 +1,15 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Profile, Course, Assignment, Submission, Announcement
+from .models import (
+    Profile,
+    Course,
+    Assignment,
+    AssignmentTestCase,
+    Submission,
+    Announcement,
+)
+from . import querycache
 
 
 class UserRegistrationForm(UserCreationForm):
@@ -94,7 +102,15 @@ class AssignmentForm(forms.ModelForm):
 
     class Meta:
         model = Assignment
-        fields = ["course", "title", "description", "due_date", "max_points", "status"]
+        fields = [
+            "course",
+            "title",
+            "description",
+            "due_date",
+            "max_points",
+            "status",
+            "auto_grade",
+        ]
         widgets = {
             "course": forms.Select(attrs={"class": "form-control"}),
             "title": forms.TextInput(
@@ -109,6 +125,7 @@ class AssignmentForm(forms.ModelForm):
             ),
             "max_points": forms.NumberInput(attrs={"class": "form-control"}),
             "status": forms.Select(attrs={"class": "form-control"}),
+            "auto_grade": forms.CheckboxInput(attrs={"class": "form-check-input"}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -116,8 +133,23 @@ class AssignmentForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
 
         # Если передан пользователь, фильтруем курсы только этого учителя
+        # (кроме архивных - они только для чтения)
         if user:
-            self.fields["course"].queryset = Course.objects.filter(teacher=user)
+            field = self.fields["course"]
+            field.queryset = Course.objects.filter(
+                teacher=user, archived_at__isnull=True
+            )
+            # Варианты списка - из кеша querysets; выбранный курс при
+            # проверке формы всё равно ищется запросом к field.queryset
+            courses = querycache.cached(
+                field.queryset,
+                [querycache.teacher_tag(user.id)],
+                row_tags=lambda course: [querycache.course_tag(course.id)],
+            )
+            field.choices = [
+                ("", field.empty_label),
+                *(field.iterator(field).choice(course) for course in courses),
+            ]
         else:
             self.fields["course"].queryset = Course.objects.none()
 
@@ -156,6 +188,29 @@ class GradeForm(forms.ModelForm):
         }
 
 
+class AssignmentTestCaseForm(forms.ModelForm):
+    class Meta:
+        model = AssignmentTestCase
+        fields = ["input_data", "expected_output", "points"]
+        widgets = {
+            "input_data": forms.Textarea(
+                attrs={
+                    "class": "form-control font-monospace",
+                    "rows": 4,
+                    "placeholder": "Данные, подаваемые на stdin",
+                }
+            ),
+            "expected_output": forms.Textarea(
+                attrs={
+                    "class": "form-control font-monospace",
+                    "rows": 4,
+                    "placeholder": "Ожидаемый вывод программы",
+                }
+            ),
+            "points": forms.NumberInput(attrs={"class": "form-control", "min": 1}),
+        }
+
+
 class AnnouncementForm(forms.ModelForm):
     class Meta:
         model = Announcement
@@ -0,0 +1,137 @@
+"""Журнал оценок курса: матрица ученики × задания.
+
+Данные собираются плоскими запросами values_list (состав курса, список
+заданий, все решения курса) без создания моделей и раскладываются в массивы
+NumPy: оценки (NaN - нет оценки), признаки "сдано", "опоздание" и "долг"
+(срок прошёл, решения нет). Итоги по строкам и столбцам считаются целыми
+операциями над массивами, а не циклами по ученикам.
+
+Страница журнала получает матрицу одним JSON (см. as_json()) и рисует только
+видимые строки, поэтому курс на 1000 учеников и 100 заданий открывается
+быстро.
+"""
+
+import numpy as np
+from django.utils import timezone
+
+from . import archive
+
+# Биты ячейки в as_json()["flags"]
+SUBMITTED = 1
+LATE = 2
+MISSING = 4
+
+
+def _positions(ids, values):
+    """Индексы ``values`` в массиве ``ids`` (-1, если значения там нет)"""
+    order = np.argsort(ids, kind="stable")
+    sorted_ids = ids[order]
+    found = np.searchsorted(sorted_ids, values)
+    found = np.minimum(found, len(ids) - 1)
+    return np.where(sorted_ids[found] == values, order[found], -1)
+
+
+class Gradebook:
+    def __init__(self, course, now=None):
+        self.course = course
+        now = now or timezone.now()
+
+        self.students = list(
+            course.students.order_by("last_name", "first_name", "id").values_list(
+                "id", "first_name", "last_name", "username"
+            )
+        )
+        self.assignments = list(
+            archive.assignments(course)
+            .order_by("due_date", "id")
+            .values_list("id", "title", "max_points", "due_date")
+        )
+        rows = list(
+            archive.submissions(course)
+            .filter(assignment_id__in=[row[0] for row in self.assignments])
+            .order_by()
+            .values_list("student_id", "assignment_id", "grade", "is_late")
+        )
+
+        shape = (len(self.students), len(self.assignments))
+        self.grades = np.full(shape, np.nan, dtype=np.float32)
+        self.submitted = np.zeros(shape, dtype=bool)
+        self.late = np.zeros(shape, dtype=bool)
+        self.max_points = np.array(
+            [row[2] for row in self.assignments], dtype=np.float32
+        )
+        overdue = np.array([row[3] < now for row in self.assignments], dtype=bool)
+
+        if rows and all(shape):
+            student_ids, assignment_ids, grades, late = zip(*rows)
+            r = _positions(
+                np.array([row[0] for row in self.students]), np.array(student_ids)
+            )
+            c = _positions(
+                np.array([row[0] for row in self.assignments]),
+                np.array(assignment_ids),
+            )
+            # Решения отчисленных учеников в журнал не попадают
+            keep = r >= 0
+            r, c = r[keep], c[keep]
+            self.grades[r, c] = np.array(grades, dtype=np.float32)[keep]
+            self.submitted[r, c] = True
+            self.late[r, c] = np.array(late, dtype=bool)[keep]
+
+        self.missing = ~self.submitted & overdue[np.newaxis, :]
+        graded = ~np.isnan(self.grades)
+
+        # По ученикам
+        self.row_total = np.nansum(self.grades, axis=1)
+        self.row_graded_max = graded.astype(np.float32) @ self.max_points
+        self.row_percent = np.divide(
+            self.row_total * 100,
+            self.row_graded_max,
+            out=np.full(len(self.students), np.nan, dtype=np.float32),
+            where=self.row_graded_max > 0,
+        )
+        self.row_missing = self.missing.sum(axis=1)
+
+        # По заданиям
+        graded_count = graded.sum(axis=0)
+        self.col_average = np.divide(
+            np.nansum(self.grades, axis=0),
+            graded_count,
+            out=np.full(len(self.assignments), np.nan, dtype=np.float32),
+            where=graded_count > 0,
+        )
+        self.col_submitted = self.submitted.sum(axis=0)
+        self.col_missing = self.missing.sum(axis=0)
+
+    @staticmethod
+    def _list(values, digits=1):
+        # NaN в JSON недопустим - заменяем на None
+        return [
+            None if value != value else round(value, digits)
+            for value in values.tolist()
+        ]
+
+    def as_json(self):
+        grades = np.where(np.isnan(self.grades), -1, self.grades).astype(np.int32)
+        flags = (
+            self.submitted * SUBMITTED + self.late * LATE + self.missing * MISSING
+        ).astype(np.int8)
+        return {
+            "students": [
+                [student_id, f"{last_name} {first_name}".strip() or username]
+                for student_id, first_name, last_name, username in self.students
+            ],
+            "assignments": [
+                [assignment_id, title, max_points, due_date.isoformat()]
+                for assignment_id, title, max_points, due_date in self.assignments
+            ],
+            # -1 - нет оценки
+            "grades": grades.tolist(),
+            "flags": flags.tolist(),
+            "row_total": self._list(self.row_total),
+            "row_percent": self._list(self.row_percent),
+            "row_missing": self.row_missing.tolist(),
+            "col_average": self._list(self.col_average),
+            "col_submitted": self.col_submitted.tolist(),
+            "col_missing": self.col_missing.tolist(),
+        }
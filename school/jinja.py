@@ -0,0 +1,99 @@
+"""Окружение Jinja2 для самых тяжёлых страниц.
+
+Панели ученика и учителя, страницы курса и задания (jinja2/*.html) -
+самые большие шаблоны проекта, и их рендеринг шаблонами Django занимает
+заметную часть времени запроса. Jinja2 компилирует шаблон в Python-код один
+раз; скомпилированный байткод сохраняется в ``JINJA2_BYTECODE_CACHE_DIR``,
+поэтому новые процессы сервера не разбирают шаблоны заново.
+
+Фильтры и функции повторяют встроенные фильтры и теги Django, которые
+используются в этих шаблонах: ``url()``, ``static()``, ``widthratio()``,
+``|date``, ``|truncatechars``, ``|floatformat``, ``|linebreaks`` и т. д.
+Как и в шаблонах Django, числа и даты в ``{{ }}`` выводятся в формате
+текущего языка (``88,0`` при ru-ru); ``|unlocalize`` выводит число как есть,
+например в CSS. Какой движок рендерит эти страницы, задаёт
+``HOT_TEMPLATES_ENGINE``.
+"""
+
+from pathlib import Path
+
+from django.conf import settings
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils import formats, timezone
+from django.utils.dateformat import format as date_format
+from django.utils.timezone import template_localtime
+from jinja2 import Environment, FileSystemBytecodeCache, Undefined
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    # Каталог создаётся при первой записи, а не при запуске manage.py
+    def dump_bytecode(self, bucket):
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        super().dump_bytecode(bucket)
+
+
+def url(viewname, *args, **kwargs):
+    """``{% url 'name' arg %}`` -> ``{{ url('name', arg) }}``"""
+    return reverse(viewname, args=args or None, kwargs=kwargs or None)
+
+
+def widthratio(value, max_value, max_width):
+    """Аналог тега ``{% widthratio %}``"""
+    try:
+        return str(round(float(value) / float(max_value) * float(max_width)))
+    except ZeroDivisionError:
+        return "0"
+    except (ValueError, TypeError, OverflowError):
+        return ""
+
+
+def now(format_string):
+    return date_format(template_localtime(timezone.now()), format_string)
+
+
+def date(value, arg=None):
+    # Как и шаблоны Django, выводим время в текущем часовом поясе
+    return defaultfilters.date(template_localtime(value), arg)
+
+
+def localize(value):
+    """Значение в формате текущего языка, как его выводят шаблоны Django"""
+    return formats.localize(template_localtime(value))
+
+
+def unlocalize(value):
+    """Аналог ``|unlocalize`` из l10n: число без форматирования языка"""
+    return str(value)
+
+
+FILTERS = {
+    "date": date,
+    "localize": localize,
+    "unlocalize": unlocalize,
+    "truncatechars": defaultfilters.truncatechars,
+    "floatformat": defaultfilters.floatformat,
+    "linebreaks": defaultfilters.linebreaks_filter,
+    "timesince": defaultfilters.timesince_filter,
+    "timeuntil": defaultfilters.timeuntil_filter,
+}
+
+
+def environment(**options):
+    cache_dir = getattr(
+        settings,
+        "JINJA2_BYTECODE_CACHE_DIR",
+        Path(settings.BASE_DIR) / "cache" / "jinja2",
+    )
+    if cache_dir is not None:
+        options["bytecode_cache"] = BytecodeCache(str(cache_dir))
+    # Как в шаблонах Django, отсутствующая переменная выводится пустой строкой
+    # (бэкенд в режиме DEBUG подставил бы DebugUndefined)
+    options["undefined"] = Undefined
+    options["finalize"] = localize
+
+    env = Environment(**options)
+    env.globals.update(url=url, static=static, widthratio=widthratio, now=now)
+    env.filters.update(FILTERS)
+    return env
@@ -0,0 +1,218 @@
+"""Рейтинг учеников курса.
+
+Суммы баллов хранятся в LeaderboardEntry и обновляются одним UPDATE при
+выставлении оценки. Для запросов "топ N" и "моё место" каждый процесс держит
+отсортированный массив ключей (-баллы, id ученика): место ученика находится
+бинарным поиском за O(log n), без пересчёта по всем решениям курса.
+Обновление оценки сдвигает хвост списка (insort и del - O(n)); для курса в
+несколько тысяч учеников это один memmove на микросекунды, поэтому
+сбалансированное дерево здесь не нужно.
+
+Массив сверяется с номером версии рейтинга курса (CourseVersion): номер
+увеличивается в той же транзакции, что и сумма баллов, поэтому изменения из
+других процессов приводят к перезагрузке массива одним запросом по индексу
+(course, -total_points). record_grade() вызывается после commit оценки
+(transaction.on_commit): отменённая оценка в рейтинг не попадает.
+"""
+
+import threading
+from bisect import bisect_left, insort
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import sharding
+from .models import ArchivedSubmission, CourseVersion, LeaderboardEntry, Submission
+
+
+class CourseLeaderboard:
+    def __init__(self, course_id, rows, version):
+        self.course_id = course_id
+        self.version = version
+        self._totals = {}
+        self._keys = []
+        for student_id, total_points, graded_count in rows:
+            self._totals[student_id] = (total_points, graded_count)
+            self._keys.append((-total_points, student_id))
+        self._keys.sort()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, student_id):
+        return student_id in self._totals
+
+    def update(self, student_id, total_points, graded_count):
+        old = self._totals.get(student_id)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old[0], student_id))]
+        insort(self._keys, (-total_points, student_id))
+        self._totals[student_id] = (total_points, graded_count)
+
+    def remove(self, student_id):
+        old = self._totals.pop(student_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old[0], student_id))]
+
+    def rank(self, student_id):
+        """Место ученика (1 - лучший, при равенстве баллов места делятся)"""
+        if student_id not in self._totals:
+            return None
+        total_points = self._totals[student_id][0]
+        return bisect_left(self._keys, (-total_points,)) + 1
+
+    def percentile(self, student_id):
+        """Процент учеников курса с меньшей суммой баллов"""
+        if student_id not in self._totals:
+            return None
+        if len(self._keys) == 1:
+            return 100
+        total_points = self._totals[student_id][0]
+        below = len(self._keys) - bisect_left(self._keys, (-total_points + 1,))
+        return round(below / (len(self._keys) - 1) * 100)
+
+    def entry(self, student_id):
+        total_points, graded_count = self._totals[student_id]
+        return {
+            "student_id": student_id,
+            "rank": self.rank(student_id),
+            "total_points": total_points,
+            "graded_count": graded_count,
+            "average_points": total_points / graded_count if graded_count else 0,
+            "percentile": self.percentile(student_id),
+        }
+
+    def top(self, n):
+        return [self.entry(student_id) for _, student_id in self._keys[:n]]
+
+
+_boards = {}
+_lock = threading.Lock()
+
+
+def get_leaderboard(course_id):
+    version = CourseVersion.current(course_id, "leaderboard")
+    with _lock:
+        board = _boards.get(course_id)
+        if board is not None and board.version == version:
+            return board
+
+    rows = LeaderboardEntry.objects.filter(course_id=course_id).values_list(
+        "student_id", "total_points", "graded_count"
+    )
+    board = CourseLeaderboard(course_id, rows, version)
+    with _lock:
+        _boards[course_id] = board
+    return board
+
+
+def record_grade(submission, old_grade):
+    """Учесть изменение оценки решения в рейтинге курса"""
+    new_grade = submission.grade
+    if new_grade == old_grade:
+        return
+
+    course_id = submission.assignment.course_id
+    delta_points = (new_grade or 0) - (old_grade or 0)
+    delta_count = (new_grade is not None) - (old_grade is not None)
+
+    with transaction.atomic():
+        entry, _ = LeaderboardEntry.objects.get_or_create(
+            course_id=course_id, student_id=submission.student_id
+        )
+        LeaderboardEntry.objects.filter(pk=entry.pk).update(
+            total_points=F("total_points") + delta_points,
+            graded_count=F("graded_count") + delta_count,
+        )
+        total_points, graded_count = LeaderboardEntry.objects.filter(
+            pk=entry.pk
+        ).values_list("total_points", "graded_count")[0]
+        version = CourseVersion.bump([course_id], "leaderboard")[course_id]
+
+    with _lock:
+        board = _boards.get(course_id)
+        if board is None:
+            return
+        if board.version == version - 1:
+            board.update(submission.student_id, total_points, graded_count)
+            board.version = version
+        else:
+            # Пропущены изменения из других процессов - перезагрузим при чтении
+            del _boards[course_id]
+
+
+def rebuild(course_id=None, check=False):
+    """Пересчитать рейтинг по всем оценкам.
+
+    Возвращает список расхождений ``(course_id, student_id, было, стало)``,
+    где было/стало - пары (сумма баллов, число оценок). При ``check=True``
+    таблица не изменяется.
+    """
+    submissions = Submission.objects.filter(grade__isnull=False)
+    archived = ArchivedSubmission.objects.filter(grade__isnull=False)
+    entries = LeaderboardEntry.objects.all()
+    databases = sharding.databases()
+    if course_id is not None:
+        submissions = submissions.filter(assignment__course_id=course_id)
+        archived = archived.filter(assignment__course_id=course_id)
+        entries = entries.filter(course_id=course_id)
+        databases = [sharding.for_course(course_id)]
+
+    # Решения архивного курса лежат в архивной таблице (school.archive), а во
+    # время переноса - частично в обеих, поэтому суммы складываются
+    expected = {}
+    for queryset in [submissions.using(alias) for alias in databases] + [archived]:
+        for row in (
+            queryset.values("assignment__course_id", "student_id")
+            .annotate(total=Sum("grade"), count=Count("id"))
+            .order_by()
+        ):
+            key = (row["assignment__course_id"], row["student_id"])
+            total, count = expected.get(key, (0, 0))
+            expected[key] = (total + row["total"], count + row["count"])
+    actual = {
+        (row[0], row[1]): (row[2], row[3])
+        for row in entries.values_list(
+            "course_id", "student_id", "total_points", "graded_count"
+        )
+    }
+
+    mismatches = [
+        (key[0], key[1], actual.get(key), expected.get(key))
+        for key in expected.keys() | actual.keys()
+        if actual.get(key) != expected.get(key)
+    ]
+    if check or not mismatches:
+        return mismatches
+
+    with transaction.atomic():
+        stale = [key for key in actual if key not in expected]
+        for stale_course_id, student_id in stale:
+            LeaderboardEntry.objects.filter(
+                course_id=stale_course_id, student_id=student_id
+            ).delete()
+
+        to_create = []
+        for key, (total_points, graded_count) in expected.items():
+            if key not in actual:
+                to_create.append(
+                    LeaderboardEntry(
+                        course_id=key[0],
+                        student_id=key[1],
+                        total_points=total_points,
+                        graded_count=graded_count,
+                    )
+                )
+            elif actual[key] != (total_points, graded_count):
+                LeaderboardEntry.objects.filter(
+                    course_id=key[0], student_id=key[1]
+                ).update(total_points=total_points, graded_count=graded_count)
+        LeaderboardEntry.objects.bulk_create(to_create, batch_size=1000)
+
+    changed = {key[0] for key in mismatches}
+    CourseVersion.bump(changed, "leaderboard")
+    with _lock:
+        for changed_course_id in changed:
+            _boards.pop(changed_course_id, None)
+
+    return mismatches
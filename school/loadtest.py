@@ -0,0 +1,292 @@
+"""Нагрузочный тест "последний час перед дедлайном".
+
+Виртуальные ученики (по потоку на каждого) входят на запущенный сервер,
+сдают решения текстом и файлом и обновляют страницу задания и панель, как
+это делают ученики перед сроком сдачи. Сценарий описывается JSON-файлом в
+loadtest/scenarios/; итог - JSON-отчёт с пропускной способностью, долей
+ошибок и перцентилями задержек по каждому действию. Ключи отчёта
+упорядочены, а числа округлены, поэтому отчёты разных версий удобно
+сравнивать diff'ом или командой load_test --compare.
+
+Модуль использует только стандартную библиотеку: генератор нагрузки можно
+запускать на отдельной машине, Django нужен лишь для подготовки данных.
+"""
+
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import (
+    HTTPCookieProcessor,
+    HTTPRedirectHandler,
+    Request,
+    build_opener,
+)
+
+DEFAULT_SCENARIO = {
+    "name": "scenario",
+    "prefix": "load",
+    "students": 50,
+    "concurrency": 20,
+    "duration": 30,
+    "ramp_up": 5,
+    "think_time": [0.5, 2.0],
+    "content_size": 2000,
+    "file_size": 20000,
+    "timeout": 30,
+    "actions": {
+        "submit": 2,
+        "submit_file": 1,
+        "assignment_detail": 4,
+        "dashboard": 3,
+    },
+}
+ACTIONS = ("submit", "submit_file", "assignment_detail", "dashboard")
+
+
+def load_scenario(path):
+    with open(path, encoding="utf-8") as f:
+        scenario = {**DEFAULT_SCENARIO, **json.load(f)}
+    unknown = set(scenario["actions"]) - set(ACTIONS)
+    if unknown:
+        raise ValueError(f"Неизвестные действия в сценарии: {', '.join(unknown)}")
+    return scenario
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    # Меряем сам запрос, а не страницу, на которую он перенаправляет
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class VirtualStudent:
+    """Один ученик со своей сессией (cookies) на сервере"""
+
+    def __init__(self, base_url, username, password, paths, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.paths = paths
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), _NoRedirect)
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, path, data=None, headers=None):
+        """Выполнить запрос, вернуть (код ответа, время в секундах)"""
+        request = Request(self.base_url + path, data=data, headers=headers or {})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            error.read()
+            status = error.code
+        except (URLError, OSError):
+            status = 0
+        return status, time.perf_counter() - start
+
+    def login(self):
+        self.request(self.paths["login"])
+        data = urlencode(
+            {
+                "csrfmiddlewaretoken": self._csrf_token(),
+                "username": self.username,
+                "password": self.password,
+            }
+        ).encode()
+        status, elapsed = self.request(
+            self.paths["login"],
+            data,
+            {"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        # Успешный вход заканчивается перенаправлением на панель
+        return status == 302, status, elapsed
+
+    def submit(self, content, file_content=None):
+        boundary = uuid.uuid4().hex
+        fields = [
+            ("csrfmiddlewaretoken", self._csrf_token()),
+            ("content", content),
+        ]
+        body = []
+        for name, value in fields:
+            body.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                f"\r\n\r\n{value}\r\n".encode()
+            )
+        if file_content is not None:
+            body.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+                f'filename="solution.py"\r\nContent-Type: text/x-python\r\n\r\n'.encode()
+                + file_content
+                + b"\r\n"
+            )
+        body.append(f"--{boundary}--\r\n".encode())
+        return self.request(
+            self.paths["submit"],
+            b"".join(body),
+            {"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        )
+
+
+def _solution(size, rnd):
+    line = "print(sum(int(x) for x in input().split()))  # "
+    text = []
+    while sum(map(len, text)) < size:
+        text.append(line + str(rnd.random()) + "\n")
+    return "".join(text)[:size]
+
+
+def run(scenario, base_url, paths, credentials):
+    """Прогнать сценарий. ``credentials`` - список (логин, пароль) учеников.
+
+    Возвращает словарь-отчёт (см. summarize()).
+    """
+    results = []
+    results_lock = threading.Lock()
+    started = time.time()
+    deadline = time.monotonic() + scenario["ramp_up"] + scenario["duration"]
+    actions, weights = zip(*scenario["actions"].items())
+    concurrency = scenario["concurrency"]
+
+    def record(action, status, elapsed):
+        ok = 200 <= status < 400
+        with results_lock:
+            results.append((action, status, elapsed, ok))
+
+    def worker(number):
+        rnd = random.Random(number)
+        # Потоки стартуют равномерно в течение ramp_up секунд
+        time.sleep(scenario["ramp_up"] * number / concurrency)
+        username, password = credentials[number % len(credentials)]
+        student = VirtualStudent(
+            base_url, username, password, paths, scenario["timeout"]
+        )
+        ok, status, elapsed = student.login()
+        record("login", status if ok else max(status, 400), elapsed)
+        if not ok:
+            return
+
+        while time.monotonic() < deadline:
+            action = rnd.choices(actions, weights)[0]
+            if action == "submit":
+                status, elapsed = student.submit(
+                    _solution(scenario["content_size"], rnd)
+                )
+            elif action == "submit_file":
+                status, elapsed = student.submit(
+                    _solution(200, rnd),
+                    _solution(scenario["file_size"], rnd).encode(),
+                )
+            else:
+                status, elapsed = student.request(paths[action])
+            record(action, status, elapsed)
+            time.sleep(rnd.uniform(*scenario["think_time"]))
+
+    threads = [
+        threading.Thread(target=worker, args=(number,), daemon=True)
+        for number in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize(scenario, base_url, results, started, time.time() - started)
+
+
+def _latencies(durations):
+    durations = sorted(durations)
+    if len(durations) >= 2:
+        cuts = statistics.quantiles(durations, n=100, method="inclusive")
+        p50, p90, p95, p99 = cuts[49], cuts[89], cuts[94], cuts[98]
+    else:
+        p50 = p90 = p95 = p99 = durations[0]
+    return {
+        "mean_ms": round(statistics.fmean(durations) * 1000, 1),
+        "p50_ms": round(p50 * 1000, 1),
+        "p90_ms": round(p90 * 1000, 1),
+        "p95_ms": round(p95 * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+        "max_ms": round(durations[-1] * 1000, 1),
+    }
+
+
+def summarize(scenario, base_url, results, started, elapsed):
+    by_action = {}
+    status_codes = {}
+    for action, status, duration, ok in results:
+        by_action.setdefault(action, []).append((duration, ok))
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+
+    actions = {}
+    for action, rows in by_action.items():
+        errors = sum(1 for _, ok in rows if not ok)
+        actions[action] = {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4),
+            "throughput_rps": round(len(rows) / elapsed, 2),
+            **_latencies([duration for duration, _ in rows]),
+        }
+
+    total = len(results)
+    errors = sum(1 for row in results if not row[3])
+    report = {
+        "scenario": scenario["name"],
+        "base_url": base_url,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "elapsed_s": round(elapsed, 1),
+        "concurrency": scenario["concurrency"],
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+        "status_codes": status_codes,
+        "actions": actions,
+    }
+    if results:
+        report.update(_latencies([row[2] for row in results]))
+    return report
+
+
+def dumps(report):
+    return json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + "\n"
+
+
+def compare(baseline, report):
+    """Строки с изменением основных показателей относительно baseline"""
+
+    def delta(old, new):
+        if not old:
+            return f"{old} -> {new}"
+        return f"{old} -> {new} ({(new - old) / old:+.0%})"
+
+    lines = [
+        f"всего: rps {delta(baseline['throughput_rps'], report['throughput_rps'])}, "
+        f"ошибки {baseline['error_rate']:.2%} -> {report['error_rate']:.2%}"
+    ]
+    for action in sorted(report["actions"]):
+        new = report["actions"][action]
+        old = baseline.get("actions", {}).get(action)
+        if old is None:
+            lines.append(f"{action}: нет в базовом отчёте")
+            continue
+        lines.append(
+            f"{action}: p50 {delta(old['p50_ms'], new['p50_ms'])}, "
+            f"p95 {delta(old['p95_ms'], new['p95_ms'])}, "
+            f"ошибки {old['error_rate']:.2%} -> {new['error_rate']:.2%}"
+        )
+    return lines
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school import sharding, similarity
+from school.models import Assignment, Submission
+
+
+class Command(BaseCommand):
+    help = "Поиск похожих решений по заданиям (MinHash/LSH)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--assignment", type=int, help="ID задания")
+        parser.add_argument(
+            "--threshold", type=float, default=similarity.DEFAULT_THRESHOLD
+        )
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Число процессов для пересчёта"
+        )
+        parser.add_argument(
+            "--backfill",
+            action="store_true",
+            help="Только посчитать недостающие сигнатуры",
+        )
+
+    def handle(self, *args, **options):
+        if options["backfill"]:
+            updated = sum(
+                similarity.backfill_signatures(Submission.objects.using(alias))
+                for alias in sharding.databases()
+            )
+            self.stdout.write(self.style.SUCCESS(f"Сигнатур посчитано: {updated}"))
+            return
+
+        assignments = sharding.gather(Assignment.objects.order_by("id"))
+        if options["assignment"]:
+            alias = sharding.locate(Assignment, options["assignment"])
+            assignments = Assignment.objects.using(alias or "default").filter(
+                id=options["assignment"]
+            )
+            if alias is None or not assignments.exists():
+                raise CommandError("Задание не найдено")
+
+        for assignment in assignments:
+            start = time.perf_counter()
+            pairs = similarity.analyze_assignment(
+                assignment, options["threshold"], workers=options["workers"]
+            )
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{assignment}: пар {len(pairs)}, {elapsed:.2f} с")
+            for pair in pairs[:20]:
+                self.stdout.write(
+                    f"  {pair['a']} ↔ {pair['b']}: {pair['similarity']:.0%}"
+                )
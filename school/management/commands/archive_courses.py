@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from school import archive
+from school.models import Course
+
+
+def _size(value):
+    if value is None:
+        return "-"
+    for unit in ("Б", "КБ", "МБ"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} ГБ"
+
+
+class Command(BaseCommand):
+    help = "Перенести задания, решения и объявления прошедших курсов в архив"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course",
+            type=int,
+            action="append",
+            help="ID курса (можно несколько); по умолчанию - все прошедшие курсы",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Дней после последнего срока сдачи (по умолчанию ARCHIVE_AFTER_DAYS)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=archive.BATCH_SIZE, help="Строк в пачке"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет перенесено",
+        )
+        parser.add_argument(
+            "--report",
+            action="store_true",
+            help="Только показать число строк и размер таблиц",
+        )
+
+    def write_report(self):
+        for row in archive.table_report():
+            kind = "архив" if row["archive"] else "рабочая"
+            self.stdout.write(
+                f"  {row['table']:<30} {kind:<8} {row['rows']:>10} строк "
+                f"{_size(row['bytes']):>10}"
+            )
+
+    def handle(self, *args, **options):
+        if options["report"]:
+            self.write_report()
+            return
+
+        if options["course"]:
+            courses = Course.objects.filter(
+                id__in=options["course"], archived_at__isnull=True
+            ).order_by("id")
+            if len(courses) != len(set(options["course"])):
+                raise CommandError("Курс не найден или уже в архиве")
+        else:
+            courses = archive.closed_courses(options["days"])
+
+        plan = archive.plan(courses)
+        if not plan:
+            self.stdout.write("Нет курсов для архивации")
+            return
+
+        self.stdout.write("Таблицы до переноса:")
+        self.write_report()
+        self.stdout.write("План:")
+        for row in plan:
+            self.stdout.write(
+                f"  {row['course'].id}. {row['course'].title}: "
+                f"заданий {row['assignments']}, решений {row['submissions']}, "
+                f"объявлений {row['announcements']}"
+            )
+        total = sum(row["submissions"] for row in plan)
+        self.stdout.write(f"Курсов: {len(plan)}, решений: {total}")
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Пробный запуск: ничего не изменено"))
+            return
+
+        for row in plan:
+            moved = archive.archive_course(row["course"], options["batch_size"])
+            self.stdout.write(
+                f"  {row['course'].id}. перенесено: заданий {moved['assignments']}, "
+                f"решений {moved['submissions']}, "
+                f"объявлений {moved['announcements']}"
+            )
+
+        self.stdout.write("Таблицы после переноса:")
+        self.write_report()
+        self.stdout.write(self.style.SUCCESS(f"В архив перенесено курсов: {len(plan)}"))
@@ -0,0 +1,128 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from school import sharding
+from school.models import ActivityEvent, Announcement, Assignment, Course, Submission
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполнить ленту активности по существующим решениям, оценкам, "
+        "объявлениям и заданиям"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Удалить все события ленты и построить её заново",
+        )
+
+    def handle(self, *args, **options):
+        if ActivityEvent.objects.exists() and not options["replace"]:
+            self.stdout.write(
+                "Лента уже заполнена; используйте --replace, чтобы построить её заново"
+            )
+            return
+
+        self.course_titles = dict(Course.objects.values_list("id", "title"))
+        with transaction.atomic():
+            ActivityEvent.objects.all().delete()
+            total = 0
+            for alias in sharding.databases():
+                for events in (
+                    self._submissions(alias),
+                    self._grades(alias),
+                    self._announcements(alias),
+                    self._assignments(alias),
+                ):
+                    total += len(
+                        ActivityEvent.objects.bulk_create(events, batch_size=BATCH_SIZE)
+                    )
+        self.stdout.write(self.style.SUCCESS(f"Создано событий: {total}"))
+
+    # Названия заданий берутся одним JOIN, названия курсов - из словаря: курсы
+    # лежат в основной базе, а задания и решения могут быть в шарде
+
+    def _submissions(self, alias):
+        return [
+            ActivityEvent(
+                kind="submission",
+                user_id=row["student_id"],
+                course_id=row["assignment__course_id"],
+                target_id=row["assignment_id"],
+                title=row["assignment__title"],
+                course_title=self.course_titles.get(row["assignment__course_id"], ""),
+                grade=row["grade"],
+                created_at=row["submitted_at"],
+            )
+            for row in Submission.objects.using(alias)
+            .values(
+                "student_id",
+                "assignment_id",
+                "assignment__title",
+                "assignment__course_id",
+                "grade",
+                "submitted_at",
+            )
+            .iterator()
+        ]
+
+    def _grades(self, alias):
+        return [
+            ActivityEvent(
+                kind="grade",
+                user_id=row["student_id"],
+                course_id=row["assignment__course_id"],
+                target_id=row["assignment_id"],
+                title=row["assignment__title"],
+                course_title=self.course_titles.get(row["assignment__course_id"], ""),
+                grade=row["grade"],
+                created_at=row["graded_at"],
+            )
+            for row in Submission.objects.using(alias)
+            .filter(grade__isnull=False, graded_at__isnull=False)
+            .values(
+                "student_id",
+                "assignment_id",
+                "assignment__title",
+                "assignment__course_id",
+                "grade",
+                "graded_at",
+            )
+            .iterator()
+        ]
+
+    def _announcements(self, alias):
+        return [
+            ActivityEvent(
+                kind="announcement",
+                user_id=row["author_id"],
+                course_id=row["course_id"],
+                target_id=row["id"],
+                title=row["title"],
+                course_title=self.course_titles.get(row["course_id"], ""),
+                created_at=row["created_at"],
+            )
+            for row in Announcement.objects.using(alias)
+            .values("id", "author_id", "course_id", "title", "created_at")
+            .iterator()
+        ]
+
+    def _assignments(self, alias):
+        return [
+            ActivityEvent(
+                kind="assignment",
+                user_id=row["teacher_id"],
+                course_id=row["course_id"],
+                target_id=row["id"],
+                title=row["title"],
+                course_title=self.course_titles.get(row["course_id"], ""),
+                created_at=row["created_at"],
+            )
+            for row in Assignment.objects.using(alias)
+            .values("id", "teacher_id", "course_id", "title", "created_at")
+            .iterator()
+        ]
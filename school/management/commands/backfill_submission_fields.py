@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef, Subquery
+
+from school import sharding
+from school.models import Assignment, Submission
+
+
+class Command(BaseCommand):
+    help = "Пересчитать сохранённые is_late и grade_percentage у существующих решений"
+
+    def handle(self, *args, **options):
+        count = 0
+        for alias in sharding.databases():
+            assignment = Assignment.objects.using(alias).filter(
+                pk=OuterRef("assignment_id")
+            )
+            # Один UPDATE на базу: срок и максимум задания - подзапросами
+            count += Submission.objects.using(alias).update(
+                is_late=Exists(
+                    assignment.filter(due_date__lt=OuterRef("submitted_at"))
+                ),
+                grade_percentage=Submission.percentage(
+                    Subquery(assignment.values("max_points")[:1])
+                ),
+            )
+        self.stdout.write(self.style.SUCCESS(f"Обработано решений: {count}"))
@@ -0,0 +1,87 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from school.management.seed import seed_school
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение задержек синхронных и асинхронных панелей через ASGI "
+        "на временной тестовой базе"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--courses", type=int, default=5)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            data = seed_school(courses=options["courses"], students=options["students"])
+            teacher = data["teacher"]
+            student = data["students"][0]
+
+            pairs = [
+                ("teacher", teacher, "dashboard", "dashboard_async"),
+                ("student", student, "dashboard", "dashboard_async"),
+                ("teacher", teacher, "teacher_statistics", "teacher_statistics_async"),
+            ]
+
+            self.stdout.write(
+                f"{'view':<36}{'mean, мс':>10}{'p50':>10}{'p95':>10}{'rps':>10}"
+            )
+            for role, user, sync_name, async_name in pairs:
+                for name in (sync_name, async_name):
+                    timings, elapsed = asyncio.run(
+                        self._run(
+                            user,
+                            reverse(name),
+                            options["requests"],
+                            options["concurrency"],
+                        )
+                    )
+                    self._report(f"{name} ({role})", timings, elapsed)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    async def _run(self, user, path, total, concurrency):
+        timings = []
+        counter = iter(range(total))
+
+        async def worker():
+            client = AsyncClient()
+            await client.aforce_login(user)
+            for _ in counter:
+                start = time.perf_counter()
+                response = await client.get(path)
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path}: HTTP {response.status_code}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return timings, time.perf_counter() - start
+
+    def _report(self, name, timings, elapsed):
+        timings_ms = sorted(t * 1000 for t in timings)
+        p95 = timings_ms[max(0, int(len(timings_ms) * 0.95) - 1)]
+        self.stdout.write(
+            f"{name:<36}"
+            f"{statistics.mean(timings_ms):>10.1f}"
+            f"{statistics.median(timings_ms):>10.1f}"
+            f"{p95:>10.1f}"
+            f"{len(timings) / elapsed:>10.1f}"
+        )
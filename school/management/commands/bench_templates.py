@@ -0,0 +1,122 @@
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template import engines
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from school import views
+from school.jinja import BytecodeCache
+from school.management.seed import seed_school
+
+HOT_TEMPLATES = (
+    "student_dashboard.html",
+    "teacher_dashboard.html",
+    "course_detail.html",
+    "assignment_detail.html",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение времени рендеринга тяжёлых страниц шаблонами Django и Jinja2 "
+        "на временной тестовой базе"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=30)
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--courses", type=int, default=5)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            data = seed_school(courses=options["courses"], students=options["students"])
+            course = data["courses"][0]
+            assignment = course.assignments.first()
+            pages = [
+                (data["teacher"], "/dashboard/"),
+                (data["students"][0], "/dashboard/"),
+                (data["teacher"], f"/courses/{course.id}/"),
+                (data["teacher"], f"/assignments/{assignment.id}/"),
+            ]
+
+            self.stdout.write(
+                f"{'template':<28}{'django, мс':>12}{'jinja2, мс':>12}{'ускорение':>12}"
+            )
+            for user, path in pages:
+                template_name, context, request = self._capture(user, path)
+                results = self._bench(template_name, context, request, options)
+                django_ms = statistics.median(results["django"])
+                jinja_ms = statistics.median(results["jinja2"])
+                self.stdout.write(
+                    f"{template_name:<28}{django_ms:>12.2f}{jinja_ms:>12.2f}"
+                    f"{django_ms / jinja_ms:>11.1f}x"
+                )
+            self._bench_loading()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _capture(self, user, path):
+        """Контекст, который представление передаёт в шаблон"""
+        captured = {}
+
+        def render_hot(request, template_name, context):
+            captured.update(request=request, name=template_name, context=context)
+            return views.render(request, template_name, context, using="django")
+
+        client = Client()
+        client.force_login(user)
+        with mock.patch.object(views, "_render_hot", render_hot):
+            response = client.get(path)
+        if response.status_code != 200 or not captured:
+            raise RuntimeError(f"{path}: HTTP {response.status_code}")
+        return captured["name"], captured["context"], captured["request"]
+
+    def _bench(self, template_name, context, request, options):
+        templates = {
+            alias: engines[alias].get_template(template_name)
+            for alias in ("django", "jinja2")
+        }
+        # Прогрев: кеши querysets заполняются одинаково для обоих движков
+        for template in templates.values():
+            template.render(context, request)
+
+        results = {alias: [] for alias in templates}
+        for _ in range(options["repeat"]):
+            for alias, template in templates.items():
+                start = time.perf_counter()
+                template.render(context, request)
+                results[alias].append((time.perf_counter() - start) * 1000)
+        return results
+
+    def _bench_loading(self):
+        """Загрузка шаблонов Jinja2 новым процессом: компиляция или байткод"""
+        env = engines["jinja2"].env
+        saved = env.bytecode_cache
+        with tempfile.TemporaryDirectory() as directory:
+            timings = {}
+            for label, cache in (
+                ("компиляция", None),
+                ("запись байткода", BytecodeCache(directory)),
+                ("из байткода", BytecodeCache(directory)),
+            ):
+                env.bytecode_cache = cache
+                env.cache.clear()
+                start = time.perf_counter()
+                for name in HOT_TEMPLATES:
+                    env.get_template(name)
+                timings[label] = (time.perf_counter() - start) * 1000
+            env.bytecode_cache = saved
+        self.stdout.write(
+            "Загрузка шаблонов Jinja2: "
+            + ", ".join(f"{label} {ms:.1f} мс" for label, ms in timings.items())
+        )
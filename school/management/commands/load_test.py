@@ -0,0 +1,142 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from school import loadtest
+from school.management.seed import seed_school
+from school.models import Assignment, Course
+
+SURGE_TITLE = "Контрольная работа (нагрузочный тест)"
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест по сценарию (loadtest/scenarios/*.json) против "
+        "запущенного сервера, использующего ту же базу данных"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", help="Путь к JSON-файлу сценария")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument(
+            "--password", default="loadtest", help="Пароль учеников сценария"
+        )
+        parser.add_argument(
+            "--prepare",
+            action="store_true",
+            help="Создать учеников, курс и задание со сроком через час",
+        )
+        parser.add_argument(
+            "--cleanup", action="store_true", help="Удалить данные сценария"
+        )
+        parser.add_argument("--report", help="Сохранить отчёт в JSON-файл")
+        parser.add_argument("--compare", help="Сравнить с ранее сохранённым отчётом")
+
+    def handle(self, *args, **options):
+        try:
+            scenario = loadtest.load_scenario(options["scenario"])
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Не удалось прочитать сценарий: {error}")
+        prefix = scenario["prefix"]
+
+        if options["cleanup"]:
+            Course.objects.filter(teacher__username=f"{prefix}_teacher").delete()
+            deleted, _ = User.objects.filter(username__startswith=f"{prefix}_").delete()
+            self.stdout.write(self.style.SUCCESS(f"Удалено объектов: {deleted}"))
+            return
+
+        if options["prepare"]:
+            self._prepare(scenario, options["password"])
+
+        assignment = (
+            Assignment.objects.filter(
+                teacher__username=f"{prefix}_teacher", title=SURGE_TITLE
+            )
+            .order_by("-id")
+            .first()
+        )
+        if assignment is None:
+            raise CommandError("Данные сценария не найдены - запустите с --prepare")
+        usernames = list(
+            User.objects.filter(username__startswith=f"{prefix}_student_")
+            .order_by("id")
+            .values_list("username", flat=True)
+        )
+
+        paths = {
+            "login": reverse("login"),
+            "submit": reverse("submit_assignment", args=[assignment.id]),
+            "assignment_detail": reverse("assignment_detail", args=[assignment.id]),
+            "dashboard": reverse("dashboard"),
+        }
+        self.stdout.write(
+            f"Сценарий {scenario['name']}: {scenario['concurrency']} потоков, "
+            f"{scenario['duration']} с + разгон {scenario['ramp_up']} с"
+        )
+        report = loadtest.run(
+            scenario,
+            options["base_url"],
+            paths,
+            [(username, options["password"]) for username in usernames],
+        )
+        self._print(report)
+
+        if options["report"]:
+            with open(options["report"], "w", encoding="utf-8") as f:
+                f.write(loadtest.dumps(report))
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            for line in loadtest.compare(baseline, report):
+                self.stdout.write(line)
+
+    def _prepare(self, scenario, password):
+        prefix = scenario["prefix"]
+        teacher = User.objects.filter(username=f"{prefix}_teacher").first()
+        if teacher is None:
+            data = seed_school(
+                courses=1,
+                students=scenario["students"],
+                assignments_per_course=5,
+                submission_rate=0.5,
+                prefix=prefix,
+            )
+            teacher, course = data["teacher"], data["courses"][0]
+            # Один хеш на всех: иначе подготовка упирается в PBKDF2
+            User.objects.filter(username__startswith=f"{prefix}_student_").update(
+                password=make_password(password)
+            )
+        else:
+            course = Course.objects.filter(teacher=teacher).first()
+
+        Assignment.objects.create(
+            title=SURGE_TITLE,
+            description="Задание, срок сдачи которого истекает через час.",
+            course=course,
+            teacher=teacher,
+            due_date=timezone.now() + timedelta(hours=1),
+            max_points=100,
+            status="published",
+        )
+        self.stdout.write(self.style.SUCCESS("Данные сценария подготовлены"))
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{'действие':<20}{'запросов':>10}{'ошибки':>9}{'rps':>9}"
+            f"{'p50, мс':>10}{'p95':>9}{'p99':>9}"
+        )
+        for action, row in sorted(report["actions"].items()):
+            self.stdout.write(
+                f"{action:<20}{row['requests']:>10}{row['error_rate']:>9.1%}"
+                f"{row['throughput_rps']:>9.1f}{row['p50_ms']:>10.0f}"
+                f"{row['p95_ms']:>9.0f}{row['p99_ms']:>9.0f}"
+            )
+        self.stdout.write(
+            f"Всего {report['requests']} запросов за {report['elapsed_s']} с, "
+            f"{report['throughput_rps']} rps, ошибок {report['error_rate']:.1%}"
+        )
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from school import profiling
+
+
+class Command(BaseCommand):
+    help = (
+        "Объединить сохранённые профили запросов в collapsed stacks "
+        "(flamegraph.pl, speedscope)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "view_names", nargs="*", help="Имена URL, например course_detail"
+        )
+        parser.add_argument("-o", "--output", help="Файл для результата")
+        parser.add_argument(
+            "--list", action="store_true", help="Показать, какие профили собраны"
+        )
+        parser.add_argument(
+            "--header",
+            metavar="USERNAME",
+            help="Показать заголовок, включающий профилирование запросов пользователя",
+        )
+
+    def handle(self, *args, **options):
+        if options["header"]:
+            try:
+                user = User.objects.get(username=options["header"])
+            except User.DoesNotExist:
+                raise CommandError(f"Пользователь {options['header']} не найден")
+            self.stdout.write(f"X-Profile: {profiling.debug_header_value(user)}")
+            return
+
+        if options["list"]:
+            for view_name, files, samples in profiling.summary():
+                self.stdout.write(f"{view_name}: профилей {files}, снимков {samples}")
+            return
+
+        counts = profiling.collapse(options["view_names"])
+        if not counts:
+            raise CommandError(f"Профили не найдены в {profiling.profiles_dir()}")
+
+        lines = "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(lines)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Стеков: {len(counts)}, снимков: {sum(counts.values())}"
+                )
+            )
+        else:
+            self.stdout.write(lines, ending="")
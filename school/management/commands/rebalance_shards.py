@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from school import sharding
+from school.models import Course
+
+
+class Command(BaseCommand):
+    help = "Перенести данные курсов между базами (шардами)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course",
+            type=int,
+            action="append",
+            help="ID курса (можно несколько); нужен --to",
+        )
+        parser.add_argument("--to", help="База, в которую переносятся курсы")
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Перенести все курсы, лежащие не в своей базе по умолчанию "
+            "(например, созданные до включения шардирования)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=sharding.BATCH_SIZE, help="Строк в пачке"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать, что будет перенесено",
+        )
+        parser.add_argument(
+            "--report",
+            action="store_true",
+            help="Только показать число курсов и строк в каждой базе",
+        )
+
+    def write_report(self):
+        for row in sharding.shard_report():
+            self.stdout.write(
+                f"  {row['database']:<12} курсов {row['courses']:>6}, "
+                f"заданий {row['assignment']:>8}, решений {row['submission']:>10}, "
+                f"объявлений {row['announcement']:>8}"
+            )
+
+    def get_plan(self, options):
+        if options["course"]:
+            if not options["to"]:
+                raise CommandError("Укажите базу: --to")
+            if options["to"] not in sharding.databases():
+                raise CommandError(
+                    f"Неизвестная база {options['to']!r}; доступны: "
+                    + ", ".join(sharding.databases())
+                )
+            courses = list(Course.objects.filter(id__in=options["course"]))
+            if len(courses) != len(set(options["course"])):
+                raise CommandError("Курс не найден")
+            return [(course, options["to"]) for course in courses]
+
+        if options["all"]:
+            # У архивных курсов в шардах ничего не осталось
+            courses = Course.objects.filter(archived_at__isnull=True).order_by("id")
+            return [
+                (course, sharding.default_placement(course.id))
+                for course in courses
+                if sharding.for_course(course) != sharding.default_placement(course.id)
+            ]
+
+        raise CommandError("Укажите --course и --to, --all или --report")
+
+    def handle(self, *args, **options):
+        if options["report"]:
+            self.write_report()
+            return
+        if not sharding.is_sharded():
+            raise CommandError("Шардирование выключено (SHARD_DATABASES)")
+
+        plan = [
+            (course, target)
+            for course, target in self.get_plan(options)
+            if sharding.for_course(course) != target
+        ]
+        if not plan:
+            self.stdout.write("Нет курсов для переноса")
+            return
+
+        self.stdout.write("План:")
+        for course, target in plan:
+            self.stdout.write(
+                f"  {course.id}. {course.title}: "
+                f"{sharding.for_course(course)} -> {target}"
+            )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Пробный запуск: ничего не изменено"))
+            return
+
+        for course, target in plan:
+            moved = sharding.move_course(course, target, options["batch_size"])
+            self.stdout.write(
+                f"  {course.id}. перенесено: заданий {moved['assignment']}, "
+                f"решений {moved['submission']}, объявлений {moved['announcement']}"
+            )
+
+        self.stdout.write("Базы после переноса:")
+        self.write_report()
+        self.stdout.write(self.style.SUCCESS(f"Перенесено курсов: {len(plan)}"))
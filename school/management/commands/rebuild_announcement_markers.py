@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from school.models import AnnouncementReadMarker
+
+
+class Command(BaseCommand):
+    help = "Пересчитать счётчики непрочитанных объявлений"
+
+    def handle(self, *args, **options):
+        fixed = 0
+        for marker in AnnouncementReadMarker.objects.select_related("user"):
+            old = marker.unread_count
+            if marker.recount() != old:
+                fixed += 1
+        self.stdout.write(self.style.SUCCESS(f"Исправлено счётчиков: {fixed}"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from school import leaderboard
+
+
+class Command(BaseCommand):
+    help = "Пересчитать рейтинги курсов по всем оценкам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, help="ID курса")
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только показать расхождения, ничего не изменяя",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = leaderboard.rebuild(
+            course_id=options["course"], check=options["check"]
+        )
+
+        for course_id, student_id, actual, expected in sorted(mismatches):
+            self.stdout.write(
+                f"курс {course_id}, ученик {student_id}: {actual} -> {expected}"
+            )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Рейтинги согласованы"))
+        elif options["check"]:
+            raise CommandError(f"Найдено расхождений: {len(mismatches)}")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(f"Исправлено записей: {len(mismatches)}")
+            )
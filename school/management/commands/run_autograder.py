@@ -0,0 +1,66 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from school import autograder
+
+
+class Command(BaseCommand):
+    help = (
+        "Автоматическая проверка решений в пуле процессов. "
+        "На SQLite запускайте один экземпляр - он сам занимает все ядра."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--poll-interval", type=float, default=1.0)
+        parser.add_argument(
+            "--once", action="store_true", help="Проверить очередь и завершиться"
+        )
+        parser.add_argument(
+            "--stats-interval",
+            type=float,
+            default=30,
+            help="Как часто печатать глубину очереди и задержки (секунды)",
+        )
+
+    def handle(self, *args, **options):
+        stats = autograder.Stats()
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(options["stats_interval"]):
+                self._report(stats)
+
+        reporter = threading.Thread(target=report, daemon=True)
+        reporter.start()
+
+        start = time.perf_counter()
+        try:
+            autograder.run(
+                workers=options["workers"],
+                batch_size=options["batch_size"],
+                poll_interval=options["poll_interval"],
+                once=options["once"],
+                stats=stats,
+            )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stop.set()
+            self._report(stats)
+            self.stdout.write(f"Время работы: {time.perf_counter() - start:.1f} с")
+
+    def _report(self, stats):
+        snapshot = stats.snapshot()
+
+        def ms(value):
+            return f"{value * 1000:.0f} мс" if value is not None else "-"
+
+        self.stdout.write(
+            f"очередь: {snapshot['queue_depth']}, в работе: {snapshot['in_flight']}, "
+            f"проверено: {snapshot['processed']}, ошибок: {snapshot['errors']}, "
+            f"p50: {ms(snapshot['latency_p50'])}, p95: {ms(snapshot['latency_p95'])}"
+        )
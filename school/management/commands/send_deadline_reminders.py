@@ -0,0 +1,36 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from school import reminders
+
+
+class Command(BaseCommand):
+    help = "Рассылка напоминаний о сроках сдачи (работает постоянно, если не указан --once)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window-hours",
+            type=float,
+            default=24,
+            help="За сколько часов до срока напоминать",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=300, help="Пауза между проходами, с"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--once", action="store_true")
+
+    def handle(self, *args, **options):
+        window = timedelta(hours=options["window_hours"])
+
+        while True:
+            start = time.perf_counter()
+            sent = reminders.run_once(window=window, batch_size=options["batch_size"])
+            self.stdout.write(
+                f"Отправлено напоминаний: {sent} за {time.perf_counter() - start:.1f} с"
+            )
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
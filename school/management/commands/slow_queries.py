@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from school import slowqueries
+
+SORT_KEYS = ("total", "count", "p95", "p99", "max")
+
+
+class Command(BaseCommand):
+    help = "Сводка журнала медленных SQL-запросов по отпечаткам"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", help="Файл журнала (по умолчанию SLOW_QUERY_LOG)")
+        parser.add_argument(
+            "--sort", choices=SORT_KEYS, default="total", help="Порядок сортировки"
+        )
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--view", help="Только запросы этого представления")
+        parser.add_argument("--json", action="store_true", help="Вывод в JSON")
+
+    def handle(self, *args, **options):
+        entries = slowqueries.read_entries(options["log"])
+        if options["view"]:
+            entries = (e for e in entries if e.get("view") == options["view"])
+        rows = slowqueries.aggregate(entries)
+        if not rows:
+            raise CommandError("Журнал медленных запросов пуст")
+
+        key = "count" if options["sort"] == "count" else f"{options['sort']}_ms"
+        rows.sort(key=lambda row: row[key], reverse=True)
+        rows = rows[: options["limit"]]
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+            return
+
+        for number, row in enumerate(rows, 1):
+            self.stdout.write(
+                f"{number}. {row['count']} раз, всего {row['total_ms']:.0f} мс, "
+                f"p50 {row['p50_ms']:.1f} / p95 {row['p95_ms']:.1f} / "
+                f"p99 {row['p99_ms']:.1f} мс"
+            )
+            self.stdout.write(f"   {row['fingerprint'][:300]}")
+            for title, counts in (("view", row["views"]), ("код", row["callers"])):
+                places = ", ".join(f"{name} ({count})" for name, count in counts)
+                self.stdout.write(f"   {title}: {places}")
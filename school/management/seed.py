@@ -0,0 +1,141 @@
+"""Генерация тестовых данных для бенчмарков и нагрузочных тестов"""
+
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from school import sharding
+from school.models import Profile, Course, Assignment, Submission, Announcement
+
+
+def _bulk_create(model, objs, course_of, batch_size=None):
+    """bulk_create в базы курсов: без подсказки маршрутизатор пишет в ``default``"""
+    by_database = {}
+    for obj in objs:
+        by_database.setdefault(sharding.for_course(course_of(obj)), []).append(obj)
+    created = []
+    for alias, rows in by_database.items():
+        created += model.objects.using(alias).bulk_create(rows, batch_size=batch_size)
+    return created
+
+
+def seed_school(
+    courses=5,
+    students=200,
+    assignments_per_course=10,
+    submission_rate=0.7,
+    prefix="bench",
+    seed=42,
+):
+    """Создать учителя, учеников, курсы, задания и решения.
+
+    Возвращает словарь с созданными объектами: ``teacher``, ``students``,
+    ``courses``, ``assignments``.
+    """
+    rnd = random.Random(seed)
+    now = timezone.now()
+
+    teacher = User.objects.create_user(
+        username=f"{prefix}_teacher", first_name="Анна", last_name="Петрова"
+    )
+    Profile.objects.create(user=teacher, role="teacher")
+
+    student_users = User.objects.bulk_create(
+        [
+            User(
+                username=f"{prefix}_student_{i}",
+                first_name=f"Ученик{i}",
+                last_name="Тестовый",
+                email=f"{prefix}_student_{i}@school.ru",
+            )
+            for i in range(students)
+        ]
+    )
+    Profile.objects.bulk_create(
+        [Profile(user=user, role="student") for user in student_users]
+    )
+
+    course_objs = Course.objects.bulk_create(
+        [
+            Course(
+                title=f"Курс {i + 1}",
+                description="Описание курса " * 5,
+                teacher=teacher,
+            )
+            for i in range(courses)
+        ]
+    )
+    for course in course_objs:
+        course.students.add(*student_users)
+    if sharding.is_sharded():
+        # bulk_create не отправляет post_save, базу курсам назначаем сами
+        for course in course_objs:
+            course.shard = sharding.default_placement(course.id)
+        Course.objects.bulk_update(course_objs, ["shard"])
+
+    assignment_objs = _bulk_create(
+        Assignment,
+        [
+            Assignment(
+                title=f"Задание {j + 1}",
+                description="Условие задания " * 10,
+                course=course,
+                teacher=teacher,
+                due_date=now + timedelta(days=rnd.randint(-14, 14)),
+                max_points=100,
+                status="published",
+            )
+            for course in course_objs
+            for j in range(assignments_per_course)
+        ],
+        lambda assignment: assignment.course,
+    )
+
+    _bulk_create(
+        Announcement,
+        [
+            Announcement(
+                title=f"Объявление {k + 1}",
+                content="Текст объявления " * 5,
+                course=course,
+                author=teacher,
+            )
+            for course in course_objs
+            for k in range(3)
+        ],
+        lambda announcement: announcement.course,
+    )
+
+    submissions = []
+    for assignment in assignment_objs:
+        for student in student_users:
+            if rnd.random() < submission_rate:
+                graded = rnd.random() < 0.5
+                submissions.append(
+                    Submission(
+                        assignment=assignment,
+                        student=student,
+                        content=f"Решение ученика {student.username}",
+                        grade=rnd.randint(40, 100) if graded else None,
+                    )
+                )
+    # bulk_create не вызывает save(): производные поля заполняем сами
+    for submission in submissions:
+        submission.update_derived_fields()
+    _bulk_create(
+        Submission,
+        submissions,
+        lambda submission: submission.assignment.course,
+        batch_size=1000,
+    )
+    # bulk_create не отправляет сигналы, счётчики курсов пересчитываем явно
+    Course.refresh_counters([course.id for course in course_objs])
+
+    return {
+        "teacher": teacher,
+        "students": student_users,
+        "courses": course_objs,
+        "assignments": assignment_objs,
+    }
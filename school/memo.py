@@ -0,0 +1,236 @@
+"""Querysets, выполняемые не больше одного раза за запрос.
+
+Шаблоны панелей по нескольку раз вызывают ``count`` у одних и тех же
+querysets (``active_assignments.count`` в заголовке, в карточке и в условии
+"Показать все"). Пока queryset не выполнен, каждый такой вызов - отдельный
+``SELECT COUNT(*)``, а потом строки всё равно загружаются для цикла.
+
+memoize() возвращает обёртку Memoized, общую для всего запроса: строки
+загружаются при первом обращении, а ``count``, ``exists``, ``first``,
+``len``, срезы и повторные циклы берут их из памяти. ``filter()`` и прочие
+методы queryset передаются исходному queryset и, как обычно, создают новый
+запрос.
+
+При ``QUERYSET_MEMO_WARNINGS`` (по умолчанию выключено) install()
+отслеживает рендеринг шаблонов и пишет предупреждение в логгер
+``school.memo``, если queryset из контекста в одном рендеринге посчитан
+отдельным COUNT и загружен целиком или посчитан несколько раз: такой
+queryset стоит обернуть в memoize(). uninstall() возвращает исходные методы.
+"""
+
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db.models.query import QuerySet
+from django.template.backends.jinja2 import Template as JinjaTemplate
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_render = ContextVar("memo_render", default=None)
+# (класс, имя атрибута, исходный метод, обёртка), подменённые install()
+_patched = []
+
+
+def warnings_enabled():
+    return getattr(settings, "QUERYSET_MEMO_WARNINGS", False)
+
+
+class Memoized:
+    """Queryset (или список из sharding.gather), выполняемый один раз"""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._rows = None
+
+    def _fetch(self):
+        if self._rows is None:
+            self._rows = list(self.queryset)
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __bool__(self):
+        return bool(self._fetch())
+
+    def __getitem__(self, index):
+        return self._fetch()[index]
+
+    def count(self):
+        return len(self._fetch())
+
+    def exists(self):
+        return bool(self._fetch())
+
+    def first(self):
+        rows = self._fetch()
+        return rows[0] if rows else None
+
+    def all(self):
+        return self
+
+    def __getattr__(self, name):
+        return getattr(self.queryset, name)
+
+    def __repr__(self):
+        state = "не выполнен" if self._rows is None else f"{len(self._rows)} строк"
+        return f"<Memoized {self.queryset!r} ({state})>"
+
+
+def _key(queryset):
+    if isinstance(queryset, QuerySet):
+        try:
+            return (queryset.db, queryset.model._meta.label, str(queryset.query))
+        except EmptyResultSet:
+            pass
+    return ("object", id(queryset))
+
+
+def memoize(request, queryset):
+    """Обёртка Memoized, общая для запроса: одинаковый SQL из разных мест
+    представления выполняется один раз"""
+    if isinstance(queryset, Memoized):
+        return queryset
+    memos = request.__dict__.setdefault("_memoized_querysets", {})
+    key = _key(queryset)
+    if key not in memos:
+        memos[key] = Memoized(queryset)
+    return memos[key]
+
+
+# --- Предупреждения ---------------------------------------------------------
+
+
+class _RenderTracker:
+    def __init__(self, template_name, context):
+        self.template_name = template_name
+        self.names = {
+            id(value): name
+            for name, value in context.items()
+            if isinstance(value, QuerySet)
+        }
+        self.counted = Counter()
+        self.fetched = set()
+
+    def report(self):
+        for queryset_id, name in self.names.items():
+            counts = self.counted[queryset_id]
+            if counts and queryset_id in self.fetched:
+                logger.warning(
+                    "%s: queryset %r посчитан отдельным COUNT (%d раз) и загружен "
+                    "целиком; оберните его в memo.memoize()",
+                    self.template_name,
+                    name,
+                    counts,
+                )
+            elif counts > 1:
+                logger.warning(
+                    "%s: queryset %r посчитан %d раз; оберните его в memo.memoize()",
+                    self.template_name,
+                    name,
+                    counts,
+                )
+
+
+def _tracked_render(render, template_name, context_of):
+    @wraps(render)
+    def _render_tracked(self, *args, **kwargs):
+        if _render.get() is not None:
+            # Вложенные шаблоны (extends, include) - часть внешнего рендеринга
+            return render(self, *args, **kwargs)
+        tracker = _RenderTracker(
+            template_name(self) or "<string>", context_of(*args, **kwargs)
+        )
+        token = _render.set(tracker)
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            _render.reset(token)
+            tracker.report()
+
+    _render_tracked.memo_tracked = True
+    return _render_tracked
+
+
+def _django_context(context, *args, **kwargs):
+    return context.flatten()
+
+
+def _jinja_context(context=None, *args, **kwargs):
+    return context or {}
+
+
+def _tracked_count(count):
+    @wraps(count)
+    def _count(self):
+        tracker = _render.get()
+        if tracker is not None and self._result_cache is None:
+            tracker.counted[id(self)] += 1
+        return count(self)
+
+    _count.memo_tracked = True
+    return _count
+
+
+def _tracked_fetch_all(fetch_all):
+    @wraps(fetch_all)
+    def _fetch_all(self):
+        tracker = _render.get()
+        if tracker is not None and self._result_cache is None:
+            tracker.fetched.add(id(self))
+        return fetch_all(self)
+
+    _fetch_all.memo_tracked = True
+    return _fetch_all
+
+
+def _patch(owner, name, wrap):
+    original = getattr(owner, name)
+    if not getattr(original, "memo_tracked", False):
+        wrapper = wrap(original)
+        setattr(owner, name, wrapper)
+        _patched.append((owner, name, original, wrapper))
+
+
+def install():
+    """Отслеживать COUNT и загрузку querysets при рендеринге (из ready()).
+
+    Каждая точка проверяется отдельно: тестовый раннер после ready()
+    подменяет Template._render своей версией.
+    """
+    _patch(QuerySet, "count", _tracked_count)
+    _patch(QuerySet, "_fetch_all", _tracked_fetch_all)
+    _patch(
+        Template,
+        "_render",
+        lambda render: _tracked_render(
+            render, lambda template: template.name, _django_context
+        ),
+    )
+    _patch(
+        JinjaTemplate,
+        "render",
+        lambda render: _tracked_render(
+            render, lambda template: template.template.name, _jinja_context
+        ),
+    )
+
+
+def uninstall():
+    """Вернуть методы, подменённые install().
+
+    Если метод после install() обернул кто-то ещё (тестовый раннер), чужая
+    обёртка остаётся на месте: снять нашу из середины цепочки нельзя.
+    """
+    while _patched:
+        owner, name, original, wrapper = _patched.pop()
+        if getattr(owner, name) is wrapper:
+            setattr(owner, name, original)
@@ -0,0 +1,383 @@
+"""Метрики в формате Prometheus (эндпоинт /metrics).
+
+Каждый процесс копит счётчики и гистограммы в памяти и не чаще раза в
+``METRICS_FLUSH_INTERVAL`` секунд записывает их целиком в собственный файл
+``METRICS_DIR/<pid>.json`` (запись во временный файл и os.replace, так что
+читатель никогда не видит половину файла). /metrics складывает файлы всех
+процессов и живое состояние текущего процесса.
+
+Как и multiprocess-режим prometheus_client, файлы завершившихся процессов не
+копятся: при сборе они прибавляются к ``METRICS_DIR/archive.json`` и
+удаляются, так что суммарные счётчики не уменьшаются. Файл с PID процесса,
+который ещё ни разу не записывал метрики, остался от прежнего процесса с тем
+же PID и тоже уходит в архив. Живость проверяется через ``os.kill(pid, 0)``,
+поэтому все процессы сервера должны видеть друг друга (одно пространство
+имён PID).
+
+Значения, которые дешевле посчитать при сборе (глубина очереди
+автопроверки), запрашиваются прямо в момент сбора.
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+# Прочие методы попадают в метку method="other" - их значения задаёт клиент
+HTTP_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE")
+)
+ARCHIVE = "archive.json"
+
+
+def metrics_dir():
+    return Path(getattr(settings, "METRICS_DIR", Path(settings.BASE_DIR) / "metrics"))
+
+
+def flush_interval():
+    return getattr(settings, "METRICS_FLUSH_INTERVAL", 1)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _metrics[name] = self
+
+    def _key(self, labels):
+        return (self.name, tuple(str(labels[name]) for name in self.labelnames))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            _counters[key] = _counters.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # [счётчики по корзинам..., +Inf, сумма]
+            state = _histograms.get(key)
+            if state is None:
+                state = _histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[-2] += 1
+            state[-1] += value
+
+
+_metrics = {}
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+_last_flush = 0.0
+# Файл, который процесс уже записывал (меняется с PID после fork)
+_written_path = None
+
+REQUESTS = Counter(
+    "school_http_requests_total",
+    "Число HTTP-запросов",
+    ("view", "method", "status"),
+)
+LATENCY = Histogram(
+    "school_http_request_duration_seconds",
+    "Время обработки запроса",
+    ("view",),
+)
+DB_QUERIES = Histogram(
+    "school_db_queries_per_request",
+    "Число SQL-запросов на HTTP-запрос",
+    ("view",),
+    buckets=QUERY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "school_cache_requests_total",
+    "Обращения к кешу Django: попадания и промахи",
+    ("result",),
+)
+QUERYCACHE_REQUESTS = Counter(
+    "school_querycache_requests_total",
+    "Кеш querysets (school.querycache): попадания по уровням и промахи",
+    ("tier",),
+)
+UPLOAD_BYTES = Histogram(
+    "school_submission_upload_bytes",
+    "Размер сдаваемых решений (текст и файл)",
+    buckets=SIZE_BUCKETS,
+)
+RESPONSE_BYTES = Counter(
+    "school_http_response_bytes_total",
+    "Размер текстовых ответов: исходный, после минификации и отправленный",
+    ("stage",),
+)
+
+
+def _state(counters, histograms):
+    return {
+        "counters": [
+            [name, list(labels), value] for (name, labels), value in counters.items()
+        ],
+        "histograms": [
+            [name, list(labels), list(state)]
+            for (name, labels), state in histograms.items()
+        ],
+    }
+
+
+def _merge(counters, histograms, state):
+    for name, labels, value in state["counters"]:
+        key = (name, tuple(labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, values in state["histograms"]:
+        key = (name, tuple(labels))
+        total = histograms.get(key)
+        if total is None or len(total) != len(values):
+            histograms[key] = list(values)
+        else:
+            histograms[key] = [a + b for a, b in zip(total, values)]
+
+
+def _read(path):
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write(path, state):
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(temporary, path)
+
+
+@contextmanager
+def _locked(directory):
+    """Архив меняют и сборщики, и процессы - по одному за раз"""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _archive(directory, paths):
+    """Прибавить файлы завершившихся процессов к архиву и удалить их"""
+    counters, histograms = {}, {}
+    for path in [directory / ARCHIVE, *paths]:
+        try:
+            _merge(counters, histograms, _read(path))
+        except FileNotFoundError:
+            continue
+        except ValueError:
+            logger.warning("Повреждённый файл метрик %s пропущен", path)
+    _write(directory / ARCHIVE, _state(counters, histograms))
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def snapshot():
+    with _lock:
+        return _state(_counters, _histograms)
+
+
+def flush(force=False):
+    """Записать состояние процесса в его файл (не чаще flush_interval())"""
+    global _last_flush, _written_path
+    if not _counters and not _histograms:
+        return
+    now = time.monotonic()
+    if not force and now - _last_flush < flush_interval():
+        return
+    _last_flush = now
+
+    directory = metrics_dir()
+    path = directory / f"{os.getpid()}.json"
+    try:
+        if _written_path != path:
+            with _locked(directory):
+                if path.exists():
+                    # Остался от завершившегося процесса с тем же PID
+                    _archive(directory, [path])
+                _write(path, snapshot())
+            _written_path = path
+        else:
+            directory.mkdir(parents=True, exist_ok=True)
+            _write(path, snapshot())
+    except OSError:
+        logger.exception("Не удалось сохранить метрики процесса")
+
+
+atexit.register(flush, force=True)
+
+
+def collect():
+    """Сумма состояний всех процессов: (счётчики, гистограммы)"""
+    counters = {}
+    histograms = {}
+    directory = metrics_dir()
+    pid = os.getpid()
+
+    with _locked(directory):
+        dead = [
+            path
+            for path in directory.glob("*.json")
+            if path.stem.isdigit()
+            and int(path.stem) != pid
+            and not _alive(int(path.stem))
+        ]
+        if dead:
+            _archive(directory, dead)
+
+        for path in directory.glob("*.json"):
+            # Свой файл может отставать от памяти
+            if path == _written_path:
+                continue
+            try:
+                _merge(counters, histograms, _read(path))
+            except (OSError, ValueError):
+                # Файл удалили или он повреждён - пропускаем этот процесс
+                continue
+    _merge(counters, histograms, snapshot())
+    return counters, histograms
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(gauges=()):
+    """Текст в формате Prometheus. ``gauges`` - тройки (имя, описание, значение)"""
+    counters, histograms = collect()
+    lines = []
+    for metric in _metrics.values():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        if metric.type == "counter":
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric.name:
+                    lines.append(
+                        f"{name}{_labels(metric.labelnames, labels)} {_number(value)}"
+                    )
+            continue
+
+        for (name, labels), state in sorted(histograms.items()):
+            if name != metric.name or len(state) != len(metric.buckets) + 2:
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ("+Inf",), state[:-1]):
+                cumulative += count
+                bucket_labels = _labels(
+                    metric.labelnames, labels, [("le", _number(bound))]
+                )
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            plain = _labels(metric.labelnames, labels)
+            lines.append(f"{name}_sum{plain} {_number(state[-1])}")
+            lines.append(f"{name}_count{plain} {cumulative}")
+
+    for name, documentation, value in gauges:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Считает запросы, их время и число SQL-запросов по имени URL.
+
+    Стоит после ServerTimingMiddleware, чтобы брать число SQL-запросов и
+    обращений к кешу из school.timing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, start)
+        return response
+
+    def _record(self, request, response, start):
+        elapsed = time.perf_counter() - start
+        match = getattr(request, "resolver_match", None)
+        # Только имена URL, а не пути - иначе число рядов неограниченно
+        view = match.view_name if match else "unresolved"
+
+        method = request.method if request.method in HTTP_METHODS else "other"
+        REQUESTS.inc(view=view, method=method, status=response.status_code)
+        LATENCY.observe(elapsed, view=view)
+        timings = timing.current()
+        if timings is not None:
+            DB_QUERIES.observe(timings.sql_count, view=view)
+            if timings.cache_hits:
+                CACHE_REQUESTS.inc(timings.cache_hits, result="hit")
+            if timings.cache_misses:
+                CACHE_REQUESTS.inc(timings.cache_misses, result="miss")
+        flush()
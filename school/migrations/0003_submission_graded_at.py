@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-19 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0002_course_assignment_announcement_profile_submission_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="graded_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, null=True, verbose_name="Время проверки"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="submission",
+            name="submitted_at",
+            field=models.DateTimeField(
+                auto_now_add=True, db_index=True, verbose_name="Время отправки"
+            ),
+        ),
+    ]
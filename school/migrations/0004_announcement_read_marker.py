@@ -0,0 +1,84 @@
+# Generated by Django 5.1.6 on 2026-10-19 02:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_markers(apps, schema_editor):
+    """Ученики, уже записанные на курсы, начинают с пустой ленты"""
+    User = apps.get_model("auth", "User")
+    AnnouncementReadMarker = apps.get_model("school", "AnnouncementReadMarker")
+    now = timezone.now()
+    user_ids = (
+        User.objects.filter(courses_enrolled__isnull=False)
+        .values_list("id", flat=True)
+        .distinct()
+    )
+    AnnouncementReadMarker.objects.bulk_create(
+        [
+            AnnouncementReadMarker(user_id=user_id, last_read_at=now)
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0003_submission_graded_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnnouncementReadMarker",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "last_read_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Прочитано до"
+                    ),
+                ),
+                (
+                    "unread_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Непрочитанных"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Отметка о прочтении",
+                "verbose_name_plural": "Отметки о прочтении",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="announcement",
+            index=models.Index(
+                fields=["course", "-created_at"], name="school_anno_course__7d5389_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="announcementreadmarker",
+            name="user",
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="announcement_marker",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Ученик",
+            ),
+        ),
+        migrations.RunPython(create_markers, migrations.RunPython.noop),
+    ]
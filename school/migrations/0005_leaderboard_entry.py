@@ -0,0 +1,70 @@
+# Generated by Django 5.1.6 on 2026-10-19 02:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0004_announcement_read_marker"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total_points",
+                    models.IntegerField(default=0, verbose_name="Сумма баллов"),
+                ),
+                (
+                    "graded_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Оценённых работ"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leaderboard_entries",
+                        to="school.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="leaderboard_entries",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Ученик",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Позиция в рейтинге",
+                "verbose_name_plural": "Рейтинг",
+                "indexes": [
+                    models.Index(
+                        fields=["course", "-total_points"],
+                        name="school_lead_course__35f2f7_idx",
+                    )
+                ],
+                "unique_together": {("course", "student")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-19 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0005_leaderboard_entry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="signature",
+            field=models.BinaryField(null=True),
+        ),
+    ]
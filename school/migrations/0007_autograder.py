@@ -0,0 +1,77 @@
+# Generated by Django 5.1.6 on 2026-10-19 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0006_submission_signature"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="assignment",
+            name="auto_grade",
+            field=models.BooleanField(
+                default=False, verbose_name="Автоматическая проверка"
+            ),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="autograde_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "Не требуется"),
+                    ("pending", "В очереди"),
+                    ("running", "Проверяется"),
+                    ("done", "Проверено"),
+                    ("error", "Ошибка проверки"),
+                ],
+                db_index=True,
+                default="",
+                max_length=10,
+                verbose_name="Автопроверка",
+            ),
+        ),
+        migrations.CreateModel(
+            name="AssignmentTestCase",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "input_data",
+                    models.TextField(blank=True, verbose_name="Входные данные"),
+                ),
+                ("expected_output", models.TextField(verbose_name="Ожидаемый вывод")),
+                (
+                    "points",
+                    models.PositiveIntegerField(default=1, verbose_name="Баллы"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "assignment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="test_cases",
+                        to="school.assignment",
+                        verbose_name="Задание",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Тест",
+                "verbose_name_plural": "Тесты",
+                "ordering": ["id"],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.6 on 2026-10-19 03:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0007_autograder"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeadlineReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Отправлено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Напоминание о сроке",
+                "verbose_name_plural": "Напоминания о сроках",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="assignment",
+            index=models.Index(
+                fields=["status", "due_date"], name="school_assi_status_4756fa_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="deadlinereminder",
+            name="assignment",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reminders",
+                to="school.assignment",
+                verbose_name="Задание",
+            ),
+        ),
+        migrations.AddField(
+            model_name="deadlinereminder",
+            name="student",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="deadline_reminders",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Ученик",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="deadlinereminder",
+            unique_together={("assignment", "student")},
+        ),
+    ]
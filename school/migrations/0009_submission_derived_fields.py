@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-19 03:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0008_deadline_reminder"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="submission",
+            name="grade_percentage",
+            field=models.FloatField(
+                db_index=True, default=0, editable=False, verbose_name="Процент"
+            ),
+        ),
+        migrations.AddField(
+            model_name="submission",
+            name="is_late",
+            field=models.BooleanField(
+                db_index=True, default=False, editable=False, verbose_name="Опоздание"
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.6 on 2026-10-19 03:24
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model("school", "Course")
+    Assignment = apps.get_model("school", "Assignment")
+
+    def count(queryset):
+        return Coalesce(
+            Subquery(
+                queryset.filter(course_id=OuterRef("pk"))
+                .order_by()
+                .values("course_id")
+                .annotate(total=Count("*"))
+                .values("total")
+            ),
+            0,
+        )
+
+    Course.objects.update(
+        students_count=count(Course.students.through.objects),
+        assignments_count=count(Assignment.objects),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0009_submission_derived_fields"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="assignments_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Заданий"
+            ),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="students_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Учеников"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(
+                fields=["-students_count", "-id"], name="course_popularity_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="course",
+            index=models.Index(fields=["-created_at", "-id"], name="course_recent_idx"),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,177 @@
+# Generated by Django 5.1.6 on 2026-10-19 03:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0010_course_counters"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="archived_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="В архиве с"
+            ),
+        ),
+        migrations.CreateModel(
+            name="ArchivedAnnouncement",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("title", models.CharField(max_length=200, verbose_name="Заголовок")),
+                ("content", models.TextField(verbose_name="Содержание")),
+                ("created_at", models.DateTimeField()),
+                (
+                    "author",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Автор",
+                    ),
+                ),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_announcements",
+                        to="school.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Архивное объявление",
+                "verbose_name_plural": "Архивные объявления",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedAssignment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "title",
+                    models.CharField(max_length=200, verbose_name="Название задания"),
+                ),
+                ("description", models.TextField(verbose_name="Описание")),
+                ("due_date", models.DateTimeField(verbose_name="Срок сдачи")),
+                ("max_points", models.IntegerField(verbose_name="Максимальный балл")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Черновик"),
+                            ("published", "Опубликовано"),
+                            ("closed", "Закрыто"),
+                        ],
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "auto_grade",
+                    models.BooleanField(
+                        default=False, verbose_name="Автоматическая проверка"
+                    ),
+                ),
+                (
+                    "test_cases",
+                    models.JSONField(blank=True, default=list, verbose_name="Тесты"),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_assignments",
+                        to="school.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+                (
+                    "teacher",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Учитель",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Архивное задание",
+                "verbose_name_plural": "Архивные задания",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedSubmission",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("content", models.TextField(verbose_name="Решение")),
+                (
+                    "file",
+                    models.FileField(
+                        blank=True,
+                        null=True,
+                        upload_to="submissions/",
+                        verbose_name="Файл",
+                    ),
+                ),
+                ("submitted_at", models.DateTimeField(verbose_name="Время отправки")),
+                (
+                    "grade",
+                    models.IntegerField(blank=True, null=True, verbose_name="Оценка"),
+                ),
+                (
+                    "feedback",
+                    models.TextField(blank=True, verbose_name="Комментарий учителя"),
+                ),
+                (
+                    "graded_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Время проверки"
+                    ),
+                ),
+                (
+                    "is_late",
+                    models.BooleanField(default=False, verbose_name="Опоздание"),
+                ),
+                (
+                    "grade_percentage",
+                    models.FloatField(default=0, verbose_name="Процент"),
+                ),
+                (
+                    "assignment",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="submissions",
+                        to="school.archivedassignment",
+                        verbose_name="Задание",
+                    ),
+                ),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_submissions",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Ученик",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Архивное решение",
+                "verbose_name_plural": "Архивные решения",
+                "unique_together": {("assignment", "student")},
+            },
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.1.6 on 2026-10-19 03:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0011_archive"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ActivityEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("submission", "Отправлено задание"),
+                            ("grade", "Оценено задание"),
+                            ("announcement", "Создано объявление"),
+                            ("assignment", "Создано задание"),
+                        ],
+                        max_length=20,
+                        verbose_name="Тип",
+                    ),
+                ),
+                ("target_id", models.BigIntegerField(verbose_name="Объект")),
+                ("title", models.CharField(max_length=200, verbose_name="Название")),
+                (
+                    "course_title",
+                    models.CharField(max_length=200, verbose_name="Название курса"),
+                ),
+                (
+                    "grade",
+                    models.IntegerField(blank=True, null=True, verbose_name="Оценка"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Время"
+                    ),
+                ),
+                (
+                    "course",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity_events",
+                        to="school.course",
+                        verbose_name="Курс",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="activity_events",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Событие",
+                "verbose_name_plural": "Лента активности",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "-created_at", "-id"],
+                        name="activity_user_feed_idx",
+                    ),
+                    models.Index(
+                        fields=["course", "-created_at", "-id"],
+                        name="activity_course_feed_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.1.6 on 2026-10-19 03:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0012_activity_events"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="shard",
+            field=models.CharField(
+                blank=True, editable=False, max_length=100, verbose_name="База данных"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="announcement",
+            name="author",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Автор",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="announcement",
+            name="course",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="announcements",
+                to="school.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assignment",
+            name="course",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="assignments",
+                to="school.course",
+                verbose_name="Курс",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="assignment",
+            name="teacher",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="assignments_created",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Учитель",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="deadlinereminder",
+            name="student",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="deadline_reminders",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Ученик",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="submission",
+            name="student",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="submissions",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Ученик",
+            ),
+        ),
+    ]
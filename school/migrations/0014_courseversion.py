@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0013_course_sharding"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseVersion",
+            fields=[
+                (
+                    "course_id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="Курс"
+                    ),
+                ),
+                ("leaderboard", models.PositiveBigIntegerField(default=0)),
+                ("analytics", models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Версия данных курса",
+                "verbose_name_plural": "Версии данных курсов",
+            },
+        ),
+    ]
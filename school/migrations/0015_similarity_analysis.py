@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-19 05:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def reset_signatures(apps, schema_editor):
+    # Сигнатуры XOR-масками несовместимы с новыми хешами: analyze_similarity
+    # пересчитает их (backfill_signatures)
+    Submission = apps.get_model("school", "Submission")
+    Submission.objects.using(schema_editor.connection.alias).update(signature=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0014_courseversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SimilarityAnalysis",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("assignment_id", models.BigIntegerField(verbose_name="Задание")),
+                ("threshold", models.FloatField(verbose_name="Порог сходства")),
+                ("pairs", models.JSONField(default=list, verbose_name="Похожие пары")),
+                ("submissions_count", models.IntegerField(verbose_name="Решений")),
+                (
+                    "latest_submitted_at",
+                    models.DateTimeField(null=True, verbose_name="Последняя сдача"),
+                ),
+                (
+                    "computed_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="Проверено"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Анализ похожих решений",
+                "verbose_name_plural": "Анализы похожих решений",
+                "unique_together": {("assignment_id", "threshold")},
+            },
+        ),
+        migrations.RunPython(
+            reset_signatures,
+            migrations.RunPython.noop,
+            hints={"model_name": "submission"},
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-19 05:07
+
+from django.db import migrations, models
+
+
+def clear_ungraded(model_name):
+    # Раньше у неоценённых решений хранился 0
+    def clear(apps, schema_editor):
+        model = apps.get_model("school", model_name)
+        model.objects.using(schema_editor.connection.alias).filter(
+            grade__isnull=True
+        ).update(grade_percentage=None)
+
+    return clear
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("school", "0015_similarity_analysis"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="archivedsubmission",
+            name="grade_percentage",
+            field=models.FloatField(null=True, verbose_name="Процент"),
+        ),
+        migrations.AlterField(
+            model_name="submission",
+            name="grade_percentage",
+            field=models.FloatField(
+                db_index=True, editable=False, null=True, verbose_name="Процент"
+            ),
+        ),
+        migrations.RunPython(
+            clear_ungraded("archivedsubmission"),
+            migrations.RunPython.noop,
+            hints={"model_name": "archivedsubmission"},
+        ),
+        migrations.RunPython(
+            clear_ungraded("submission"),
+            migrations.RunPython.noop,
+            hints={"model_name": "submission"},
+        ),
+    ]
@@ -1,11 +1,26 @@
+from collections import Counter
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models import Avg, Count
+from django.db.models import (
+    Case,
+    Count,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, NullIf
+
+from . import querycache, sharding
 
 
 class Profile(models.Model):
@@ -38,9 +53,15 @@ class Profile(models.Model):
         from .models import Submission
 
         submissions = Submission.objects.filter(student=self.user, grade__isnull=False)
-        if submissions.exists():
-            avg = submissions.aggregate(Avg("grade"))["grade__avg"]
-            return round(avg, 1)
+        total = count = 0
+        for alias in sharding.databases():
+            result = submissions.using(alias).aggregate(
+                total=Sum("grade"), count=Count("grade")
+            )
+            total += result["total"] or 0
+            count += result["count"]
+        if count:
+            return round(total / count, 1)
         return None
 
     def get_success_rate(self):
@@ -50,10 +71,16 @@ class Profile(models.Model):
 
         from .models import Assignment, Submission
 
-        total_assignments = Assignment.objects.filter(
-            course__students=self.user
-        ).count()
-        completed_assignments = Submission.objects.filter(student=self.user).count()
+        total_assignments = sharding.count(
+            Assignment.objects.filter(
+                course_id__in=sharding.id_list(
+                    self.user.courses_enrolled.values_list("id", flat=True)
+                )
+            )
+        )
+        completed_assignments = sharding.count(
+            Submission.objects.filter(student=self.user)
+        )
 
         if total_assignments > 0:
             return round((completed_assignments / total_assignments) * 100)
@@ -79,9 +106,11 @@ class Profile(models.Model):
 
         from .models import Submission
 
-        return Submission.objects.filter(
-            assignment__teacher=self.user, grade__isnull=False
-        ).count()
+        return sharding.count(
+            Submission.objects.filter(
+                assignment__teacher=self.user, grade__isnull=False
+            )
+        )
 
     def get_courses_count(self):
         """Количество курсов"""
@@ -93,56 +122,10 @@ class Profile(models.Model):
             return self.user.courses_enrolled.count()
 
     def get_recent_activity_list(self):
-        """Последняя активность (простой список)"""
-        activities = []
-
-        if self.role == "student":
-            from .models import Submission
-
-            submissions = Submission.objects.filter(student=self.user).order_by(
-                "-submitted_at"
-            )[:5]
-            for submission in submissions:
-                activities.append(
-                    {
-                        "type": "submission",
-                        "title": f"Отправлено задание: {submission.assignment.title}",
-                        "date": submission.submitted_at,
-                        "grade": submission.grade,
-                        "course": submission.assignment.course.title,
-                    }
-                )
-        else:
-            from .models import Announcement, Assignment
-
-            announcements = Announcement.objects.filter(author=self.user).order_by(
-                "-created_at"
-            )[:3]
-            for announcement in announcements:
-                activities.append(
-                    {
-                        "type": "announcement",
-                        "title": f"Создано объявление: {announcement.title}",
-                        "date": announcement.created_at,
-                        "course": announcement.course.title,
-                    }
-                )
-
-            assignments = Assignment.objects.filter(teacher=self.user).order_by(
-                "-created_at"
-            )[:2]
-            for assignment in assignments:
-                activities.append(
-                    {
-                        "type": "assignment",
-                        "title": f"Создано задание: {assignment.title}",
-                        "date": assignment.created_at,
-                        "course": assignment.course.title,
-                    }
-                )
+        """Последняя активность: пять записей ленты (school.activity)"""
+        from . import activity
 
-        activities.sort(key=lambda x: x["date"], reverse=True)
-        return activities[:5]
+        return activity.user_feed(self.user, limit=5)[0]
 
 
 class Course(models.Model):
@@ -164,13 +147,81 @@ class Course(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Поддерживаются сигналами (school/signals.py), чтобы каталог не считал
+    # записи и задания для каждой карточки
+    students_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Учеников"
+    )
+    assignments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Заданий"
+    )
+    # Задания, решения и объявления курса перенесены в архивные таблицы
+    # (school.archive); курс доступен только для чтения
+    archived_at = models.DateTimeField(
+        null=True, blank=True, editable=False, verbose_name="В архиве с"
+    )
+    # База с заданиями, решениями и объявлениями курса (school.sharding);
+    # пусто - default
+    shard = models.CharField(
+        max_length=100, blank=True, editable=False, verbose_name="База данных"
+    )
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def refresh_counters(cls, course_ids, students=True, assignments=True):
+        """Пересчитать students_count и assignments_count одним UPDATE"""
+        values = {}
+        if students:
+            enrolled = (
+                cls.students.through.objects.filter(course_id=OuterRef("pk"))
+                .order_by()
+                .values("course_id")
+                .annotate(total=Count("*"))
+                .values("total")
+            )
+            values["students_count"] = Coalesce(Subquery(enrolled), 0)
+        if assignments and sharding.is_sharded():
+            # Задания лежат в базах курсов - подзапрос из default невозможен
+            course_ids = list(course_ids)
+            totals = Counter()
+            for alias in sharding.databases():
+                totals.update(
+                    dict(
+                        Assignment.objects.using(alias)
+                        .filter(course_id__in=course_ids)
+                        .order_by()
+                        .values_list("course_id")
+                        .annotate(total=Count("*"))
+                    )
+                )
+            values["assignments_count"] = Case(
+                *(When(pk=pk, then=Value(totals[pk])) for pk in course_ids),
+                default=Value(0),
+            )
+        elif assignments:
+            created = (
+                Assignment.objects.filter(course_id=OuterRef("pk"))
+                .order_by()
+                .values("course_id")
+                .annotate(total=Count("*"))
+                .values("total")
+            )
+            values["assignments_count"] = Coalesce(Subquery(created), 0)
+        if values and course_ids:
+            cls.objects.filter(pk__in=course_ids).update(**values)
+            querycache.invalidate(querycache.course_tag(pk) for pk in course_ids)
+
     class Meta:
         verbose_name = "Курс"
         verbose_name_plural = "Курсы"
+        indexes = [
+            models.Index(
+                fields=["-students_count", "-id"], name="course_popularity_idx"
+            ),
+            models.Index(fields=["-created_at", "-id"], name="course_recent_idx"),
+        ]
 
 
 class Assignment(models.Model):
@@ -182,16 +233,20 @@ class Assignment(models.Model):
 
     title = models.CharField(max_length=200, verbose_name="Название задания")
     description = models.TextField(verbose_name="Описание")
+    # Курсы и пользователи хранятся в default, задания - в базе курса
+    # (school.sharding), поэтому ограничения внешних ключей в СУБД нет
     course = models.ForeignKey(
         Course,
         on_delete=models.CASCADE,
         related_name="assignments",
+        db_constraint=False,
         verbose_name="Курс",
     )
     teacher = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name="assignments_created",
+        db_constraint=False,
         verbose_name="Учитель",
     )
     due_date = models.DateTimeField(verbose_name="Срок сдачи")
@@ -199,21 +254,57 @@ class Assignment(models.Model):
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default="draft", verbose_name="Статус"
     )
+    auto_grade = models.BooleanField(
+        default=False, verbose_name="Автоматическая проверка"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = sharding.ShardedQuerySet.as_manager()
+
     def is_overdue(self):
         return timezone.now() > self.due_date
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "due_date" in field_names and "max_points" in field_names:
+            instance._loaded_grading = (instance.due_date, instance.max_points)
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        loaded = getattr(self, "_loaded_grading", None)
+        if loaded is not None and loaded != (self.due_date, self.max_points):
+            self.recompute_submissions()
+        self._loaded_grading = (self.due_date, self.max_points)
+
+    def recompute_submissions(self):
+        """Пересчитать is_late и grade_percentage всех решений (три UPDATE)"""
+        submissions = self.submissions.all()
+        submissions.filter(submitted_at__gt=self.due_date).update(is_late=True)
+        submissions.filter(submitted_at__lte=self.due_date).update(is_late=False)
+
+        submissions.update(grade_percentage=Submission.percentage(self.max_points))
+
     def __str__(self):
         return f"{self.title} - {self.course.title}"
 
     class Meta:
         verbose_name = "Задание"
         verbose_name_plural = "Задания"
+        indexes = [models.Index(fields=["status", "due_date"])]
 
 
 class Submission(models.Model):
+    AUTOGRADE_CHOICES = [
+        ("", "Не требуется"),
+        ("pending", "В очереди"),
+        ("running", "Проверяется"),
+        ("done", "Проверено"),
+        ("error", "Ошибка проверки"),
+    ]
+
     assignment = models.ForeignKey(
         Assignment,
         on_delete=models.CASCADE,
@@ -224,6 +315,7 @@ class Submission(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name="submissions",
+        db_constraint=False,
         verbose_name="Ученик",
     )
     content = models.TextField(verbose_name="Решение")
@@ -231,7 +323,7 @@ class Submission(models.Model):
         upload_to="submissions/", blank=True, null=True, verbose_name="Файл"
     )
     submitted_at = models.DateTimeField(
-        auto_now_add=True, verbose_name="Время отправки"
+        auto_now_add=True, db_index=True, verbose_name="Время отправки"
     )
     grade = models.IntegerField(
         null=True,
@@ -240,14 +332,61 @@ class Submission(models.Model):
         verbose_name="Оценка",
     )
     feedback = models.TextField(blank=True, verbose_name="Комментарий учителя")
+    graded_at = models.DateTimeField(
+        null=True, blank=True, db_index=True, verbose_name="Время проверки"
+    )
+    # MinHash-сигнатура содержимого для поиска похожих решений (school.similarity)
+    signature = models.BinaryField(null=True, editable=False)
+    autograde_status = models.CharField(
+        max_length=10,
+        choices=AUTOGRADE_CHOICES,
+        blank=True,
+        default="",
+        db_index=True,
+        verbose_name="Автопроверка",
+    )
+    # Вычисляются при сохранении, чтобы списки фильтровались и сортировались
+    # в SQL без обращения к заданию для каждой строки
+    is_late = models.BooleanField(
+        default=False, db_index=True, editable=False, verbose_name="Опоздание"
+    )
+    # None, пока решение не оценено: отличается от оценки 0
+    grade_percentage = models.FloatField(
+        null=True, db_index=True, editable=False, verbose_name="Процент"
+    )
+
+    objects = sharding.ShardedQuerySet.as_manager()
+
+    @staticmethod
+    def percentage(max_points):
+        """Выражение grade_percentage для UPDATE; ``max_points`` - число или
+        выражение (подзапрос к заданию)"""
+        return Case(
+            When(grade__isnull=True, then=Value(None)),
+            default=ExpressionWrapper(
+                F("grade") * 100.0 / NullIf(max_points, 0),
+                output_field=models.FloatField(),
+            ),
+        )
+
+    def update_derived_fields(self):
+        """Пересчитать сохраняемые is_late и grade_percentage по заданию"""
+        assignment = self.assignment
+        self.is_late = (self.submitted_at or timezone.now()) > assignment.due_date
+        if self.grade is not None and assignment.max_points:
+            self.grade_percentage = (self.grade / assignment.max_points) * 100
+        else:
+            self.grade_percentage = None
 
-    def is_late(self):
-        return self.submitted_at > self.assignment.due_date
+    def save(self, *args, **kwargs):
+        self.update_derived_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "is_late", "grade_percentage"}
+        super().save(*args, **kwargs)
 
     def get_grade_percentage(self):
-        if self.grade and self.assignment.max_points:
-            return (self.grade / self.assignment.max_points) * 100
-        return 0
+        return self.grade_percentage
 
     def __str__(self):
         return f"{self.student.username} - {self.assignment.title}"
@@ -258,6 +397,31 @@ class Submission(models.Model):
         unique_together = ["assignment", "student"]
 
 
+class AssignmentTestCase(models.Model):
+    """Тест для автоматической проверки: входные данные и ожидаемый вывод"""
+
+    assignment = models.ForeignKey(
+        Assignment,
+        on_delete=models.CASCADE,
+        related_name="test_cases",
+        verbose_name="Задание",
+    )
+    input_data = models.TextField(blank=True, verbose_name="Входные данные")
+    expected_output = models.TextField(verbose_name="Ожидаемый вывод")
+    points = models.PositiveIntegerField(default=1, verbose_name="Баллы")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = sharding.ShardedQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.assignment.title}: тест {self.pk}"
+
+    class Meta:
+        verbose_name = "Тест"
+        verbose_name_plural = "Тесты"
+        ordering = ["id"]
+
+
 class Announcement(models.Model):
     title = models.CharField(max_length=200, verbose_name="Заголовок")
     content = models.TextField(verbose_name="Содержание")
@@ -265,11 +429,16 @@ class Announcement(models.Model):
         Course,
         on_delete=models.CASCADE,
         related_name="announcements",
+        db_constraint=False,
         verbose_name="Курс",
     )
-    author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Автор")
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, db_constraint=False, verbose_name="Автор"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = sharding.ShardedQuerySet.as_manager()
+
     def __str__(self):
         return self.title
 
@@ -277,3 +446,355 @@ class Announcement(models.Model):
         verbose_name = "Объявление"
         verbose_name_plural = "Объявления"
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["course", "-created_at"])]
+
+
+class AnnouncementReadMarker(models.Model):
+    """Отметка о прочтении ленты объявлений учеником.
+
+    ``unread_count`` поддерживается сигналами при создании и удалении
+    объявлений, поэтому значок в навигации читается одной строкой.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name="announcement_marker",
+        verbose_name="Ученик",
+    )
+    last_read_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Прочитано до"
+    )
+    unread_count = models.PositiveIntegerField(default=0, verbose_name="Непрочитанных")
+
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count}"
+
+    class Meta:
+        verbose_name = "Отметка о прочтении"
+        verbose_name_plural = "Отметки о прочтении"
+
+    def unread_queryset(self):
+        return Announcement.objects.filter(
+            course_id__in=sharding.id_list(
+                self.user.courses_enrolled.values_list("id", flat=True)
+            ),
+            created_at__gt=self.last_read_at,
+        )
+
+    def recount(self):
+        """Пересчитать счётчик по индексу (course, created_at)"""
+        self.unread_count = sharding.count(self.unread_queryset())
+        self.save(update_fields=["unread_count"])
+        return self.unread_count
+
+    def mark_read(self, moment=None):
+        self.last_read_at = moment or timezone.now()
+        self.unread_count = 0
+        self.save(update_fields=["last_read_at", "unread_count"])
+
+
+class LeaderboardEntry(models.Model):
+    """Сумма баллов ученика по курсу.
+
+    Обновляется инкрементально при выставлении оценки (school.leaderboard),
+    полностью пересчитывается командой rebuild_leaderboards.
+    """
+
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name="leaderboard_entries",
+        verbose_name="Курс",
+    )
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="leaderboard_entries",
+        verbose_name="Ученик",
+    )
+    total_points = models.IntegerField(default=0, verbose_name="Сумма баллов")
+    graded_count = models.PositiveIntegerField(
+        default=0, verbose_name="Оценённых работ"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def get_average_points(self):
+        if self.graded_count:
+            return self.total_points / self.graded_count
+        return 0
+
+    def __str__(self):
+        return f"{self.course.title}: {self.student.username} ({self.total_points})"
+
+    class Meta:
+        verbose_name = "Позиция в рейтинге"
+        verbose_name_plural = "Рейтинг"
+        unique_together = ["course", "student"]
+        indexes = [models.Index(fields=["course", "-total_points"])]
+
+
+class CourseVersion(models.Model):
+    """Номера версий производных данных курса: рейтинга и аналитики.
+
+    Хранятся в базе ``default``, а не в кеше: увеличение - атомарный UPDATE,
+    и новый номер сразу видят все процессы сервера. Ссылки на курс нет,
+    чтобы сброс версии при удалении курса не мешал каскадному удалению.
+    """
+
+    course_id = models.BigIntegerField(primary_key=True, verbose_name="Курс")
+    leaderboard = models.PositiveBigIntegerField(default=0)
+    analytics = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls, course_id, field):
+        version = (
+            cls.objects.filter(course_id=course_id)
+            .values_list(field, flat=True)
+            .first()
+        )
+        return version or 0
+
+    @classmethod
+    def bump(cls, course_ids, field):
+        """Увеличить версию курсов; возвращает ``{id курса: новая версия}``"""
+        course_ids = set(course_ids)
+        if not course_ids:
+            return {}
+        with transaction.atomic(using="default"):
+            cls.objects.bulk_create(
+                [cls(course_id=course_id) for course_id in course_ids],
+                ignore_conflicts=True,
+            )
+            versions = cls.objects.filter(course_id__in=course_ids)
+            versions.update(**{field: F(field) + 1})
+            return dict(versions.values_list("course_id", field))
+
+    def __str__(self):
+        return (
+            f"Курс {self.course_id}: рейтинг {self.leaderboard}, "
+            f"аналитика {self.analytics}"
+        )
+
+    class Meta:
+        verbose_name = "Версия данных курса"
+        verbose_name_plural = "Версии данных курсов"
+
+
+class SimilarityAnalysis(models.Model):
+    """Последний результат поиска похожих решений задания (school.similarity).
+
+    Хранится в базе ``default``, а не только в кеше: анализ запускается по
+    расписанию, и вытеснение из кеша потеряло бы его до следующего запуска.
+    Задание может лежать в другой базе (school.sharding), поэтому вместо
+    внешнего ключа - id задания.
+    """
+
+    assignment_id = models.BigIntegerField(verbose_name="Задание")
+    threshold = models.FloatField(verbose_name="Порог сходства")
+    pairs = models.JSONField(default=list, verbose_name="Похожие пары")
+    # Состояние решений задания на момент анализа
+    submissions_count = models.IntegerField(verbose_name="Решений")
+    latest_submitted_at = models.DateTimeField(
+        null=True, verbose_name="Последняя сдача"
+    )
+    computed_at = models.DateTimeField(default=timezone.now, verbose_name="Проверено")
+
+    def __str__(self):
+        return f"Задание {self.assignment_id}: пар {len(self.pairs)}"
+
+    class Meta:
+        verbose_name = "Анализ похожих решений"
+        verbose_name_plural = "Анализы похожих решений"
+        unique_together = ["assignment_id", "threshold"]
+
+
+class DeadlineReminder(models.Model):
+    """Отправленное напоминание о сроке сдачи (повторно не отправляется)"""
+
+    assignment = models.ForeignKey(
+        Assignment,
+        on_delete=models.CASCADE,
+        related_name="reminders",
+        verbose_name="Задание",
+    )
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="deadline_reminders",
+        db_constraint=False,
+        verbose_name="Ученик",
+    )
+    sent_at = models.DateTimeField(auto_now_add=True, verbose_name="Отправлено")
+
+    objects = sharding.ShardedQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.student.username} - {self.assignment.title}"
+
+    class Meta:
+        verbose_name = "Напоминание о сроке"
+        verbose_name_plural = "Напоминания о сроках"
+        unique_together = ["assignment", "student"]
+
+
+class ActivityEvent(models.Model):
+    """Запись ленты активности (school.activity).
+
+    Таблица только пополняется. Названия задания, объявления и курса
+    копируются в запись, поэтому лента выводится одним запросом по индексу
+    без обращения к другим таблицам.
+    """
+
+    KIND_CHOICES = [
+        ("submission", "Отправлено задание"),
+        ("grade", "Оценено задание"),
+        ("announcement", "Создано объявление"),
+        ("assignment", "Создано задание"),
+    ]
+
+    # Индексы внешних ключей не нужны: их заменяют составные индексы лент
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="activity_events",
+        db_index=False,
+        verbose_name="Пользователь",
+    )
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name="activity_events",
+        db_index=False,
+        verbose_name="Курс",
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Тип")
+    # id задания (для решений и оценок) или объявления
+    target_id = models.BigIntegerField(verbose_name="Объект")
+    title = models.CharField(max_length=200, verbose_name="Название")
+    course_title = models.CharField(max_length=200, verbose_name="Название курса")
+    grade = models.IntegerField(null=True, blank=True, verbose_name="Оценка")
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Время")
+
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
+
+    class Meta:
+        verbose_name = "Событие"
+        verbose_name_plural = "Лента активности"
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="activity_user_feed_idx"
+            ),
+            models.Index(
+                fields=["course", "-created_at", "-id"],
+                name="activity_course_feed_idx",
+            ),
+        ]
+
+
+class ArchivedAssignment(models.Model):
+    """Задание архивного курса (school.archive), id сохраняется прежним"""
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200, verbose_name="Название задания")
+    description = models.TextField(verbose_name="Описание")
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name="archived_assignments",
+        verbose_name="Курс",
+    )
+    teacher = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", verbose_name="Учитель"
+    )
+    due_date = models.DateTimeField(verbose_name="Срок сдачи")
+    max_points = models.IntegerField(verbose_name="Максимальный балл")
+    status = models.CharField(
+        max_length=20, choices=Assignment.STATUS_CHOICES, verbose_name="Статус"
+    )
+    auto_grade = models.BooleanField(
+        default=False, verbose_name="Автоматическая проверка"
+    )
+    # Тесты автопроверки: [{"input_data", "expected_output", "points"}, ...]
+    test_cases = models.JSONField(default=list, blank=True, verbose_name="Тесты")
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def is_overdue(self):
+        return timezone.now() > self.due_date
+
+    def __str__(self):
+        return f"{self.title} - {self.course.title}"
+
+    class Meta:
+        verbose_name = "Архивное задание"
+        verbose_name_plural = "Архивные задания"
+
+
+class ArchivedSubmission(models.Model):
+    """Решение по заданию архивного курса"""
+
+    id = models.BigIntegerField(primary_key=True)
+    assignment = models.ForeignKey(
+        ArchivedAssignment,
+        on_delete=models.CASCADE,
+        related_name="submissions",
+        verbose_name="Задание",
+    )
+    student = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="archived_submissions",
+        verbose_name="Ученик",
+    )
+    content = models.TextField(verbose_name="Решение")
+    file = models.FileField(
+        upload_to="submissions/", blank=True, null=True, verbose_name="Файл"
+    )
+    submitted_at = models.DateTimeField(verbose_name="Время отправки")
+    grade = models.IntegerField(null=True, blank=True, verbose_name="Оценка")
+    feedback = models.TextField(blank=True, verbose_name="Комментарий учителя")
+    graded_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Время проверки"
+    )
+    is_late = models.BooleanField(default=False, verbose_name="Опоздание")
+    grade_percentage = models.FloatField(null=True, verbose_name="Процент")
+
+    def get_grade_percentage(self):
+        return self.grade_percentage
+
+    def __str__(self):
+        return f"{self.student.username} - {self.assignment.title}"
+
+    class Meta:
+        verbose_name = "Архивное решение"
+        verbose_name_plural = "Архивные решения"
+        unique_together = ["assignment", "student"]
+
+
+class ArchivedAnnouncement(models.Model):
+    """Объявление архивного курса"""
+
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200, verbose_name="Заголовок")
+    content = models.TextField(verbose_name="Содержание")
+    course = models.ForeignKey(
+        Course,
+        on_delete=models.CASCADE,
+        related_name="archived_announcements",
+        verbose_name="Курс",
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+", verbose_name="Автор"
+    )
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        verbose_name = "Архивное объявление"
+        verbose_name_plural = "Архивные объявления"
+        ordering = ["-created_at"]
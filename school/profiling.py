@@ -0,0 +1,244 @@
+"""Выборочное профилирование запросов.
+
+SamplingProfilerMiddleware профилирует долю ``PROFILING_SAMPLE_RATE``
+запросов, а также запросы с подписанным заголовком ``X-Profile``. Заголовок
+выдаёт команда ``profile_stacks --header <пользователь>``: он действует
+``PROFILING_HEADER_MAX_AGE`` секунд и только в сессии этого пользователя.
+Пока такой
+запрос выполняется, фоновый поток каждые ``PROFILING_INTERVAL`` секунд снимает
+стек потока, обрабатывающего запрос: накладные расходы статистического
+профайлера не зависят от числа вызовов функций.
+
+Стеки сохраняются в формате collapsed stacks, по файлу на запрос в
+``PROFILING_DIR/<имя URL>/``; хранятся последние ``PROFILING_MAX_FILES``
+файлов. Команда profile_stacks объединяет их для flamegraph.pl или speedscope.
+
+Для запросов без выборки middleware делает только сравнение со случайным
+числом и поиск заголовка.
+"""
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core import signing
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+HEADER = "HTTP_X_PROFILE"
+_SALT = "school.profiling"
+# Кадры до middleware (сервер, обработчик Django) в профиль не попадают
+_ROOT_FRAMES = {
+    f"{__name__}:SamplingProfilerMiddleware.__call__",
+    f"{__name__}:SamplingProfilerMiddleware.__acall__",
+}
+
+
+def sample_rate():
+    return getattr(settings, "PROFILING_SAMPLE_RATE", 0)
+
+
+def interval():
+    return getattr(settings, "PROFILING_INTERVAL", 0.005)
+
+
+def profiles_dir():
+    return Path(
+        getattr(settings, "PROFILING_DIR", Path(settings.BASE_DIR) / "profiles")
+    )
+
+
+def max_files():
+    return getattr(settings, "PROFILING_MAX_FILES", 100)
+
+
+def header_max_age():
+    return getattr(settings, "PROFILING_HEADER_MAX_AGE", 3600)
+
+
+def debug_header_value(user):
+    """Значение заголовка X-Profile, включающего профилирование запросов user"""
+    return signing.TimestampSigner(salt=_SALT).sign(str(user.pk))
+
+
+def _session_user_id(request):
+    # Middleware стоит раньше SessionMiddleware и AuthenticationMiddleware,
+    # поэтому сессия читается здесь, и только для запросов с заголовком
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not session_key:
+        return None
+    engine = import_string(f"{settings.SESSION_ENGINE}.SessionStore")
+    return engine(session_key).get(SESSION_KEY)
+
+
+def has_debug_header(request):
+    value = request.META.get(HEADER)
+    if not value:
+        return False
+    try:
+        user_id = signing.TimestampSigner(salt=_SALT).unsign(
+            value, max_age=header_max_age()
+        )
+    except signing.BadSignature:
+        return False
+    return user_id == str(_session_user_id(request))
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    # ";" разделяет кадры в формате collapsed stacks
+    return f"{module}:{code.co_qualname}".replace(";", ",")
+
+
+class StackSampler:
+    """Снимает стеки одного потока из фонового потока"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                label = _frame_label(frame)
+                if label in _ROOT_FRAMES:
+                    break
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+
+def _directory_name(view_name):
+    return re.sub(r"[^\w.-]", "_", view_name or "unresolved")
+
+
+def save(view_name, counts):
+    """Записать стеки запроса и удалить самые старые файлы этого URL"""
+    directory = profiles_dir() / _directory_name(view_name)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{time.time_ns()}-{os.getpid()}.txt"
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(
+        "".join(f"{stack} {count}\n" for stack, count in counts.items()),
+        encoding="utf-8",
+    )
+    os.replace(temporary, path)
+
+    for old in sorted(directory.glob("*.txt"))[: -max_files()]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def _read(path, counts):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                counts[stack] += int(count)
+
+
+def collapse(view_names=None):
+    """Объединить сохранённые стеки (всех URL или только ``view_names``)"""
+    counts = Counter()
+    root = profiles_dir()
+    if view_names:
+        directories = [root / _directory_name(name) for name in view_names]
+    else:
+        directories = [path for path in root.glob("*") if path.is_dir()]
+    for directory in directories:
+        for path in directory.glob("*.txt"):
+            _read(path, counts)
+    return counts
+
+
+def summary():
+    """Список (имя URL, число профилей, число снимков стека)"""
+    rows = []
+    root = profiles_dir()
+    for directory in sorted(path for path in root.glob("*") if path.is_dir()):
+        files = list(directory.glob("*.txt"))
+        counts = Counter()
+        for path in files:
+            _read(path, counts)
+        rows.append((directory.name, len(files), sum(counts.values())))
+    return rows
+
+
+class SamplingProfilerMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = sample_rate()
+        self.interval = interval()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def should_profile(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        return has_debug_header(request)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._finish(request, sampler.stop())
+        return response
+
+    async def __acall__(self, request):
+        # В асинхронном режиме снимается стек потока цикла событий, поэтому
+        # в профиль могут попасть и другие запросы этого процесса.
+        if not self.should_profile(request):
+            return await self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval).start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._finish(request, sampler.stop())
+        return response
+
+    def _finish(self, request, counts):
+        if not counts:
+            return
+        match = getattr(request, "resolver_match", None)
+        try:
+            save(match.view_name if match else None, counts)
+        except OSError:
+            logger.exception("Не удалось сохранить профиль запроса")
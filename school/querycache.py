@@ -0,0 +1,223 @@
+"""Кеш результатов querysets с инвалидацией по тегам.
+
+Одни и те же запросы (курсы учителя, курсы ученика, список курсов в форме
+задания) выполняются почти на каждой странице. cached() сохраняет результат
+queryset под тегами вроде ``course:<id>``, ``teacher:<id>``, ``student:<id>``;
+обработчики post_save/post_delete/m2m_changed в signals.py вызывают
+invalidate() с тегами изменённых строк.
+
+* Для каждого тега в кеше Django хранится время последней инвалидации.
+  Запись кеша помнит, когда начался её запрос, и отдаётся, только пока все
+  её теги менялись раньше (с запасом ``QUERYCACHE_CLOCK_SKEW`` секунд на
+  расхождение часов процессов). Так устаревает и запись, запрос которой шёл
+  одновременно с изменением, - в том числе по тегам строк, которые
+  становятся известны только после запроса. Если время тега вытеснено из
+  кеша, оно считается текущим, и все записи с этим тегом устаревают.
+* Внутри транзакции время тегов обновляется ещё раз после commit: иначе
+  другой процесс мог бы закешировать данные, прочитанные до commit.
+* Время тегов должно быть общим для всех процессов: в кеше ``default`` из
+  CACHES, но не в LocMemCache/DummyCache. Иначе изменение в одном процессе
+  не сбросит записи другого, поэтому с таким кешем cached() не кеширует
+  ничего и сразу выполняет запрос.
+* Локальный уровень - LRU в памяти процесса на ``QUERYCACHE_MAX_ENTRIES``
+  записей. Общий уровень (``QUERYCACHE_SHARED`` - алиас кеша из CACHES)
+  позволяет процессам переиспользовать результаты друг друга.
+* Строки хранятся в pickle и восстанавливаются при каждом чтении: объекты
+  из select_related и prefetch_related у каждого вызова свои.
+
+Кроме тегов запроса, каждой строке можно назначить свои (``row_tags``):
+тогда изменение любого курса из списка сбрасывает и список. Время тега
+строки, которого ещё нет в кеше, заводится только после запроса, поэтому
+такая запись сразу устаревает и кешируется со следующего чтения; курсы
+получают время тега уже при создании.
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from . import metrics
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def max_entries():
+    return getattr(settings, "QUERYCACHE_MAX_ENTRIES", 500)
+
+
+def timeout():
+    return getattr(settings, "QUERYCACHE_TIMEOUT", 5 * 60)
+
+
+def shared_alias():
+    return getattr(settings, "QUERYCACHE_SHARED", None)
+
+
+def clock_skew():
+    return getattr(settings, "QUERYCACHE_CLOCK_SKEW", 1.0)
+
+
+def enabled():
+    """Время тегов видно всем процессам (кеш default не в памяти процесса)"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+# --- Теги -------------------------------------------------------------------
+
+
+def course_tag(course_id):
+    """Строка курса: название, счётчики, архив, база"""
+    return f"course:{course_id}"
+
+
+def teacher_tag(user_id):
+    """Состав курсов учителя"""
+    return f"teacher:{user_id}"
+
+
+def student_tag(user_id):
+    """Состав курсов ученика"""
+    return f"student:{user_id}"
+
+
+def user_tag(user_id):
+    """Строка пользователя (имя в select_related)"""
+    return f"user:{user_id}"
+
+
+def _stamp_key(tag):
+    return f"querycache:tag:{tag}"
+
+
+def _changed_at(tags):
+    """Время последней инвалидации самого свежего из тегов"""
+    keys = [_stamp_key(tag) for tag in tags]
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time(), timeout=None)
+        stamps.update(cache.get_many(missing))
+    return max(stamps.values(), default=0)
+
+
+def _bump(tags):
+    cache.set_many({_stamp_key(tag): time.time() for tag in tags}, timeout=None)
+
+
+def invalidate(tags, using=DEFAULT_DB_ALIAS):
+    """Сбросить записи с любым из тегов"""
+    tags = set(tags)
+    if not tags:
+        return
+    _bump(tags)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: _bump(tags), using=using)
+
+
+def clear():
+    """Очистить локальный уровень"""
+    with _lock:
+        _local.clear()
+
+
+# --- Хранение ---------------------------------------------------------------
+
+
+def _key(queryset):
+    query = f"{queryset.db}:{queryset.model._meta.label}:{queryset.query}"
+    return hashlib.sha1(query.encode()).hexdigest()
+
+
+def _valid(entry):
+    """Строки записи, если срок не истёк и теги не менялись после начала
+    запроса"""
+    tags, started, rows = entry
+    if started + timeout() < time.time():
+        return None
+    if _changed_at(tags) >= started - clock_skew():
+        return None
+    return rows
+
+
+def _get(key):
+    with _lock:
+        entry = _local.get(key)
+        if entry is not None:
+            _local.move_to_end(key)
+    if entry is not None:
+        rows = _valid(entry)
+        if rows is not None:
+            metrics.QUERYCACHE_REQUESTS.inc(tier="local")
+            return rows
+
+    alias = shared_alias()
+    if alias:
+        entry = caches[alias].get(f"querycache:{key}")
+        if entry is not None:
+            rows = _valid(entry)
+            if rows is not None:
+                _put_local(key, entry)
+                metrics.QUERYCACHE_REQUESTS.inc(tier="shared")
+                return rows
+
+    metrics.QUERYCACHE_REQUESTS.inc(tier="miss")
+    return None
+
+
+def _put_local(key, entry):
+    with _lock:
+        _local[key] = entry
+        _local.move_to_end(key)
+        while len(_local) > max_entries():
+            _local.popitem(last=False)
+
+
+def _put(key, entry):
+    _put_local(key, entry)
+    alias = shared_alias()
+    if alias:
+        caches[alias].set(f"querycache:{key}", entry, timeout())
+
+
+# --- Чтение -----------------------------------------------------------------
+
+
+def cached(queryset, tags, row_tags=None):
+    """queryset с уже заполненным результатом из кеша.
+
+    ``count()``, ``exists()``, ``len``, срезы и итерация берут строки из кеша;
+    ``filter()``, ``values()`` и ``aggregate()`` создают новый queryset и идут
+    в базу. Объекты (вместе со связанными) создаются заново из pickle,
+    поэтому их можно менять, не портя кеш.
+    """
+    if queryset.query.is_empty() or not enabled():
+        return queryset
+    key = _key(queryset)
+    rows = _get(key)
+    if rows is None:
+        # Время тегов запроса заводится до его начала, иначе первая запись
+        # сразу оказалась бы устаревшей
+        _changed_at(tags)
+        started = time.time()
+        objects = list(queryset.all())
+        if row_tags is not None:
+            tags = [*tags, *(tag for row in objects for tag in row_tags(row))]
+        rows = pickle.dumps(objects, pickle.HIGHEST_PROTOCOL)
+        _put(key, (tuple(dict.fromkeys(tags)), started, rows))
+    else:
+        objects = pickle.loads(rows)
+
+    result = queryset.all()
+    result._result_cache = objects
+    result._prefetch_done = True
+    return result
@@ -0,0 +1,147 @@
+"""Напоминания ученикам о приближающемся сроке сдачи.
+
+Задания выбираются диапазоном по индексу (status, due_date). Ученики курса
+читаются пачками по ``batch_size`` id (по возрастанию, без OFFSET); для
+каждой пачки двумя запросами ``student_id IN (...)`` отбрасываются сдавшие
+и уже получившие напоминание. Записи о курсе и решения могут лежать в разных
+базах (school.sharding), поэтому это не один NOT EXISTS; зато в памяти
+одновременно только одна пачка, сколько бы учеников ни было на курсах.
+Письма уходят через одно соединение почтового бэкенда Django.
+
+Получатели пачки отмечаются (DeadlineReminder) до отправки, в транзакции с
+блокировкой строки задания: параллельный проход ждёт её и уже не видит
+отмеченных учеников. При сбое почты напоминание может не дойти, но дважды
+не отправляется.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import Assignment, Course, DeadlineReminder
+
+# Заданий за один запрос; при шардировании курсы к ним подгружаются
+# prefetch_related по той же пачке
+CHUNK_SIZE = 500
+
+
+def upcoming_assignments(now, window):
+    return (
+        Assignment.objects.filter(
+            status="published", due_date__gt=now, due_date__lte=now + window
+        )
+        .select_related("course")
+        .order_by("due_date")
+    )
+
+
+def enrolled_batches(assignment, batch_size):
+    """id учеников курса пачками по возрастанию"""
+    enrolled = (
+        Course.students.through.objects.filter(course_id=assignment.course_id)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+    last = 0
+    while True:
+        batch = list(enrolled.filter(user_id__gt=last)[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]
+        yield batch
+
+
+def pending_students(assignment, student_ids):
+    """Ученики из ``student_ids``, которые ещё не сдали задание и не получили
+    напоминание"""
+    done = set(
+        assignment.submissions.filter(student_id__in=student_ids).values_list(
+            "student_id", flat=True
+        )
+    )
+    done.update(
+        assignment.reminders.filter(student_id__in=student_ids).values_list(
+            "student_id", flat=True
+        )
+    )
+    return [student_id for student_id in student_ids if student_id not in done]
+
+
+def build_message(assignment, email, first_name):
+    due = timezone.localtime(assignment.due_date).strftime("%d.%m.%Y %H:%M")
+    body = (
+        f"Здравствуйте{', ' + first_name if first_name else ''}!\n\n"
+        f"Срок сдачи задания «{assignment.title}» по курсу "
+        f"«{assignment.course.title}» истекает {due}.\n"
+        f"Решение ещё не отправлено.\n\n"
+        f"Online School"
+    )
+    return EmailMessage(
+        subject=f"Напоминание: «{assignment.title}» до {due}",
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+    )
+
+
+def claim_students(assignment, student_ids):
+    """Отметить и вернуть учеников из ``student_ids``, которым нужно
+    напоминание"""
+    alias = assignment._state.db
+    with transaction.atomic(using=alias):
+        list(
+            Assignment.objects.using(alias)
+            .select_for_update()
+            .filter(pk=assignment.pk)
+            .values_list("pk")
+        )
+        student_ids = pending_students(assignment, student_ids)
+        DeadlineReminder.objects.using(alias).bulk_create(
+            [
+                DeadlineReminder(assignment=assignment, student_id=student_id)
+                for student_id in student_ids
+            ],
+            ignore_conflicts=True,
+        )
+    return student_ids
+
+
+def remind(assignment, batch_size=500, connection=None):
+    """Отправить напоминания по одному заданию. Возвращает число писем."""
+    connection = connection or get_connection()
+    sent = 0
+
+    for batch in enrolled_batches(assignment, batch_size):
+        # Отмечаются все ученики, в том числе без email, чтобы не выбирать их
+        # снова на следующем проходе
+        student_ids = claim_students(assignment, batch)
+        if not student_ids:
+            continue
+        recipients = User.objects.filter(id__in=student_ids).exclude(email="")
+        messages = [
+            build_message(assignment, email, first_name)
+            for email, first_name in recipients.values_list("email", "first_name")
+        ]
+        if messages:
+            sent += connection.send_messages(messages) or 0
+
+    return sent
+
+
+def run_once(window=timedelta(hours=24), batch_size=500, now=None):
+    now = now or timezone.now()
+    total = 0
+    connection = get_connection()
+    with connection:
+        for alias in sharding.databases():
+            assignments = upcoming_assignments(now, window).using(alias)
+            for assignment in assignments.iterator(chunk_size=CHUNK_SIZE):
+                total += remind(
+                    assignment, batch_size=batch_size, connection=connection
+                )
+    return total
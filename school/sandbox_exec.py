@@ -0,0 +1,104 @@
+"""Обёртка запуска решения в песочнице автопроверки (school/autograder.py).
+
+Передаётся интерпретатору через ``python -I -S -c``, поэтому не импортирует
+ни Django, ни проект и работает без проекта в sys.path. Параметры - JSON в
+``sys.argv[1]``. В новом пространстве имён монтирования (unshare) обёртка:
+
+1. монтирует свои пустые /tmp, /var/tmp и /dev/shm и возвращает в них только
+   рабочий каталог решения: каталоги других проверок, идущих в это же время
+   от того же пользователя, не видны;
+2. закрывает пустым tmpfs (каталоги) или /dev/null (файлы) пути проекта -
+   базу SQLite, настройки с SECRET_KEY, MEDIA_ROOT;
+3. запускает дочерний процесс, который ставит ограничения ресурсов (включая
+   RLIMIT_NPROC), переходит к непривилегированному пользователю и заменяет
+   себя (exec) интерпретатором с решением в пустом рабочем каталоге;
+4. ждёт его и завершается с тем же кодом, а гибель от сигнала N передаёт
+   кодом ``128 + N`` (unshare не умеет передавать, например, SIGXCPU).
+
+В пространстве имён PID обёртка - процесс 1: с её завершением ядро убивает
+все оставшиеся процессы решения.
+"""
+
+import ctypes
+import json
+import os
+import resource
+import stat
+import sys
+
+MS_BIND = 4096
+TMP_SIZE = "16m"
+
+
+def hide(libc, path):
+    try:
+        mode = os.stat(path).st_mode
+    except OSError:
+        return
+    if stat.S_ISDIR(mode):
+        result = libc.mount(b"none", path.encode(), b"tmpfs", 0, b"size=4k,mode=000")
+    else:
+        result = libc.mount(b"/dev/null", path.encode(), None, MS_BIND, None)
+    if result != 0:
+        raise OSError(ctypes.get_errno(), f"не удалось скрыть {path}")
+
+
+def private_tmp(libc, paths, workdir):
+    # Рабочий каталог открыт до монтирования: после него путь ведёт в tmpfs
+    keep = os.open(workdir, os.O_PATH)
+    for path in paths:
+        if not os.path.isdir(path):
+            continue
+        options = f"size={TMP_SIZE},mode=1777".encode()
+        if libc.mount(b"none", path.encode(), b"tmpfs", 0, options) != 0:
+            raise OSError(ctypes.get_errno(), f"не удалось закрыть {path}")
+    os.makedirs(workdir, exist_ok=True)
+    source = f"/proc/self/fd/{keep}".encode()
+    if libc.mount(source, workdir.encode(), None, MS_BIND, None) != 0:
+        raise OSError(ctypes.get_errno(), f"не удалось вернуть {workdir}")
+    os.close(keep)
+
+
+def run_solution(options):
+    for name, value in options["limits"].items():
+        limit = getattr(resource, name)
+        resource.setrlimit(limit, (value, value))
+
+    if options["uid"] is not None:
+        os.setgroups([])
+        os.setgid(options["gid"])
+        os.setuid(options["uid"])
+
+    os.chdir(options["workdir"])
+    os.execve(
+        options["python"],
+        [options["python"], "-I", "-S", options["source"]],
+        options["env"],
+    )
+
+
+def main():
+    options = json.loads(sys.argv[1])
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    if options["private_tmp"]:
+        private_tmp(libc, options["private_tmp"], options["workdir"])
+    if options["hide"]:
+        # Сначала вложенные пути: после скрытия родителя они недоступны
+        for path in sorted(options["hide"], key=len, reverse=True):
+            hide(libc, path)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_solution(options)
+        finally:
+            os._exit(127)
+    status = os.waitpid(pid, 0)[1]
+    if os.WIFSIGNALED(status):
+        sys.exit(128 + os.WTERMSIG(status))
+    sys.exit(os.waitstatus_to_exitcode(status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,726 @@
+"""Шардирование данных курсов по нескольким базам.
+
+Задания, тесты, решения, напоминания и объявления курса (SHARDED_MODELS)
+хранятся в одной из баз ``SHARD_DATABASES``; пользователи, профили, курсы,
+рейтинги, лента активности и архив остаются в базе ``default``. База курса
+записана в Course.shard (пусто - ``default``, где лежат данные, созданные до
+включения шардирования); новый курс получает базу по остатку от деления id.
+Процесс помнит базу курса ``SHARD_PLACEMENT_TTL`` секунд: move_course
+сбрасывает её в своём процессе, остальные увидят перенос не позже этого срока.
+
+* CourseShardRouter выбирает базу по подсказке ``instance``: объект
+  шардированной модели остаётся в своей базе, ``course.assignments``
+  идёт в базу курса, ``submission.student`` - в ``default``. Запросы
+  ``Model.objects`` без подсказки идут в базу текущего запроса;
+* ShardRoutingMiddleware определяет эту базу по ``course_id``,
+  ``assignment_id`` или ``submission_id`` из URL, поэтому представления
+  одного курса работают без изменений;
+* select_related к моделям из ``default`` в базе шарда выполняется как
+  prefetch_related (ShardedQuerySet - менеджер шардированных моделей);
+* страницы по нескольким курсам (панели, статистика) и фоновые процессы
+  обходят все базы через databases()/gather()/count(), а постраничные
+  списки - через paginated();
+* id строк шардированных таблиц не пересекаются между базами: каждой базе
+  выдаётся свой диапазон по ``SHARD_ID_RANGE`` (reserve_id_ranges() после
+  migrate), поэтому база строки известна по её id, а перенос курса командой
+  rebalance_shards сохраняет id и ссылки на них.
+
+Пока ``SHARD_DATABASES == ["default"]``, маршрутизатор ничего не меняет и
+лишних запросов не делает. Базы подключаются переменной окружения
+``SCHOOL_SHARDS`` (см. settings.py) и создаются командой
+``migrate --database shardN``. Порядок ``SHARD_DATABASES`` менять нельзя:
+от позиции базы в списке зависит её диапазон id.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import chain
+from operator import attrgetter, itemgetter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections, models, transaction
+from django.db.models import F, OrderBy
+from django.db.models.query import (
+    FlatValuesListIterable,
+    ModelIterable,
+    ValuesIterable,
+)
+
+from . import querycache
+
+SHARDED_MODELS = {
+    "assignment",
+    "assignmenttestcase",
+    "submission",
+    "deadlinereminder",
+    "announcement",
+}
+
+BATCH_SIZE = 500
+
+_current = ContextVar("shard", default=None)
+_moving = ContextVar("moving_course", default=False)
+# id курса -> (база, время чтения Course.shard) в памяти процесса
+_placement = {}
+_lock = threading.Lock()
+
+
+def aliases():
+    return list(getattr(settings, "SHARD_DATABASES", ["default"]))
+
+
+def id_range():
+    return getattr(settings, "SHARD_ID_RANGE", 10**12)
+
+
+def placement_ttl():
+    return getattr(settings, "SHARD_PLACEMENT_TTL", 60)
+
+
+def is_sharded():
+    return aliases() != ["default"]
+
+
+def is_sharded_model(model):
+    meta = model._meta
+    return meta.app_label == "school" and meta.model_name in SHARDED_MODELS
+
+
+def databases():
+    """Все базы с данными курсов: шарды и ``default`` (курсы до шардирования)"""
+    return list(dict.fromkeys([*aliases(), "default"]))
+
+
+# --- Размещение курсов ------------------------------------------------------
+
+
+def default_placement(course_id):
+    shards = aliases()
+    return shards[course_id % len(shards)]
+
+
+def invalidate_placement(course_id):
+    """Забыть базу курса в памяти этого процесса"""
+    with _lock:
+        _placement.pop(course_id, None)
+
+
+def for_course(course):
+    """База данных курса (объект Course или id)"""
+    if not is_sharded():
+        return "default"
+
+    from .models import Course
+
+    if isinstance(course, Course):
+        if "shard" not in course.get_deferred_fields():
+            return course.shard or "default"
+        course = course.pk
+    now = time.monotonic()
+    with _lock:
+        cached = _placement.get(course)
+    if cached is not None and cached[1] + placement_ttl() > now:
+        return cached[0]
+    alias = (
+        Course.objects.filter(pk=course).values_list("shard", flat=True).first()
+        or "default"
+    )
+    with _lock:
+        _placement[course] = (alias, now)
+    return alias
+
+
+def id_offset(alias):
+    if alias == "default":
+        return 0
+    return (aliases().index(alias) + 1) * id_range()
+
+
+def home_database(pk):
+    """База, в которой строка с этим id была создана"""
+    position = pk // id_range()
+    shards = aliases()
+    if 0 < position <= len(shards):
+        return shards[position - 1]
+    return "default"
+
+
+def candidates(pk):
+    """Базы для поиска строки по id: сначала та, где она создана"""
+    home = home_database(pk)
+    return [home, *(alias for alias in databases() if alias != home)]
+
+
+def locate(model, pk):
+    """База, в которой сейчас лежит строка (курс мог быть перенесён)"""
+    if not is_sharded():
+        return "default"
+    for alias in candidates(pk):
+        if model._default_manager.using(alias).filter(pk=pk).exists():
+            return alias
+    return None
+
+
+# --- Текущая база запроса ---------------------------------------------------
+
+
+def current():
+    return _current.get()
+
+
+def is_moving():
+    """Идёт перенос курса: сигналы удаления не пересчитывают счётчики по строке"""
+    return _moving.get()
+
+
+@contextmanager
+def use(alias):
+    """Запросы без подсказки внутри блока идут в базу ``alias``"""
+    token = _current.set(alias)
+    try:
+        yield alias
+    finally:
+        _current.reset(token)
+
+
+def route_view(view_kwargs):
+    """База для представления по id курса, задания или решения из URL"""
+    from .models import Assignment, Submission
+
+    try:
+        if "course_id" in view_kwargs:
+            return for_course(int(view_kwargs["course_id"]))
+        if "assignment_id" in view_kwargs:
+            return locate(Assignment, int(view_kwargs["assignment_id"]))
+        if "submission_id" in view_kwargs:
+            return locate(Submission, int(view_kwargs["submission_id"]))
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class ShardRoutingMiddleware:
+    """Направляет запросы представлений одного курса в базу этого курса"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        token = _current.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if is_sharded():
+            alias = route_view(view_kwargs)
+            if alias is not None:
+                _current.set(alias)
+        return None
+
+
+# --- Маршрутизатор ----------------------------------------------------------
+
+
+def _parent_database(instance):
+    # Несохранённый объект: база курса или родительского задания
+    course_id = getattr(instance, "course_id", None)
+    if course_id is not None:
+        return for_course(course_id)
+    field = instance._meta.get_field("assignment")
+    if field.is_cached(instance):
+        assignment = field.get_cached_value(instance)
+        return assignment._state.db or for_course(assignment.course_id)
+    if instance.assignment_id is not None:
+        return current() or home_database(instance.assignment_id)
+    return current() or "default"
+
+
+class CourseShardRouter:
+    def _database(self, model, hints):
+        if not is_sharded_model(model):
+            # Явно: иначе Django взял бы базу объекта-подсказки
+            # (submission.student из шарда)
+            return "default"
+        if not is_sharded():
+            return "default"
+        instance = hints.get("instance")
+        if instance is not None:
+            if is_sharded_model(type(instance)):
+                return instance._state.db or _parent_database(instance)
+            if instance._meta.label == "school.Course":
+                return for_course(instance)
+        return current() or "default"
+
+    def db_for_read(self, model, **hints):
+        return self._database(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._database(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Внешние ключи между шардом и default проверяются приложением
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == "default" or db not in aliases():
+            return None
+        return app_label == "school" and model_name in SHARDED_MODELS
+
+
+def reserve_id_ranges(using="default", **kwargs):
+    """Начать счётчики id шардированных таблиц базы с её диапазона"""
+    offset = id_offset(using) if using in aliases() else 0
+    if not offset:
+        return
+    from django.apps import apps
+
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in apps.get_app_config("school").get_models():
+            if not is_sharded_model(model):
+                continue
+            table = model._meta.db_table
+            if connection.vendor == "sqlite":
+                cursor.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = %s", [table]
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                        [table, offset],
+                    )
+                elif row[0] < offset:
+                    cursor.execute(
+                        "UPDATE sqlite_sequence SET seq = %s WHERE name = %s",
+                        [offset, table],
+                    )
+            elif connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {table})))",
+                    [table, offset],
+                )
+
+
+# --- Запросы к шардированным моделям ----------------------------------------
+
+
+def _leaf_paths(related, path):
+    if not related:
+        return [path]
+    return [
+        leaf
+        for name, nested in related.items()
+        for leaf in _leaf_paths(nested, f"{path}__{name}")
+    ]
+
+
+def _split_related(model, related, prefix=""):
+    """Дерево select_related: связи внутри базы курса и пути prefetch_related
+    к моделям из ``default``"""
+    local, prefetch = {}, []
+    for name, nested in related.items():
+        target = model._meta.get_field(name).related_model
+        if is_sharded_model(target):
+            local[name], nested_prefetch = _split_related(
+                target, nested, f"{prefix}{name}__"
+            )
+            prefetch += nested_prefetch
+        else:
+            prefetch += _leaf_paths(nested, f"{prefix}{name}")
+    return local, prefetch
+
+
+class ShardedQuerySet(models.QuerySet):
+    """QuerySet моделей из SHARDED_MODELS.
+
+    В базе шарда нет таблиц пользователей и курсов, поэтому select_related
+    связей с моделями из ``default`` выполняется там как prefetch_related;
+    связи внутри базы курса (решение - задание) остаются в JOIN.
+    """
+
+    def _for_database(self):
+        related = self.query.select_related
+        if (
+            not isinstance(related, dict)
+            or self._iterable_class is not ModelIterable
+            or self.db == "default"
+        ):
+            return self
+        local, prefetch = _split_related(self.model, related)
+        if not prefetch:
+            return self
+        queryset = self._chain()
+        queryset.query.select_related = local or False
+        return queryset.prefetch_related(*prefetch)
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            queryset = self._for_database()
+            if queryset is not self:
+                self._result_cache = list(queryset)
+                self._prefetch_done = True
+        super()._fetch_all()
+
+    def iterator(self, chunk_size=None):
+        queryset = self._for_database()
+        if queryset is not self:
+            return queryset.iterator(chunk_size)
+        return super().iterator(chunk_size)
+
+
+# --- Запросы по всем базам --------------------------------------------------
+
+
+def id_list(queryset):
+    """Значения для ``__in`` в запросе к шардированной таблице.
+
+    В одной базе - подзапрос (``values_list(..., flat=True)``), при
+    шардировании - список: подзапрос в другую базу невозможен.
+    """
+    if is_sharded():
+        return list(queryset)
+    return queryset
+
+
+class Gathered(list):
+    """Результаты из нескольких баз; ``count``/``exists`` как у queryset"""
+
+    def count(self):
+        return len(self)
+
+    def exists(self):
+        return bool(self)
+
+
+def _getter(queryset, name):
+    """Значение ``name`` в строке результата или None, если его там нет"""
+    query = queryset.query
+    iterable = queryset._iterable_class
+    if iterable is ModelIterable:
+        if name in query.annotation_select:
+            return attrgetter(name)
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return attrgetter(queryset.model._meta.pk.attname) if name == "pk" else None
+        # Имя внешнего ключа сортирует по полям связанной модели
+        if not field.concrete or (field.is_relation and name != field.attname):
+            return None
+        return attrgetter(field.attname)
+    fields = list(queryset._fields or ())
+    if iterable is ValuesIterable:
+        if name in fields or name in query.annotation_select:
+            return itemgetter(name)
+        return None
+    if name in fields:
+        if iterable is FlatValuesListIterable:
+            return lambda row: row
+        return itemgetter(fields.index(name))
+    return None
+
+
+def _ordering(queryset):
+    """Ключи слияния строк из нескольких баз: (значение, по убыванию, NULL первыми).
+
+    Повторяется только сортировка по значениям, которые есть в самих строках:
+    полям модели и аннотациям, для values() - выбранным полям. Сортировка по
+    связанным моделям и выражениям в Python разошлась бы с SQL, поэтому для
+    неё ValueError. Без order_by строки values() идут по базам.
+    """
+    order_by = queryset.query.order_by
+    if (
+        not order_by
+        and queryset._iterable_class is ModelIterable
+        and queryset.query.default_ordering
+    ):
+        order_by = queryset.model._meta.ordering
+    # NULL в SQLite и MySQL меньше любого значения, в PostgreSQL - больше
+    nulls_largest = connections[databases()[0]].features.nulls_order_largest
+    keys = []
+    for item in order_by:
+        nulls_first = None
+        if isinstance(item, str):
+            name, descending = item.removeprefix("-"), item.startswith("-")
+        elif isinstance(item, F):
+            name, descending = item.name, False
+        elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+            name, descending = item.expression.name, item.descending
+            if item.nulls_first or item.nulls_last:
+                nulls_first = bool(item.nulls_first)
+        else:
+            name = None
+        get = _getter(queryset, name) if name and name != "?" else None
+        if get is None:
+            raise ValueError(
+                f"gather() не может повторить сортировку {item!r}: "
+                "нужны поля модели, аннотации или выбранные values()"
+            )
+        if nulls_first is None:
+            nulls_first = nulls_largest == descending
+        keys.append((get, descending, nulls_first))
+    return keys
+
+
+def _split(queryset):
+    """Queryset для каждой базы, ключи слияния и срез общего списка"""
+    low, high = queryset.query.low_mark, queryset.query.high_mark
+    queryset = queryset.all()
+    ordering = _ordering(queryset)
+    if low:
+        # Смещение применяется к общему списку: из каждой базы - первые high
+        queryset.query.clear_limits()
+        if high is not None:
+            queryset.query.set_limits(0, high)
+    return queryset, ordering, low, high
+
+
+def _merge(rows, ordering, low, high):
+    for get, descending, nulls_first in reversed(ordering):
+        # sort устойчив: проходы от последнего ключа к первому
+        null_rank = int(nulls_first == descending)
+        rows.sort(
+            key=lambda row: (
+                (null_rank,) if (value := get(row)) is None else (1 - null_rank, value)
+            ),
+            reverse=descending,
+        )
+    return Gathered(rows[low:high])
+
+
+def gather(queryset):
+    """Выполнить queryset в каждой базе и слить результаты.
+
+    Строки - объекты моделей или строки values()/values_list(). Порядок
+    (``order_by`` по значениям в строках, см. _ordering) и срез повторяются
+    над объединёнными строками. Без шардирования и для моделей из
+    ``default`` queryset возвращается как есть.
+    """
+    if not is_sharded() or not is_sharded_model(queryset.model):
+        return queryset
+    queryset, ordering, low, high = _split(queryset)
+    rows = list(chain.from_iterable(queryset.using(alias) for alias in databases()))
+    return _merge(rows, ordering, low, high)
+
+
+async def agather(queryset):
+    """gather() для async-представлений; queryset одной базы выполняется и
+    возвращается с заполненным кешем результатов"""
+    if not is_sharded() or not is_sharded_model(queryset.model):
+        async for _ in queryset:
+            pass
+        return queryset
+    queryset, ordering, low, high = _split(queryset)
+    rows = []
+    for alias in databases():
+        rows += [row async for row in queryset.using(alias)]
+    return _merge(rows, ordering, low, high)
+
+
+async def aid_list(queryset):
+    if is_sharded():
+        return [value async for value in queryset]
+    return queryset
+
+
+def count(queryset):
+    if not is_sharded():
+        return queryset.count()
+    return sum(queryset.using(alias).count() for alias in databases())
+
+
+async def acount(queryset):
+    if not is_sharded():
+        return await queryset.acount()
+    total = 0
+    for alias in databases():
+        total += await queryset.using(alias).acount()
+    return total
+
+
+class Paginated:
+    """Queryset по всем базам для Paginator.
+
+    Число строк - COUNT в каждой базе, страница ``[low:high]`` - первые
+    ``high`` строк каждой базы, слитые gather(): все строки ленты ради одной
+    страницы не загружаются.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def count(self):
+        return count(self.queryset)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return gather(self.queryset[index])
+        return gather(self.queryset[index : index + 1])[0]
+
+
+def paginated(queryset):
+    """Источник строк для Paginator: queryset одной базы или Paginated"""
+    if not is_sharded() or not is_sharded_model(queryset.model):
+        return queryset
+    return Paginated(queryset)
+
+
+# --- Перенос курса ----------------------------------------------------------
+
+
+def _models():
+    from django.apps import apps
+
+    config = apps.get_app_config("school")
+    return {name: config.get_model(name) for name in SHARDED_MODELS}
+
+
+def _of_course(model, alias, course_id):
+    if model._meta.model_name in ("assignment", "announcement"):
+        return model.objects.using(alias).filter(course_id=course_id)
+    return model.objects.using(alias).filter(assignment__course_id=course_id)
+
+
+def _copy(model, queryset, target):
+    rows = list(queryset)
+    for row in rows:
+        row._state.adding = True
+    # Строки, уже скопированные прерванным запуском или изменённые во время
+    # переноса, перезаписываются
+    model.objects.using(target).bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["id"],
+        update_fields=[
+            field.name for field in model._meta.concrete_fields if not field.primary_key
+        ],
+    )
+    return rows
+
+
+def _move_batch(model, course_id, source, target, batch_size):
+    batch = _of_course(model, source, course_id).order_by("pk")[:batch_size]
+    with transaction.atomic(using=target), transaction.atomic(using=source):
+        rows = _copy(model, batch, target)
+        model.objects.using(source).filter(pk__in=[row.pk for row in rows]).delete()
+    return len(rows)
+
+
+@contextmanager
+def _suspend_signals():
+    token = _moving.set(True)
+    try:
+        yield
+    finally:
+        _moving.reset(token)
+
+
+def move_course(course, target, batch_size=BATCH_SIZE):
+    """Перенести данные курса в базу ``target``; возвращает число строк.
+
+    Задания с тестами и напоминаниями копируются первыми (на них ссылаются
+    решения), решения и объявления переносятся пачками - копирование и
+    удаление пачки выполняются вместе. В последней транзакции переносятся
+    строки, появившиеся или изменившиеся во время переноса, удаляются
+    задания в старой базе и меняется Course.shard. Пока идёт перенос, часть
+    решений не видна на страницах курса, поэтому переносить лучше курсы без
+    активной сдачи.
+    """
+    from .models import Course
+
+    source = for_course(course)
+    if target == source:
+        return {}
+    if target not in databases():
+        raise ValueError(f"Неизвестная база {target!r}")
+
+    models = _models()
+    parents = [models[name] for name in ("assignment", "assignmenttestcase")]
+    parents.append(models["deadlinereminder"])
+    batched = [models["submission"], models["announcement"]]
+    moved = {}
+
+    with _suspend_signals():
+        with transaction.atomic(using=target):
+            for model in parents:
+                _copy(model, _of_course(model, source, course.id), target)
+        for model in batched:
+            total = 0
+            while True:
+                count_moved = _move_batch(model, course.id, source, target, batch_size)
+                total += count_moved
+                if count_moved < batch_size:
+                    break
+            moved[model._meta.model_name] = total
+
+        # Course.shard в default: при переносе между шардами её изменение
+        # тоже должно откатиться вместе с последней пачкой
+        with (
+            transaction.atomic(using=target),
+            transaction.atomic(using=source),
+            transaction.atomic(using="default"),
+        ):
+            for model in parents:
+                rows = _copy(model, _of_course(model, source, course.id), target)
+                moved[model._meta.model_name] = len(rows)
+            for model in batched:
+                queryset = _of_course(model, source, course.id)
+                moved[model._meta.model_name] += len(_copy(model, queryset, target))
+                queryset.delete()
+            _of_course(models["assignment"], source, course.id).delete()
+            course.shard = target
+            Course.objects.filter(pk=course.pk).update(shard=target)
+            querycache.invalidate([querycache.course_tag(course.pk)])
+
+    invalidate_placement(course.pk)
+    return moved
+
+
+def shard_report():
+    """Число курсов и строк шардированных таблиц по базам"""
+    from .models import Course
+
+    models = _models()
+    placement = {}
+    for shard in Course.objects.values_list("shard", flat=True):
+        alias = shard or "default"
+        placement[alias] = placement.get(alias, 0) + 1
+    return [
+        {
+            "database": alias,
+            "courses": placement.get(alias, 0),
+            **{
+                name: models[name].objects.using(alias).count()
+                for name in ("assignment", "submission", "announcement")
+            },
+        }
+        for alias in databases()
+    ]
@@ -0,0 +1,185 @@
+from django.db.models import F
+from django.contrib.auth.models import User
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import activity, analytics, archive, catalog, querycache, sharding
+from .models import (
+    Announcement,
+    AnnouncementReadMarker,
+    Assignment,
+    Course,
+    DeadlineReminder,
+    Submission,
+)
+
+
+def _bulk_operation():
+    # Архивация и перенос курса пересчитывают всё сами после переноса
+    return archive.is_archiving() or sharding.is_moving()
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def create_announcement_markers(sender, instance, action, reverse, pk_set, **kwargs):
+    """Новые ученики курса получают отметку о прочтении ленты"""
+    if action != "post_add" or not pk_set:
+        return
+
+    user_ids = [instance.pk] if reverse else pk_set
+    now = timezone.now()
+    AnnouncementReadMarker.objects.bulk_create(
+        [
+            AnnouncementReadMarker(user_id=user_id, last_read_at=now)
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@receiver(post_save, sender=Announcement)
+def increment_unread_announcements(sender, instance, created, **kwargs):
+    if not created:
+        return
+
+    AnnouncementReadMarker.objects.filter(
+        user__courses_enrolled=instance.course_id,
+        last_read_at__lt=instance.created_at,
+    ).update(unread_count=F("unread_count") + 1)
+
+
+@receiver(post_delete, sender=Announcement)
+def decrement_unread_announcements(sender, instance, **kwargs):
+    if _bulk_operation():
+        return
+    AnnouncementReadMarker.objects.filter(
+        user__courses_enrolled=instance.course_id,
+        last_read_at__lt=instance.created_at,
+        unread_count__gt=0,
+    ).update(unread_count=F("unread_count") - 1)
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def update_enrollment_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """Число учеников курса и кеш курсов ученика при записи и отчислении"""
+    if action == "pre_clear":
+        # После очистки уже не узнать, какие записи были удалены
+        related = instance.courses_enrolled if reverse else instance.students
+        instance._cleared_ids = list(related.values_list("id", flat=True))
+        return
+    if action == "post_clear":
+        pk_set = instance.__dict__.pop("_cleared_ids", ())
+    elif action not in ("post_add", "post_remove"):
+        return
+
+    if reverse:
+        course_ids, user_ids = pk_set or (), [instance.pk]
+    else:
+        course_ids, user_ids = [instance.pk], pk_set or ()
+    Course.refresh_counters(course_ids, assignments=False)
+    catalog.invalidate_enrolled(user_ids)
+    querycache.invalidate(querycache.student_tag(user_id) for user_id in user_ids)
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def update_assignments_counter(sender, instance, **kwargs):
+    if _bulk_operation():
+        return
+    Course.refresh_counters([instance.course_id], students=False)
+    # Смена максимума баллов меняет проценты всех решений задания
+    analytics.invalidate([instance.course_id], using=kwargs["using"])
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def invalidate_grade_analytics(sender, instance, created=False, **kwargs):
+    # Новое непроверенное решение на распределение оценок не влияет
+    if created and instance.grade is None or _bulk_operation():
+        return
+    analytics.invalidate([instance.assignment.course_id], using=kwargs["using"])
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_save, sender=Announcement)
+@receiver(post_save, sender=Assignment)
+def record_activity(sender, instance, created, **kwargs):
+    """Новые решения, объявления и задания попадают в ленту активности"""
+    if not created:
+        return
+    if sender is Submission:
+        activity.record_submissions([instance])
+    elif sender is Announcement:
+        activity.record_announcement(instance)
+    else:
+        activity.record_assignment(instance)
+
+
+@receiver(post_save, sender=Course)
+def place_course(sender, instance, created, **kwargs):
+    """Новый курс получает базу для своих данных (school.sharding)"""
+    if not created or instance.shard or not sharding.is_sharded():
+        return
+    instance.shard = sharding.default_placement(instance.pk)
+    Course.objects.filter(pk=instance.pk).update(shard=instance.shard)
+
+
+@receiver(pre_delete, sender=Course)
+def delete_sharded_course_data(sender, instance, **kwargs):
+    # Каскадное удаление Django ищет задания в базе курса, т.е. в default;
+    # из шарда их приходится удалять отдельно
+    alias = sharding.for_course(instance)
+    if alias != "default":
+        Announcement.objects.using(alias).filter(course_id=instance.pk).delete()
+        Assignment.objects.using(alias).filter(course_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_user_data(sender, instance, **kwargs):
+    if not sharding.is_sharded():
+        return
+    for alias in sharding.databases():
+        if alias == "default":
+            continue
+        Submission.objects.using(alias).filter(student_id=instance.pk).delete()
+        DeadlineReminder.objects.using(alias).filter(student_id=instance.pk).delete()
+        Announcement.objects.using(alias).filter(author_id=instance.pk).delete()
+        Assignment.objects.using(alias).filter(teacher_id=instance.pk).delete()
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_teacher(sender, instance, update_fields=None, **kwargs):
+    """Прежний учитель курса: при смене меняется состав курсов обоих"""
+    if instance._state.adding or (update_fields and "teacher" not in update_fields):
+        return
+    instance._previous_teacher_id = (
+        Course.objects.filter(pk=instance.pk)
+        .values_list("teacher_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_querysets(sender, instance, **kwargs):
+    teacher_ids = {
+        instance.teacher_id,
+        instance.__dict__.pop("_previous_teacher_id", None),
+    }
+    querycache.invalidate(
+        [
+            querycache.course_tag(instance.pk),
+            *(querycache.teacher_tag(pk) for pk in teacher_ids if pk is not None),
+        ]
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_querysets(sender, instance, **kwargs):
+    querycache.invalidate([querycache.user_tag(instance.pk)])
@@ -0,0 +1,292 @@
+"""Поиск похожих решений (MinHash + LSH).
+
+Сигнатура решения - NUM_PERM минимумов универсальных хешей
+``(a*x + b) mod p`` со случайными a и b по хешам 5-символьных шинглов. Доля
+совпавших минимумов двух сигнатур - несмещённая оценка коэффициента Жаккара.
+Сигнатура вычисляется один раз при сдаче и хранится в Submission.signature.
+Для анализа задания сигнатуры разбиваются на BANDS полос: решения с
+совпадающей полосой становятся кандидатами, и только для них считается
+точный коэффициент Жаккара. Так не нужно сравнивать все пары решений.
+
+Анализ заданий выполняет команда analyze_similarity (по расписанию) и
+сохраняет результат в SimilarityAnalysis; список решений показывает его
+(stored_analysis()) и не запускает анализ в запросе.
+"""
+
+import hashlib
+import operator
+import os
+import random
+import re
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+from django.db.models import Count, Max
+from django.utils import timezone
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+DEFAULT_THRESHOLD = 0.5
+# Меньше кандидатов проще пересчитать в текущем процессе
+POOL_MIN_PAIRS = 500
+MAX_BUCKET = 200
+MAX_RESCORE = 20000
+MAX_RESULTS = 200
+
+# Простое Мерсенна 2**31 - 1: a*x + b < 2**62 не переполняет uint64,
+# а значения хешей помещаются в 32-битную сигнатуру
+_PRIME = (1 << 31) - 1
+_EMPTY = (1 << 32) - 1
+_rnd = random.Random(20240901)
+_A = np.array([_rnd.randrange(1, _PRIME) for _ in range(NUM_PERM)], dtype=np.uint64)[
+    :, None
+]
+_B = np.array([_rnd.randrange(0, _PRIME) for _ in range(NUM_PERM)], dtype=np.uint64)[
+    :, None
+]
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", (text or "").lower()).strip()
+
+
+def shingles(text):
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _hash(shingle):
+    return int.from_bytes(
+        hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little"
+    )
+
+
+def minhash(text):
+    """Сигнатура текста в виде bytes (NUM_PERM беззнаковых 32-битных чисел)"""
+    hashes = np.fromiter(map(_hash, shingles(text)), dtype=np.uint64)
+    if not hashes.size:
+        return array("I", [_EMPTY] * NUM_PERM).tobytes()
+    # Строка i - значения i-го хеша для всех шинглов
+    values = (_A * (hashes % _PRIME) + _B) % _PRIME
+    return array("I", values.min(axis=1).tolist()).tobytes()
+
+
+def _unpack(signature):
+    values = array("I")
+    values.frombytes(bytes(signature))
+    return values
+
+
+def estimate(signature_a, signature_b):
+    """Оценка коэффициента Жаккара по доле совпавших минимумов"""
+    return sum(map(operator.eq, _unpack(signature_a), _unpack(signature_b))) / NUM_PERM
+
+
+def jaccard(text_a, text_b):
+    a, b = shingles(text_a), shingles(text_b)
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def find_candidates(signatures, max_bucket=MAX_BUCKET):
+    """Пары id решений, совпавших хотя бы в одной полосе LSH.
+
+    ``signatures`` - итерируемое пар (id, signature). Полосы, общие для
+    слишком многих решений (шаблон из условия, пустой ответ), дают пары
+    только для полностью совпадающих сигнатур - иначе число кандидатов
+    снова растёт квадратично.
+    """
+    buckets = {}
+    full = {}
+    for submission_id, signature in signatures:
+        signature = bytes(signature)
+        full[submission_id] = signature
+        values = _unpack(signature)
+        for band in range(BANDS):
+            key = (band, tuple(values[band * ROWS : (band + 1) * ROWS]))
+            buckets.setdefault(key, []).append(submission_id)
+
+    candidates = set()
+    for ids in buckets.values():
+        if len(ids) < 2:
+            continue
+        if len(ids) > max_bucket:
+            duplicates = {}
+            for submission_id in ids:
+                duplicates.setdefault(full[submission_id], []).append(submission_id)
+            groups = [group for group in duplicates.values() if len(group) > 1]
+        else:
+            groups = [ids]
+        for group in groups:
+            candidates.update(combinations(sorted(group), 2))
+    return candidates
+
+
+def _rescore_chunk(chunk):
+    pairs, contents = chunk
+    shingle_sets = {}
+
+    def get(submission_id):
+        if submission_id not in shingle_sets:
+            shingle_sets[submission_id] = shingles(contents[submission_id])
+        return shingle_sets[submission_id]
+
+    results = []
+    for a_id, b_id in pairs:
+        a, b = get(a_id), get(b_id)
+        union = len(a | b)
+        results.append((a_id, b_id, len(a & b) / union if union else 1.0))
+    return results
+
+
+def rescore(pairs, contents, workers=None):
+    """Точный Жаккар для пар кандидатов.
+
+    Большие наборы пар считаются в пуле процессов порциями; шинглы каждого
+    решения строятся один раз на порцию.
+    """
+    pairs = sorted(pairs)
+    if workers == 1 or len(pairs) < POOL_MIN_PAIRS:
+        return _rescore_chunk((pairs, contents))
+
+    chunk_size = max(len(pairs) // ((workers or os.cpu_count() or 1) * 4), 50)
+    chunks = []
+    for i in range(0, len(pairs), chunk_size):
+        chunk_pairs = pairs[i : i + chunk_size]
+        ids = {submission_id for pair in chunk_pairs for submission_id in pair}
+        chunks.append((chunk_pairs, {key: contents[key] for key in ids}))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for scored in pool.map(_rescore_chunk, chunks):
+            results.extend(scored)
+    return results
+
+
+def backfill_signatures(submissions, batch_size=500):
+    """Посчитать сигнатуры для решений, сданных до появления анализа"""
+    from .models import Submission
+
+    batch = []
+    updated = 0
+    # База решений (school.sharding): bulk_update сам её не определит
+    manager = Submission.objects.db_manager(submissions.db)
+    for submission in submissions.filter(signature__isnull=True).only("id", "content"):
+        submission.signature = minhash(submission.content)
+        batch.append(submission)
+        if len(batch) >= batch_size:
+            manager.bulk_update(batch, ["signature"])
+            updated += len(batch)
+            batch = []
+    if batch:
+        manager.bulk_update(batch, ["signature"])
+        updated += len(batch)
+    return updated
+
+
+def _state(assignment):
+    # Меняется при каждой новой или обновлённой сдаче
+    state = assignment.submissions.aggregate(
+        count=Count("id"), latest=Max("submitted_at")
+    )
+    return (state["count"], state["latest"])
+
+
+def _stored(assignment, threshold):
+    from .models import SimilarityAnalysis
+
+    return SimilarityAnalysis.objects.filter(
+        assignment_id=assignment.id, threshold=threshold
+    ).first()
+
+
+def stored_analysis(assignment, threshold=DEFAULT_THRESHOLD):
+    """Последний результат analyze_assignment() без пересчёта.
+
+    ``{"pairs": [...], "computed_at": время, "outdated": bool}`` или None,
+    если задание ещё не анализировалось. ``outdated`` - после анализа
+    появились новые сдачи. Анализ выполняет команда analyze_similarity
+    (по расписанию), а не запрос к странице.
+    """
+    stored = _stored(assignment, threshold)
+    if stored is None:
+        return None
+    return {
+        "pairs": stored.pairs,
+        "computed_at": stored.computed_at,
+        "outdated": (stored.submissions_count, stored.latest_submitted_at)
+        != _state(assignment),
+    }
+
+
+def analyze_assignment(assignment, threshold=DEFAULT_THRESHOLD, workers=1):
+    """Похожие пары решений задания, от самых похожих.
+
+    Возвращает не более MAX_RESULTS словарей
+    ``{"a": id, "b": id, "similarity": float}``; результат сохраняется в
+    SimilarityAnalysis и пересчитывается только после новой сдачи.
+    """
+    from .models import SimilarityAnalysis
+
+    state = _state(assignment)
+    stored = _stored(assignment, threshold)
+    if (
+        stored is not None
+        and (
+            stored.submissions_count,
+            stored.latest_submitted_at,
+        )
+        == state
+    ):
+        return stored.pairs
+
+    backfill_signatures(assignment.submissions.all())
+    signatures = {
+        submission_id: bytes(signature)
+        for submission_id, signature in assignment.submissions.values_list(
+            "id", "signature"
+        )
+    }
+    candidates = find_candidates(signatures.items())
+
+    if len(candidates) > MAX_RESCORE:
+        # Точный пересчёт только для лучших пар по оценке сигнатур
+        values = {key: _unpack(signature) for key, signature in signatures.items()}
+        estimated = [
+            (sum(map(operator.eq, values[a], values[b])) / NUM_PERM, a, b)
+            for a, b in candidates
+        ]
+        estimated = [item for item in estimated if item[0] >= threshold]
+        estimated.sort(reverse=True)
+        candidates = [(a, b) for _, a, b in estimated[:MAX_RESCORE]]
+
+    result = []
+    if candidates:
+        ids = {submission_id for pair in candidates for submission_id in pair}
+        contents = dict(
+            assignment.submissions.filter(id__in=ids).values_list("id", "content")
+        )
+        for a_id, b_id, similarity in rescore(candidates, contents, workers=workers):
+            if similarity >= threshold:
+                result.append({"a": a_id, "b": b_id, "similarity": similarity})
+        result.sort(key=lambda pair: pair["similarity"], reverse=True)
+        del result[MAX_RESULTS:]
+
+    SimilarityAnalysis.objects.update_or_create(
+        assignment_id=assignment.id,
+        threshold=threshold,
+        defaults={
+            "pairs": result,
+            "submissions_count": state[0],
+            "latest_submitted_at": state[1],
+            "computed_at": timezone.now(),
+        },
+    )
+    return result
@@ -0,0 +1,195 @@
+"""Журнал медленных SQL-запросов.
+
+Обёртка выполнения запросов (устанавливается на все подключения в install())
+замеряет каждый запрос; запросы дольше ``SLOW_QUERY_THRESHOLD`` секунд
+пишутся строкой JSON в ``SLOW_QUERY_LOG`` с ротацией по размеру. Вместе с
+текстом запроса сохраняются:
+
+* отпечаток - SQL без литералов и с одинаковыми списками IN, по нему
+  группируются одинаковые запросы с разными параметрами;
+* представление, во время которого выполнялся запрос (из school.timing);
+* ближайшая функция проекта в стеке вызовов, например
+  ``school.models:Profile.get_average_grade``.
+
+Команда slow_queries агрегирует журнал по отпечаткам. Быстрые запросы
+стоят двух вызовов perf_counter(); стек разбирается только для медленных.
+"""
+
+import json
+import logging
+import math
+import re
+import sys
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from . import memo, timing
+
+logger = logging.getLogger(__name__)
+
+MAX_SQL_LENGTH = 4000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?(?![\w\"])")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def threshold():
+    return getattr(settings, "SLOW_QUERY_THRESHOLD", 0.1)
+
+
+def log_path():
+    return Path(
+        getattr(
+            settings,
+            "SLOW_QUERY_LOG",
+            Path(settings.BASE_DIR) / "logs" / "slow_queries.log",
+        )
+    )
+
+
+def fingerprint(sql):
+    """SQL без литералов: ``WHERE id IN (1, 2, 3)`` -> ``WHERE id IN (?+)``"""
+    sql = _STRING.sub("?", sql)
+    sql = sql.replace("%s", "?")
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER_LIST.sub("(?+)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def _project_caller():
+    # Первый кадр из кода проекта, не считая обёрток запросов этого модуля,
+    # school.timing и school.memo
+    root = str(settings.BASE_DIR)
+    wrappers = (__name__, timing.__name__, memo.__name__)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        module = frame.f_globals.get("__name__", "")
+        if (
+            filename.startswith(root)
+            and module not in wrappers
+            and "site-packages" not in filename
+        ):
+            return f"{module}:{frame.f_code.co_qualname}"
+        frame = frame.f_back
+    return None
+
+
+def _wrapper(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        limit = threshold()
+        if limit is not None and elapsed >= limit:
+            _record(sql, elapsed, context)
+
+
+def _record(sql, elapsed, context):
+    timings = timing.current()
+    entry = {
+        "at": timezone.now().isoformat(),
+        "ms": round(elapsed * 1000, 2),
+        "alias": context["connection"].alias,
+        "fingerprint": fingerprint(sql),
+        "sql": sql[:MAX_SQL_LENGTH],
+        "view": timings.view_name if timings is not None else None,
+        "caller": _project_caller(),
+    }
+    log_path().parent.mkdir(parents=True, exist_ok=True)
+    logger.warning(json.dumps(entry, ensure_ascii=False))
+
+
+def _add_wrapper(sender, connection, **kwargs):
+    if _wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_wrapper)
+
+
+def install():
+    """Подключить журнал к файлу и обёртку ко всем подключениям"""
+    path = log_path()
+    if not any(
+        getattr(handler, "baseFilename", None) == str(path)
+        for handler in logger.handlers
+    ):
+        handler = RotatingFileHandler(
+            path,
+            maxBytes=getattr(settings, "SLOW_QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024),
+            backupCount=getattr(settings, "SLOW_QUERY_LOG_BACKUPS", 5),
+            encoding="utf-8",
+            delay=True,
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    connection_created.connect(_add_wrapper, dispatch_uid="school.slowqueries")
+
+
+def read_entries(path=None):
+    """Записи журнала вместе с файлами ротации (от старых к новым)"""
+    path = Path(path) if path else log_path()
+    rotated = sorted(
+        path.parent.glob(path.name + ".*"),
+        key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0,
+        reverse=True,
+    )
+    for file in rotated + [path]:
+        if not file.exists():
+            continue
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _percentile(values, fraction):
+    # values отсортированы; метод ближайшего ранга
+    index = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def aggregate(entries, top_callers=3):
+    """Сводка по отпечаткам: число, p50/p95/p99, суммарное время, частые места"""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(
+            entry["fingerprint"],
+            {"durations": [], "views": {}, "callers": {}, "sql": entry["sql"]},
+        )
+        group["durations"].append(entry["ms"])
+        for field, counter in (("view", "views"), ("caller", "callers")):
+            name = entry.get(field) or "-"
+            group[counter][name] = group[counter].get(name, 0) + 1
+
+    rows = []
+    for fp, group in groups.items():
+        durations = sorted(group["durations"])
+        rows.append(
+            {
+                "fingerprint": fp,
+                "example": group["sql"],
+                "count": len(durations),
+                "total_ms": round(sum(durations), 2),
+                "p50_ms": _percentile(durations, 0.5),
+                "p95_ms": _percentile(durations, 0.95),
+                "p99_ms": _percentile(durations, 0.99),
+                "max_ms": durations[-1],
+                "views": sorted(group["views"].items(), key=lambda i: -i[1])[
+                    :top_callers
+                ],
+                "callers": sorted(group["callers"].items(), key=lambda i: -i[1])[
+                    :top_callers
+                ],
+            }
+        )
+    return rows
@@ -0,0 +1,948 @@
+"""Статический анализ шаблонов: N+1 и повторные запросы.
+
+Разбирает шаблоны Django (``templates/``) и Jinja2 (``jinja2/``) и ищет:
+
+* ``syntax-error`` - шаблон не компилируется;
+* ``loop-related`` - обращение к ForeignKey внутри ``{% for %}``
+  (``course.teacher.get_full_name``): запрос на каждую итерацию, нужен
+  ``select_related``;
+* ``loop-count`` - ``.count``/``.exists``/``|length`` у связи внутри цикла
+  (``course.assignments.count``): нужна аннотация ``Count``;
+* ``loop-prefetch`` - цикл по связи внутри цикла: нужен
+  ``prefetch_related``;
+* ``loop-query`` - ``filter``/``order_by`` и т.п. у связи внутри цикла:
+  отдельный запрос на итерацию, который ``prefetch_related`` не убирает;
+* ``repeated-evaluation`` - один queryset из контекста выполняется за
+  рендеринг несколько раз (``count`` до цикла, срезы): нужен memo.memoize().
+
+Контекст шаблона восстанавливается по исходникам представлений (ast, без
+их выполнения) и вспомогательных функций - своих и из модулей пакета
+(``from . import catalog``; экземпляры классов модуля querysets не считаются):
+для каждого ``render(request, "x.html", context)`` известно,
+каким выражением получено каждое значение, какая у него модель и есть ли
+уже ``select_related``/``prefetch_related``/``annotate``. Если все
+представления шаблона уже загружают связь, находка не выводится; иначе в
+ней перечислены представления, которым нужна подсказка.
+
+Анализ эвристический: включения и наследование шаблонов не отслеживаются,
+а ветви ``if`` считаются выполняемыми. Запуск - ``find_bad_urls.py``.
+"""
+
+import ast
+import re
+from collections import defaultdict, deque
+from functools import lru_cache
+from pathlib import Path
+
+import jinja2
+from django.apps import apps
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.template.base import Lexer, TokenType
+from jinja2 import nodes
+
+SEVERITY = {
+    "syntax-error": "error",
+    "loop-related": "warning",
+    "loop-count": "warning",
+    "loop-prefetch": "warning",
+    "loop-query": "warning",
+    "repeated-evaluation": "warning",
+}
+
+RENDER_FUNCTIONS = {
+    "render",
+    "_render_hot",
+    "_arender",
+    "render_to_string",
+    "TemplateResponse",
+}
+
+# Операции над значением в шаблоне (последний элемент пути)
+COUNT = "count"
+LENGTH = "|length"
+ITEM = "[]"
+
+COUNT_METHODS = {"count", "exists"}
+ITEM_METHODS = {"first", "last"}
+LENGTH_FILTERS = {"length", "length_is", "count"}
+ITEM_FILTERS = {"first", "last", "slice", "random", "batch"}
+
+# Вызовы, результат которых уже не ленивый queryset
+_EVALUATING_CALLS = {
+    "list",
+    "sorted",
+    "tuple",
+    "dict",
+    "set",
+    "len",
+    "sum",
+    "min",
+    "max",
+    "bool",
+    "memoize",
+    "_aevaluate",
+    "cached",
+    "first",
+    "last",
+    "get",
+    "count",
+    "exists",
+    "aggregate",
+    "get_object_or_404",
+    "acount",
+    "aget",
+    "afirst",
+}
+
+_COMPARISONS = {"==", "!=", "<", ">", "<=", ">=", "in", "not in", "is", "is not"}
+_KEYWORDS = {"and", "or", "not", "in", "is", "as", "only", "reversed", "with"}
+_PATH = re.compile(r"^[A-Za-z_]\w*(?:\.\w+)*$")
+
+
+# --- События шаблона --------------------------------------------------------
+#
+# Оба движка сводятся к одному потоку событий:
+#   ("for", targets, path, line), ("endfor",), ("use", path, line, in_if),
+#   ("define", name)
+# path - список имён: ["course", "assignments", "count"], операции - COUNT,
+# LENGTH, ITEM.
+
+
+def _django_paths(expression):
+    """Пути из выражения Django ``a.b|length|default:c.d``"""
+    bits = expression.split("|")
+    paths = []
+    base = bits[0].strip()
+    path = base.split(".") if _PATH.match(base) else None
+    for bit in bits[1:]:
+        name, _, argument = bit.partition(":")
+        name = name.strip()
+        if path is not None:
+            if name in LENGTH_FILTERS:
+                path = [*path, LENGTH]
+            elif name in ITEM_FILTERS:
+                path = [*path, ITEM]
+        argument = argument.strip()
+        if _PATH.match(argument) and argument not in ("True", "False", "None"):
+            paths.append(argument.split("."))
+    if path is not None and path[0] not in ("True", "False", "None"):
+        paths.insert(0, path)
+    return paths
+
+
+def _django_events(source):
+    events = []
+    for token in Lexer(source).tokenize():
+        if token.token_type == TokenType.VAR:
+            for path in _django_paths(token.contents):
+                events.append(("use", path, token.lineno, False))
+            continue
+        if token.token_type != TokenType.BLOCK:
+            continue
+        bits = token.split_contents()
+        tag = bits[0]
+        if tag == "for" and "in" in bits:
+            position = bits.index("in")
+            targets = [
+                name for bit in bits[1:position] for name in bit.split(",") if name
+            ]
+            paths = _django_paths(bits[position + 1])
+            events.append(("for", targets, paths[0] if paths else [], token.lineno))
+            for path in paths[1:]:
+                events.append(("use", path, token.lineno, False))
+        elif tag == "endfor":
+            events.append(("endfor",))
+        elif tag in ("if", "elif"):
+            arguments = bits[1:]
+            for index, bit in enumerate(arguments):
+                if bit in _KEYWORDS or bit in _COMPARISONS:
+                    continue
+                neighbours = {
+                    arguments[index - 1] if index else None,
+                    arguments[index + 1] if index + 1 < len(arguments) else None,
+                }
+                in_if = not (neighbours & _COMPARISONS)
+                for path in _django_paths(bit):
+                    events.append(("use", path, token.lineno, in_if))
+        elif tag in ("with", "url", "widthratio", "include", "cycle", "firstof"):
+            arguments = bits[1:]
+            if "as" in arguments:
+                position = arguments.index("as")
+                aliases = arguments[position + 1 : position + 2]
+                arguments = arguments[:position]
+            else:
+                aliases = []
+            for bit in arguments:
+                name, equals, value = bit.partition("=")
+                if equals:
+                    aliases.append(name)
+                    bit = value
+                if bit in _KEYWORDS or bit[:1] in ("'", '"'):
+                    continue
+                for path in _django_paths(bit):
+                    events.append(("use", path, token.lineno, False))
+            events.extend(("define", alias) for alias in aliases)
+    return events
+
+
+def _jinja_path(node, sides):
+    """Путь цепочки атрибутов; побочные выражения (аргументы) - в sides"""
+    if isinstance(node, nodes.Name):
+        return [node.name]
+    if isinstance(node, nodes.Getattr):
+        path = _jinja_path(node.node, sides)
+        return path and [*path, node.attr]
+    if isinstance(node, nodes.Getitem):
+        path = _jinja_path(node.node, sides)
+        if isinstance(node.arg, nodes.Const) and isinstance(node.arg.value, str):
+            return path and [*path, node.arg.value]
+        sides.append(node.arg)
+        return path and [*path, ITEM]
+    if isinstance(node, nodes.Call):
+        sides.extend(node.args)
+        sides.extend(keyword.value for keyword in node.kwargs)
+        if isinstance(node.node, nodes.Getattr):
+            return _jinja_path(node.node, sides)
+        sides.append(node.node)
+        return None
+    if isinstance(node, nodes.Filter) and node.node is not None:
+        sides.extend(node.args)
+        sides.extend(keyword.value for keyword in node.kwargs)
+        path = _jinja_path(node.node, sides)
+        if path and node.name in LENGTH_FILTERS:
+            return [*path, LENGTH]
+        if path and node.name in ITEM_FILTERS:
+            return [*path, ITEM]
+        return path
+    return None
+
+
+def _jinja_expression(node, events, in_if=False):
+    if isinstance(node, (nodes.And, nodes.Or)):
+        _jinja_expression(node.left, events, in_if)
+        _jinja_expression(node.right, events, in_if)
+        return
+    if isinstance(node, nodes.Not):
+        _jinja_expression(node.node, events, in_if)
+        return
+    sides = []
+    path = _jinja_path(node, sides)
+    if path:
+        events.append(("use", path, node.lineno, in_if))
+        for side in sides:
+            _jinja_expression(side, events)
+        return
+    for side in sides:
+        _jinja_expression(side, events)
+    for child in node.iter_child_nodes():
+        if path is None and child not in sides:
+            _jinja_expression(child, events)
+
+
+def _jinja_names(target):
+    if isinstance(target, nodes.Name):
+        return [target.name]
+    return [name.name for name in target.find_all(nodes.Name)]
+
+
+def _jinja_statement(node, events):
+    if isinstance(node, nodes.For):
+        sides = []
+        path = _jinja_path(node.iter, sides) or []
+        targets = _jinja_names(node.target)
+        events.append(("for", targets, path, node.lineno))
+        for side in sides:
+            _jinja_expression(side, events)
+        for child in node.body:
+            _jinja_statement(child, events)
+        events.append(("endfor",))
+        for child in node.else_:
+            _jinja_statement(child, events)
+        return
+    if isinstance(node, nodes.If):
+        _jinja_expression(node.test, events, in_if=True)
+        for child in (*node.body, *node.elif_, *node.else_):
+            _jinja_statement(child, events)
+        return
+    if isinstance(node, nodes.Assign):
+        events.extend(("define", name) for name in _jinja_names(node.target))
+        _jinja_expression(node.node, events)
+        return
+    if isinstance(node, nodes.With):
+        for value in node.values:
+            _jinja_expression(value, events)
+        for target in node.targets:
+            events.extend(("define", name) for name in _jinja_names(target))
+        for child in node.body:
+            _jinja_statement(child, events)
+        return
+    for child in node.iter_child_nodes():
+        if isinstance(child, nodes.Expr):
+            _jinja_expression(child, events)
+        else:
+            _jinja_statement(child, events)
+
+
+def _jinja_events(source):
+    events = []
+    _jinja_statement(jinja2.Environment().parse(source), events)
+    return events
+
+
+def _syntax_error(source, path, engine):
+    """Текст ошибки компиляции шаблона или None"""
+    try:
+        if engine == "jinja2":
+            engines["jinja2"].env.compile(source, path.name, str(path))
+        else:
+            engines["django"].engine.from_string(source)
+    except jinja2.TemplateSyntaxError as error:
+        return error.message, error.lineno
+    except TemplateSyntaxError as error:
+        debug = getattr(error, "template_debug", None) or {}
+        return str(error), debug.get("line", 1)
+    return None
+
+
+# --- Модели -----------------------------------------------------------------
+
+
+def _models():
+    return {model.__name__: model for model in apps.get_models()}
+
+
+def _relations(model):
+    """Связи модели по имени атрибута: ``{"teacher": field, ...}``"""
+    relations = {}
+    for field in model._meta.get_fields():
+        if not field.is_relation or field.related_model is None:
+            continue
+        if field.auto_created and not field.concrete:
+            name = field.get_accessor_name()
+            if not name:
+                continue
+        else:
+            name = field.name
+        relations[name] = field
+    return relations
+
+
+def _is_multiple(field):
+    return field.one_to_many or field.many_to_many
+
+
+def _accessor_models(models):
+    """Модель по имени связи-множества (``students`` -> User), если однозначна"""
+    found = defaultdict(set)
+    for model in models.values():
+        for name, field in _relations(model).items():
+            if _is_multiple(field):
+                found[name].add(field.related_model)
+    return {
+        name: next(iter(targets))
+        for name, targets in found.items()
+        if len(targets) == 1
+    }
+
+
+def _model_for_name(name, models, accessors):
+    """Модель по имени переменной: ``course``, ``courses``, ``students``"""
+    by_lower = {model_name.lower(): model for model_name, model in models.items()}
+    for candidate in (name, name[:-1] if name.endswith("s") else None):
+        if candidate and candidate.lower() in by_lower:
+            return by_lower[candidate.lower()]
+    return accessors.get(name)
+
+
+# --- Контекст представлений --------------------------------------------------
+
+
+def _call_name(node):
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        return node.func.attr
+    return None
+
+
+def _string(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _assignments(function):
+    """Значения, присвоенные каждому имени в функции (по порядку)"""
+    values = defaultdict(list)
+    for node in ast.walk(function):
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value is not None:
+            targets = [node.target]
+        else:
+            continue
+        for target in targets:
+            for name in ast.walk(target):
+                if isinstance(name, ast.Name):
+                    values[name.id].append(node.value)
+    for names in values.values():
+        names.sort(key=lambda value: (value.lineno, value.col_offset))
+    return values
+
+
+def _iterated(function):
+    """Имена, которые функция сама перебирает (for, генераторы, list())"""
+    names = set()
+    for node in ast.walk(function):
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.comprehension)):
+            sources = [node.iter]
+        elif isinstance(node, ast.Call) and _call_name(node) in ("list", "len"):
+            sources = node.args[:1]
+        else:
+            continue
+        names.update(source.id for source in sources if isinstance(source, ast.Name))
+    return names
+
+
+@lru_cache(maxsize=None)
+def _module(path):
+    """Функции и классы модуля и модули пакета, которые он импортирует
+    (``from . import catalog``): ``{имя: функция}, {имя: путь}, {класс}``"""
+    tree = ast.parse(Path(path).read_text(encoding="utf-8"))
+    functions = {
+        node.name: node
+        for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    }
+    modules = {}
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.level == 1 and not node.module:
+            for alias in node.names:
+                module_path = Path(path).with_name(f"{alias.name}.py")
+                if module_path.exists():
+                    modules[alias.asname or alias.name] = module_path
+    classes = {node.name for node in tree.body if isinstance(node, ast.ClassDef)}
+    return functions, modules, classes
+
+
+def _walk(node, scope):
+    """ast.walk без аргументов конструкторов классов модуля: их экземпляр
+    (CourseLeaderboard, Paginated) - уже не queryset из аргументов"""
+    todo = deque([node])
+    while todo:
+        node = todo.popleft()
+        yield node
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in scope.classes
+        ):
+            todo.extend(ast.iter_child_nodes(node))
+
+
+class _Scope:
+    def __init__(self, function, functions, modules, classes):
+        self.function = function
+        self.functions = functions
+        self.modules = modules
+        self.classes = classes
+        self.values = _assignments(function)
+        self.iterated = _iterated(function)
+
+    def helper(self, call):
+        """Имя и область вспомогательной функции из ``call``: ``f()`` этого
+        модуля или ``catalog.f()`` модуля пакета"""
+        func = call.func
+        if isinstance(func, ast.Name) and func.id in self.functions:
+            function = self.functions[func.id]
+            return func.id, _Scope(function, self.functions, self.modules, self.classes)
+        if (
+            isinstance(func, ast.Attribute)
+            and isinstance(func.value, ast.Name)
+            and func.value.id in self.modules
+        ):
+            functions, modules, classes = _module(self.modules[func.value.id])
+            if func.attr in functions:
+                name = f"{func.value.id}.{func.attr}"
+                return name, _Scope(functions[func.attr], functions, modules, classes)
+        return None
+
+
+def _dict_items(node, scope):
+    """Ключи и значения словаря контекста (литерал, update, ``ctx[k] = v``)"""
+    if isinstance(node, ast.Dict):
+        return [
+            (_string(key), value)
+            for key, value in zip(node.keys, node.values)
+            if _string(key)
+        ]
+    if not isinstance(node, ast.Name):
+        return []
+    items = []
+    for value in scope.values.get(node.id, []):
+        if isinstance(value, ast.Dict):
+            items.extend(_dict_items(value, scope))
+    for statement in ast.walk(scope.function):
+        if isinstance(statement, ast.Assign):
+            for target in statement.targets:
+                if (
+                    isinstance(target, ast.Subscript)
+                    and isinstance(target.value, ast.Name)
+                    and target.value.id == node.id
+                    and _string(target.slice)
+                ):
+                    items.append((_string(target.slice), statement.value))
+        if (
+            isinstance(statement, ast.Call)
+            and isinstance(statement.func, ast.Attribute)
+            and statement.func.attr == "update"
+            and isinstance(statement.func.value, ast.Name)
+            and statement.func.value.id == node.id
+        ):
+            for argument in statement.args:
+                items.extend(_dict_items(argument, scope))
+            items.extend(
+                (keyword.arg, keyword.value)
+                for keyword in statement.keywords
+                if keyword.arg
+            )
+    return items
+
+
+def _collect(node, scope, found, seen, depth=0):
+    """Выражение со всеми присваиваниями и вспомогательными функциями, из
+    которых оно получено: пары (выражение, область)"""
+    found.append((node, scope))
+    for child in _walk(node, scope):
+        if isinstance(child, ast.Name) and (scope.function, child.id) not in seen:
+            seen.add((scope.function, child.id))
+            for value in scope.values.get(child.id, []):
+                _collect(value, scope, found, seen, depth)
+        helper = scope.helper(child) if isinstance(child, ast.Call) else None
+        if helper is not None and depth < 3 and helper[0] not in seen:
+            name, helper = helper
+            seen.add(name)
+            for statement in ast.walk(helper.function):
+                if isinstance(statement, ast.Return) and statement.value is not None:
+                    _collect(statement.value, helper, found, seen, depth + 1)
+
+
+def _evaluated(node, scope, depth=0):
+    """Значение уже не ленивый queryset (список, число, memoize, cached)"""
+    if isinstance(node, ast.Await):
+        node = node.value
+    if isinstance(node, ast.Name):
+        if node.id in scope.iterated:
+            return True
+        values = scope.values.get(node.id)
+        return bool(values) and depth < 5 and _evaluated(values[-1], scope, depth + 1)
+    if isinstance(node, ast.IfExp):
+        return _evaluated(node.body, scope, depth) and _evaluated(
+            node.orelse, scope, depth
+        )
+    if isinstance(node, ast.Call):
+        name = _call_name(node)
+        if name in _EVALUATING_CALLS:
+            return True
+        if name == "gather" and any(
+            isinstance(call, ast.Call) and _call_name(call) == "_aevaluate"
+            for call in ast.walk(node)
+        ):
+            return True
+        helper = scope.helper(node)
+        if helper is not None and depth < 3:
+            helper = helper[1]
+            returns = [
+                statement.value
+                for statement in ast.walk(helper.function)
+                if isinstance(statement, ast.Return) and statement.value is not None
+            ]
+            return bool(returns) and all(
+                _evaluated(value, helper, depth + 1) for value in returns
+            )
+        return False
+    return not isinstance(node, (ast.Attribute, ast.Subscript))
+
+
+def _value_info(node, scope, models, accessors):
+    found = []
+    _collect(node, scope, found, set())
+    info = {
+        "model": None,
+        "evaluated": _evaluated(node, scope),
+        "select_related": set(),
+        "prefetch_related": set(),
+        "annotations": set(),
+    }
+    for expression, expression_scope in found:
+        for child in _walk(expression, expression_scope):
+            if (
+                info["model"] is None
+                and isinstance(child, ast.Attribute)
+                and child.attr == "objects"
+                and isinstance(child.value, ast.Name)
+                and child.value.id in models
+            ):
+                info["model"] = models[child.value.id]
+            if not isinstance(child, ast.Call):
+                continue
+            name = _call_name(child)
+            strings = [_string(argument) for argument in child.args]
+            if name == "select_related":
+                info["select_related"].update(filter(None, strings))
+            elif name == "prefetch_related":
+                info["prefetch_related"].update(filter(None, strings))
+            elif name == "Prefetch" and strings and strings[0]:
+                info["prefetch_related"].add(strings[0])
+            elif name == "annotate":
+                info["annotations"].update(
+                    keyword.arg for keyword in child.keywords if keyword.arg
+                )
+    if info["model"] is None:
+        for expression, expression_scope in found:
+            for child in _walk(expression, expression_scope):
+                if isinstance(child, ast.Attribute) and child.attr in accessors:
+                    info["model"] = accessors[child.attr]
+                    break
+            if info["model"] is not None:
+                break
+    return info
+
+
+def view_contexts(paths=None):
+    """Контексты шаблонов по исходникам представлений:
+    ``{"course_detail.html": [{"view": ..., "line": ..., "names": {...}}]}``"""
+    if paths is None:
+        paths = sorted(Path(settings.BASE_DIR, "school").glob("*views*.py"))
+    models = _models()
+    accessors = _accessor_models(models)
+    contexts = defaultdict(list)
+    for path in paths:
+        functions, modules, classes = _module(Path(path))
+        for function in functions.values():
+            scope = _Scope(function, functions, modules, classes)
+            for call in ast.walk(function):
+                if not (
+                    isinstance(call, ast.Call) and _call_name(call) in RENDER_FUNCTIONS
+                ):
+                    continue
+                arguments = [*call.args]
+                position = next(
+                    (i for i, a in enumerate(arguments[:3]) if _string(a)), None
+                )
+                if position is None:
+                    continue
+                context = next(
+                    (k.value for k in call.keywords if k.arg == "context"),
+                    arguments[position + 1] if len(arguments) > position + 1 else None,
+                )
+                names = {}
+                if context is not None:
+                    for key, value in _dict_items(context, scope):
+                        names[key] = _value_info(value, scope, models, accessors)
+                contexts[_string(arguments[position])].append(
+                    {
+                        "view": f"{Path(path).stem}.{function.name}",
+                        "line": call.lineno,
+                        "names": names,
+                    }
+                )
+    return contexts
+
+
+# --- Анализ -----------------------------------------------------------------
+
+
+def _covered(info, path, kinds):
+    return any(
+        loaded == path or loaded.startswith(f"{path}__")
+        for kind in kinds
+        for loaded in info[kind]
+    )
+
+
+class _Analysis:
+    def __init__(self, name, contexts, models, accessors):
+        self.name = name
+        self.contexts = contexts
+        self.models = models
+        self.accessors = accessors
+        self.findings = []
+        self.reported = set()
+
+    def infos(self, root):
+        return [
+            (context["view"], context["names"][root])
+            for context in self.contexts
+            if root in context["names"]
+        ]
+
+    def context_model(self, name):
+        for view, info in self.infos(name):
+            if info["model"] is not None:
+                return info["model"]
+        return _model_for_name(name, self.models, self.accessors)
+
+    def add(self, rule, line, subject, message, suggestion, views=()):
+        if (rule, subject) in self.reported:
+            return
+        self.reported.add((rule, subject))
+        self.findings.append(
+            {
+                "file": self.name,
+                "line": line,
+                "rule": rule,
+                "severity": SEVERITY[rule],
+                "subject": subject,
+                "message": message,
+                "suggestion": suggestion,
+                "views": list(views),
+            }
+        )
+
+    def lacking(self, root, path, kinds):
+        """Представления, которые не загружают связь; None - всем хватает"""
+        infos = self.infos(root)
+        views = [view for view, info in infos if not _covered(info, path, kinds)]
+        if infos and not views:
+            return None
+        return views
+
+    def relation(self, frame, path, line, iterated=False):
+        """Разобрать путь от переменной цикла; модель и путь связи, по которой
+        идёт вложенный цикл"""
+        model, prefix, root = frame["model"], frame["prefix"], frame["root"]
+        label, base = frame["label"], frame["base"]
+        variable = path[0]
+        for index, attribute in enumerate(path[1:], 1):
+            field = _relations(model).get(attribute)
+            if field is None:
+                return None, None
+            lookup = f"{prefix}__{attribute}" if prefix else attribute
+            # Путь от значения контекста - для сверки с представлением
+            loaded = f"{base}__{lookup}" if base else lookup
+            shown = ".".join(path[: index + 1])
+            if not _is_multiple(field):
+                views = self.lacking(
+                    root, loaded, ("select_related", "prefetch_related")
+                )
+                if views is not None:
+                    self.add(
+                        "loop-related",
+                        line,
+                        shown,
+                        f"{shown} внутри цикла: запрос на каждую итерацию",
+                        f'{label}: select_related("{lookup}")',
+                        views,
+                    )
+                model, prefix = field.related_model, lookup
+                continue
+
+            rest = path[index + 1 :]
+            if any(step in COUNT_METHODS or step == LENGTH for step in rest):
+                views = self.lacking(root, loaded, ("prefetch_related",))
+                if views is not None:
+                    self.add(
+                        "loop-count",
+                        line,
+                        shown,
+                        f"{'.'.join(path)} внутри цикла: COUNT на каждую итерацию",
+                        f'{label}: annotate({attribute}_count=Count("{lookup}"))',
+                        views,
+                    )
+                return None, None
+            if not rest or rest[0] in ("all", ITEM, *ITEM_METHODS):
+                if iterated or rest:
+                    views = self.lacking(root, loaded, ("prefetch_related",))
+                    if views is not None:
+                        self.add(
+                            "loop-prefetch",
+                            line,
+                            shown,
+                            f"{shown} перебирается внутри цикла по {variable}: "
+                            "запрос на каждую итерацию",
+                            f'{label}: prefetch_related("{lookup}")',
+                            views,
+                        )
+                return field.related_model, lookup
+            self.add(
+                "loop-query",
+                line,
+                ".".join(path),
+                f"{'.'.join(path)} внутри цикла: отдельный запрос на каждую "
+                "итерацию, prefetch_related его не убирает",
+                f'{label}: annotate() с Count/Exists/Subquery или Prefetch("{lookup}", '
+                "queryset=...)",
+                self.lacking(root, loaded, ()) or [],
+            )
+            return None, None
+        return model if iterated else None, prefix
+
+    def repeated(self, name, uses):
+        """Сколько запросов выполнит queryset контекста за рендеринг"""
+        queries, fetched, lines, per_iteration = 0, False, [], False
+        for operation, line, in_loop in uses:
+            if fetched and operation != "clone":
+                continue
+            if operation in ("fetch", "clone"):
+                queries += 1
+                fetched = fetched or operation == "fetch"
+            else:
+                queries += 1
+                per_iteration = per_iteration or in_loop
+            lines.append(line)
+        if queries < 2 and not per_iteration:
+            return
+        infos = self.infos(name)
+        if infos:
+            views = [view for view, info in infos if not info["evaluated"]]
+            if not views:
+                return
+        else:
+            views = []
+            if not any(operation == "count" for operation, line, loop in uses):
+                return
+        where = ", ".join(str(line) for line in sorted(set(lines)))
+        times = "на каждой итерации цикла" if per_iteration else f"{queries} раз"
+        self.add(
+            "repeated-evaluation",
+            lines[0],
+            name,
+            f"{name} выполняется {times} за рендеринг (строки {where})",
+            f'"{name}": memo.memoize(request, {name})',
+            views,
+        )
+
+    def run(self, events):
+        frames = []
+        defined = set()
+        uses = defaultdict(list)
+
+        def loop_variable(name):
+            for frame in reversed(frames):
+                if name in frame:
+                    return frame[name]
+            return None
+
+        def context_use(path, line, operation=None):
+            name, rest = path[0], path[1:]
+            if name in defined:
+                return
+            # .all - новый queryset без кеша результатов
+            clone = rest[:1] == ["all"]
+            if clone:
+                rest = rest[1:]
+            if not rest:
+                operation = "clone" if clone else operation or "fetch"
+            elif rest[0] in COUNT_METHODS:
+                operation = "count"
+            elif rest[0] in (ITEM, *ITEM_METHODS):
+                operation = "item"
+            elif rest[0] == LENGTH:
+                operation = "fetch"
+            else:
+                return
+            uses[name].append((operation, line, bool(frames)))
+
+        for event in events:
+            if event[0] == "define":
+                defined.add(event[1])
+            elif event[0] == "use":
+                _, path, line, in_if = event
+                frame = loop_variable(path[0])
+                if frame is not None:
+                    if frame["model"] is not None:
+                        self.relation(frame, path, line)
+                elif len(path) > 1 or in_if:
+                    context_use(path, line)
+            elif event[0] == "for":
+                _, targets, path, line = event
+                scope = {}
+                model, prefix, root, label, base = None, "", None, None, ""
+                frame = loop_variable(path[0]) if path else None
+                if frame is not None:
+                    root, label, base = frame["root"], frame["label"], frame["base"]
+                    if frame["model"] is not None:
+                        model, prefix = self.relation(frame, path, line, iterated=True)
+                elif path:
+                    context_use(path, line, "fetch")
+                    core = list(path)
+                    while len(core) > 1 and core[-1] in ("all", ITEM):
+                        core.pop()
+                    root, label = path[0], ".".join(core)
+                    model, base = self.context_model(path[0]), ""
+                    for attribute in core[1:]:
+                        field = model and _relations(model).get(attribute)
+                        if not field:
+                            model = None
+                            break
+                        model = field.related_model
+                        base = f"{base}__{attribute}" if base else attribute
+                if len(targets) == 1 and model is None and frame is None:
+                    model = _model_for_name(targets[0], self.models, {})
+                for target in targets:
+                    scope[target] = {
+                        "model": model if len(targets) == 1 else None,
+                        "prefix": prefix or "",
+                        "root": root or target,
+                        "label": label or target,
+                        "base": base,
+                    }
+                frames.append(scope)
+            elif event[0] == "endfor" and frames:
+                frames.pop()
+
+        for name, name_uses in uses.items():
+            self.repeated(name, name_uses)
+        return self.findings
+
+
+def template_dirs():
+    """Каталоги шаблонов: ``{"django": templates/, "jinja2": jinja2/}``"""
+    base = Path(settings.BASE_DIR)
+    return {"django": base / "templates", "jinja2": base / "jinja2"}
+
+
+def analyze_template(path, engine, name=None, contexts=None, models=None):
+    """Находки по одному файлу шаблона"""
+    path = Path(path)
+    name = name or path.name
+    source = path.read_text(encoding="utf-8")
+    models = models if models is not None else _models()
+    analysis = _Analysis(
+        (
+            str(path.relative_to(settings.BASE_DIR))
+            if path.is_absolute() and path.is_relative_to(settings.BASE_DIR)
+            else str(path)
+        ),
+        (contexts or {}).get(name, []),
+        models,
+        _accessor_models(models),
+    )
+    error = _syntax_error(source, path, engine)
+    if error is not None:
+        message, line = error
+        analysis.add("syntax-error", line, name, message, "")
+        return analysis.findings
+    events = _jinja_events(source) if engine == "jinja2" else _django_events(source)
+    return analysis.run(events)
+
+
+def analyze(directories=None, views=None):
+    """Находки по всем шаблонам, отсортированные по файлу и строке"""
+    directories = directories or template_dirs()
+    contexts = view_contexts(views)
+    models = _models()
+    findings = []
+    for engine, directory in directories.items():
+        for path in sorted(Path(directory).rglob("*.html")):
+            name = path.relative_to(directory).as_posix()
+            findings.extend(analyze_template(path, engine, name, contexts, models))
+    findings.sort(key=lambda finding: (finding["file"], finding["line"]))
+    return findings
+
+
+def fingerprint(finding):
+    """Ключ находки без номера строки - для списка известных находок"""
+    return f"{finding['rule']}:{finding['file']}:{finding['subject']}"
@@ -0,0 +1,28 @@
+"""Запуск тестов с базами шардов.
+
+ShardingTests (school/tests.py) включают SHARD_DATABASES на базах shard1 и
+shard2. Раннер добавляет их в DATABASES только на время тестов, если
+SCHOOL_SHARDS не подключил их сам, поэтому настройки сервера от способа
+запуска не зависят.
+"""
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+TEST_SHARDS = ("shard1", "shard2")
+
+
+class ShardedTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        for alias in TEST_SHARDS:
+            settings.DATABASES.setdefault(
+                alias,
+                {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": settings.BASE_DIR / f"db_{alias}.sqlite3",
+                },
+            )
+        # Список баз читается при первом обращении к connections
+        connections.__dict__.pop("settings", None)
+        super().setup_test_environment(**kwargs)
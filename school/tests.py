@@ -1,3 +1,2728 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import random
+import shutil
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import datetime, timedelta
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.db.models.query import QuerySet
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.template.base import Template
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    AsyncClient,
+    LiveServerTestCase,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.utils import timezone, translation
+from django.utils.html import strip_tags
+
+from . import (
+    activity,
+    analytics,
+    archive,
+    autograder,
+    compression,
+    gradebook,
+    leaderboard,
+    loadtest,
+    memo,
+    metrics,
+    profiling,
+    querycache,
+    reminders,
+    sharding,
+    similarity,
+    slowqueries,
+    templatelint,
+    timing,
+    views,
+)
+from .forms import AssignmentForm
+from .management.commands import load_test
+from .models import (
+    ActivityEvent,
+    Announcement,
+    AnnouncementReadMarker,
+    ArchivedAnnouncement,
+    ArchivedAssignment,
+    ArchivedSubmission,
+    Assignment,
+    Course,
+    DeadlineReminder,
+    LeaderboardEntry,
+    Profile,
+    Submission,
+)
+
+
+@override_settings(QUERYCACHE_CLOCK_SKEW=0, QUERYCACHE_SHARED=None)
+class QuerysetCacheTests(TestCase):
+    """Кеш querysets никогда не отдаёт данные, изменённые после их чтения"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher", first_name="Анна")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.course.students.add(cls.student)
+
+    def setUp(self):
+        # Кеш в файлах временного каталога: время тегов видно всем процессам,
+        # как в Redis, и не смешивается с кешем разработчика
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": directory.name,
+                }
+            }
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        querycache.clear()
+        # Как после создания курса: у тега строки уже есть время изменения
+        querycache.invalidate([querycache.course_tag(self.course.id)])
+
+    def titles(self, courses):
+        return sorted(course.title for course in courses)
+
+    def test_repeated_lookup_is_served_from_cache(self):
+        self.assertEqual(self.titles(views._teacher_courses(self.teacher)), ["Алгебра"])
+        with self.assertNumQueries(0):
+            courses = views._teacher_courses(self.teacher)
+            self.assertEqual(courses.count(), 1)
+            self.assertTrue(courses.exists())
+            self.assertEqual(self.titles(courses), ["Алгебра"])
+
+    def test_cached_objects_are_copies(self):
+        views._teacher_courses(self.teacher)[0].title = "Испорчено"
+        self.assertEqual(self.titles(views._teacher_courses(self.teacher)), ["Алгебра"])
+
+    def test_related_objects_are_copies(self):
+        views._enrolled_courses(self.student, with_teacher=True)
+        courses = views._enrolled_courses(self.student, with_teacher=True)
+        courses[0].teacher.first_name = "Испорчено"
+        with self.assertNumQueries(0):
+            courses = views._enrolled_courses(self.student, with_teacher=True)
+            self.assertEqual(courses[0].teacher.first_name, "Анна")
+
+        lookup = Course.objects.filter(pk=self.course.pk).prefetch_related("students")
+        querycache.cached(lookup, ["all"])
+        courses = querycache.cached(lookup, ["all"])
+        courses[0].students.all()[0].username = "Испорчено"
+        with self.assertNumQueries(0):
+            courses = querycache.cached(lookup, ["all"])
+            self.assertEqual(
+                [student.username for student in courses[0].students.all()],
+                ["student"],
+            )
+
+    def test_course_update_invalidates(self):
+        views._teacher_courses(self.teacher)
+        views._enrolled_courses(self.student)
+        self.course.title = "Геометрия"
+        self.course.save()
+        self.assertEqual(
+            self.titles(views._teacher_courses(self.teacher)), ["Геометрия"]
+        )
+        self.assertEqual(
+            self.titles(views._enrolled_courses(self.student)), ["Геометрия"]
+        )
+
+    def test_new_and_deleted_courses(self):
+        views._teacher_courses(self.teacher)
+        other = Course.objects.create(title="Физика", teacher=self.teacher)
+        self.assertEqual(
+            self.titles(views._teacher_courses(self.teacher)), ["Алгебра", "Физика"]
+        )
+        other.delete()
+        self.assertEqual(self.titles(views._teacher_courses(self.teacher)), ["Алгебра"])
+
+    def test_teacher_change_invalidates_both_teachers(self):
+        other = User.objects.create_user("other")
+        views._teacher_courses(self.teacher)
+        views._teacher_courses(other)
+        self.course.teacher = other
+        self.course.save()
+        self.assertEqual(self.titles(views._teacher_courses(self.teacher)), [])
+        self.assertEqual(self.titles(views._teacher_courses(other)), ["Алгебра"])
+
+    def test_enrollment_changes_invalidate(self):
+        other = Course.objects.create(title="Физика", teacher=self.teacher)
+        views._enrolled_courses(self.student)
+        other.students.add(self.student)
+        self.assertEqual(
+            self.titles(views._enrolled_courses(self.student)), ["Алгебра", "Физика"]
+        )
+        self.student.courses_enrolled.remove(self.course)
+        self.assertEqual(self.titles(views._enrolled_courses(self.student)), ["Физика"])
+        self.student.courses_enrolled.clear()
+        self.assertEqual(self.titles(views._enrolled_courses(self.student)), [])
+
+    def test_counters_are_not_stale(self):
+        self.assertEqual(views._teacher_courses(self.teacher)[0].assignments_count, 0)
+        Assignment.objects.create(
+            title="Задание",
+            description="Условие",
+            course=self.course,
+            teacher=self.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+        )
+        self.assertEqual(views._teacher_courses(self.teacher)[0].assignments_count, 1)
+
+    def test_teacher_rename_invalidates_enrolled_courses(self):
+        courses = views._enrolled_courses(self.student, with_teacher=True)
+        self.assertEqual(courses[0].teacher.first_name, "Анна")
+        self.teacher.first_name = "Мария"
+        self.teacher.save()
+        courses = views._enrolled_courses(self.student, with_teacher=True)
+        self.assertEqual(courses[0].teacher.first_name, "Мария")
+
+    def test_assignment_form_choices(self):
+        def choices():
+            form = AssignmentForm(user=self.teacher)
+            return [label for value, label in form.fields["course"].choices if value]
+
+        self.assertEqual(choices(), ["Алгебра"])
+        self.course.archived_at = timezone.now()
+        self.course.save()
+        self.assertEqual(choices(), [])
+
+    def test_write_during_query_makes_entry_stale(self):
+        # Изменение в ту же секунду, что и запрос, не даёт записи стать
+        # действительной, даже если запрос прочитал старые данные
+        with mock.patch.object(querycache.time, "time", return_value=1000.0):
+            views._teacher_courses(self.teacher)
+            querycache.invalidate([querycache.teacher_tag(self.teacher.id)])
+        with self.assertNumQueries(1):
+            views._teacher_courses(self.teacher)
+
+    def test_evicted_tag_invalidates_entries(self):
+        views._teacher_courses(self.teacher)
+        cache.delete(f"querycache:tag:{querycache.teacher_tag(self.teacher.id)}")
+        with self.assertNumQueries(1):
+            views._teacher_courses(self.teacher)
+
+    @override_settings(QUERYCACHE_MAX_ENTRIES=2)
+    def test_local_tier_is_lru_bounded(self):
+        for title in ("Б", "В"):
+            Course.objects.create(title=title, teacher=self.teacher)
+        lookups = [
+            Course.objects.filter(title=title) for title in ("Алгебра", "Б", "В")
+        ]
+        for queryset in lookups[:2]:
+            querycache.cached(queryset, ["all"])
+        querycache.cached(lookups[0], ["all"])  # теперь самая свежая
+        querycache.cached(lookups[2], ["all"])
+        self.assertEqual(len(querycache._local), 2)
+        with self.assertNumQueries(0):
+            querycache.cached(lookups[0], ["all"])
+        with self.assertNumQueries(1):
+            querycache.cached(lookups[1], ["all"])
+
+    @override_settings(QUERYCACHE_SHARED="default")
+    def test_shared_tier(self):
+        views._teacher_courses(self.teacher)
+        querycache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.titles(views._teacher_courses(self.teacher)), ["Алгебра"]
+            )
+        self.course.title = "Геометрия"
+        self.course.save()
+        querycache.clear()
+        self.assertEqual(
+            self.titles(views._teacher_courses(self.teacher)), ["Геометрия"]
+        )
+
+    def in_process(self, process, lookup):
+        stamps, local = process
+        with mock.patch.object(querycache, "cache", stamps):
+            with mock.patch.object(querycache, "_local", local):
+                return lookup()
+
+    def test_other_process_sees_invalidation(self):
+        processes = [(cache, OrderedDict()), (cache, OrderedDict())]
+        self.in_process(processes[1], self.teacher_courses)
+        self.in_process(processes[0], self.rename_course)
+        courses = self.in_process(processes[1], self.teacher_courses)
+        self.assertEqual(self.titles(courses), ["Геометрия"])
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_process_local_stamps_disable_cache(self):
+        # У каждого процесса своя LocMemCache: время тегов, обновлённое одним,
+        # не видно другому, поэтому кеш querysets не используется вовсе
+        processes = [
+            (LocMemCache(f"process{number}", {}), OrderedDict()) for number in (1, 2)
+        ]
+        self.in_process(processes[1], self.teacher_courses)
+        self.in_process(processes[0], self.rename_course)
+        with self.assertNumQueries(1):
+            courses = self.in_process(processes[1], self.teacher_courses)
+            self.assertEqual(self.titles(courses), ["Геометрия"])
+        self.assertFalse(processes[1][1])
+
+    def teacher_courses(self):
+        return views._teacher_courses(self.teacher)
+
+    def rename_course(self):
+        self.course.title = "Геометрия"
+        self.course.save()
+
+    def test_my_courses_page_shows_new_course(self):
+        self.client.force_login(self.teacher)
+        self.client.get("/courses/")
+        Course.objects.create(title="Физика", teacher=self.teacher)
+        response = self.client.get("/courses/")
+        self.assertContains(response, "Физика")
+
+
+class MemoTests(TestCase):
+    """memoize() выполняет queryset не больше одного раза за запрос"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        for title in ("Алгебра", "Геометрия", "Физика"):
+            Course.objects.create(title=title, teacher=cls.teacher)
+
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+
+    def courses(self):
+        return Course.objects.filter(teacher=self.teacher).order_by("title")
+
+    def test_count_exists_and_slices_share_one_query(self):
+        courses = memo.memoize(self.request, self.courses())
+        with self.assertNumQueries(1):
+            self.assertEqual(courses.count(), 3)
+            self.assertTrue(courses.exists())
+            self.assertEqual(len(courses), 3)
+            self.assertEqual(courses.first().title, "Алгебра")
+            self.assertEqual([c.title for c in courses[1:]], ["Геометрия", "Физика"])
+            self.assertEqual(len(list(courses)), 3)
+
+    def test_same_query_is_shared_within_request(self):
+        first = memo.memoize(self.request, self.courses())
+        self.assertIs(memo.memoize(self.request, self.courses()), first)
+        self.assertIsNot(memo.memoize(RequestFactory().get("/"), self.courses()), first)
+
+    def test_filter_builds_new_query(self):
+        courses = memo.memoize(self.request, self.courses())
+        list(courses)
+        with self.assertNumQueries(1):
+            self.assertEqual(courses.filter(title="Физика").count(), 1)
+
+    def test_template_counts_from_memo(self):
+        template = engines["django"].from_string(
+            "{{ courses.count }}{% for c in courses %}{{ c.title }}{% endfor %}"
+            "{% if courses.count > 2 %}+{% endif %}"
+        )
+        with self.assertNumQueries(1):
+            template.render({"courses": memo.memoize(self.request, self.courses())})
+
+    def test_warns_when_template_counts_and_iterates(self):
+        memo.install()
+        self.addCleanup(memo.uninstall)
+        template = engines["django"].from_string(
+            "{{ courses.count }}{% for c in courses %}{{ c.title }}{% endfor %}"
+        )
+        with self.assertLogs("school.memo", "WARNING") as logs:
+            template.render({"courses": self.courses()})
+        self.assertIn("'courses'", logs.output[0])
+        with self.assertNoLogs("school.memo", "WARNING"):
+            template.render({"courses": memo.memoize(self.request, self.courses())})
+
+    @skipIf(memo.warnings_enabled(), "обёртки уже установлены в ready()")
+    def test_uninstall_restores_methods(self):
+        methods = (QuerySet.count, QuerySet._fetch_all, Template._render)
+        memo.install()
+        memo.install()
+        self.assertTrue(QuerySet.count.memo_tracked)
+        memo.uninstall()
+        self.assertEqual(
+            (QuerySet.count, QuerySet._fetch_all, Template._render), methods
+        )
+        template = engines["django"].from_string(
+            "{{ courses.count }}{% for c in courses %}{{ c.title }}{% endfor %}"
+        )
+        with self.assertNoLogs("school.memo", "WARNING"):
+            template.render({"courses": self.courses()})
+
+    def test_disabled_by_default(self):
+        with self.settings(DEBUG=True):
+            del settings.QUERYSET_MEMO_WARNINGS
+            self.assertFalse(memo.warnings_enabled())
+
+
+class TemplateLintTests(TestCase):
+    """Статический анализ находит N+1 и учитывает контекст представлений"""
+
+    VIEWS = """
+def course_list(request):
+    courses = Course.objects.filter(teacher=request.user)
+    return render(request, "courses.html", {"courses": courses})
+
+
+def course_list_fast(request):
+    courses = Course.objects.select_related("teacher").annotate(
+        students_count=Count("students")
+    )
+    return render(request, "courses.html", {"courses": memo.memoize(request, courses)})
+"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.views = self.directory / "views.py"
+        self.views.write_text(self.VIEWS, encoding="utf-8")
+
+    def lint(self, source, engine="django", views=None):
+        path = self.directory / "courses.html"
+        path.write_text(source, encoding="utf-8")
+        contexts = templatelint.view_contexts(views or [])
+        return {
+            (finding["rule"], finding["subject"]): finding
+            for finding in templatelint.analyze_template(
+                path, engine, "courses.html", contexts
+            )
+        }
+
+    def test_related_access_and_count_in_loop(self):
+        findings = self.lint(
+            "{% for course in courses %}{{ course.teacher.get_full_name }}"
+            "{{ course.students.count }}{{ course.title }}{% endfor %}"
+        )
+        self.assertEqual(
+            set(findings),
+            {("loop-related", "course.teacher"), ("loop-count", "course.students")},
+        )
+        self.assertIn(
+            'select_related("teacher")',
+            findings[("loop-related", "course.teacher")]["suggestion"],
+        )
+
+    def test_nested_loop_needs_prefetch(self):
+        findings = self.lint(
+            "{% for course in courses %}{% for a in course.assignments.all %}"
+            "{{ a.title }}{% endfor %}{% endfor %}"
+        )
+        self.assertEqual(
+            findings[("loop-prefetch", "course.assignments")]["suggestion"],
+            'courses: prefetch_related("assignments")',
+        )
+
+    def test_views_are_cross_referenced(self):
+        findings = self.lint(
+            "{{ courses.count }}{% for course in courses %}"
+            "{{ course.teacher }}{{ course.students.count }}{% endfor %}",
+            views=[self.views],
+        )
+        # Связь teacher загружена не во всех представлениях
+        self.assertEqual(
+            findings[("loop-related", "course.teacher")]["views"],
+            ["views.course_list"],
+        )
+        self.assertEqual(
+            findings[("repeated-evaluation", "courses")]["views"],
+            ["views.course_list"],
+        )
+
+    def test_jinja_templates(self):
+        findings = self.lint(
+            "{% if courses.count() > 1 %}{% for course in courses[:3] %}"
+            "{{ course.teacher.username }}{% endfor %}{% endif %}{{ courses|length }}",
+            engine="jinja2",
+        )
+        self.assertEqual(
+            set(findings),
+            {("loop-related", "course.teacher"), ("repeated-evaluation", "courses")},
+        )
+
+    def test_syntax_error(self):
+        findings = self.lint("{% for course in courses %}{{ course|nosuchfilter }}")
+        self.assertEqual([rule for rule, subject in findings], ["syntax-error"])
+
+    def test_helpers_from_other_modules(self):
+        (self.directory / "catalog.py").write_text(
+            """
+class Board:
+    def __init__(self, rows):
+        self.rows = rows
+
+
+def courses():
+    return Course.objects.select_related("teacher")
+
+
+def board():
+    return Board(list(Course.objects.all()))
+""",
+            encoding="utf-8",
+        )
+        self.views.write_text(
+            """
+from . import catalog
+
+
+def course_list(request):
+    return render(request, "courses.html", {"courses": catalog.courses()})
+
+
+def course_board(request):
+    rows = catalog.board().rows
+    return render(request, "courses.html", {"rows": rows})
+""",
+            encoding="utf-8",
+        )
+        findings = self.lint(
+            "{% for course in courses %}{{ course.teacher }}{% endfor %}"
+            "{% for row in rows %}{{ row.teacher }}{% endfor %}",
+            views=[self.views],
+        )
+        # select_related из catalog.courses учтён, а экземпляр Board - не queryset
+        self.assertEqual(findings, {})
+
+    def test_stale_baseline_fails(self):
+        import find_bad_urls
+
+        baseline = self.directory / "baseline.json"
+        baseline.write_text('["loop-related:templates/x.html:course.teacher"]')
+        stderr = StringIO()
+        with mock.patch.object(templatelint, "analyze", return_value=[]):
+            with redirect_stdout(StringIO()), redirect_stderr(stderr):
+                code = find_bad_urls.main(["--baseline", str(baseline)])
+        self.assertEqual(code, 1)
+        self.assertIn(
+            "устаревшая запись loop-related:templates/x.html", stderr.getvalue()
+        )
+
+        baseline.write_text("[]")
+        with mock.patch.object(templatelint, "analyze", return_value=[]):
+            with redirect_stdout(StringIO()):
+                self.assertEqual(find_bad_urls.main(["--baseline", str(baseline)]), 0)
+
+
+class SubmissionEventsTests(TestCase):
+    """SSE-поток работает только под ASGI и не занимает WSGI-воркер"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+
+    def test_stream_ends_under_wsgi(self):
+        self.client.force_login(self.student)
+        response = self.client.get("/events/submissions/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+        self.assertEqual(b"".join(response), b"")
+
+    def test_pages_subscribe_only_under_asgi(self):
+        self.client.force_login(self.student)
+        self.assertNotContains(self.client.get("/dashboard/"), "initSubmissionEvents(")
+
+        client = AsyncClient()
+        client.force_login(self.student)
+        response = async_to_sync(client.get)("/dashboard/")
+        self.assertContains(response, "initSubmissionEvents(")
+
+
+def _sandbox_available():
+    try:
+        autograder.sandbox_prefix()
+    except ImproperlyConfigured:
+        return False
+    return True
+
+
+@skipUnless(_sandbox_available(), "нет пространств имён для песочницы")
+@override_settings(AUTOGRADER_TIME_LIMIT=1, AUTOGRADER_MEMORY_LIMIT_MB=128)
+class AutograderSandboxTests(TestCase):
+    """Решение ограничено по ресурсам и не видит ни проекта, ни сети"""
+
+    def run_solution(self, source, input_data="", expected_output=""):
+        submission = SimpleNamespace(
+            file=None, content=source, assignment=SimpleNamespace(max_points=100)
+        )
+        test = SimpleNamespace(
+            input_data=input_data, expected_output=expected_output, points=1
+        )
+        result = autograder.grade(submission, [test])
+        return result["grade"], result["feedback"].splitlines()[-1]
+
+    def test_correct_solution(self):
+        self.assertEqual(
+            self.run_solution("print(int(input()) * 2)", "21", "42"),
+            (100, "Тест 1: пройден"),
+        )
+
+    def test_infinite_loop_times_out(self):
+        grade, feedback = self.run_solution("while True: pass")
+        self.assertEqual(grade, 0)
+        self.assertIn("превышено время выполнения", feedback)
+
+    def test_memory_limit(self):
+        grade, feedback = self.run_solution("data = bytearray(512 * 1024 * 1024)")
+        self.assertIn("MemoryError", feedback)
+
+    def test_fork_bomb_is_contained(self):
+        source = (
+            "import os\n"
+            "while True:\n"
+            "    try:\n"
+            "        os.fork()\n"
+            "    except OSError:\n"
+            "        pass\n"
+        )
+        started = time.monotonic()
+        grade, feedback = self.run_solution(source)
+        self.assertIn("превышено время выполнения", feedback)
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_detached_child_is_killed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        os.chmod(directory, 0o777)
+        marker = os.path.join(directory, "escaped")
+        source = (
+            "import os, time\n"
+            "if os.fork() == 0:\n"
+            "    os.setsid()\n"
+            "    time.sleep(1)\n"
+            f"    open({marker!r}, 'w').close()\n"
+            "print('ok')\n"
+        )
+        self.assertEqual(self.run_solution(source, "", "ok")[0], 100)
+        time.sleep(2)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_project_files_are_hidden(self):
+        for path in (
+            settings.DATABASES["default"]["NAME"],
+            settings.BASE_DIR / "school_web" / "settings.py",
+        ):
+            with self.subTest(path=path):
+                grade, feedback = self.run_solution(f"open({str(path)!r}).read()")
+                self.assertIn("Error", feedback)
+
+    def test_other_workdirs_are_hidden(self):
+        other = autograder.make_workdir()
+        self.addCleanup(shutil.rmtree, other)
+        Path(other, "solution.py").write_text("секрет", encoding="utf-8")
+        source = (
+            "import os\n" f"print(len(os.listdir('/tmp')), os.path.exists({other!r}))\n"
+        )
+        # В /tmp решения - только его собственный рабочий каталог
+        self.assertEqual(self.run_solution(source, "", "1 False")[0], 100)
+
+    def test_no_network(self):
+        grade, feedback = self.run_solution(
+            "import socket\nsocket.create_connection(('1.1.1.1', 80), timeout=2)"
+        )
+        self.assertIn("ошибка выполнения", feedback)
+
+
+@override_settings(AUTOGRADER_SANDBOX="none")
+class AutograderQueueTests(TestCase):
+    """Очередь автопроверки: каждое решение забирается и сохраняется один раз"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.assignment = cls.course.assignments.create(
+            title="Задание",
+            description="Условие",
+            teacher=cls.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+            auto_grade=True,
+        )
+        for number in range(7):
+            student = User.objects.create_user(f"student{number}")
+            cls.assignment.submissions.create(
+                student=student, content="print(1)", autograde_status="pending"
+            )
+
+    def statuses(self):
+        return Counter(Submission.objects.values_list("autograde_status", flat=True))
+
+    def test_claims_do_not_overlap(self):
+        first = autograder.claim(3)
+        second = autograder.claim(10)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 4)
+        self.assertFalse({s.id for s in first} & {s.id for s in second})
+        self.assertEqual(autograder.claim(10), [])
+        self.assertEqual(self.statuses(), {"running": 7})
+
+    def test_concurrent_claim_gets_only_rows_it_marked(self):
+        mark_running = autograder._mark_running
+
+        def other_worker_first(submissions, ids):
+            # Другой процесс забрал два решения между SELECT и UPDATE
+            submissions.filter(id__in=ids[:2]).update(autograde_status="running")
+            return mark_running(submissions, ids)
+
+        pending = list(
+            Submission.objects.order_by("submitted_at").values_list("id", flat=True)
+        )
+        with mock.patch.object(autograder, "_mark_running", other_worker_first):
+            claimed = autograder.claim(4)
+        self.assertEqual([s.id for s in claimed], pending[2:4])
+
+    def test_save_results_in_one_update(self):
+        claimed = autograder.claim(7)
+        results = [
+            (s, None, {"grade": 80, "feedback": "ok", "latency": 0}) for s in claimed
+        ]
+        results[0] = (claimed[0], None, None)
+        with CaptureQueriesContext(connections["default"]) as queries:
+            autograder.save_results(results)
+        updates = [
+            q["sql"]
+            for q in queries.captured_queries
+            if q["sql"].startswith('UPDATE "school_submission"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.statuses(), {"done": 6, "error": 1})
+        graded = Submission.objects.filter(autograde_status="done")
+        self.assertEqual(set(graded.values_list("grade", flat=True)), {80})
+        self.assertEqual(set(graded.values_list("grade_percentage", flat=True)), {80})
+
+    def test_run_grades_every_submission_once(self):
+        graded = Counter()
+        lock = threading.Lock()
+        failing = User.objects.get(username="student0").id
+
+        def fake_grade(submission, tests):
+            with lock:
+                graded[submission.id] += 1
+            if submission.student_id == failing:
+                raise RuntimeError("сбой")
+            time.sleep(0.01)
+            return {"grade": 90, "feedback": "ok", "latency": 0.01}
+
+        with (
+            mock.patch.object(autograder, "grade", fake_grade),
+            self.assertLogs("school.autograder", "ERROR"),
+        ):
+            stats = autograder.run(
+                workers=2, batch_size=3, poll_interval=0.01, once=True
+            )
+        self.assertEqual(set(graded.values()), {1})
+        self.assertEqual(len(graded), 7)
+        self.assertEqual((stats.processed, stats.errors), (7, 1))
+        self.assertEqual(self.statuses(), {"done": 6, "error": 1})
+        self.assertEqual(autograder.queue_depth(), 0)
+
+
+class CourseVersionTests(TestCase):
+    """Рейтинг и аналитика видят оценки, выставленные в других процессах"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.course.students.add(cls.student)
+        cls.assignment = Assignment.objects.create(
+            title="Задание",
+            description="Условие",
+            course=cls.course,
+            teacher=cls.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.submission = Submission.objects.create(
+            assignment=self.assignment, student=self.student, content="ответ"
+        )
+
+    def grade(self, grade):
+        self.client.force_login(self.teacher)
+        return self.client.post(
+            f"/submissions/{self.submission.id}/grade/",
+            {"grade": grade, "feedback": ""},
+        )
+
+    def test_leaderboard_reloads_after_grade_in_other_process(self):
+        self.assertEqual(len(leaderboard.get_leaderboard(self.course.id)), 0)
+        # Другой процесс: свои массивы рейтинга, общая база
+        with mock.patch.object(leaderboard, "_boards", {}):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.grade(80)
+        board = leaderboard.get_leaderboard(self.course.id)
+        self.assertEqual(board.entry(self.student.id)["total_points"], 80)
+
+    def test_grade_is_recorded_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.grade(80)
+        self.assertFalse(LeaderboardEntry.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(LeaderboardEntry.objects.get().total_points, 80)
+
+    def test_rolled_back_grade_is_not_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.grade(80)
+                raise RuntimeError
+        self.assertFalse(LeaderboardEntry.objects.exists())
+
+    def test_distribution_follows_grade_changes(self):
+        self.assertIsNone(analytics.assignment_distribution(self.assignment))
+        self.grade(80)
+        self.assertEqual(analytics.assignment_distribution(self.assignment)["mean"], 80)
+        self.grade(60)
+        self.assertEqual(analytics.assignment_distribution(self.assignment)["mean"], 60)
+
+
+class LeaderboardTests(TestCase):
+    """Места, процентили и пересчёт рейтинга"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.assignment = cls.course.assignments.create(
+            title="Задание",
+            description="Условие",
+            teacher=cls.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+        )
+        cls.students = []
+        for number, grade in enumerate((90, 70, 70, 50)):
+            student = User.objects.create_user(f"student{number}")
+            cls.students.append(student)
+            cls.assignment.submissions.create(
+                student=student, content="ответ", grade=grade
+            )
+
+    def setUp(self):
+        leaderboard._boards.clear()
+
+    def board(self):
+        # (id ученика, сумма баллов, число оценок)
+        return leaderboard.CourseLeaderboard(
+            1, [(1, 90, 1), (2, 70, 1), (3, 70, 1), (4, 50, 1)], version=0
+        )
+
+    def test_ties_share_rank(self):
+        board = self.board()
+        self.assertEqual([board.rank(s) for s in (1, 2, 3, 4)], [1, 2, 2, 4])
+        self.assertEqual([entry["student_id"] for entry in board.top(3)], [1, 2, 3])
+        board.update(4, 90, 2)
+        self.assertEqual([board.rank(s) for s in (1, 4, 2, 3)], [1, 1, 3, 3])
+        board.remove(1)
+        self.assertEqual(board.rank(4), 1)
+        self.assertIsNone(board.rank(1))
+
+    def test_percentile_bounds(self):
+        board = self.board()
+        self.assertEqual(board.percentile(1), 100)
+        self.assertEqual(board.percentile(2), 33)
+        self.assertEqual(board.percentile(3), 33)
+        self.assertEqual(board.percentile(4), 0)
+        self.assertIsNone(board.percentile(99))
+        alone = leaderboard.CourseLeaderboard(1, [(1, 0, 0)], version=0)
+        self.assertEqual(alone.percentile(1), 100)
+        self.assertEqual(alone.entry(1)["average_points"], 0)
+
+    def test_empty_course(self):
+        board = leaderboard.get_leaderboard(self.course.id + 100)
+        self.assertEqual(len(board), 0)
+        self.assertEqual(board.top(10), [])
+        self.assertIsNone(board.rank(self.students[0].id))
+
+    def test_rebuild_fixes_corrupted_entry(self):
+        self.assertEqual(len(leaderboard.rebuild()), 4)
+        board = leaderboard.get_leaderboard(self.course.id)
+        self.assertEqual(board.rank(self.students[0].id), 1)
+
+        first, second = self.students[:2]
+        LeaderboardEntry.objects.filter(student=first).update(total_points=10)
+        LeaderboardEntry.objects.filter(student=second).delete()
+        self.assertEqual(
+            sorted(leaderboard.rebuild(check=True)),
+            [
+                (self.course.id, first.id, (10, 1), (90, 1)),
+                (self.course.id, second.id, None, (70, 1)),
+            ],
+        )
+        self.assertEqual(LeaderboardEntry.objects.count(), 3)
+
+        self.assertEqual(len(leaderboard.rebuild(course_id=self.course.id)), 2)
+        self.assertEqual(leaderboard.rebuild(check=True), [])
+        # Версия курса увеличена - массив в памяти перечитан
+        board = leaderboard.get_leaderboard(self.course.id)
+        self.assertEqual(board.entry(first.id)["total_points"], 90)
+        self.assertEqual(board.rank(second.id), 2)
+
+    def test_rebuild_archived_course(self):
+        leaderboard.rebuild()
+        archive.archive_course(self.course)
+        self.assertFalse(Submission.objects.exists())
+        self.assertEqual(leaderboard.rebuild(check=True), [])
+        out = StringIO()
+        call_command("rebuild_leaderboards", "--check", stdout=out)
+        self.assertIn("Рейтинги согласованы", out.getvalue())
+
+        first = self.students[0]
+        LeaderboardEntry.objects.filter(student=first).update(total_points=10)
+        self.assertEqual(
+            leaderboard.rebuild(course_id=self.course.id),
+            [(self.course.id, first.id, (10, 1), (90, 1))],
+        )
+        self.assertEqual(LeaderboardEntry.objects.count(), 4)
+        board = leaderboard.get_leaderboard(self.course.id)
+        self.assertEqual(board.rank(first.id), 1)
+
+    def test_rebuild_command(self):
+        leaderboard.rebuild()
+        LeaderboardEntry.objects.filter(student=self.students[0]).update(
+            total_points=10
+        )
+        with self.assertRaisesMessage(CommandError, "Найдено расхождений: 1"):
+            call_command("rebuild_leaderboards", "--check", stdout=StringIO())
+        out = StringIO()
+        call_command("rebuild_leaderboards", stdout=out)
+        self.assertIn("Исправлено записей: 1", out.getvalue())
+        out = StringIO()
+        call_command("rebuild_leaderboards", "--check", stdout=out)
+        self.assertIn("Рейтинги согласованы", out.getvalue())
+
+
+@override_settings(SHARD_DATABASES=["shard1", "shard2"])
+class ShardingTests(TestCase):
+    """Данные курса живут в базе курса; запросы по всем базам сливаются"""
+
+    databases = {"default", "shard1", "shard2"}
+
+    @classmethod
+    def setUpTestData(cls):
+        for alias in ("shard1", "shard2"):
+            sharding.reserve_id_ranges(using=alias)
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        cls.courses = [
+            Course.objects.create(title=title, teacher=cls.teacher)
+            for title in ("Алгебра", "Физика")
+        ]
+        for course in cls.courses:
+            course.students.add(cls.student)
+
+    def setUp(self):
+        cache.clear()
+        sharding._placement.clear()
+
+    def create_assignment(self, course, title="Задание"):
+        # Без подсказки (Assignment.objects.create) строка ушла бы в базу
+        # текущего запроса; объект направляется в базу своего курса
+        assignment = Assignment(
+            title=title,
+            description="Условие",
+            course=course,
+            teacher=self.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+        )
+        assignment.save()
+        return assignment
+
+    def rows(self, model, alias):
+        return list(model.objects.using(alias).values_list("id", flat=True))
+
+    def test_courses_are_placed_by_id(self):
+        shards = {course.shard for course in self.courses}
+        self.assertEqual(shards, {"shard1", "shard2"})
+        for course in self.courses:
+            self.assertEqual(course.shard, sharding.default_placement(course.id))
+            self.assertEqual(sharding.for_course(course.id), course.shard)
+
+    def test_writes_go_to_course_database(self):
+        for course in self.courses:
+            assignment = self.create_assignment(course)
+            submission = assignment.submissions.create(
+                student=self.student, content="ответ"
+            )
+            self.assertEqual(assignment._state.db, course.shard)
+            self.assertEqual(submission._state.db, course.shard)
+            self.assertEqual(sharding.home_database(assignment.id), course.shard)
+            self.assertEqual(sharding.home_database(submission.id), course.shard)
+            self.assertEqual(self.rows(Assignment, "default"), [])
+
+    def test_reserved_id_ranges(self):
+        first, second = (self.create_assignment(course) for course in self.courses)
+        for assignment in (first, second):
+            offset = sharding.id_offset(assignment._state.db)
+            self.assertGreater(assignment.id, offset)
+            self.assertLess(assignment.id, offset + sharding.id_range())
+
+    def test_reads_are_routed_by_url(self):
+        self.client.force_login(self.teacher)
+        for course in self.courses:
+            assignment = self.create_assignment(course, title=f"Задание {course.title}")
+            response = self.client.get(f"/assignments/{assignment.id}/")
+            self.assertContains(response, f"Задание {course.title}")
+            response = self.client.get(f"/courses/{course.id}/")
+            self.assertContains(response, f"Задание {course.title}")
+
+    def test_gather_and_count_span_all_databases(self):
+        assignments = [
+            self.create_assignment(course, title=f"{course.title} {number}")
+            for number in range(3)
+            for course in self.courses
+        ]
+        queryset = Assignment.objects.order_by("-id")
+        expected = sorted(assignment.id for assignment in assignments)[::-1]
+        self.assertEqual([row.id for row in sharding.gather(queryset)], expected)
+        self.assertEqual(
+            [row.id for row in sharding.gather(queryset[2:5])], expected[2:5]
+        )
+        self.assertEqual(sharding.count(queryset), 6)
+        self.assertEqual(sharding.count(queryset.filter(title__startswith="Физ")), 3)
+
+    def test_gather_repeats_sql_ordering(self):
+        grades = [None, 70, None, 90, 50, 70]
+        for number, grade in enumerate(grades):
+            assignment = self.create_assignment(self.courses[number % 2])
+            assignment.submissions.create(
+                student=self.student, content="ответ", grade=grade
+            )
+
+        def merged(queryset):
+            return [(row.grade, row.id) for row in sharding.gather(queryset)]
+
+        submissions = Submission.objects.all()
+        # NULL в SQLite меньше любого значения: при убывании - в конце
+        rows = merged(submissions.order_by("grade", "id"))
+        self.assertEqual([grade for grade, _ in rows], [None, None, 50, 70, 70, 90])
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row[0] or 0, row[1])))
+        self.assertEqual(
+            [grade for grade, _ in merged(submissions.order_by("-grade"))],
+            [90, 70, 70, 50, None, None],
+        )
+        self.assertEqual(
+            [
+                grade
+                for grade, _ in merged(
+                    submissions.order_by(F("grade").asc(nulls_last=True))
+                )
+            ],
+            [50, 70, 70, 90, None, None],
+        )
+        self.assertEqual(
+            list(
+                sharding.gather(
+                    submissions.order_by("-grade").values_list("grade", flat=True)[:2]
+                )
+            ),
+            [90, 70],
+        )
+
+        for ordering in ("assignment__title", "assignment", "?", Lower("content")):
+            with self.subTest(ordering=ordering):
+                with self.assertRaises(ValueError):
+                    sharding.gather(submissions.order_by(ordering))
+
+    def test_select_related_to_default_is_prefetched(self):
+        for course in self.courses:
+            assignment = self.create_assignment(course)
+            assignment.submissions.create(student=self.student, content="ответ")
+        for course in self.courses:
+            submissions = Submission.objects.using(course.shard).select_related(
+                "assignment__course", "student__profile"
+            )
+            for rows in (list(submissions), list(submissions.iterator(chunk_size=10))):
+                (submission,) = rows
+                with (
+                    self.assertNumQueries(0),
+                    self.assertNumQueries(0, using=course.shard),
+                ):
+                    self.assertEqual(submission.student.profile.role, "student")
+                    self.assertEqual(submission.assignment.course.title, course.title)
+
+    def test_placement_is_kept_in_process(self):
+        course = self.courses[0]
+        source = course.shard
+        target = next(alias for alias in ("shard1", "shard2") if alias != source)
+        with self.assertNumQueries(1):
+            sharding.for_course(course.id)
+            sharding.for_course(course.id)
+
+        sharding.move_course(course, target)
+        with self.assertNumQueries(1):
+            self.assertEqual(sharding.for_course(course.id), target)
+
+        # Перенос из другого процесса виден после SHARD_PLACEMENT_TTL
+        Course.objects.filter(pk=course.pk).update(shard=source)
+        self.assertEqual(sharding.for_course(course.id), target)
+        with override_settings(SHARD_PLACEMENT_TTL=0):
+            self.assertEqual(sharding.for_course(course.id), source)
+
+    def test_move_course(self):
+        course = self.courses[0]
+        source = course.shard
+        target = next(alias for alias in ("shard1", "shard2") if alias != source)
+        assignment = self.create_assignment(course)
+        for number in range(5):
+            student = User.objects.create_user(f"student{number}")
+            assignment.submissions.create(student=student, content="ответ")
+
+        moved = sharding.move_course(course, target, batch_size=2)
+
+        self.assertEqual(moved["submission"], 5)
+        self.assertEqual(Course.objects.get(pk=course.pk).shard, target)
+        self.assertEqual(sharding.for_course(course.id), target)
+        self.assertEqual(self.rows(Submission, source), [])
+        self.assertEqual(self.rows(Assignment, target), [assignment.id])
+        self.assertEqual(len(self.rows(Submission, target)), 5)
+
+    def test_failed_move_is_rolled_back_and_resumed(self):
+        course = self.courses[0]
+        source = course.shard
+        target = next(alias for alias in ("shard1", "shard2") if alias != source)
+        assignment = self.create_assignment(course)
+        assignment.submissions.create(student=self.student, content="ответ")
+
+        with mock.patch.object(
+            sharding.querycache, "invalidate", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                sharding.move_course(course, target)
+        # Последняя транзакция откатилась в обеих базах
+        self.assertEqual(Course.objects.get(pk=course.pk).shard, source)
+        self.assertEqual(self.rows(Assignment, source), [assignment.id])
+
+        sharding.move_course(Course.objects.get(pk=course.pk), target)
+        self.assertEqual(self.rows(Assignment, source), [])
+        self.assertEqual(self.rows(Submission, source), [])
+        self.assertEqual(self.rows(Assignment, target), [assignment.id])
+        self.assertEqual(len(self.rows(Submission, target)), 1)
+
+    def test_reminders_in_every_database(self):
+        User.objects.filter(pk=self.student.pk).update(email="student@school.ru")
+        for course in self.courses:
+            assignment = self.create_assignment(course)
+            assignment.status = "published"
+            assignment.due_date = timezone.now() + timedelta(hours=12)
+            assignment.save()
+        self.assertEqual(reminders.run_once(), 2)
+        self.assertEqual(reminders.run_once(), 0)
+        for course in self.courses:
+            alias = sharding.for_course(course)
+            self.assertEqual(DeadlineReminder.objects.using(alias).count(), 1)
+
+    def test_announcement_feed_limits_each_database(self):
+        for number in range(25):
+            self.courses[number % 2].announcements.create(
+                title=f"Объявление {number}", content="Текст", author=self.teacher
+            )
+        self.client.force_login(self.student)
+        with CaptureQueriesContext(connections["shard1"]) as queries:
+            response = self.client.get("/announcements/?page=2")
+        page = response.context["page"]
+        self.assertEqual(page.paginator.count, 25)
+        self.assertIsInstance(page.paginator.object_list, sharding.Paginated)
+        self.assertEqual(
+            [announcement.title for announcement in page.object_list],
+            [f"Объявление {number}" for number in range(4, -1, -1)],
+        )
+        selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if 'FROM "school_announcement"' in query["sql"]
+            and "COUNT" not in query["sql"]
+        ]
+        self.assertEqual(len(selects), 1)
+        # Вторая страница из 25 строк: первые 25 строк каждой базы, а не все
+        self.assertIn("LIMIT 25", selects[0])
+
+
+class ArchiveTests(TestCase):
+    """Архивация переносит все строки курса и оставляет курс для чтения"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.course.students.add(cls.student)
+        cls.assignment = Assignment.objects.create(
+            title="Старое задание",
+            description="Условие",
+            course=cls.course,
+            teacher=cls.teacher,
+            due_date=timezone.now() - timedelta(days=365),
+        )
+        for number in range(5):
+            student = User.objects.create_user(f"student{number}")
+            Profile.objects.create(user=student, role="student")
+            cls.assignment.submissions.create(student=student, content="ответ")
+        for number in range(3):
+            cls.course.announcements.create(
+                title=f"Объявление {number}", content="Текст", author=cls.teacher
+            )
+
+    def assertFullyArchived(self, submissions=5):
+        self.assertIsNotNone(Course.objects.get(pk=self.course.pk).archived_at)
+        self.assertFalse(Assignment.objects.exists())
+        self.assertFalse(Submission.objects.exists())
+        self.assertFalse(Announcement.objects.exists())
+        self.assertEqual(ArchivedAssignment.objects.count(), 1)
+        self.assertEqual(ArchivedSubmission.objects.count(), submissions)
+        self.assertEqual(ArchivedAnnouncement.objects.count(), 3)
+
+    def test_archive_course(self):
+        self.assertEqual(list(archive.closed_courses()), [self.course])
+        moved = archive.archive_course(self.course, batch_size=2)
+        self.assertEqual(
+            moved, {"assignments": 1, "submissions": 5, "announcements": 3}
+        )
+        self.assertFullyArchived()
+        self.assertEqual(list(archive.closed_courses()), [])
+
+    def test_rows_added_during_archive_are_not_lost(self):
+        drain = archive._drain
+        late = iter(User.objects.create_user(f"late{n}") for n in range(5))
+
+        def drain_then_submit(move, course, batch_size, atomic=True):
+            total = drain(move, course, batch_size, atomic)
+            if atomic and move is archive._move_announcements:
+                # Сдано, пока переносились объявления: больше одной пачки
+                for student in late:
+                    self.assignment.submissions.create(student=student, content="")
+            return total
+
+        with mock.patch.object(archive, "_drain", drain_then_submit):
+            moved = archive.archive_course(self.course, batch_size=2)
+        self.assertEqual(moved["submissions"], 10)
+        self.assertFullyArchived(submissions=10)
+
+    def test_interrupted_archive_resumes(self):
+        with mock.patch.object(
+            archive.querycache, "invalidate", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                archive.archive_course(self.course, batch_size=2)
+        # Пачки до сбоя уже в архиве, последняя транзакция откатилась
+        self.assertIsNone(Course.objects.get(pk=self.course.pk).archived_at)
+        self.assertTrue(Assignment.objects.exists())
+        self.assertEqual(ArchivedSubmission.objects.count(), 5)
+
+        archive.archive_course(Course.objects.get(pk=self.course.pk), batch_size=2)
+        self.assertFullyArchived()
+
+    def test_archived_course_is_read_only(self):
+        archive.archive_course(self.course)
+        self.client.force_login(self.teacher)
+        self.assertContains(
+            self.client.get(f"/courses/{self.course.id}/"), "Старое задание"
+        )
+        self.assertContains(
+            self.client.get(f"/assignments/{self.assignment.id}/"), "Старое задание"
+        )
+        self.client.post(
+            f"/courses/{self.course.id}/", {"title": "Новое", "content": "Текст"}
+        )
+        self.assertFalse(Announcement.objects.exists())
+
+        self.client.force_login(self.student)
+        response = self.client.post(
+            f"/assignment/{self.assignment.id}/submit/", {"content": "ответ"}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Submission.objects.exists())
+
+
+class DerivedSubmissionFieldsTests(TestCase):
+    """is_late и grade_percentage следуют за сроком и максимумом задания"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        cls.student = User.objects.create_user("student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.assignment = Assignment.objects.create(
+            title="Задание",
+            description="Условие",
+            course=cls.course,
+            teacher=cls.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+            max_points=50,
+        )
+        cls.submission = cls.assignment.submissions.create(
+            student=cls.student, content="ответ", grade=45
+        )
+
+    def derived(self):
+        submission = Submission.objects.get(pk=self.submission.pk)
+        return submission.is_late, submission.grade_percentage
+
+    def test_fields_are_computed_on_save(self):
+        self.assertEqual(self.derived(), (False, 90.0))
+        self.submission.grade = 10
+        self.submission.save(update_fields=["grade"])
+        self.assertEqual(self.derived(), (False, 20.0))
+
+    def test_due_date_change_recomputes_lateness(self):
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        assignment.due_date = self.submission.submitted_at - timedelta(hours=1)
+        assignment.save()
+        self.assertEqual(self.derived(), (True, 90.0))
+        assignment.due_date = self.submission.submitted_at + timedelta(hours=1)
+        assignment.save()
+        self.assertEqual(self.derived(), (False, 90.0))
+
+    def test_max_points_change_recomputes_percentage(self):
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        assignment.max_points = 90
+        assignment.save()
+        self.assertEqual(self.derived(), (False, 50.0))
+
+    def test_unchanged_assignment_does_not_recompute(self):
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        assignment.title = "Новое название"
+        with mock.patch.object(Assignment, "recompute_submissions") as recompute:
+            assignment.save()
+        recompute.assert_not_called()
+
+    def test_ungraded_percentage_is_null(self):
+        self.submission.grade = None
+        self.submission.save()
+        self.assertEqual(self.derived(), (False, None))
+        self.submission.grade = 0
+        self.submission.save()
+        self.assertEqual(self.derived(), (False, 0.0))
+        assignment = Assignment.objects.get(pk=self.assignment.pk)
+        Submission.objects.update(grade=None)
+        assignment.recompute_submissions()
+        self.assertEqual(self.derived(), (False, None))
+
+    def test_backfill_command(self):
+        ungraded = self.assignment.submissions.create(
+            student=User.objects.create_user("other"), content="ответ"
+        )
+        late = Assignment.objects.create(
+            title="Прошлое задание",
+            description="Условие",
+            course=self.course,
+            teacher=self.teacher,
+            due_date=timezone.now() - timedelta(days=1),
+        ).submissions.create(student=self.student, content="ответ", grade=30)
+        Submission.objects.update(is_late=False, grade_percentage=0)
+        out = StringIO()
+        with CaptureQueriesContext(connections["default"]) as queries:
+            call_command("backfill_submission_fields", stdout=out)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.derived(), (False, 90.0))
+        ungraded.refresh_from_db()
+        self.assertIsNone(ungraded.grade_percentage)
+        late.refresh_from_db()
+        self.assertEqual((late.is_late, late.grade_percentage), (True, 30.0))
+        self.assertIn("Обработано решений: 3", out.getvalue())
+
+
+@override_settings(HOT_TEMPLATES_ENGINE="django")
+class StudentSubmissionAnnotationTests(TestCase):
+    """``my_submission_id``, ``my_grade`` и ``my_is_late`` у заданий ученика"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        cls.other = User.objects.create_user("other")
+        Profile.objects.create(user=cls.other, role="student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.course.students.add(cls.student, cls.other)
+
+        def assignment(title, days):
+            return cls.course.assignments.create(
+                title=title,
+                description="Условие",
+                teacher=cls.teacher,
+                due_date=timezone.now() + timedelta(days=days),
+                status="published",
+            )
+
+        graded = assignment("Оценено", 7)
+        cls.graded = graded.submissions.create(
+            student=cls.student, content="ответ", grade=90
+        )
+        # Срок прошёл до отправки - решение с опозданием
+        late = assignment("С опозданием", -1)
+        cls.late = late.submissions.create(student=cls.student, content="ответ")
+        # Решение другого ученика не должно попасть в строку задания
+        assignment("Не сдано", 7).submissions.create(
+            student=cls.other, content="ответ", grade=50
+        )
+
+    def setUp(self):
+        cache.clear()
+        querycache.clear()
+        self.client.force_login(self.student)
+
+    def expected(self):
+        return {
+            "Оценено": (self.graded.id, 90, False),
+            "С опозданием": (self.late.id, None, True),
+            "Не сдано": (None, None, None),
+        }
+
+    def mine(self, assignments):
+        return {
+            a.title: (a.my_submission_id, a.my_grade, a.my_is_late) for a in assignments
+        }
+
+    def test_annotations(self):
+        assignments = views._with_student_submission(
+            Assignment.objects.filter(course=self.course), self.student
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(self.mine(assignments), self.expected())
+
+    def test_course_page(self):
+        response = self.client.get(f"/courses/{self.course.id}/")
+        self.assertEqual(self.mine(response.context["assignments"]), self.expected())
+        for engine in ("django", "jinja2"):
+            with (
+                self.subTest(engine=engine),
+                self.settings(HOT_TEMPLATES_ENGINE=engine),
+            ):
+                response = self.client.get(f"/courses/{self.course.id}/")
+                self.assertContains(response, "Оценка: 90/100")
+                self.assertContains(response, "Сдано с опозданием")
+                self.assertNotContains(response, "Оценка: 50/100")
+
+    def test_student_dashboard(self):
+        response = self.client.get("/dashboard/")
+        expected = self.expected()
+        del expected["С опозданием"]  # срок прошёл - не в списке активных
+        self.assertEqual(self.mine(response.context["active_assignments"]), expected)
+        self.assertContains(response, f"/submission/{self.graded.id}/view/")
+        self.assertContains(response, "оценка 90/100")
+
+    def test_archived_course(self):
+        archive.archive_course(self.course)
+        response = self.client.get(f"/courses/{self.course.id}/")
+        assignments = response.context["assignments"]
+        self.assertEqual(assignments.model, ArchivedAssignment)
+        self.assertEqual(self.mine(assignments), self.expected())
+
+
+class SimilarityTests(TestCase):
+    """Список решений показывает сохранённый анализ и не пересчитывает его"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.assignment = Assignment.objects.create(
+            title="Задание",
+            description="Условие",
+            course=cls.course,
+            teacher=cls.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+        )
+        for number in range(2):
+            student = User.objects.create_user(f"student{number}")
+            Profile.objects.create(user=student, role="student")
+            cls.assignment.submissions.create(
+                student=student, content="print(sum(map(int, input().split())))"
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+
+    def submissions_page(self):
+        return self.client.get(f"/assignments/{self.assignment.id}/submissions/")
+
+    def test_page_does_not_run_analysis(self):
+        with mock.patch.object(similarity, "analyze_assignment") as analyze:
+            response = self.submissions_page()
+        analyze.assert_not_called()
+        self.assertEqual(response.context["similar_pairs"], [])
+        self.assertIsNone(response.context["similarity_analysis"])
+
+    def test_page_shows_stored_analysis(self):
+        call_command("analyze_similarity", stdout=StringIO())
+        response = self.submissions_page()
+        self.assertEqual(len(response.context["similar_pairs"]), 1)
+        self.assertFalse(response.context["similarity_analysis"]["outdated"])
+
+        student = User.objects.create_user("late")
+        Profile.objects.create(user=student, role="student")
+        self.assignment.submissions.create(student=student, content="другое")
+        response = self.submissions_page()
+        self.assertEqual(len(response.context["similar_pairs"]), 1)
+        self.assertTrue(response.context["similarity_analysis"]["outdated"])
+        self.assertContains(response, "при следующем запуске")
+
+    def test_analysis_is_stored_in_database(self):
+        pairs = similarity.analyze_assignment(self.assignment)
+        self.assertEqual(len(pairs), 1)
+        cache.clear()
+        stored = similarity.stored_analysis(self.assignment)
+        self.assertEqual(stored["pairs"], pairs)
+        self.assertFalse(stored["outdated"])
+        with mock.patch.object(similarity, "find_candidates") as find:
+            self.assertEqual(similarity.analyze_assignment(self.assignment), pairs)
+        find.assert_not_called()
+
+
+class MinHashTests(SimpleTestCase):
+    """Оценки Жаккара по сигнатурам и полнота кандидатов LSH"""
+
+    def setUp(self):
+        rnd = random.Random(7)
+        self.rnd = rnd
+        self.vocab = [
+            "".join(rnd.choice("abcdefghij") for _ in range(6)) for _ in range(3000)
+        ]
+
+    def pair(self, shared, words=80):
+        """Два текста из ``words`` слов, первые ``shared`` из которых общие"""
+        base = self.rnd.sample(self.vocab, words)
+        other = base[:shared] + self.rnd.sample(self.vocab, words - shared)
+        return " ".join(base), " ".join(other)
+
+    def test_estimates_known_overlaps(self):
+        text = " ".join(self.vocab[:100])
+        self.assertEqual(similarity.estimate(*[similarity.minhash(text)] * 2), 1.0)
+        empty = similarity.minhash("")
+        self.assertEqual(similarity.estimate(empty, empty), 1.0)
+
+        errors = []
+        for shared in range(0, 81, 4):
+            a, b = self.pair(shared)
+            errors.append(
+                similarity.estimate(similarity.minhash(a), similarity.minhash(b))
+                - similarity.jaccard(a, b)
+            )
+        # Ошибка одной оценки ~ sqrt(J(1-J)/NUM_PERM) <= 0.07; среднее без смещения
+        self.assertLess(max(map(abs, errors)), 0.25)
+        self.assertLess(sum(map(abs, errors)) / len(errors), 0.08)
+        self.assertLess(abs(sum(errors) / len(errors)), 0.03)
+
+    def test_lsh_candidate_recall(self):
+        signatures = []
+        similar = set()
+        for number in range(30):
+            a, b = self.pair(self.rnd.randrange(70, 80))
+            signatures += [(2 * number, a), (2 * number + 1, b)]
+            similar.add((2 * number, 2 * number + 1))
+        for number in range(60, 100):
+            signatures.append((number, self.pair(0)[0]))
+
+        candidates = similarity.find_candidates(
+            (submission_id, similarity.minhash(text))
+            for submission_id, text in signatures
+        )
+        # J >= 0.75: вероятность пропуска (1 - J**ROWS) ** BANDS < 0.1%
+        self.assertLessEqual(similar, candidates)
+        self.assertLess(len(candidates - similar), 10)
+
+
+@override_settings(HOT_TEMPLATES_ENGINE="django")
+class AsyncViewsTests(TestCase):
+    """Async-панели и статистика передают шаблону то же, что синхронные"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        for title in ("Алгебра", "Физика"):
+            course = Course.objects.create(title=title, teacher=cls.teacher)
+            course.students.add(cls.student)
+            course.announcements.create(
+                title=f"Начало курса {title}", content="Текст", author=cls.teacher
+            )
+            for number, due in enumerate((-2, 3, 5)):
+                assignment = Assignment.objects.create(
+                    title=f"{title} {number}",
+                    description="Условие",
+                    course=course,
+                    teacher=cls.teacher,
+                    due_date=now + timedelta(days=due),
+                    status="published",
+                )
+                if number:
+                    assignment.submissions.create(
+                        student=cls.student,
+                        content="ответ",
+                        grade=70 + number * 10 if number == 1 else None,
+                    )
+
+    def normalize(self, value):
+        if isinstance(value, dict):
+            return {key: self.normalize(item) for key, item in value.items()}
+        if isinstance(value, (str, int, float, type(None))):
+            return value
+        if hasattr(value, "_meta"):
+            annotations = (
+                "my_submission_id",
+                "my_grade",
+                "my_is_late",
+                "avg_grade",
+                "distribution",
+            )
+            return (
+                value._meta.label,
+                value.pk,
+                {
+                    name: getattr(value, name)
+                    for name in annotations
+                    if hasattr(value, name)
+                },
+            )
+        return [self.normalize(item) for item in value]
+
+    def contexts(self, user, sync_url, async_url, keys):
+        self.client.force_login(user)
+        sync_context = self.client.get(sync_url).context
+        client = AsyncClient()
+        client.force_login(user)
+        async_context = async_to_sync(client.get)(async_url).context
+        for key in keys:
+            with self.subTest(key=key):
+                self.assertEqual(
+                    self.normalize(async_context[key]),
+                    self.normalize(sync_context[key]),
+                )
+
+    def test_teacher_dashboard(self):
+        self.contexts(
+            self.teacher,
+            "/dashboard/",
+            "/async/dashboard/",
+            [
+                "courses",
+                "assignments",
+                "submissions_to_grade",
+                "stats",
+                "recent_announcements",
+            ],
+        )
+
+    def test_student_dashboard(self):
+        self.contexts(
+            self.student,
+            "/dashboard/",
+            "/async/dashboard/",
+            [
+                "courses",
+                "active_assignments",
+                "overdue_assignments",
+                "recent_submissions",
+                "grades",
+            ],
+        )
+
+    def test_teacher_statistics(self):
+        self.contexts(
+            self.teacher,
+            "/statistics/",
+            "/async/statistics/",
+            [
+                "courses_count",
+                "assignments_count",
+                "students_count",
+                "courses_stats",
+                "monthly_stats",
+            ],
+        )
+
+
+class AnnouncementFeedTests(TestCase):
+    """Лента объявлений и счётчик непрочитанных по отметке ученика"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.other = Course.objects.create(title="Физика", teacher=cls.teacher)
+        cls.course.students.add(cls.student)
+
+    def announce(self, course, title):
+        return course.announcements.create(
+            title=title, content="Текст", author=self.teacher
+        )
+
+    def unread(self):
+        return AnnouncementReadMarker.objects.get(user=self.student).unread_count
+
+    def test_unread_count_follows_announcements(self):
+        first = self.announce(self.course, "Первое")
+        self.announce(self.course, "Второе")
+        self.announce(self.other, "Чужой курс")
+        self.assertEqual(self.unread(), 2)
+        first.delete()
+        self.assertEqual(self.unread(), 1)
+        marker = AnnouncementReadMarker.objects.get(user=self.student)
+        self.assertEqual(marker.recount(), 1)
+
+    def test_feed_marks_announcements_read(self):
+        for title in ("Первое", "Второе"):
+            self.announce(self.course, title)
+        self.announce(self.other, "Чужой курс")
+        self.client.force_login(self.student)
+        self.assertEqual(
+            self.client.get("/courses/").context["unread_announcements"], 2
+        )
+
+        response = self.client.get("/announcements/")
+        self.assertEqual(
+            [item.title for item in response.context["page"].object_list],
+            ["Второе", "Первое"],
+        )
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(
+            self.client.get("/announcements/").context["unread_announcements"], 0
+        )
+
+    def test_later_pages_do_not_mark_read(self):
+        for number in range(25):
+            self.announce(self.course, f"Объявление {number}")
+        self.client.force_login(self.student)
+        response = self.client.get("/announcements/?page=2")
+        self.assertEqual(len(response.context["page"].object_list), 5)
+        self.assertEqual(self.unread(), 25)
+
+    def test_rebuild_command(self):
+        self.announce(self.course, "Первое")
+        AnnouncementReadMarker.objects.update(unread_count=7)
+        out = StringIO()
+        call_command("rebuild_announcement_markers", stdout=out)
+        self.assertEqual(self.unread(), 1)
+        self.assertIn("Исправлено счётчиков: 1", out.getvalue())
+
+
+class ActivityFeedTests(TestCase):
+    """Курсор ленты активности не съезжает при новых событиях"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user("student")
+        Profile.objects.create(user=cls.student, role="student")
+        cls.outsider = User.objects.create_user("outsider")
+        Profile.objects.create(user=cls.outsider, role="student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.course.students.add(cls.student)
+        cls.now = timezone.now()
+
+    def event(self, title, created_at):
+        return ActivityEvent.objects.create(
+            user=self.student,
+            course=self.course,
+            kind="submission",
+            target_id=1,
+            title=title,
+            course_title=self.course.title,
+            created_at=created_at,
+        )
+
+    def read_all(self, feed, limit, between_pages=None):
+        titles, cursor = [], None
+        while True:
+            events, cursor = feed(before=cursor, limit=limit)
+            titles += [event.title for event in events]
+            if cursor is None:
+                return titles
+            if between_pages:
+                between_pages()
+
+    def test_pages_do_not_shift_when_events_arrive(self):
+        # Одинаковое время у соседних событий: порядок задаёт id
+        for number in range(7):
+            self.event(f"Событие {number}", self.now - timedelta(minutes=number // 3))
+        expected = [
+            event.title for event in activity.user_feed(self.student, limit=10)[0]
+        ]
+        self.assertEqual(len(expected), 7)
+
+        arrived = iter(range(100))
+
+        def new_events():
+            number = next(arrived)
+            self.event(f"Новое {number}", self.now + timedelta(minutes=1))
+            # В ту же микросекунду, что и уже показанные события
+            self.event(f"Новое в то же время {number}", self.now)
+
+        feeds = {
+            "user": lambda **kwargs: activity.user_feed(self.student, **kwargs),
+            "course": lambda **kwargs: activity.course_feed(self.course, **kwargs),
+        }
+        for name, feed in feeds.items():
+            with self.subTest(feed=name):
+                ActivityEvent.objects.filter(title__startswith="Новое").delete()
+                self.assertEqual(
+                    self.read_all(feed, limit=2, between_pages=new_events), expected
+                )
+
+    def test_cursor(self):
+        event = self.event("Событие", self.now)
+        cursor = activity.encode_cursor(event)
+        self.assertEqual(activity.decode_cursor(cursor), (event.created_at, event.id))
+        for broken in (None, "", "abc", "1_2_3", "x_1", "9" * 40 + "_1"):
+            with self.subTest(cursor=broken):
+                self.assertIsNone(activity.decode_cursor(broken))
+
+    def test_views(self):
+        for number in range(activity.PER_PAGE + 3):
+            self.event(f"Событие {number}", self.now - timedelta(minutes=number))
+        self.client.force_login(self.student)
+        for url in ("/activity/", "/courses/%d/activity/" % self.course.id):
+            with self.subTest(url=url):
+                ActivityEvent.objects.filter(title="Новое").delete()
+                first = self.client.get(url).json()
+                self.assertEqual(len(first["events"]), activity.PER_PAGE)
+                self.event("Новое", self.now + timedelta(minutes=1))
+                second = self.client.get(url, {"before": first["next"]}).json()
+                self.assertEqual(
+                    [event["title"] for event in second["events"]],
+                    [
+                        f"Событие {number}"
+                        for number in range(activity.PER_PAGE, activity.PER_PAGE + 3)
+                    ],
+                )
+                self.assertIsNone(second["next"])
+
+        self.client.force_login(self.outsider)
+        response = self.client.get("/courses/%d/activity/" % self.course.id)
+        self.assertEqual(response.status_code, 403)
+
+
+class DeadlineReminderTests(TestCase):
+    """Напоминание о сроке уходит каждому ученику не больше одного раза"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.students = [
+            User.objects.create_user(f"student{n}", email=f"student{n}@school.ru")
+            for n in range(3)
+        ]
+        cls.course.students.add(*cls.students)
+        cls.assignment = Assignment.objects.create(
+            title="Задание",
+            description="Условие",
+            course=cls.course,
+            teacher=cls.teacher,
+            due_date=timezone.now() + timedelta(hours=12),
+            status="published",
+        )
+
+    def recipients(self):
+        return sorted(address for message in mail.outbox for address in message.to)
+
+    def test_each_student_is_reminded_once(self):
+        self.assignment.submissions.create(student=self.students[0], content="ответ")
+        self.assertEqual(reminders.run_once(), 2)
+        self.assertEqual(reminders.run_once(), 0)
+        self.assertEqual(
+            self.recipients(), ["student1@school.ru", "student2@school.ru"]
+        )
+        self.assertIn("«Задание»", mail.outbox[0].subject)
+
+    def test_students_without_email_are_marked(self):
+        User.objects.filter(pk=self.students[2].pk).update(email="")
+        self.assertEqual(reminders.run_once(), 2)
+        self.assertEqual(self.assignment.reminders.count(), 3)
+
+    def test_outside_window_is_not_reminded(self):
+        self.assertEqual(reminders.run_once(window=timedelta(hours=1)), 0)
+        self.assertFalse(self.assignment.reminders.exists())
+
+    def test_concurrent_pass_does_not_resend(self):
+        # Второй проход запускается, пока первый отправляет письма
+        second = []
+        send_messages = EmailBackend.send_messages
+
+        def send_and_run_again(connection, messages):
+            if not second:
+                second.append(reminders.run_once())
+            return send_messages(connection, messages)
+
+        with mock.patch.object(EmailBackend, "send_messages", send_and_run_again):
+            self.assertEqual(reminders.run_once(), 3)
+        self.assertEqual(second, [0])
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_students_are_read_in_batches(self):
+        more = [
+            User.objects.create_user(f"more{n}", email=f"more{n}@school.ru")
+            for n in range(3)
+        ]
+        self.course.students.add(*more)
+        self.assignment.submissions.create(student=self.students[1], content="ответ")
+        with CaptureQueriesContext(connections["default"]) as queries:
+            self.assertEqual(reminders.run_once(batch_size=2), 5)
+        enrolled = [
+            q["sql"]
+            for q in queries.captured_queries
+            if 'FROM "school_course_students"' in q["sql"]
+        ]
+        # 6 учеников по 2 и пустая пачка в конце
+        self.assertEqual(len(enrolled), 4)
+        self.assertTrue(all("LIMIT 2" in sql for sql in enrolled))
+        self.assertEqual(len(set(self.recipients())), 5)
+
+    def test_failed_send_is_not_retried(self):
+        with mock.patch.object(EmailBackend, "send_messages", side_effect=OSError):
+            with self.assertRaises(OSError):
+                reminders.run_once()
+        self.assertEqual(reminders.run_once(), 0)
+        self.assertEqual(mail.outbox, [])
+
+
+class ProfilingTests(TestCase):
+    """Профилируются только выбранные запросы; профили объединяются"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        overrides = override_settings(
+            PROFILING_DIR=self.directory, PROFILING_INTERVAL=0.001
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def slow_view(self, request):
+        time.sleep(0.05)
+        return HttpResponse("ok")
+
+    def request(self, user=None, **headers):
+        request = RequestFactory().get("/", headers=headers)
+        if user is not None:
+            self.client.force_login(user)
+            name = settings.SESSION_COOKIE_NAME
+            request.COOKIES[name] = self.client.cookies[name].value
+        middleware = profiling.SamplingProfilerMiddleware(self.slow_view)
+        return middleware(request)
+
+    def profiles(self):
+        return sorted(self.directory.glob("*/*.txt"))
+
+    def test_signed_header_profiles_request(self):
+        user = User.objects.create_user("dev", password="pass")
+        self.request(user, x_profile=profiling.debug_header_value(user))
+        (path,) = self.profiles()
+        self.assertEqual(path.parent.name, "unresolved")
+        self.assertIn("school.tests:ProfilingTests.slow_view", path.read_text())
+
+    def test_unsampled_and_forged_requests_are_not_profiled(self):
+        user = User.objects.create_user("dev", password="pass")
+        self.request()
+        self.request(user, x_profile=f"{user.pk}:forged:forged")
+        self.assertEqual(self.profiles(), [])
+
+    def test_header_is_bound_to_user(self):
+        user = User.objects.create_user("dev", password="pass")
+        other = User.objects.create_user("other", password="pass")
+        header = profiling.debug_header_value(user)
+        self.request(x_profile=header)
+        self.request(other, x_profile=header)
+        self.assertEqual(self.profiles(), [])
+
+    @override_settings(PROFILING_HEADER_MAX_AGE=60)
+    def test_expired_header_is_rejected(self):
+        user = User.objects.create_user("dev", password="pass")
+        with mock.patch("django.core.signing.time.time", return_value=time.time() - 61):
+            header = profiling.debug_header_value(user)
+        self.request(user, x_profile=header)
+        self.assertEqual(self.profiles(), [])
+
+    def test_header_command(self):
+        user = User.objects.create_user("dev", password="pass")
+        out = StringIO()
+        call_command("profile_stacks", "--header", "dev", stdout=out)
+        header = out.getvalue().strip().removeprefix("X-Profile: ")
+        self.request(user, x_profile=header)
+        self.assertEqual(len(self.profiles()), 1)
+        with self.assertRaises(CommandError):
+            call_command("profile_stacks", "--header", "nobody")
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sample_rate(self):
+        self.request()
+        self.assertEqual(len(self.profiles()), 1)
+
+    @override_settings(PROFILING_MAX_FILES=2)
+    def test_old_profiles_are_removed_and_collapsed(self):
+        for _ in range(3):
+            profiling.save("course_detail", Counter({"a;b": 2, "a": 1}))
+        self.assertEqual(len(self.profiles()), 2)
+        self.assertEqual(profiling.collapse(), {"a;b": 4, "a": 2})
+
+        out = StringIO()
+        call_command("profile_stacks", "course_detail", stdout=out)
+        self.assertEqual(out.getvalue(), "a 2\na;b 4\n")
+
+
+class ServerTimingTests(TestCase):
+    """Server-Timing раскладывает время ответа на SQL, кеш и шаблоны"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        Course.objects.create(title="Алгебра", teacher=cls.teacher)
+
+    def setUp(self):
+        self.client.force_login(self.teacher)
+
+    def metrics(self, response):
+        metrics = {}
+        for part in response["Server-Timing"].split(", "):
+            name, *params = part.split(";")
+            metrics[name] = dict(param.split("=", 1) for param in params)
+        return metrics
+
+    def test_header_breaks_down_request(self):
+        # Тестовый раннер подменяет Template._render поверх обёртки install()
+        timed = timing._timed_render(Template._render)
+        with (
+            mock.patch.object(Template, "_render", timed),
+            CaptureQueriesContext(connections["default"]) as queries,
+        ):
+            response = self.client.get("/courses/")
+        metrics = self.metrics(response)
+        self.assertEqual(
+            metrics["db"]["desc"], f'"{len(queries.captured_queries)} queries"'
+        )
+        self.assertIn("view", metrics)
+        self.assertIn("tpl.my_courses.html", metrics)
+        self.assertEqual(metrics["tpl.my_courses.html"]["desc"], '"my_courses.html x1"')
+        self.assertLessEqual(
+            float(metrics["view"]["dur"]), float(metrics["total"]["dur"])
+        )
+
+    def test_async_view_queries_are_counted(self):
+        client = AsyncClient()
+        client.force_login(self.teacher)
+        response = async_to_sync(client.get)("/async/dashboard/")
+        self.assertNotEqual(self.metrics(response)["db"]["desc"], '"0 queries"')
+
+    def test_cache_hits_and_misses(self):
+        timings = timing.RequestTimings()
+        token = timing._current.set(timings)
+        try:
+            cache.set("timing-test", 1)
+            cache.get("timing-test")
+            cache.get("timing-missing")
+        finally:
+            timing._current.reset(token)
+        self.assertEqual(
+            (timings.cache_calls, timings.cache_hits, timings.cache_misses), (3, 1, 1)
+        )
+
+    def test_header_is_ascii(self):
+        timings = timing.RequestTimings()
+        timings.templates["курс.html"] = [0.01, 1]
+        self.assertTrue(timing.header_value(timings).isascii())
+
+    @override_settings(SERVER_TIMING_LOG=True)
+    def test_log(self):
+        with self.assertLogs("school.timing", "INFO") as logs:
+            self.client.get("/courses/")
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "my_courses")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["db_queries"], 0)
+
+
+class MetricsTests(TestCase):
+    """Метрики процессов складываются, в том числе завершившихся"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        overrides = override_settings(METRICS_DIR=self.directory)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # Чистое состояние процесса: другие тесты тоже считают запросы
+        for name, value in (
+            ("_counters", {}),
+            ("_histograms", {}),
+            ("_written_path", None),
+        ):
+            patcher = mock.patch.object(metrics, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, pid, requests):
+        state = {
+            "counters": [["school_http_requests_total", ["x", "GET", "200"], requests]],
+            "histograms": [],
+        }
+        (self.directory / f"{pid}.json").write_text(json.dumps(state))
+
+    def requests_total(self):
+        counters, _ = metrics.collect()
+        return counters.get(("school_http_requests_total", ("x", "GET", "200")), 0)
+
+    def dead_pid(self):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        return process.pid
+
+    def test_dead_process_file_is_archived(self):
+        dead = self.dead_pid()
+        self.write(dead, 3)
+        self.write(os.getppid(), 2)
+
+        self.assertEqual(self.requests_total(), 5)
+        self.assertFalse((self.directory / f"{dead}.json").exists())
+        self.assertTrue((self.directory / f"{os.getppid()}.json").exists())
+        self.assertTrue((self.directory / metrics.ARCHIVE).exists())
+        # Повторный сбор не считает архив дважды
+        self.assertEqual(self.requests_total(), 5)
+
+        self.write(self.dead_pid(), 1)
+        self.assertEqual(self.requests_total(), 6)
+
+    def test_reused_pid_file_is_archived_on_first_flush(self):
+        self.write(os.getpid(), 4)
+        self.assertEqual(self.requests_total(), 4)
+
+        metrics.REQUESTS.inc(view="x", method="GET", status=200)
+        metrics.flush(force=True)
+
+        archived = json.loads((self.directory / metrics.ARCHIVE).read_text())
+        self.assertEqual(archived["counters"][0][2], 4)
+        self.assertEqual(self.requests_total(), 5)
+        metrics.flush(force=True)
+        self.assertEqual(self.requests_total(), 5)
+
+    def test_endpoint_and_method_label(self):
+        self.client.force_login(self.teacher)
+        self.client.get("/courses/")
+        self.client.generic("PROPFIND", "/courses/")
+
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn(
+            'school_http_requests_total{view="my_courses",method="GET",status="200"} 1',
+            body,
+        )
+        self.assertIn('view="my_courses",method="other"', body)
+        self.assertNotIn("PROPFIND", body)
+
+
+class SlowQueryLogTests(TestCase):
+    """Медленные запросы попадают в журнал с местом вызова"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log = Path(directory.name) / "slow.log"
+
+    def entry(self, fingerprint, ms, view="my_courses"):
+        return {
+            "ms": ms,
+            "fingerprint": fingerprint,
+            "sql": fingerprint,
+            "view": view,
+            "caller": "school.views:my_courses",
+        }
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            slowqueries.fingerprint(
+                'SELECT "t1"."id" FROM "school_course" "t1" '
+                "WHERE \"t1\".\"id\" IN (1, 2, 3) AND title = 'it''s'  AND x > -1.5"
+            ),
+            'SELECT "t1"."id" FROM "school_course" "t1" '
+            'WHERE "t1"."id" IN (?+) AND title = ? AND x > ?',
+        )
+        self.assertEqual(
+            slowqueries.fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s)"),
+            slowqueries.fingerprint("SELECT 1 FROM t WHERE id IN (%s)"),
+        )
+
+    def test_slow_queries_are_logged_with_view_and_caller(self):
+        self.client.force_login(self.teacher)
+        with (
+            override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=self.log),
+            self.assertLogs("school.slowqueries", "WARNING") as logs,
+        ):
+            self.client.get("/courses/")
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        self.assertTrue(entries)
+        self.assertEqual({entry["view"] for entry in entries}, {"my_courses"})
+        self.assertEqual({entry["alias"] for entry in entries}, {"default"})
+        self.assertIn("school.views:my_courses", {entry["caller"] for entry in entries})
+
+    @override_settings(SLOW_QUERY_THRESHOLD=None)
+    def test_disabled(self):
+        with self.assertNoLogs("school.slowqueries"):
+            list(Course.objects.all())
+
+    def test_command_aggregates_rotated_logs(self):
+        rotated = self.log.with_name(self.log.name + ".1")
+        rotated.write_text(
+            "".join(
+                json.dumps(self.entry("SELECT ?", ms)) + "\n" for ms in range(1, 101)
+            )
+        )
+        self.log.write_text(
+            json.dumps(self.entry("UPDATE t SET x = ?", 500, view="grade")) + "\n"
+            "не JSON\n"
+        )
+
+        out = StringIO()
+        call_command("slow_queries", log=str(self.log), json=True, stdout=out)
+        rows = json.loads(out.getvalue())
+        self.assertEqual(
+            [row["fingerprint"] for row in rows], ["SELECT ?", "UPDATE t SET x = ?"]
+        )
+        select = rows[0]
+        self.assertEqual(select["count"], 100)
+        self.assertEqual(
+            (select["p50_ms"], select["p95_ms"], select["p99_ms"]), (50, 95, 99)
+        )
+        self.assertEqual(select["views"], [["my_courses", 100]])
+
+        out = StringIO()
+        call_command(
+            "slow_queries", log=str(self.log), sort="max", view="grade", stdout=out
+        )
+        self.assertIn("1. 1 раз, всего 500 мс", out.getvalue())
+
+
+class LoadTestTests(LiveServerTestCase):
+    """Нагрузочный тест против живого сервера и его отчёт"""
+
+    scenario = {
+        "name": "tiny",
+        "prefix": "loadtiny",
+        "students": 3,
+        "concurrency": 2,
+        "duration": 1,
+        "ramp_up": 0,
+        "think_time": [0.05, 0.1],
+        "content_size": 100,
+        "file_size": 500,
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        overrides = override_settings(
+            MEDIA_ROOT=self.directory / "media",
+            METRICS_DIR=self.directory / "metrics",
+            # PBKDF2 при входе занимает почти всю секунду сценария
+            PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def write_scenario(self, **changes):
+        path = self.directory / "scenario.json"
+        path.write_text(json.dumps({**self.scenario, **changes}))
+        return str(path)
+
+    def test_unknown_action(self):
+        with self.assertRaises(CommandError):
+            call_command("load_test", self.write_scenario(actions={"delete": 1}))
+
+    def test_run_against_live_server(self):
+        report_path = self.directory / "report.json"
+        # Потоки живого сервера делят одно соединение с базой SQLite в памяти:
+        # параллельные запросы ломают его транзакции
+        call_command(
+            "load_test",
+            self.write_scenario(concurrency=1),
+            prepare=True,
+            base_url=self.live_server_url,
+            report=str(report_path),
+            stdout=StringIO(),
+        )
+        report = json.loads(report_path.read_text())
+
+        self.assertEqual(report["actions"]["login"]["requests"], 1)
+        self.assertEqual(report["errors"], 0, report["status_codes"])
+        self.assertGreater(report["requests"], 1)
+        self.assertEqual(set(report["status_codes"]) - {"200", "302"}, set())
+        submitted = sum(
+            report["actions"].get(action, {}).get("requests", 0)
+            for action in ("submit", "submit_file")
+        )
+        assignment = Assignment.objects.get(title=load_test.SURGE_TITLE)
+        self.assertEqual(assignment.submissions.count(), min(submitted, 1))
+
+        out = StringIO()
+        call_command(
+            "load_test",
+            self.write_scenario(duration=0),
+            base_url=self.live_server_url,
+            compare=str(report_path),
+            stdout=out,
+        )
+        self.assertIn("login: p50", out.getvalue())
+
+    def test_summary(self):
+        results = [
+            ("dashboard", 200, duration / 1000, True) for duration in range(1, 101)
+        ]
+        results.append(("submit", 500, 0.2, False))
+        report = loadtest.summarize(self.scenario, "http://x", results, 0, 10)
+
+        self.assertEqual(report["requests"], 101)
+        self.assertEqual(report["status_codes"], {"200": 100, "500": 1})
+        self.assertEqual(report["actions"]["submit"]["error_rate"], 1)
+        dashboard = report["actions"]["dashboard"]
+        self.assertEqual((dashboard["p50_ms"], dashboard["max_ms"]), (50.5, 100))
+        self.assertEqual(dashboard["throughput_rps"], 10)
+        # Отчёты разных версий сравниваются diff'ом: ключи упорядочены
+        self.assertEqual(
+            loadtest.dumps(report), loadtest.dumps(json.loads(loadtest.dumps(report)))
+        )
+
+
+class CourseCountersTests(TestCase):
+    """Число учеников и заданий курса хранится в нём самом"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.students = []
+        for number in range(3):
+            student = User.objects.create_user(f"student{number}")
+            Profile.objects.create(user=student, role="student")
+            cls.students.append(student)
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+
+    def setUp(self):
+        cache.clear()
+        querycache.clear()
+
+    def add_course(self, title, students=(), assignments=1):
+        course = Course.objects.create(title=title, teacher=self.teacher)
+        course.students.add(*students)
+        for number in range(assignments):
+            assignment = course.assignments.create(
+                title=f"{title} {number}",
+                description="-",
+                teacher=self.teacher,
+                due_date=timezone.now() + timedelta(days=1),
+                max_points=100,
+                status="published",
+            )
+            for student in students:
+                assignment.submissions.create(student=student, content="-")
+        return course
+
+    def test_counters_follow_enrollment_and_assignments(self):
+        course = self.add_course("Геометрия", self.students, assignments=2)
+        course.refresh_from_db()
+        self.assertEqual((course.students_count, course.assignments_count), (3, 2))
+
+        course.students.remove(self.students[0])
+        self.students[1].courses_enrolled.remove(course)
+        course.assignments.first().delete()
+        course.refresh_from_db()
+        self.assertEqual((course.students_count, course.assignments_count), (1, 1))
+
+        course.students.clear()
+        course.refresh_from_db()
+        self.assertEqual(course.students_count, 0)
+
+    def test_catalog_excludes_enrolled_courses(self):
+        popular = self.add_course("Физика", self.students[1:])
+        self.add_course("Химия", self.students[2:])
+        self.course.students.add(self.students[0])
+        self.client.force_login(self.students[0])
+
+        response = self.client.get("/courses/catalog/")
+        titles = [course.title for course in response.context["page"]]
+        self.assertEqual(titles, ["Физика", "Химия"])
+
+        popular.students.add(self.students[0])
+        response = self.client.get("/courses/catalog/")
+        self.assertEqual(
+            [course.title for course in response.context["page"]], ["Химия"]
+        )
+
+    def queries(self, user, url):
+        querycache.clear()
+        self.client.force_login(user)
+        with CaptureQueriesContext(connections["default"]) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries.captured_queries)
+
+    def test_pages_do_not_query_per_row(self):
+        self.course.students.add(*self.students[:2])
+        assignment = self.add_course("Физика", self.students[:2]).assignments.get()
+        pages = [
+            (self.teacher, "/dashboard/"),
+            (self.teacher, f"/assignments/{assignment.id}/"),
+            (self.teacher, f"/courses/{assignment.course_id}/"),
+            (self.students[0], "/dashboard/"),
+            (self.students[0], f"/courses/{assignment.course_id}/"),
+        ]
+        before = [self.queries(user, url) for user, url in pages]
+
+        more = []
+        for number in range(4):
+            student = User.objects.create_user(f"more{number}")
+            Profile.objects.create(user=student, role="student")
+            more.append(student)
+        assignment.course.students.add(*more)
+        for student in more:
+            assignment.submissions.create(student=student, content="-")
+        self.add_course("Химия", [self.students[0], *more], assignments=3)
+        self.add_course("Биология", more)
+        Course.objects.get(title="Химия").announcements.create(
+            title="-", content="-", author=self.teacher
+        )
+
+        self.assertEqual([self.queries(user, url) for user, url in pages], before)
+
+    def test_teacher_pages_query_budget(self):
+        assignment = self.add_course("Физика", self.students).assignments.get()
+        self.client.force_login(self.teacher)
+        # Сессия, пользователь, профиль - и по одному запросу на каждый список
+        with self.assertNumQueries(8):
+            self.client.get("/dashboard/")
+        with self.assertNumQueries(7):
+            self.client.get(f"/assignments/{assignment.id}/")
+        with self.assertNumQueries(8):
+            self.client.get(f"/courses/{assignment.course_id}/")
+
+
+class GradebookTests(TestCase):
+    """Журнал оценок: ячейки, итоги и число запросов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.anna = User.objects.create_user(
+            "anna", first_name="Анна", last_name="Белова"
+        )
+        cls.boris = User.objects.create_user("boris")
+        dropped = User.objects.create_user("dropped")
+        cls.course.students.add(cls.anna, cls.boris, dropped)
+
+        now = timezone.now()
+        cls.first, cls.second, cls.future = [
+            cls.course.assignments.create(
+                title=title,
+                description="-",
+                teacher=cls.teacher,
+                due_date=now + timedelta(days=days),
+                max_points=max_points,
+                status="published",
+            )
+            for title, days, max_points in (
+                ("Первое", -2, 100),
+                ("Второе", -1, 10),
+                ("Третье", 5, 100),
+            )
+        ]
+        for student, assignment, grade in (
+            (cls.anna, cls.first, 80),
+            (cls.anna, cls.second, None),
+            (cls.boris, cls.first, 60),
+            (cls.boris, cls.future, 50),
+            (dropped, cls.first, 100),
+        ):
+            assignment.submissions.create(student=student, content="-", grade=grade)
+        cls.course.students.remove(dropped)
+
+    def test_matrix(self):
+        with self.assertNumQueries(3):
+            data = gradebook.Gradebook(self.course).as_json()
+
+        self.assertEqual(
+            [name for _, name in data["students"]], ["boris", "Белова Анна"]
+        )
+        self.assertEqual(
+            [row[1] for row in data["assignments"]], ["Первое", "Второе", "Третье"]
+        )
+        self.assertEqual(data["grades"], [[60, -1, 50], [80, -1, -1]])
+        submitted_late = gradebook.SUBMITTED | gradebook.LATE
+        self.assertEqual(
+            data["flags"],
+            [
+                [submitted_late, gradebook.MISSING, gradebook.SUBMITTED],
+                [submitted_late, submitted_late, 0],
+            ],
+        )
+        self.assertEqual(data["row_total"], [110, 80])
+        self.assertEqual(data["row_percent"], [55, 80])
+        self.assertEqual(data["row_missing"], [1, 0])
+        self.assertEqual(data["col_average"], [70, None, 50])
+        self.assertEqual(data["col_submitted"], [2, 1, 1])
+        self.assertEqual(data["col_missing"], [0, 1, 0])
+
+    def test_empty_course(self):
+        course = Course.objects.create(title="Пусто", teacher=self.teacher)
+        data = gradebook.Gradebook(course).as_json()
+        self.assertEqual((data["students"], data["grades"]), ([], []))
+
+    def test_only_teacher_sees_gradebook(self):
+        self.client.force_login(self.anna)
+        url = f"/courses/{self.course.id}/gradebook/"
+        self.assertEqual(self.client.get(url + "data/").status_code, 403)
+        self.assertRedirects(
+            self.client.get(url),
+            f"/courses/{self.course.id}/",
+            fetch_redirect_response=False,
+        )
+
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        data = self.client.get(url + "data/").json()
+        self.assertEqual(data["row_missing"], [1, 0])
+
+
+class JinjaTemplatesTests(TestCase):
+    """Страницы на Jinja2 выводят то же, что и шаблоны Django"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user(
+            "teacher", first_name="Иван", last_name="Петров"
+        )
+        Profile.objects.create(user=cls.teacher, role="teacher")
+        cls.student = User.objects.create_user(
+            "student", first_name="Анна", last_name="Белова"
+        )
+        Profile.objects.create(user=cls.student, role="student")
+        cls.course = Course.objects.create(title="Алгебра", teacher=cls.teacher)
+        cls.course.students.add(cls.student)
+        cls.course.announcements.create(
+            title="Контрольная", content="В пятницу", author=cls.teacher
+        )
+        cls.assignment = cls.course.assignments.create(
+            title="Уравнения",
+            description="-",
+            teacher=cls.teacher,
+            due_date=timezone.now() + timedelta(days=1),
+            max_points=100,
+            status="published",
+        )
+        cls.assignment.submissions.create(student=cls.student, content="-", grade=88)
+
+    def render(self, user, url):
+        self.client.force_login(user)
+        pages = {}
+        for engine in ("django", "jinja2"):
+            with override_settings(HOT_TEMPLATES_ENGINE=engine):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages[engine] = response.content.decode()
+        return pages
+
+    def test_pages_match_django_templates(self):
+        for user in (self.teacher, self.student):
+            for url in (
+                "/dashboard/",
+                f"/courses/{self.course.id}/",
+                f"/assignments/{self.assignment.id}/",
+            ):
+                with self.subTest(user=user.username, url=url):
+                    django, jinja = (
+                        " ".join(strip_tags(page).split())
+                        for page in self.render(user, url).values()
+                    )
+                    self.assertEqual(jinja, django)
+
+    def test_numbers_are_localized(self):
+        value = timezone.make_aware(datetime(2026, 3, 1, 9, 30))
+        context = {"grade": 88.0, "at": value}
+        source = "{{ grade }} {{ grade|unlocalize }} {{ at }}"
+        with translation.override("ru"):
+            jinja = engines["jinja2"].from_string(source).render(context)
+            django = (
+                engines["django"]
+                .from_string("{% load l10n %}" + source)
+                .render(context)
+            )
+        self.assertEqual(jinja, django)
+        self.assertTrue(jinja.startswith("88,0 88.0 "))
+
+        # В CSS число остаётся с точкой
+        pages = self.render(self.student, "/dashboard/")
+        for page in pages.values():
+            self.assertIn('style="width: 88.0%"', page)
+
+
+class CompressionTests(TestCase):
+    """Выбор кодировки, минификация и сжатие потоков по кускам"""
+
+    events = [b"data: first\n\n", b"data: second\n\n"]
+
+    def middleware(self, view, accept_encoding):
+        request = RequestFactory().get(
+            "/", headers={"accept-encoding": accept_encoding}
+        )
+        return compression.CompressionMiddleware(view)(request)
+
+    def test_choose_encoding(self):
+        for header, expected in (
+            ("", None),
+            ("gzip, deflate", "gzip"),
+            ("gzip, br", "br"),
+            ("br;q=0.5, gzip", "gzip"),
+            ("gzip;q=0.2, br;q=0.8", "br"),
+            ("br;q=0, *", "gzip"),
+            ("*;q=0", None),
+            ("identity", None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(compression.choose_encoding(header), expected)
+        with mock.patch.object(compression, "brotli", None):
+            self.assertEqual(compression.choose_encoding("br, gzip"), "gzip")
+            self.assertIsNone(compression.choose_encoding("br"))
+
+    def test_page_is_compressed(self):
+        teacher = User.objects.create_user("teacher")
+        Profile.objects.create(user=teacher, role="teacher")
+        self.client.force_login(teacher)
+
+        def without_csrf(content):
+            # Маскированный CSRF-токен в каждом ответе свой
+            return re.sub(rb'name="csrfmiddlewaretoken" value="\w+"', b"", content)
+
+        plain = without_csrf(self.client.get("/courses/").content)
+        for encoding, decompress in (
+            ("gzip", gzip.decompress),
+            ("br", compression.brotli.decompress),
+        ):
+            response = self.client.get(
+                "/courses/", headers={"accept-encoding": encoding}
+            )
+            self.assertEqual(response["Content-Encoding"], encoding)
+            self.assertIn("Accept-Encoding", response["Vary"])
+            self.assertEqual(response["Content-Length"], str(len(response.content)))
+            self.assertEqual(without_csrf(decompress(response.content)), plain)
+
+    def test_small_and_binary_responses_are_left_alone(self):
+        for response in (
+            HttpResponse("ok"),
+            HttpResponse(b"\0" * 4096, content_type="application/octet-stream"),
+        ):
+            result = self.middleware(lambda request: response, "gzip")
+            self.assertFalse(result.has_header("Content-Encoding"))
+
+    def test_stream_chunks_are_flushed(self):
+        produced = []
+
+        def stream():
+            for event in self.events:
+                produced.append(event)
+                yield event
+
+        for encoding, decompressor in (
+            ("gzip", lambda: zlib.decompressobj(31).decompress),
+            ("br", lambda: compression.brotli.Decompressor().process),
+        ):
+            produced.clear()
+            response = self.middleware(
+                lambda request: StreamingHttpResponse(
+                    stream(), content_type="text/event-stream"
+                ),
+                encoding,
+            )
+            self.assertEqual(response["Content-Encoding"], encoding)
+            chunks = iter(response.streaming_content)
+            decompress = decompressor()
+            # Каждое событие можно распаковать, не дожидаясь следующего
+            self.assertEqual(decompress(next(chunks)), self.events[0])
+            self.assertEqual(produced, self.events[:1])
+            self.assertEqual(decompress(next(chunks)), self.events[1])
+
+    def test_async_stream_chunks_are_flushed(self):
+        async def stream():
+            for event in self.events:
+                yield event
+
+        response = self.middleware(
+            lambda request: StreamingHttpResponse(
+                stream(), content_type="text/event-stream"
+            ),
+            "gzip",
+        )
+
+        async def first_chunk():
+            async for chunk in response.streaming_content:
+                return chunk
+
+        chunk = async_to_sync(first_chunk)()
+        self.assertEqual(zlib.decompressobj(31).decompress(chunk), self.events[0])
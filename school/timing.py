@@ -0,0 +1,301 @@
+"""Заголовок Server-Timing: из чего складывается время ответа.
+
+ServerTimingMiddleware добавляет к каждому ответу заголовок вида::
+
+    Server-Timing: total;dur=84.1, view;dur=80.3, db;dur=31.2;desc="14 queries",
+        cache;dur=0.4;desc="3 calls", tpl;dur=40.7,
+        tpl.teacher_dashboard.html;dur=40.7;desc="teacher_dashboard.html x1"
+
+который виден во вкладке Network инструментов разработчика без DEBUG.
+Время SQL собирается обёрткой выполнения запросов на всех подключениях,
+время шаблонов и кеша - обёртками методов, установленными в install().
+Данные текущего запроса хранятся в ContextVar, поэтому учитываются и запросы
+из sync_to_async в асинхронных представлениях.
+
+Время шаблона включает вложенные шаблоны (extends, include); ``tpl`` - время
+только внешних шаблонов. При ``SERVER_TIMING_LOG`` те же числа пишутся
+строкой JSON в логгер ``school.timing``.
+"""
+
+import json
+import logging
+import re
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db.backends.signals import connection_created
+from django.template.backends.jinja2 import Template as JinjaTemplate
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+# Сколько шаблонов показывать в заголовке (самые долгие)
+MAX_TEMPLATES = 5
+CACHE_METHODS = (
+    "add",
+    "get",
+    "set",
+    "touch",
+    "delete",
+    "get_many",
+    "get_or_set",
+    "has_key",
+    "incr",
+    "decr",
+    "set_many",
+    "delete_many",
+    "clear",
+)
+
+_current = ContextVar("request_timings", default=None)
+
+
+def enabled():
+    return getattr(settings, "SERVER_TIMING", True)
+
+
+def log_enabled():
+    return getattr(settings, "SERVER_TIMING_LOG", False)
+
+
+class RequestTimings:
+    """Накопленные за запрос времена (в секундах)"""
+
+    def __init__(self):
+        self.total = 0.0
+        self.view = None
+        self.view_name = None
+        self.view_start = None
+        self.sql_time = 0.0
+        self.sql_count = 0
+        self.cache_time = 0.0
+        self.cache_calls = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        # имя шаблона -> [время, число отрисовок]
+        self.templates = {}
+        self._cache_depth = 0
+        self._template_depth = 0
+
+    def top_templates(self, limit=MAX_TEMPLATES):
+        return sorted(self.templates.items(), key=lambda item: -item[1][0])[:limit]
+
+    def as_dict(self):
+        return {
+            "total_ms": _ms(self.total),
+            "view_ms": _ms(self.view) if self.view is not None else None,
+            "db_ms": _ms(self.sql_time),
+            "db_queries": self.sql_count,
+            "cache_ms": _ms(self.cache_time),
+            "cache_calls": self.cache_calls,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "template_ms": _ms(self.template_time),
+            "templates": {
+                name: {"ms": _ms(elapsed), "count": count}
+                for name, (elapsed, count) in self.templates.items()
+            },
+        }
+
+
+def current():
+    return _current.get()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def _token(name):
+    # Значения заголовков - только ASCII; кириллица в имени шаблона - "_"
+    return re.sub(r"[^\w.-]", "_", name, flags=re.ASCII)
+
+
+def _description(text):
+    text = text.encode("ascii", "replace").decode("ascii")
+    return text.replace("\\", "/").replace('"', "'")
+
+
+def header_value(timings):
+    parts = [f"total;dur={_ms(timings.total)}"]
+    if timings.view is not None:
+        parts.append(f"view;dur={_ms(timings.view)}")
+    parts.append(f'db;dur={_ms(timings.sql_time)};desc="{timings.sql_count} queries"')
+    parts.append(
+        f'cache;dur={_ms(timings.cache_time)};desc="{timings.cache_calls} calls"'
+    )
+    parts.append(f"tpl;dur={_ms(timings.template_time)}")
+    for name, (elapsed, count) in timings.top_templates():
+        parts.append(
+            f"tpl.{_token(name)};dur={_ms(elapsed)};"
+            f'desc="{_description(name)} x{count}"'
+        )
+    return ", ".join(parts)
+
+
+# Обёртки
+
+
+def _sql_wrapper(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.sql_time += time.perf_counter() - start
+        timings.sql_count += 1
+
+
+def _add_sql_wrapper(sender, connection, **kwargs):
+    if _sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_wrapper)
+
+
+def _timed_render(render, template_name=lambda template: template.name):
+    @wraps(render)
+    def _render(self, *args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return render(self, *args, **kwargs)
+        start = time.perf_counter()
+        timings._template_depth += 1
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            timings._template_depth -= 1
+            if not timings._template_depth:
+                timings.template_time += elapsed
+            name = template_name(self) or "<string>"
+            entry = timings.templates.setdefault(name, [0.0, 0])
+            entry[0] += elapsed
+            entry[1] += 1
+
+    _render.timed = True
+    return _render
+
+
+def _count_hits(timings, name, args, kwargs, result):
+    if name == "get":
+        # get(key, default=None, version=None)
+        default = args[2] if len(args) > 2 else kwargs.get("default")
+        if result is default:
+            timings.cache_misses += 1
+        else:
+            timings.cache_hits += 1
+    elif name == "get_many":
+        keys = args[1] if len(args) > 1 else kwargs.get("keys", ())
+        timings.cache_hits += len(result)
+        timings.cache_misses += len(keys) - len(result)
+
+
+def _timed_cache_method(name, method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        # get_or_set и подобные вызывают другие методы - считаем внешний вызов
+        if timings is None or timings._cache_depth:
+            return method(*args, **kwargs)
+        start = time.perf_counter()
+        timings._cache_depth += 1
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            timings._cache_depth -= 1
+            timings.cache_time += time.perf_counter() - start
+            timings.cache_calls += 1
+        _count_hits(timings, name, args, kwargs, result)
+        return result
+
+    wrapper.timed = True
+    return wrapper
+
+
+def install():
+    """Установить обёртки SQL, шаблонов и кеша (вызывается из ready())"""
+    connection_created.connect(_add_sql_wrapper, dispatch_uid="school.timing")
+
+    if not getattr(Template._render, "timed", False):
+        Template._render = _timed_render(Template._render)
+    # Шаблоны Jinja2 (school/jinja.py) учитываются целиком, вместе с extends
+    if not getattr(JinjaTemplate.render, "timed", False):
+        JinjaTemplate.render = _timed_render(
+            JinjaTemplate.render, lambda template: template.template.name
+        )
+
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        for name in CACHE_METHODS:
+            method = getattr(backend, name, None)
+            if method is not None and not getattr(method, "timed", False):
+                setattr(backend, name, _timed_cache_method(name, method))
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.log = log_enabled()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings, start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.view_start = time.perf_counter()
+            timings.view_name = request.resolver_match.view_name
+
+    def _finish(self, request, response, timings, start):
+        end = time.perf_counter()
+        timings.total = end - start
+        if timings.view_start is not None:
+            # Включает ответную часть внутренних middleware - она пренебрежимо мала
+            timings.view = end - timings.view_start
+
+        response["Server-Timing"] = header_value(timings)
+        if self.log:
+            match = getattr(request, "resolver_match", None)
+            logger.info(
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "view": match.view_name if match else None,
+                        "status": response.status_code,
+                        **timings.as_dict(),
+                    },
+                    ensure_ascii=False,
+                )
+            )
+        return response
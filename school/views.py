@@ -1,11 +1,28 @@
+import asyncio
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth.models import User
-from django.db.models import Q, Count, Avg
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Q, Count, Avg, Sum, OuterRef, Subquery
 from django.utils import timezone
-from .models import Profile, Course, Assignment, Submission, Announcement
+from django.utils.crypto import constant_time_compare
+from django.conf import settings
+from .models import (
+    Profile,
+    Course,
+    Assignment,
+    Submission,
+    Announcement,
+    AnnouncementReadMarker,
+    AssignmentTestCase,
+    ArchivedAssignment,
+)
 from .forms import (
     UserRegistrationForm,
     LoginForm,
@@ -14,9 +31,25 @@ from .forms import (
     SubmissionForm,
     GradeForm,
     AnnouncementForm,
+    AssignmentTestCaseForm,
     ProfileForm,
 )
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from . import (
+    activity,
+    analytics,
+    archive,
+    autograder,
+    catalog,
+    events,
+    gradebook,
+    leaderboard,
+    memo,
+    metrics,
+    querycache,
+    sharding,
+    similarity,
+)
 
 
 def home(request):
@@ -119,16 +152,140 @@ def student_check(user):
         return False
 
 
+def _hot_engine():
+    # Панели, страницы курса и задания есть и в jinja2/ (school/jinja.py)
+    return getattr(settings, "HOT_TEMPLATES_ENGINE", "django")
+
+
+def _render_hot(request, template_name, context):
+    return render(request, template_name, context, using=_hot_engine())
+
+
+def _teacher_courses(user):
+    """Курсы учителя из кеша querysets (сбрасывается при изменении курсов)"""
+    return querycache.cached(
+        Course.objects.filter(teacher=user),
+        [querycache.teacher_tag(user.id)],
+        row_tags=lambda course: [querycache.course_tag(course.id)],
+    )
+
+
+def _enrolled_courses(user, with_teacher=False):
+    """Курсы ученика из кеша querysets; ``with_teacher`` - вместе с учителем"""
+    courses = user.courses_enrolled.all()
+    if with_teacher:
+        courses = courses.select_related("teacher")
+    return querycache.cached(
+        courses,
+        [querycache.student_tag(user.id)],
+        row_tags=lambda course: [
+            querycache.course_tag(course.id),
+            querycache.user_tag(course.teacher_id),
+        ],
+    )
+
+
+def _with_student_submission(assignments, student):
+    """Задания с решением ученика в той же строке запроса.
+
+    ``my_submission_id``, ``my_grade`` и ``my_is_late`` - подзапросы по
+    уникальному индексу (задание, ученик); None, если решения нет. Работает и
+    для архивных заданий.
+    """
+    submissions = assignments.model._meta.get_field("submissions").related_model
+    mine = submissions.objects.filter(assignment=OuterRef("pk"), student=student)
+    return assignments.annotate(
+        my_submission_id=Subquery(mine.values("id")[:1]),
+        my_grade=Subquery(mine.values("grade")[:1]),
+        my_is_late=Subquery(mine.values("is_late")[:1]),
+    )
+
+
+def _grades_by_course(user):
+    """Средняя оценка ученика по курсам.
+
+    При шардировании решения и курсы лежат в разных базах, поэтому оценки
+    группируются по course_id в каждой базе, а названия берутся из ``default``
+    (курс целиком лежит в одной базе, среднее не нужно пересчитывать).
+    """
+    grades = Submission.objects.filter(student=user, grade__isnull=False)
+    if not sharding.is_sharded():
+        return list(
+            grades.values("assignment__course__title").annotate(avg_grade=Avg("grade"))
+        )
+    rows = sharding.gather(
+        grades.values("assignment__course_id")
+        .annotate(avg_grade=Avg("grade"))
+        .order_by("assignment__course_id")
+    )
+    titles = dict(
+        Course.objects.filter(
+            id__in=[row["assignment__course_id"] for row in rows]
+        ).values_list("id", "title")
+    )
+    return [
+        {
+            "assignment__course__title": titles.get(row["assignment__course_id"], ""),
+            "avg_grade": row["avg_grade"],
+        }
+        for row in rows
+    ]
+
+
+def _course_average_grades(courses):
+    """Курсы со средней оценкой ``avg_grade`` (Avg через JOIN, если решения
+    лежат в той же базе, что и курсы, иначе - Sum/Count по каждой базе)"""
+    if not sharding.is_sharded():
+        return list(courses.annotate(avg_grade=Avg("assignments__submissions__grade")))
+    courses = list(courses)
+    totals = {}
+    for alias in sharding.databases():
+        rows = (
+            Submission.objects.using(alias)
+            .filter(
+                assignment__course_id__in=[course.id for course in courses],
+                grade__isnull=False,
+            )
+            .values("assignment__course_id")
+            .annotate(total=Sum("grade"), graded=Count("id"))
+            .order_by()
+        )
+        for row in rows:
+            total, graded = totals.get(row["assignment__course_id"], (0, 0))
+            totals[row["assignment__course_id"]] = (
+                total + row["total"],
+                graded + row["graded"],
+            )
+    for course in courses:
+        total, graded = totals.get(course.id, (0, 0))
+        course.avg_grade = total / graded if graded else None
+    return courses
+
+
 @login_required
 @user_passes_test(teacher_check, login_url="/dashboard/")
 def teacher_dashboard(request):
-    courses = Course.objects.filter(teacher=request.user)
-
-    assignments = Assignment.objects.filter(teacher=request.user)
+    # Счётчики в stats и шаблоне берутся из уже загруженных строк, число
+    # учеников и заданий курса - из его полей students_count/assignments_count
+    courses = memo.memoize(request, _teacher_courses(request.user))
+
+    assignments = memo.memoize(
+        request,
+        sharding.gather(
+            Assignment.objects.filter(teacher=request.user).select_related("course")
+        ),
+    )
 
-    submissions_to_grade = Submission.objects.filter(
-        assignment__teacher=request.user, grade__isnull=True
-    ).order_by("-submitted_at")[:10]
+    submissions_to_grade = memo.memoize(
+        request,
+        sharding.gather(
+            Submission.objects.filter(
+                assignment__teacher=request.user, grade__isnull=True
+            )
+            .select_related("assignment", "student")
+            .order_by("-submitted_at")[:10]
+        ),
+    )
 
     stats = {
         "courses_count": courses.count(),
@@ -141,9 +298,14 @@ def teacher_dashboard(request):
         "submissions_to_grade": submissions_to_grade.count(),
     }
 
-    recent_announcements = Announcement.objects.filter(
-        course__teacher=request.user
-    ).order_by("-created_at")[:5]
+    recent_announcements = memo.memoize(
+        request,
+        sharding.gather(
+            Announcement.objects.filter(course_id__in=[course.id for course in courses])
+            .select_related("course")
+            .order_by("-created_at")[:5]
+        ),
+    )
 
     context = {
         "courses": courses,
@@ -153,51 +315,50 @@ def teacher_dashboard(request):
         "recent_announcements": recent_announcements,
     }
 
-    return render(request, "teacher_dashboard.html", context)
+    return _render_hot(request, "teacher_dashboard.html", context)
 
 
 @login_required
 @user_passes_test(student_check, login_url="/dashboard/")
 def student_dashboard(request):
-    courses = request.user.courses_enrolled.all()
-
-    active_assignments = Assignment.objects.filter(
-        course__in=courses, status="published", due_date__gt=timezone.now()
-    ).order_by("due_date")
+    courses = _enrolled_courses(request.user, with_teacher=True)
+    course_ids = [course.id for course in courses]
+
+    # Решение ученика и курс приходят в той же строке, что и задание
+    published = Assignment.objects.filter(
+        course_id__in=course_ids, status="published"
+    ).select_related("course")
+
+    active_assignments = sharding.gather(
+        _with_student_submission(
+            published.filter(due_date__gt=timezone.now()), request.user
+        ).order_by("due_date")
+    )
 
-    overdue_assignments = (
-        Assignment.objects.filter(
-            course__in=courses, status="published", due_date__lt=timezone.now()
-        )
+    overdue_assignments = sharding.gather(
+        published.filter(due_date__lt=timezone.now())
         .exclude(submissions__student=request.user)
         .order_by("due_date")
     )
 
-    recent_submissions = Submission.objects.filter(student=request.user).order_by(
-        "-submitted_at"
-    )[:10]  # Увеличим до 10 для таблицы
+    recent_submissions = sharding.gather(
+        Submission.objects.filter(student=request.user)
+        .select_related("assignment__course")
+        .order_by("-submitted_at")[:10]
+    )  # Увеличим до 10 для таблицы
 
-    grades = (
-        Submission.objects.filter(student=request.user, grade__isnull=False)
-        .values("assignment__course__title")
-        .annotate(avg_grade=Avg("grade"))
-    )
-
-    # Получаем ID заданий, которые уже сданы
-    submitted_assignments = Submission.objects.filter(
-        student=request.user
-    ).values_list('assignment_id', flat=True)
+    grades = _grades_by_course(request.user)
 
+    # Шаблон по нескольку раз вызывает count у каждого списка
     context = {
         "courses": courses,
-        "active_assignments": active_assignments,
-        "overdue_assignments": overdue_assignments,
-        "recent_submissions": recent_submissions,
+        "active_assignments": memo.memoize(request, active_assignments),
+        "overdue_assignments": memo.memoize(request, overdue_assignments),
+        "recent_submissions": memo.memoize(request, recent_submissions),
         "grades": grades,
-        "submitted_assignments": submitted_assignments,
     }
 
-    return render(request, "student_dashboard.html", context)
+    return _render_hot(request, "student_dashboard.html", context)
 
 @login_required
 @user_passes_test(teacher_check, login_url="/dashboard/")
@@ -230,7 +391,9 @@ def create_assignment(request, course_id=None):
     """Создание задания"""
     course = None
     if course_id:
-        course = get_object_or_404(Course, id=course_id, teacher=request.user)
+        course = get_object_or_404(
+            Course, id=course_id, teacher=request.user, archived_at__isnull=True
+        )
 
     if request.method == "POST":
         form = AssignmentForm(request.POST, user=request.user)
@@ -257,15 +420,27 @@ def create_assignment(request, course_id=None):
     return render(request, "create_assignment.html", context)
 
 
+def _prepare_submission(submission, assignment, upload=None):
+    """Общая подготовка решения перед сохранением при сдаче"""
+    size = len(submission.content.encode("utf-8"))
+    if upload is not None:
+        size += upload.size
+    metrics.UPLOAD_BYTES.observe(size)
+    submission.signature = similarity.minhash(submission.content)
+    if assignment.auto_grade:
+        submission.autograde_status = "pending"
+
+
 @login_required
 def assignment_detail(request, assignment_id):
     """Детальная информация о задании"""
-    assignment = get_object_or_404(Assignment, id=assignment_id)
+    assignment = archive.get_assignment_or_404(assignment_id)
+    archived = isinstance(assignment, ArchivedAssignment)
 
-    is_teacher = request.user == assignment.teacher
+    is_teacher = request.user.id == assignment.teacher_id
     is_student = (
         request.user.profile.role == "student"
-        and request.user in assignment.course.students.all()
+        and assignment.course.students.filter(pk=request.user.pk).exists()
     )
 
     if not (is_teacher or is_student):
@@ -276,17 +451,18 @@ def assignment_detail(request, assignment_id):
     submission_form = None
 
     if is_student:
-        submission = Submission.objects.filter(
-            assignment=assignment, student=request.user
-        ).first()
+        submission = assignment.submissions.filter(student=request.user).first()
 
-        if not submission and assignment.status == "published":
+        if not submission and assignment.status == "published" and not archived:
             if request.method == "POST":
                 submission_form = SubmissionForm(request.POST, request.FILES)
                 if submission_form.is_valid():
                     submission = submission_form.save(commit=False)
                     submission.assignment = assignment
                     submission.student = request.user
+                    _prepare_submission(
+                        submission, assignment, request.FILES.get("file")
+                    )
                     submission.save()
                     messages.success(request, "✅ Ваше решение отправлено!")
                     return redirect("assignment_detail", assignment_id=assignment_id)
@@ -294,8 +470,13 @@ def assignment_detail(request, assignment_id):
                 submission_form = SubmissionForm()
 
     submissions = None
+    course_students = None
     if is_teacher:
-        submissions = assignment.submissions.all()
+        submissions = memo.memoize(
+            request,
+            assignment.submissions.select_related("student__profile"),
+        )
+        course_students = assignment.course.students.select_related("profile")[:5]
 
     context = {
         "assignment": assignment,
@@ -304,26 +485,84 @@ def assignment_detail(request, assignment_id):
         "submission": submission,
         "submission_form": submission_form,
         "submissions": submissions,
+        "course_students": course_students,
+        "archived": archived,
     }
 
-    return render(request, "assignment_detail.html", context)
+    return _render_hot(request, "assignment_detail.html", context)
 
 
 @login_required
 @user_passes_test(teacher_check, login_url="/dashboard/")
 def submissions_list(request, assignment_id):
     """Список всех решений для задания (для учителя)"""
-    assignment = get_object_or_404(Assignment, id=assignment_id, teacher=request.user)
-    submissions = assignment.submissions.all()
+    assignment = archive.get_assignment_or_404(assignment_id, teacher=request.user)
+    archived = isinstance(assignment, ArchivedAssignment)
+    submissions = assignment.submissions.select_related("student")
+
+    # Анализ выполняет команда analyze_similarity; здесь - только результат
+    analysis = None if archived else similarity.stored_analysis(assignment)
+    similar_pairs = []
+    if analysis:
+        by_id = {submission.id: submission for submission in submissions}
+        similar_pairs = [
+            {
+                "a": by_id[pair["a"]],
+                "b": by_id[pair["b"]],
+                "similarity": round(pair["similarity"] * 100),
+            }
+            for pair in analysis["pairs"]
+            if pair["a"] in by_id and pair["b"] in by_id
+        ]
 
     context = {
         "assignment": assignment,
         "submissions": submissions,
+        "similar_pairs": similar_pairs,
+        "similarity_analysis": analysis,
+        "distribution": analytics.assignment_distribution(assignment),
+        "archived": archived,
     }
 
     return render(request, "submissions.html", context)
 
 
+@login_required
+@user_passes_test(teacher_check, login_url="/dashboard/")
+def assignment_tests(request, assignment_id):
+    """Тесты для автоматической проверки задания"""
+    assignment = get_object_or_404(Assignment, id=assignment_id, teacher=request.user)
+
+    if request.method == "POST":
+        if "delete" in request.POST:
+            AssignmentTestCase.objects.filter(
+                id=request.POST.get("delete"), assignment=assignment
+            ).delete()
+            messages.success(request, "✅ Тест удалён.")
+            return redirect("assignment_tests", assignment_id=assignment.id)
+
+        form = AssignmentTestCaseForm(request.POST)
+        if form.is_valid():
+            test_case = form.save(commit=False)
+            test_case.assignment = assignment
+            test_case.save()
+            messages.success(request, "✅ Тест добавлен.")
+            return redirect("assignment_tests", assignment_id=assignment.id)
+    else:
+        form = AssignmentTestCaseForm()
+
+    context = {
+        "assignment": assignment,
+        "test_cases": assignment.test_cases.all(),
+        "form": form,
+        "queue": assignment.submissions.filter(
+            autograde_status__in=["pending", "running"]
+        ).count(),
+    }
+
+    return render(request, "assignment_tests.html", context)
+
+
 @login_required
 @user_passes_test(teacher_check, login_url="/dashboard/")
 def grade_submission(request, submission_id):
@@ -332,9 +571,17 @@ def grade_submission(request, submission_id):
     )
 
     if request.method == "POST":
+        old_grade = submission.grade
         form = GradeForm(request.POST, instance=submission)
         if form.is_valid():
-            form.save()
+            submission = form.save(commit=False)
+            submission.graded_at = timezone.now()
+            submission.save()
+            transaction.on_commit(
+                partial(leaderboard.record_grade, submission, old_grade),
+                using=submission._state.db,
+            )
+            activity.record_grades([submission])
             messages.success(request, f"✅ Решение оценено! Оценка: {submission.grade}")
             return redirect("submissions_list", assignment_id=submission.assignment.id)
     else:
@@ -357,19 +604,24 @@ def my_courses(request):
         profile = Profile.objects.create(user=request.user, role="student")
 
     if profile.role == "teacher":
-        courses = Course.objects.filter(teacher=request.user)
+        courses = _teacher_courses(request.user)
     else:
-        courses = request.user.courses_enrolled.all()
+        courses = _enrolled_courses(request.user, with_teacher=True)
 
     available_courses = None
     if profile.role == "student":
-        available_courses = Course.objects.exclude(students=request.user).all()[:10]
+        available_courses = list(catalog.available_courses(request.user)[:10])
 
     context = {
         "courses": courses,
         "available_courses": available_courses,
         "is_teacher": profile.role == "teacher",
     }
+    if profile.role == "teacher":
+        context.update(
+            total_students=sum(course.students_count for course in courses),
+            total_assignments=sum(course.assignments_count for course in courses),
+        )
 
     return render(request, "my_courses.html", context)
 
@@ -401,11 +653,30 @@ def profile_view(request):
     return render(request, "profile.html", context)
 
 
+MONTHLY_STATS = [
+    {"month": "Янв", "avg_grade": 85},
+    {"month": "Фев", "avg_grade": 88},
+    {"month": "Мар", "avg_grade": 82},
+    {"month": "Апр", "avg_grade": 90},
+    {"month": "Май", "avg_grade": 87},
+    {"month": "Июн", "avg_grade": 92},
+]
+
+
+def _courses_stats(courses):
+    """Курсы учителя со средней оценкой и распределением оценок"""
+    courses_stats = _course_average_grades(courses)
+    for course in courses_stats:
+        course.distribution = analytics.course_distribution(course.id)["course"]
+    return courses_stats
+
+
 @login_required
 @user_passes_test(teacher_check, login_url="/dashboard/")
 def teacher_statistics(request):
-    courses_count = Course.objects.filter(teacher=request.user).count()
-    assignments_count = Assignment.objects.filter(teacher=request.user).count()
+    courses = _teacher_courses(request.user)
+    courses_count = len(courses)
+    assignments_count = sharding.count(Assignment.objects.filter(teacher=request.user))
     students_count = (
         User.objects.filter(
             profile__role="student", courses_enrolled__teacher=request.user
@@ -414,27 +685,12 @@ def teacher_statistics(request):
         .count()
     )
 
-    courses_stats = Course.objects.filter(teacher=request.user).annotate(
-        assignments_count=Count("assignments"),
-        students_count=Count("students"),
-        avg_grade=Avg("assignments__submissions__grade"),
-    )
-
-    monthly_stats = [
-        {"month": "Янв", "avg_grade": 85},
-        {"month": "Фев", "avg_grade": 88},
-        {"month": "Мар", "avg_grade": 82},
-        {"month": "Апр", "avg_grade": 90},
-        {"month": "Май", "avg_grade": 87},
-        {"month": "Июн", "avg_grade": 92},
-    ]
-
     context = {
         "courses_count": courses_count,
         "assignments_count": assignments_count,
         "students_count": students_count,
-        "courses_stats": courses_stats,
-        "monthly_stats": monthly_stats,
+        "courses_stats": _courses_stats(courses),
+        "monthly_stats": MONTHLY_STATS,
     }
 
     return render(request, "teacher_statistics.html", context)
@@ -444,17 +700,23 @@ def teacher_statistics(request):
 def course_detail(request, course_id):
     try:
         course_id_int = int(course_id)
-        course = get_object_or_404(Course, id=course_id_int)
+        course = get_object_or_404(
+            Course.objects.select_related("teacher"), id=course_id_int
+        )
 
         if request.user.profile.role == "teacher":
-            if course.teacher != request.user:
+            if course.teacher_id != request.user.id:
                 messages.error(request, "❌ У вас нет доступа к этому курсу.")
                 return redirect("dashboard")
         else:
-            if request.user not in course.students.all():
+            if not course.students.filter(pk=request.user.pk).exists():
                 messages.error(request, "❌ Вы не записаны на этот курс.")
                 return redirect("dashboard")
 
+        if request.method == "POST" and course.archived_at:
+            messages.error(request, "❌ Курс в архиве и доступен только для чтения.")
+            return redirect("course_detail", course_id=course.id)
+
         if request.method == "POST" and request.user.profile.role == "teacher":
             if "title" in request.POST and "content" in request.POST:
                 title = request.POST.get("title", "").strip()
@@ -486,28 +748,49 @@ def course_detail(request, course_id):
 
                 return redirect("course_detail", course_id=course.id)
 
-        assignments = course.assignments.all().order_by("-created_at")
-        students = course.students.all().order_by("last_name", "first_name")
-        announcements = course.announcements.all().order_by("-created_at")
+        assignments = (
+            archive.assignments(course)
+            .annotate(
+                submissions_count=Count("submissions"),
+                graded_count=Count(
+                    "submissions", filter=Q(submissions__grade__isnull=False)
+                ),
+            )
+            .order_by("-created_at")
+        )
+        if request.user.profile.role != "teacher":
+            assignments = _with_student_submission(assignments, request.user)
+        students = memo.memoize(
+            request, course.students.all().order_by("last_name", "first_name")
+        )
+        # Решения учеников в этом курсе - одним запросом, а не count() на каждого
+        completed = dict(
+            archive.submissions(course)
+            .filter(assignment__course=course)
+            .values_list("student_id")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for student in students:
+            student.completed_count = completed.get(student.id, 0)
+        announcements = (
+            archive.announcements(course).select_related("author").order_by("-created_at")
+        )
 
-        total_submissions = 0
-        graded_submissions = 0
-        for assignment in assignments:
-            total_submissions += assignment.submissions.count()
-            graded_submissions += assignment.submissions.filter(
-                grade__isnull=False
-            ).count()
+        total_submissions = sum(a.submissions_count for a in assignments)
+        graded_submissions = sum(a.graded_count for a in assignments)
 
         context = {
             "course": course,
             "assignments": assignments,
             "students": students,
-            "announcements": announcements,
+            "announcements": memo.memoize(request, announcements),
             "total_submissions": total_submissions,
             "graded_submissions": graded_submissions,
+            "archived": bool(course.archived_at),
         }
 
-        return render(request, "course_detail.html", context)
+        return _render_hot(request, "course_detail.html", context)
 
     except (ValueError, TypeError):
         messages.error(request, "❌ Неверный ID курса.")
@@ -517,13 +800,150 @@ def course_detail(request, course_id):
         return redirect("dashboard")
 
 
+@login_required
+@user_passes_test(student_check, login_url="/dashboard/")
+def announcement_feed(request):
+    """Лента объявлений по всем курсам ученика"""
+    marker, _ = AnnouncementReadMarker.objects.get_or_create(user=request.user)
+    last_read_at = marker.last_read_at
+
+    course_ids = [course.id for course in _enrolled_courses(request.user)]
+    announcements = sharding.paginated(
+        Announcement.objects.filter(course_id__in=course_ids)
+        .select_related("course", "author")
+        .order_by("-created_at", "-id")
+    )
+    page = Paginator(announcements, 20).get_page(request.GET.get("page"))
+
+    if page.number == 1 and page.object_list:
+        newest = page.object_list[0].created_at
+        if newest > last_read_at:
+            marker.mark_read(newest)
+
+    context = {
+        "page": page,
+        "last_read_at": last_read_at,
+    }
+
+    return render(request, "announcement_feed.html", context)
+
+
+@login_required
+def course_catalog(request):
+    """Каталог курсов с сортировкой по популярности или новизне"""
+    sort = request.GET.get("sort")
+    if sort not in catalog.SORTS:
+        sort = "popular"
+
+    can_enroll = student_check(request.user)
+    if can_enroll:
+        courses = catalog.available_courses(request.user, sort)
+    else:
+        courses = catalog.courses(sort)
+    page = Paginator(courses, catalog.PER_PAGE).get_page(request.GET.get("page"))
+
+    context = {
+        "page": page,
+        "sort": sort,
+        "sort_choices": catalog.SORT_CHOICES,
+        "can_enroll": can_enroll,
+    }
+
+    return render(request, "course_catalog.html", context)
+
+
+@login_required
+def course_gradebook(request, course_id):
+    """Журнал оценок курса (данные загружаются отдельным запросом)"""
+    course = get_object_or_404(Course, id=course_id)
+
+    if course.teacher_id != request.user.id:
+        messages.error(request, "❌ Журнал доступен только преподавателю курса.")
+        return redirect("course_detail", course_id=course.id)
+
+    return render(request, "course_gradebook.html", {"course": course})
+
+
+@login_required
+def course_gradebook_data(request, course_id):
+    """Матрица журнала оценок в JSON"""
+    course = get_object_or_404(Course, id=course_id)
+
+    if course.teacher_id != request.user.id:
+        return JsonResponse({"error": "Нет доступа"}, status=403)
+
+    return JsonResponse(gradebook.Gradebook(course).as_json())
+
+
+@login_required
+def activity_feed_data(request):
+    """Лента активности пользователя в JSON, ``?before=<курсор>``"""
+    events, next_cursor = activity.user_feed(request.user, request.GET.get("before"))
+    return JsonResponse(
+        {"events": [activity.as_json(e) for e in events], "next": next_cursor}
+    )
+
+
+@login_required
+def course_activity_data(request, course_id):
+    """Лента активности курса в JSON, ``?before=<курсор>``"""
+    course = get_object_or_404(Course, id=course_id)
+
+    is_teacher = course.teacher_id == request.user.id
+    if not is_teacher and not course.students.filter(id=request.user.id).exists():
+        return JsonResponse({"error": "Нет доступа"}, status=403)
+
+    events, next_cursor = activity.course_feed(course, request.GET.get("before"))
+    return JsonResponse(
+        {"events": [activity.as_json(e) for e in events], "next": next_cursor}
+    )
+
+
+@login_required
+def course_leaderboard(request, course_id):
+    """Рейтинг учеников курса"""
+    course = get_object_or_404(Course, id=course_id)
+
+    is_teacher = course.teacher_id == request.user.id
+    if not is_teacher and not course.students.filter(id=request.user.id).exists():
+        messages.error(request, "❌ Вы не записаны на этот курс.")
+        return redirect("dashboard")
+
+    try:
+        top_n = min(max(int(request.GET.get("top", 20)), 1), 500)
+    except ValueError:
+        top_n = 20
+
+    board = leaderboard.get_leaderboard(course.id)
+    top = board.top(top_n)
+
+    users = User.objects.in_bulk([row["student_id"] for row in top])
+    for row in top:
+        row["student"] = users.get(row["student_id"])
+
+    my_entry = None
+    if not is_teacher and request.user.id in board:
+        my_entry = board.entry(request.user.id)
+
+    context = {
+        "course": course,
+        "top": top,
+        "top_n": top_n,
+        "total_students": len(board),
+        "my_entry": my_entry,
+        "is_teacher": is_teacher,
+    }
+
+    return render(request, "course_leaderboard.html", context)
+
+
 @login_required
 def enroll_course(request, course_id):
     if not student_check(request.user):
         messages.error(request, "❌ Только ученики могут записываться на курсы.")
         return redirect("dashboard")
 
-    course = get_object_or_404(Course, id=course_id)
+    course = get_object_or_404(Course, id=course_id, archived_at__isnull=True)
 
     if request.method == "POST":
         if request.user in course.students.all():
@@ -561,9 +981,13 @@ def profile_view(request):
     else:
         form = ProfileForm(instance=profile)
 
+    events, next_cursor = activity.user_feed(request.user, request.GET.get("before"))
     context = {
         "profile": profile,
         "form": form,
+        "activity_events": events,
+        "activity_next": next_cursor,
+        "activity_paged": "before" in request.GET,
     }
 
     return render(request, "profile.html", context)
@@ -617,13 +1041,16 @@ def submit_assignment(request, assignment_id):
                 if form.cleaned_data.get('file'):
                     submission.file = form.cleaned_data['file']
                 submission.submitted_at = timezone.now()
+                _prepare_submission(submission, assignment, request.FILES.get("file"))
                 submission.save()
+                activity.record_submissions([submission])
                 messages.success(request, "✅ Решение обновлено!")
             else:
                 # Создаем новую попытку
                 submission = form.save(commit=False)
                 submission.assignment = assignment
                 submission.student = request.user
+                _prepare_submission(submission, assignment, request.FILES.get("file"))
                 submission.save()
                 messages.success(request, "✅ Решение успешно отправлено!")
 
@@ -675,7 +1102,7 @@ def submit_assignment(request, assignment_id):
 @user_passes_test(student_check, login_url="/dashboard/")
 def view_submission(request, submission_id):
     """Просмотр отправленного решения"""
-    submission = get_object_or_404(Submission, id=submission_id)
+    submission = archive.get_submission_or_404(submission_id)
 
     # Проверяем, что ученик имеет доступ к этому решению
     if submission.student != request.user:
@@ -691,4 +1118,222 @@ def view_submission(request, submission_id):
         'course': course,
     }
 
-    return render(request, 'view_submission.html', context)
\ No newline at end of file
+    return render(request, 'view_submission.html', context)
+
+# ---------------------------------------------------------------------------
+# Асинхронные версии панелей и статистики (для запуска через ASGI)
+# ---------------------------------------------------------------------------
+
+
+async def _aevaluate(queryset):
+    """Выполнить queryset через async ORM, заполнив его кеш результатов.
+
+    После этого ``count``, ``if`` и итерация в шаблоне не делают новых запросов.
+    """
+    return await sharding.agather(queryset)
+
+
+async def _arender(request, template_name, context, using=None):
+    # Шаблоны могут обращаться к ленивым связям (course.teacher и т.п.),
+    # поэтому рендеринг выполняется в синхронном потоке.
+    return await sync_to_async(render)(request, template_name, context, using=using)
+
+
+@login_required
+async def dashboard_async(request):
+    user = await request.auser()
+    profile, _ = await Profile.objects.aget_or_create(
+        user=user, defaults={"role": "student"}
+    )
+
+    if profile.role == "teacher":
+        return await teacher_dashboard_async(request)
+    else:
+        return await student_dashboard_async(request)
+
+
+@login_required
+@user_passes_test(teacher_check, login_url="/dashboard/")
+async def teacher_dashboard_async(request):
+    user = await request.auser()
+
+    courses = Course.objects.filter(teacher=user)
+    assignments = Assignment.objects.filter(teacher=user).select_related("course")
+    submissions_to_grade = (
+        Submission.objects.filter(assignment__teacher=user, grade__isnull=True)
+        .select_related("assignment", "student")
+        .order_by("-submitted_at")[:10]
+    )
+    recent_announcements = (
+        Announcement.objects.filter(
+            course_id__in=await sharding.aid_list(courses.values_list("id", flat=True))
+        )
+        .select_related("course")
+        .order_by("-created_at")[:5]
+    )
+    students_count = (
+        User.objects.filter(profile__role="student", courses_enrolled__teacher=user)
+        .distinct()
+        .acount()
+    )
+
+    # Независимые запросы запускаются одновременно, рендеринг - один раз
+    courses, assignments, submissions_to_grade, recent_announcements, students_count = (
+        await asyncio.gather(
+            _aevaluate(courses),
+            _aevaluate(assignments),
+            _aevaluate(submissions_to_grade),
+            _aevaluate(recent_announcements),
+            students_count,
+        )
+    )
+
+    stats = {
+        "courses_count": len(courses),
+        "assignments_count": len(assignments),
+        "students_count": students_count,
+        "submissions_to_grade": len(submissions_to_grade),
+    }
+
+    context = {
+        "courses": courses,
+        "assignments": assignments,
+        "submissions_to_grade": submissions_to_grade,
+        "stats": stats,
+        "recent_announcements": recent_announcements,
+    }
+
+    return await _arender(
+        request, "teacher_dashboard.html", context, using=_hot_engine()
+    )
+
+
+@login_required
+@user_passes_test(student_check, login_url="/dashboard/")
+async def student_dashboard_async(request):
+    user = await request.auser()
+    now = timezone.now()
+
+    courses = user.courses_enrolled.select_related("teacher")
+    course_ids = await sharding.aid_list(courses.values_list("id", flat=True))
+    published = Assignment.objects.filter(
+        course_id__in=course_ids, status="published"
+    ).select_related("course")
+    active_assignments = _with_student_submission(
+        published.filter(due_date__gt=now), user
+    ).order_by("due_date")
+    overdue_assignments = (
+        published.filter(due_date__lt=now)
+        .exclude(submissions__student=user)
+        .order_by("due_date")
+    )
+    recent_submissions = (
+        Submission.objects.filter(student=user)
+        .select_related("assignment__course")
+        .order_by("-submitted_at")[:10]
+    )
+
+    (
+        courses,
+        active_assignments,
+        overdue_assignments,
+        recent_submissions,
+        grades,
+    ) = await asyncio.gather(
+        _aevaluate(courses),
+        _aevaluate(active_assignments),
+        _aevaluate(overdue_assignments),
+        _aevaluate(recent_submissions),
+        sync_to_async(_grades_by_course)(user),
+    )
+
+    context = {
+        "courses": courses,
+        "active_assignments": active_assignments,
+        "overdue_assignments": overdue_assignments,
+        "recent_submissions": recent_submissions,
+        "grades": grades,
+    }
+
+    return await _arender(
+        request, "student_dashboard.html", context, using=_hot_engine()
+    )
+
+
+@login_required
+@user_passes_test(teacher_check, login_url="/dashboard/")
+async def teacher_statistics_async(request):
+    user = await request.auser()
+
+    courses_count, assignments_count, students_count, courses_stats = (
+        await asyncio.gather(
+            Course.objects.filter(teacher=user).acount(),
+            sharding.acount(Assignment.objects.filter(teacher=user)),
+            User.objects.filter(
+                profile__role="student", courses_enrolled__teacher=user
+            )
+            .distinct()
+            .acount(),
+            sync_to_async(_courses_stats)(Course.objects.filter(teacher=user)),
+        )
+    )
+
+    context = {
+        "courses_count": courses_count,
+        "assignments_count": assignments_count,
+        "students_count": students_count,
+        "courses_stats": courses_stats,
+        "monthly_stats": MONTHLY_STATS,
+    }
+
+    return await _arender(request, "teacher_statistics.html", context)
+
+
+@login_required
+async def submission_events(request):
+    """SSE-поток событий о новых решениях и оценках.
+
+    Учитель получает события по своим курсам, ученик - оценки своих решений.
+    Под WSGI отвечает 204: EventSource после этого не переподключается.
+    """
+    if not events.available(request):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    course_ids = [
+        course_id
+        async for course_id in Course.objects.filter(teacher=user).values_list(
+            "id", flat=True
+        )
+    ]
+    subscriber = events.Subscriber(course_ids=course_ids, student_id=user.id)
+
+    response = StreamingHttpResponse(
+        events.stream(subscriber), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def metrics_view(request):
+    """Метрики для Prometheus.
+
+    Если задан METRICS_TOKEN, сборщик должен передать его в заголовке
+    ``Authorization: Bearer <токен>``.
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not constant_time_compare(supplied, token):
+            return HttpResponse(status=403)
+
+    gauges = [
+        (
+            "school_autograde_queue_depth",
+            "Решения в очереди автопроверки",
+            autograder.queue_depth(),
+        ),
+    ]
+    return HttpResponse(
+        metrics.render(gauges), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -34,6 +34,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "school.profiling.SamplingProfilerMiddleware",
+    "school.timing.ServerTimingMiddleware",
+    "school.metrics.MetricsMiddleware",
+    "school.compression.CompressionMiddleware",
+    "school.sharding.ShardRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -55,11 +60,32 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "school.context_processors.unread_announcements",
+                "school.context_processors.submission_events",
+            ],
+        },
+    },
+    {
+        # Самые тяжёлые страницы (jinja2/, school/jinja.py)
+        "BACKEND": "django.template.backends.jinja2.Jinja2",
+        "DIRS": [BASE_DIR / "jinja2"],
+        "APP_DIRS": False,
+        "OPTIONS": {
+            "environment": "school.jinja.environment",
+            "context_processors": [
+                "django.template.context_processors.request",
+                "django.contrib.auth.context_processors.auth",
+                "django.contrib.messages.context_processors.messages",
+                "school.context_processors.unread_announcements",
+                "school.context_processors.submission_events",
             ],
         },
     },
 ]
 
+# Движок для панелей, страниц курса и задания: "jinja2" или "django"
+HOT_TEMPLATES_ENGINE = "jinja2"
+
 WSGI_APPLICATION = "school_web.wsgi.application"
 
 
@@ -70,6 +96,41 @@ DATABASES = {
     }
 }
 
+# Шардирование данных курсов (school/sharding.py). SCHOOL_SHARDS=N подключает
+# базы shard1..shardN; каждую создаёт "manage.py migrate --database shardN".
+# Порядок SHARD_DATABASES менять нельзя: от него зависят диапазоны id.
+SHARD_COUNT = int(os.environ.get("SCHOOL_SHARDS", 0))
+for number in range(1, SHARD_COUNT + 1):
+    DATABASES[f"shard{number}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / f"db_shard{number}.sqlite3",
+    }
+SHARD_DATABASES = [f"shard{number}" for number in range(1, SHARD_COUNT + 1)] or [
+    "default"
+]
+SHARD_ID_RANGE = 10**12  # id строк в шарде N начинаются с N * SHARD_ID_RANGE
+SHARD_PLACEMENT_TTL = 60  # секунды, которые процесс помнит базу курса
+DATABASE_ROUTERS = ["school.sharding.CourseShardRouter"]
+# Добавляет базы shard1 и shard2 для тестов шардирования
+TEST_RUNNER = "school.testrunner.ShardedTestRunner"
+
+# Кеш: в нём время инвалидации querycache, версии рейтингов и аналитики.
+# По умолчанию LocMemCache - в памяти процесса; кеш querysets с ним отключён,
+# потому что инвалидация не доходила бы до других процессов. Для нескольких
+# процессов сервера задайте SCHOOL_REDIS_URL (нужен пакет redis).
+REDIS_URL = os.environ.get("SCHOOL_REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -103,3 +164,65 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+
+# Server-Sent Events (school/events.py)
+EVENTS_POLL_INTERVAL = 2  # секунды между опросами базы
+EVENTS_HEARTBEAT_INTERVAL = 15  # секунды между keep-alive комментариями
+
+
+# Автопроверка решений (school/autograder.py)
+AUTOGRADER_TIME_LIMIT = 5  # секунды процессорного времени на тест
+AUTOGRADER_MEMORY_LIMIT_MB = 256
+AUTOGRADER_MAX_PROCESSES = 16  # RLIMIT_NPROC пользователя решений
+AUTOGRADER_USER = "nobody"  # от него запускаются решения, если проверка идёт от root
+AUTOGRADER_PYTHON = None  # интерпретатор решений; по умолчанию python3 из /usr/bin
+AUTOGRADER_SANDBOX = "namespaces"  # "none" или префикс команды: ["bwrap", ...]
+
+# Выборочное профилирование запросов (school/profiling.py)
+PROFILING_SAMPLE_RATE = 0  # доля профилируемых запросов, например 0.01
+PROFILING_INTERVAL = 0.005  # секунды между снимками стека
+PROFILING_DIR = BASE_DIR / "profiles"
+PROFILING_MAX_FILES = 100  # файлов на каждый URL
+PROFILING_HEADER_MAX_AGE = 3600  # секунды действия заголовка X-Profile
+
+# Заголовок Server-Timing (school/timing.py)
+SERVER_TIMING = True
+SERVER_TIMING_LOG = False  # строка JSON с разбивкой времени в логгер school.timing
+
+# Метрики Prometheus (school/metrics.py)
+METRICS_DIR = BASE_DIR / "metrics"  # общий каталог для всех процессов сервера
+METRICS_FLUSH_INTERVAL = 1  # секунды между записями файла процесса
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Журнал медленных SQL-запросов (school/slowqueries.py)
+SLOW_QUERY_THRESHOLD = 0.1  # секунды; None отключает журнал
+SLOW_QUERY_LOG = BASE_DIR / "logs" / "slow_queries.log"
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Минификация HTML и сжатие ответов (school/compression.py)
+HTML_MINIFY = True
+COMPRESSION_MIN_SIZE = 512  # байт; меньшие ответы не сжимаются
+
+# Байткод шаблонов Jinja2; None - без кеша на диске
+JINJA2_BYTECODE_CACHE_DIR = BASE_DIR / "cache" / "jinja2"
+
+# Архив прошедших курсов (school/archive.py, команда archive_courses)
+ARCHIVE_AFTER_DAYS = 180  # дней после последнего срока сдачи
+
+# Кеш querysets с инвалидацией по тегам (school/querycache.py)
+QUERYCACHE_MAX_ENTRIES = 500  # записей в LRU каждого процесса
+QUERYCACHE_TIMEOUT = 5 * 60  # секунды
+QUERYCACHE_SHARED = None  # алиас из CACHES для общего уровня, например "default"
+QUERYCACHE_CLOCK_SKEW = 1.0  # секунды запаса на расхождение часов процессов
+
+# Предупреждения о querysets, которые шаблон и считает, и загружает (school/memo.py).
+# Подменяет методы QuerySet и шаблонов, поэтому включается только явно, на время
+# поиска лишних запросов: SCHOOL_MEMO_WARNINGS=1 python manage.py runserver
+QUERYSET_MEMO_WARNINGS = os.environ.get("SCHOOL_MEMO_WARNINGS") == "1"
+
+# Почта: локально письма сохраняются в файлы
+DEFAULT_FROM_EMAIL = "Online School <noreply@school.ru>"
+if DEBUG:
+    EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
+    EMAIL_FILE_PATH = BASE_DIR / "sent_emails"
@@ -10,10 +10,33 @@ urlpatterns = [
     path("profile/", views.profile_view, name="profile"),
     path("profile/avatar/", views.update_avatar, name="update_avatar"),
     path("courses/", views.my_courses, name="my_courses"),
+    path("courses/catalog/", views.course_catalog, name="course_catalog"),
     path("courses/create/", views.create_course, name="create_course"),
     path("courses/<int:course_id>/", views.course_detail, name="course_detail"),
+    path(
+        "courses/<int:course_id>/gradebook/",
+        views.course_gradebook,
+        name="course_gradebook",
+    ),
+    path(
+        "courses/<int:course_id>/gradebook/data/",
+        views.course_gradebook_data,
+        name="course_gradebook_data",
+    ),
+    path(
+        "courses/<int:course_id>/leaderboard/",
+        views.course_leaderboard,
+        name="course_leaderboard",
+    ),
     path("courses/<int:course_id>/enroll/", views.enroll_course, name="enroll_course"),
     path("courses/<int:course_id>/enroll/", views.enroll_course, name="enroll_course"),
+    path(
+        "courses/<int:course_id>/activity/",
+        views.course_activity_data,
+        name="course_activity_data",
+    ),
+    path("activity/", views.activity_feed_data, name="activity_feed_data"),
+    path("announcements/", views.announcement_feed, name="announcement_feed"),
     path("assignments/create/", views.create_assignment, name="create_assignment"),
     path('assignment/<int:assignment_id>/submit/', views.submit_assignment, name='submit_assignment'),
     path('submission/<int:submission_id>/view/', views.view_submission, name='view_submission'),
@@ -33,12 +56,25 @@ urlpatterns = [
         views.submissions_list,
         name="submissions_list",
     ),
+    path(
+        "assignments/<int:assignment_id>/tests/",
+        views.assignment_tests,
+        name="assignment_tests",
+    ),
     path(
         "submissions/<int:submission_id>/grade/",
         views.grade_submission,
         name="grade_submission",
     ),
     path("statistics/", views.teacher_statistics, name="teacher_statistics"),
+    path("async/dashboard/", views.dashboard_async, name="dashboard_async"),
+    path(
+        "async/statistics/",
+        views.teacher_statistics_async,
+        name="teacher_statistics_async",
+    ),
+    path("events/submissions/", views.submission_events, name="submission_events"),
+    path("metrics", views.metrics_view, name="metrics"),
 
     path('admin/', admin.site.urls),
     ]
\ No newline at end of file
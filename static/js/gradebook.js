@@ -0,0 +1,110 @@
+// Журнал оценок с виртуальной прокруткой: в DOM только видимые строки
+(function () {
+    const ROW_HEIGHT = 32;
+    const BUFFER = 10;
+    const SUBMITTED = 1, LATE = 2, MISSING = 4;
+
+    function escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, ch => ({
+            '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+        })[ch]);
+    }
+
+    function formatNumber(value) {
+        return value === null ? '—' : value;
+    }
+
+    function cell(grade, flags, maxPoints) {
+        if (flags & MISSING) {
+            return '<td class="table-danger text-center" title="Не сдано">—</td>';
+        }
+        if (!(flags & SUBMITTED)) {
+            return '<td></td>';
+        }
+        const late = flags & LATE ? ' text-warning fw-bold' : '';
+        const title = flags & LATE ? 'Сдано с опозданием' : 'Сдано';
+        const text = grade < 0 ? '✓' : grade + '/' + maxPoints;
+        return '<td class="text-center' + late + '" title="' + title + '">' + text + '</td>';
+    }
+
+    function renderHeader(table, data) {
+        const titles = data.assignments.map(a =>
+            '<th class="text-center" title="' + escapeHtml(a[1]) + '">' +
+            escapeHtml(a[1].length > 12 ? a[1].slice(0, 12) + '…' : a[1]) + '</th>'
+        ).join('');
+        const averages = data.col_average.map((avg, i) =>
+            '<th class="text-center small text-muted" title="Сдали: ' + data.col_submitted[i] +
+            ', долгов: ' + data.col_missing[i] + '">' + formatNumber(avg) + '</th>'
+        ).join('');
+        table.querySelector('thead').innerHTML =
+            '<tr><th class="gradebook-name">Ученик</th>' + titles +
+            '<th>Сумма</th><th>%</th><th>Долги</th></tr>' +
+            '<tr><th class="gradebook-name small text-muted">Среднее</th>' + averages +
+            '<th></th><th></th><th></th></tr>';
+    }
+
+    function renderRows(container, table, data, state) {
+        const total = data.students.length;
+        const first = Math.max(0, Math.floor(container.scrollTop / ROW_HEIGHT) - BUFFER);
+        const visible = Math.ceil(container.clientHeight / ROW_HEIGHT) + BUFFER * 2;
+        const last = Math.min(total, first + visible);
+        if (first === state.first && last === state.last) {
+            return;
+        }
+        state.first = first;
+        state.last = last;
+
+        const columns = data.assignments.length + 4;
+        const rows = ['<tr style="height:' + first * ROW_HEIGHT + 'px"><td colspan="' + columns + '"></td></tr>'];
+        for (let r = first; r < last; r++) {
+            const grades = data.grades[r];
+            const flags = data.flags[r];
+            let html = '<tr style="height:' + ROW_HEIGHT + 'px"><td class="gradebook-name">' +
+                escapeHtml(data.students[r][1]) + '</td>';
+            for (let c = 0; c < grades.length; c++) {
+                html += cell(grades[c], flags[c], data.assignments[c][2]);
+            }
+            const missing = data.row_missing[r];
+            html += '<td class="fw-bold">' + data.row_total[r] + '</td>' +
+                '<td>' + formatNumber(data.row_percent[r]) + '</td>' +
+                '<td class="' + (missing ? 'text-danger fw-bold' : 'text-muted') + '">' + missing + '</td></tr>';
+            rows.push(html);
+        }
+        rows.push('<tr style="height:' + (total - last) * ROW_HEIGHT + 'px"><td colspan="' + columns + '"></td></tr>');
+        table.querySelector('tbody').innerHTML = rows.join('');
+    }
+
+    function initGradebook(container) {
+        const table = container.querySelector('table');
+        fetch(container.dataset.url, {credentials: 'same-origin'})
+            .then(response => response.json())
+            .then(data => {
+                renderHeader(table, data);
+                const state = {first: -1, last: -1};
+                let scheduled = false;
+                renderRows(container, table, data, state);
+                container.addEventListener('scroll', () => {
+                    if (scheduled) {
+                        return;
+                    }
+                    scheduled = true;
+                    requestAnimationFrame(() => {
+                        scheduled = false;
+                        renderRows(container, table, data, state);
+                    });
+                });
+                const status = document.getElementById('gradebook-status');
+                if (status) {
+                    status.textContent = data.students.length + ' учеников × ' +
+                        data.assignments.length + ' заданий';
+                }
+            });
+    }
+
+    document.addEventListener('DOMContentLoaded', () => {
+        const container = document.getElementById('gradebook');
+        if (container) {
+            initGradebook(container);
+        }
+    });
+})();
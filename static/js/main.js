@@ -140,6 +140,53 @@ function initComponents() {
     });
 }
 
+function initSubmissionEvents(url) {
+    if (!window.EventSource) return;
+
+    const source = new EventSource(url);
+
+    source.addEventListener('submissions', function(e) {
+        const events = JSON.parse(e.data);
+        events.forEach(event => {
+            let text;
+            if (event.type === 'graded') {
+                text = `Работа «${event.assignment_title}» проверена: ${event.grade}/${event.max_points}`;
+            } else {
+                text = `Новое решение по заданию «${event.assignment_title}»`;
+            }
+            showLiveNotification(text, `/assignments/${event.assignment_id}/`);
+        });
+    });
+
+    source.addEventListener('reset', function() {
+        showLiveNotification('Появилось много обновлений', window.location.pathname);
+    });
+}
+
+function showLiveNotification(text, link) {
+    let container = document.getElementById('live-notifications');
+    if (!container) {
+        container = document.createElement('div');
+        container.id = 'live-notifications';
+        container.style.cssText = 'position: fixed; bottom: 20px; right: 20px; z-index: 1080; max-width: 360px;';
+        document.body.appendChild(container);
+    }
+
+    const alert = document.createElement('div');
+    alert.className = 'alert alert-info alert-dismissible fade show shadow';
+    const message = document.createElement('a');
+    message.href = link;
+    message.className = 'alert-link';
+    message.textContent = text;
+    alert.appendChild(message);
+    const close = document.createElement('button');
+    close.type = 'button';
+    close.className = 'btn-close';
+    close.setAttribute('data-bs-dismiss', 'alert');
+    alert.appendChild(close);
+    container.appendChild(alert);
+}
+
 function formatDate(dateString) {
     const date = new Date(dateString);
     return date.toLocaleDateString('ru-RU', {